@@ -11,6 +11,7 @@ from flask import Flask, g, render_template, session, request, redirect, url_for
 from db import get_db, close_db
 from views.inventory import init_inventory_views
 from views.inventory_v2 import init_inventory_views_v2, init_inventory_views_v3
+from views.inventory_sync import init_inventory_sync_views
 from views.masters import init_master_views
 from views.purchases import init_purchase_views
 from views.reports import init_report_views
@@ -42,6 +43,7 @@ from views.admin.store_holidays import init_store_holidays_views
 from views.order_support import init_order_support_views
 from views.mst_items_csv import init_items_csv_views
 from views.pur_delivery_paste import init_delivery_paste_views
+from views.jobs import init_job_views
 from views.help import init_help_views
 
 # ----------------------------------------
@@ -286,52 +288,71 @@ def inject_store_list():
 # ----------------------------------------
 # Helpers
 # ----------------------------------------
+def _purchase_row_to_dict(row):
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        data = row
+    else:
+        try:
+            data = dict(row)
+        except TypeError:
+            return {"_raw": str(row)}
+
+    def convert(v):
+        if isinstance(v, datetime):
+            return v.isoformat(timespec="seconds")
+        if isinstance(v, date):
+            return v.isoformat()
+        return v
+
+    return {k: convert(v) for k, v in data.items()}
+
+
 def log_purchase_change(db, purchase_id, action, old_row, new_row, changed_by=None):
     """
     purchases changes -> purchase_logs
     (Works for both sqlite row-like and dict rows)
     """
+    log_purchase_changes(
+        db, [(purchase_id, action, old_row, new_row)], changed_by=changed_by
+    )
 
-    def row_to_dict(row):
-        if row is None:
-            return None
-        if isinstance(row, dict):
-            data = row
-        else:
-            try:
-                data = dict(row)
-            except TypeError:
-                return {"_raw": str(row)}
-
-        def convert(v):
-            if isinstance(v, datetime):
-                return v.isoformat(timespec="seconds")
-            if isinstance(v, date):
-                return v.isoformat()
-            return v
-
-        return {k: convert(v) for k, v in data.items()}
-
-    old_data = row_to_dict(old_row)
-    new_data = row_to_dict(new_row)
+
+def log_purchase_changes(db, changes, changed_by=None):
+    """
+    Batched log_purchase_change: changes = [(purchase_id, action, old_row, new_row)].
+    One multi-row INSERT into purchase_logs and one into sys_work_logs,
+    however many lines a delivery slip has.
+    """
+    if not changes:
+        return
+    changed_at = datetime.now().isoformat(timespec="seconds")
+    entries = [
+        (purchase_id, action, _purchase_row_to_dict(old_row), _purchase_row_to_dict(new_row))
+        for purchase_id, action, old_row, new_row in changes
+    ]
 
     # -----------------------------
     # Existing purchase_logs insert
     # -----------------------------
-    db.execute(
-        """
-        INSERT INTO purchase_logs
-          (purchase_id, action, old_data, new_data, changed_by, changed_at)
-        VALUES (%s, %s, %s, %s, %s, %s)
-        """,
-        (
+    params = []
+    for purchase_id, action, old_data, new_data in entries:
+        params += [
             purchase_id,
             action,
             json.dumps(old_data, ensure_ascii=False) if old_data is not None else None,
             json.dumps(new_data, ensure_ascii=False) if new_data is not None else None,
             changed_by,
-            datetime.now().isoformat(timespec="seconds"),
-        ),
+            changed_at,
+        ]
+    db.execute(
+        """
+        INSERT INTO purchase_logs
+          (purchase_id, action, old_data, new_data, changed_by, changed_at)
+        VALUES
+        """ + ",\n".join(["(%s, %s, %s, %s, %s, %s)"] * len(entries)),
+        params,
     )
 
     # -----------------------------
@@ -339,24 +360,26 @@ def log_purchase_change(db, purchase_id, action, old_row, new_row, changed_by=No
     # -----------------------------
     try:
         # local import avoids circular imports
-        from views.reports.audit_log import log_event
-
-        log_event(
-            db,
-            action=action,                     # CREATE / UPDATE / DELETE
-            module="pur",
-            entity_table="purchases",
-            entity_id=str(purchase_id),
-            message=f"Purchase {action}",
-            old_data=old_data,
-            new_data=new_data,
-            store_id=(
-                new_data.get("store_id")
-                if isinstance(new_data, dict)
-                else None
-            ),
-            status_code=200,
-        )
+        from views.reports.audit_log import log_events
+
+        log_events(db, [
+            {
+                "action": action,                  # CREATE / UPDATE / DELETE
+                "module": "pur",
+                "entity_table": "purchases",
+                "entity_id": str(purchase_id),
+                "message": f"Purchase {action}",
+                "old_data": old_data,
+                "new_data": new_data,
+                "store_id": (
+                    new_data.get("store_id")
+                    if isinstance(new_data, dict)
+                    else None
+                ),
+                "status_code": 200,
+            }
+            for purchase_id, action, old_data, new_data in entries
+        ])
     except Exception:
         # audit logging must NEVER break business logic
         pass
@@ -443,15 +466,17 @@ init_store_holidays_views(app, get_db)
 init_order_support_views(app, get_db)
 
 # Existing modules
-init_purchase_views(app, get_db, log_purchase_change)
+init_purchase_views(app, get_db, log_purchase_change, log_purchase_changes)
 init_report_views(app, get_db)
 init_master_views(app, get_db)
 init_inventory_views(app, get_db)
 init_inventory_views_v2(app, get_db)
 init_inventory_views_v3(app, get_db)
+init_inventory_sync_views(app, get_db)
 init_location_views(app, get_db)
 init_items_csv_views(app, get_db)
-init_delivery_paste_views(app, get_db)
+init_delivery_paste_views(app, get_db, log_purchase_changes)
+init_job_views(app, get_db)
 init_help_views(app)
 
 
@@ -13,13 +13,18 @@ class DBWrapper:
         if params is None:
             params = []
 
-        # Convert SQLite style placeholders
-        fixed_sql = sql.replace("?", "%s") if "?" in sql else sql
+        # Convert SQLite style placeholders. Named (dict) params use
+        # %(key)s only, so a "?" there is SQL text (regex, jsonb operator).
+        if "?" in sql and not isinstance(params, dict):
+            fixed_sql = sql.replace("?", "%s")
+        else:
+            fixed_sql = sql
 
         # ---- Guard: placeholder count vs params count ----
+        # (named %(key)s params are matched by psycopg2 itself)
         placeholder_count = fixed_sql.count("%s")
         try:
-            param_count = len(params)
+            param_count = None if isinstance(params, dict) else len(params)
         except TypeError:
             # if params is not sized (rare), skip
             param_count = None
@@ -76,16 +81,19 @@ def _db_url_for_env(env: str) -> str:
     return url
 
 
+def connect_db() -> DBWrapper:
+    """New connection for the current environment (outside a request,
+    e.g. the background worker). The caller closes it."""
+    conn = psycopg2.connect(
+        _db_url_for_env(_current_env()),
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+    return DBWrapper(conn)
+
+
 def get_db():
     if "db" not in g:
-        env = _current_env()
-        db_url = _db_url_for_env(env)
-
-        conn = psycopg2.connect(
-            db_url,
-            cursor_factory=psycopg2.extras.RealDictCursor,
-        )
-        g.db = DBWrapper(conn)
+        g.db = connect_db()
 
     return g.db
 
@@ -0,0 +1,271 @@
+"""
+Benchmark: count-sheet loading, old multi-query path vs utils.count_sheet.
+
+For every store (or --store-id), loads the sheet for --count-date with
+  legacy   the former _fetch_count_data (6 queries) + fetch_item_frequency
+  sheet    load_count_sheet(..., with_frequency=True) (1 query)
+and prints the number of queries, median latency and item count, smallest
+store first. The legacy loader is kept here only for the comparison.
+
+Read-only; every run ends in a rollback.
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/bench_count_sheet.py
+    python init/bench_count_sheet.py --store-id 3 --count-date 2026-10-19 --repeat 10
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import DBWrapper  # noqa: E402
+from utils.count_sheet import TZ_MAP, load_count_sheet  # noqa: E402
+from utils.item_frequency import fetch_item_frequency  # noqa: E402
+
+
+class CountingDB:
+    """Wraps a DBWrapper and counts execute() calls."""
+
+    def __init__(self, db):
+        self.db = db
+        self.queries = 0
+
+    def execute(self, *args, **kwargs):
+        self.queries += 1
+        return self.db.execute(*args, **kwargs)
+
+    def rollback(self):
+        self.db.rollback()
+
+
+def legacy_count_sheet(db, store_id, count_date, company_id):
+    """The pre-loader path: base rows, then one batch query per column."""
+    base_rows = db.execute(
+        """
+        SELECT i.id AS item_id, i.code AS item_code, i.name AS item_name,
+               COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') AS tz_raw,
+               sh.code AS shelf_code, sh.name AS shelf_name,
+               COALESCE(sam.display_name, am.name, '') AS area_name,
+               i.is_internal
+        FROM mst_items i
+        LEFT JOIN item_location_prefs pref
+          ON pref.store_id = %s AND pref.item_id = i.id
+        LEFT JOIN item_shelf_map m
+          ON m.store_id = %s AND m.item_id = i.id AND m.is_active = TRUE
+        LEFT JOIN store_shelves sh ON sh.id = m.shelf_id
+        LEFT JOIN store_area_map sam ON sam.id = sh.store_area_map_id
+        LEFT JOIN area_master am ON am.id = sam.area_id
+        WHERE i.company_id = %s
+          AND (
+            pref.item_id IS NOT NULL OR m.item_id IS NOT NULL
+            OR i.is_internal = 1
+            OR EXISTS (
+              SELECT 1 FROM purchases p
+              WHERE p.store_id = %s AND p.item_id = i.id
+                AND p.is_deleted = 0 AND p.delivery_date <= %s
+            )
+          )
+        ORDER BY
+          CASE
+            WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷凍','FREEZE') THEN 1
+            WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷蔵','CHILL')  THEN 2
+            WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('常温','AMB')    THEN 3
+            ELSE 9
+          END,
+          COALESCE(sam.sort_order,9999), COALESCE(am.name,''),
+          COALESCE(sh.sort_order,9999),  COALESCE(sh.code,''),
+          COALESCE(m.sort_order,9999),   i.code
+        """,
+        (store_id, store_id, company_id, store_id, count_date),
+    ).fetchall()
+    item_ids = [r["item_id"] for r in base_rows]
+
+    last_map = {
+        r["item_id"]: (r["opening_qty"] or 0, r["last_count_date"])
+        for r in db.execute(
+            """
+            SELECT DISTINCT ON (item_id) item_id,
+                   count_date AS last_count_date, counted_qty AS opening_qty
+            FROM stock_counts
+            WHERE store_id = %s AND item_id = ANY(%s) AND count_date <= %s
+            ORDER BY item_id, count_date DESC, id DESC
+            """,
+            (store_id, item_ids, count_date),
+        ).fetchall()
+    }
+    after_map = {
+        r["item_id"]: r["qty_after"] or 0
+        for r in db.execute(
+            """
+            WITH last_cnt AS (
+              SELECT DISTINCT ON (item_id) item_id, count_date AS last_count_date
+              FROM stock_counts
+              WHERE store_id = %s AND item_id = ANY(%s) AND count_date <= %s
+              ORDER BY item_id, count_date DESC, id DESC
+            )
+            SELECT p.item_id, COALESCE(SUM(p.quantity),0) AS qty_after
+            FROM purchases p
+            LEFT JOIN last_cnt lc ON lc.item_id = p.item_id
+            WHERE p.store_id = %s AND p.item_id = ANY(%s)
+              AND p.is_deleted = 0 AND p.delivery_date <= %s
+              AND (lc.last_count_date IS NULL OR p.delivery_date > lc.last_count_date)
+            GROUP BY p.item_id
+            """,
+            (store_id, item_ids, count_date, store_id, item_ids, count_date),
+        ).fetchall()
+    }
+    price_map = {
+        r["item_id"]: float(r["unit_price"] or 0)
+        for r in db.execute(
+            """
+            SELECT item_id,
+                   CASE WHEN SUM(quantity)>0
+                        THEN SUM(quantity*unit_price)::numeric/SUM(quantity)
+                        ELSE 0 END AS unit_price
+            FROM purchases
+            WHERE store_id = %s AND item_id = ANY(%s)
+              AND is_deleted = 0 AND delivery_date <= %s
+            GROUP BY item_id
+            """,
+            (store_id, item_ids, count_date),
+        ).fetchall()
+    }
+    counted_map = {
+        r["item_id"]: r["counted_qty"]
+        for r in db.execute(
+            "SELECT item_id, counted_qty FROM stock_counts "
+            "WHERE store_id = %s AND item_id = ANY(%s) AND count_date = %s",
+            (store_id, item_ids, count_date),
+        ).fetchall()
+    }
+    last_ever_map = {
+        r["item_id"]: (r["last_ever_date"], r["last_ever_at"])
+        for r in db.execute(
+            """
+            SELECT DISTINCT ON (item_id) item_id,
+                   count_date AS last_ever_date, created_at AS last_ever_at
+            FROM stock_counts
+            WHERE store_id = %s AND item_id = ANY(%s)
+            ORDER BY item_id, count_date DESC, id DESC
+            """,
+            (store_id, item_ids),
+        ).fetchall()
+    }
+
+    items = []
+    for row in base_rows:
+        item_id = row["item_id"]
+        opening, last_count_date = last_map.get(item_id, (0, None))
+        system_qty = opening + after_map.get(item_id, 0)
+        if system_qty <= 0 and not row["is_internal"]:
+            continue
+        last_ever_date, last_ever_at = last_ever_map.get(item_id, (None, None))
+        items.append({
+            "item_id": item_id,
+            "item_code": row["item_code"],
+            "temp_zone": TZ_MAP.get(row["tz_raw"] or "", "その他"),
+            "system_qty": system_qty,
+            "unit_price": price_map.get(item_id, 0.0),
+            "counted_qty": counted_map.get(item_id),
+            "last_count_date": last_count_date,
+            "last_ever_date": last_ever_date,
+        })
+
+    freq_map = fetch_item_frequency(db, [i["item_id"] for i in items], store_id=store_id)
+    for it in items:
+        it["frequency"] = freq_map.get(it["item_id"], {"bucket": "none"})
+    return items
+
+
+def _time(fn, repeat):
+    """(median ms, queries per call, result of the last call)."""
+    timings = []
+    result, queries = None, 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result, queries = fn()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return statistics.median(timings), queries, result
+
+
+def _diff(legacy, sheet):
+    """Item ids whose system qty / counted qty / bucket disagree."""
+    keyed = {it["item_id"]: it for it in sheet}
+    bad = [it["item_id"] for it in legacy if it["item_id"] not in keyed]
+    for it in legacy:
+        other = keyed.get(it["item_id"])
+        if other and (
+            it["system_qty"] != other["system_qty"]
+            or it["frequency"]["bucket"] != other["frequency"]["bucket"]
+        ):
+            bad.append(it["item_id"])
+    return bad
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store-id", type=int, default=None, help="Benchmark a single store")
+    ap.add_argument("--count-date", default=date.today().isoformat())
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV (or DATABASE_URL) not set")
+
+    count_date = date.fromisoformat(args.count_date)
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    conn.autocommit = False
+    db = DBWrapper(conn)
+    try:
+        stores = db.execute(
+            """
+            SELECT s.id, s.code, s.company_id,
+                   (SELECT COUNT(DISTINCT p.item_id) FROM purchases p
+                    WHERE p.store_id = s.id AND p.is_deleted = 0) AS n_items
+            FROM mst_stores s
+            WHERE (%s::int IS NULL OR s.id = %s)
+            ORDER BY n_items, s.id
+            """,
+            (args.store_id, args.store_id),
+        ).fetchall()
+
+        print(f"count_date={count_date}  repeat={args.repeat}  (median ms)")
+        print(f"{'store':<10} {'items':>6} │ {'legacy q':>8} {'ms':>8} │ "
+              f"{'sheet q':>7} {'ms':>8} │ {'speedup':>7}  mismatches")
+        for s in stores:
+            def run_legacy():
+                cdb = CountingDB(db)
+                return legacy_count_sheet(cdb, s["id"], count_date, s["company_id"]), cdb.queries
+
+            def run_sheet():
+                cdb = CountingDB(db)
+                return load_count_sheet(cdb, s["id"], count_date, s["company_id"],
+                                        with_frequency=True), cdb.queries
+
+            legacy_ms, legacy_q, legacy = _time(run_legacy, args.repeat)
+            sheet_ms, sheet_q, sheet = _time(run_sheet, args.repeat)
+            bad = _diff(legacy, sheet)
+            speedup = legacy_ms / sheet_ms if sheet_ms else 0.0
+            print(f"{(s['code'] or s['id']):<10} {len(sheet):>6} │ {legacy_q:>8} {legacy_ms:>8.1f} │ "
+                  f"{sheet_q:>7} {sheet_ms:>8.1f} │ {speedup:>6.1f}x  "
+                  f"{len(bad)}{' e.g. ' + str(bad[:5]) if bad else ''}")
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
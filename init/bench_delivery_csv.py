@@ -0,0 +1,133 @@
+"""
+Benchmark: delivery CSV parsing, whole-file path vs utils.delivery_csv.
+
+Writes a synthetic cp932 export (シーニュ-style fallback column layout,
+--lines data lines, --lines-per-invoice lines per 伝票NO.) to a temp file
+and parses it with
+  legacy   f.read() → decode → list(csv.reader) → full invoices list
+           (the former delivery_paste_csv_upload body)
+  stream   detect_encoding → iter_text_lines → iter_invoices, consuming
+           one invoice at a time (what the NDJSON response does)
+printing median wall time and tracemalloc peak for each. No database:
+master matching and the duplicate check are not part of the comparison.
+
+Usage:
+    python init/bench_delivery_csv.py
+    python init/bench_delivery_csv.py --lines 100000 --lines-per-invoice 8 --repeat 5
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.delivery_csv import detect_encoding, iter_invoices, iter_text_lines  # noqa: E402
+from views.pur_delivery_paste import _FALLBACK_CSV_COL  # noqa: E402
+
+
+ITEM_NAMES = ["国産若鶏もも肉", "北海道牛乳 1L", "たまねぎ（L）", "ｷｬﾍﾞﾂ", "冷凍えび 31/40",
+              "薄力粉 25kg", "サラダ油 16.5kg", "濃口醤油 18L", "ﾊﾞﾀｰ 450g", "木綿豆腐"]
+PLACES = ["本店", "駅前店", "中央キッチン"]
+
+
+def write_synthetic(path, lines, per_invoice, seed=1):
+    rng = random.Random(seed)
+    width = max(_FALLBACK_CSV_COL.values()) + 1
+    with open(path, "w", encoding="cp932", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow([f"列{i}" for i in range(width)])
+        for n in range(lines):
+            row = [""] * width
+            if n % per_invoice == 0:
+                row[_FALLBACK_CSV_COL["invoice_no"]] = f"{100000 + n // per_invoice}"
+                row[_FALLBACK_CSV_COL["supplier_name"]] = "尾家産業株式会社"
+                row[_FALLBACK_CSV_COL["delivery_place"]] = rng.choice(PLACES)
+                row[_FALLBACK_CSV_COL["invoice_date"]] = "2026/10/01"
+                row[_FALLBACK_CSV_COL["delivery_date"]] = f"2026/10/{rng.randint(1, 28):02d}"
+            qty = rng.randint(1, 20)
+            price = rng.randint(80, 4800)
+            row[_FALLBACK_CSV_COL["item_name"]] = rng.choice(ITEM_NAMES)
+            row[_FALLBACK_CSV_COL["unit_price"]] = f"{price:,}"
+            row[_FALLBACK_CSV_COL["quantity"]] = str(qty)
+            row[_FALLBACK_CSV_COL["unit"]] = "個"
+            row[_FALLBACK_CSV_COL["line_amount"]] = f"{qty * price:,}"
+            row[_FALLBACK_CSV_COL["item_code"]] = f"{rng.randint(1, 99999):05d}"
+            w.writerow(row)
+
+
+def parse_legacy(path):
+    with open(path, "rb") as fh:
+        raw = fh.read()
+    try:
+        text = raw.decode("cp932")
+    except UnicodeDecodeError:
+        text = raw.decode("utf-8-sig")
+    rows = list(csv.reader(io.StringIO(text)))
+    invoices = list(iter_invoices(rows[1:], _FALLBACK_CSV_COL))
+    return len(invoices), sum(len(inv["items"]) for inv in invoices)
+
+
+def parse_stream(path):
+    with open(path, "rb") as fh:
+        encoding = detect_encoding(fh)
+        reader = csv.reader(iter_text_lines(fh, encoding))
+        next(reader, None)
+        n_invoices = n_items = 0
+        for inv in iter_invoices(reader, _FALLBACK_CSV_COL):
+            n_invoices += 1
+            n_items += len(inv["items"])
+    return n_invoices, n_items
+
+
+def measure(fn, path, repeat):
+    times = []
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(path)
+        times.append((time.perf_counter() - t0) * 1000.0)
+    tracemalloc.start()
+    fn(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(times), peak / (1024 * 1024)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=100_000, help="Data lines in the synthetic file")
+    ap.add_argument("--lines-per-invoice", type=int, default=8)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "delivery.csv")
+        write_synthetic(path, args.lines, args.lines_per_invoice)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"[info] synthetic file: {args.lines} lines, {size_mb:.1f} MB (cp932)")
+
+        results = {}
+        for label, fn in (("legacy", parse_legacy), ("stream", parse_stream)):
+            (n_inv, n_items), ms, peak_mb = measure(fn, path, args.repeat)
+            results[label] = (n_inv, n_items)
+            print(f"[info]   {label:<7} {ms:8.0f} ms   peak {peak_mb:7.1f} MB   "
+                  f"{n_inv} invoices / {n_items} lines")
+
+        if results["legacy"] != results["stream"]:
+            print(f"[warn] result mismatch: {results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Benchmark: purchase window queries on a flat vs a monthly-partitioned table.
+
+Builds a throwaway schema (bench_purchase_partitions) holding the same
+synthetic multi-year purchase history twice —
+  flat   one table with the production indexes
+  part   the same, range-partitioned by delivery_date month
+         (layout of init/migrate_20261019_purchase_partitions.sql)
+— with skewed stores / items (a few big stores, a long tail of rarely
+bought items), ANALYZEs both and runs the hot query shapes against each
+with EXPLAIN (ANALYZE, BUFFERS). Prints median execution / planning time,
+shared buffers touched and the number of partitions the plan kept.
+
+The schema is dropped at the end unless --keep.
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/bench_purchase_partitions.py
+    python init/bench_purchase_partitions.py --rows 5000000 --years 5 --stores 80 --repeat 5
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from datetime import date
+
+import psycopg2
+import psycopg2.extras
+
+
+SCHEMA = "bench_purchase_partitions"
+
+COLUMNS = """
+  id            BIGINT NOT NULL,
+  store_id      INTEGER NOT NULL,
+  supplier_id   INTEGER NOT NULL,
+  item_id       INTEGER NOT NULL,
+  delivery_date DATE NOT NULL,
+  quantity      NUMERIC NOT NULL,
+  unit_price    NUMERIC NOT NULL,
+  amount        NUMERIC NOT NULL,
+  invoice_no    TEXT,
+  is_deleted    SMALLINT NOT NULL DEFAULT 0
+"""
+
+INDEXES = (
+    "(store_id, delivery_date DESC, id DESC)",
+    "(store_id, item_id, delivery_date)",
+    "(item_id, supplier_id, delivery_date DESC, id DESC)",
+    "(supplier_id, invoice_no)",
+)
+
+
+def _month_add(d: date, n: int) -> date:
+    y, m = divmod(d.month - 1 + n, 12)
+    return date(d.year + y, m + 1, 1)
+
+
+def build(cur, rows, years, stores, items, suppliers):
+    today = date.today()
+    end = today.replace(day=1)
+    start = _month_add(end, -12 * years)
+    cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+    cur.execute(f"CREATE SCHEMA {SCHEMA}")
+    cur.execute(f"CREATE TABLE {SCHEMA}.flat ({COLUMNS})")
+    cur.execute(f"CREATE TABLE {SCHEMA}.part ({COLUMNS}) PARTITION BY RANGE (delivery_date)")
+    m = start
+    while m <= _month_add(end, 3):
+        cur.execute(
+            f"CREATE TABLE {SCHEMA}.part_y{m:%Y}m{m:%m} PARTITION OF {SCHEMA}.part "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            (m, _month_add(m, 1)),
+        )
+        m = _month_add(m, 1)
+    cur.execute(f"CREATE TABLE {SCHEMA}.part_default PARTITION OF {SCHEMA}.part DEFAULT")
+
+    # power() skews towards low ids: store 1 and the first items get most rows
+    t0 = time.perf_counter()
+    cur.execute(
+        f"""
+        INSERT INTO {SCHEMA}.flat
+        SELECT g,
+               1 + floor(power(random(), 2) * %(stores)s)::int,
+               s.supplier_id,
+               s.item_id,
+               %(start)s::date + floor(random() * (%(end)s::date - %(start)s::date))::int,
+               q, p, q * p,
+               'INV' || (g / 8),
+               CASE WHEN random() < 0.02 THEN 1 ELSE 0 END
+        FROM generate_series(1, %(rows)s) g
+        CROSS JOIN LATERAL (
+          SELECT 1 + floor(power(random(), 3) * %(items)s)::int AS item_id,
+                 1 + (g %% %(suppliers)s)                       AS supplier_id,
+                 1 + floor(random() * 20)                       AS q,
+                 80 + floor(random() * 4800)                    AS p
+        ) s
+        """,
+        {"rows": rows, "stores": stores, "items": items, "suppliers": suppliers,
+         "start": start, "end": today},
+    )
+    cur.execute(f"INSERT INTO {SCHEMA}.part SELECT * FROM {SCHEMA}.flat")
+    t1 = time.perf_counter()
+    for table in ("flat", "part"):
+        cur.execute(f"CREATE UNIQUE INDEX ON {SCHEMA}.{table} "
+                    + ("(id)" if table == "flat" else "(id, delivery_date)"))
+        for cols in INDEXES:
+            cur.execute(f"CREATE INDEX ON {SCHEMA}.{table} {cols}")
+    cur.execute(f"ANALYZE {SCHEMA}.flat")
+    cur.execute(f"ANALYZE {SCHEMA}.part")
+    print(f"[info] {rows:,} rows × 2 over {start} … {today} loaded in {t1 - t0:.1f} s, "
+          f"indexed + analyzed in {time.perf_counter() - t1:.1f} s")
+    return end
+
+
+def queries(month: date):
+    """(name, sql with {t} for the table, params) — the shapes the views run;
+    month is the first day of the current month."""
+    y12 = _month_add(month, -11)
+    nxt = _month_add(month, 1)
+    return [
+        ("report 12 months (store)",
+         """SELECT TO_CHAR(delivery_date, 'YYYY-MM') AS ym, supplier_id, SUM(amount)
+            FROM {t} WHERE is_deleted = 0 AND store_id = %s
+              AND delivery_date >= %s AND delivery_date < %s
+            GROUP BY 1, 2""",
+         (1, y12, nxt)),
+        ("report 12 months (all)",
+         """SELECT TO_CHAR(delivery_date, 'YYYY-MM') AS ym, SUM(amount)
+            FROM {t} WHERE is_deleted = 0
+              AND delivery_date >= %s AND delivery_date < %s
+            GROUP BY 1""",
+         (y12, nxt)),
+        ("dashboard this month",
+         """SELECT store_id, SUM(amount) FROM {t}
+            WHERE is_deleted = 0 AND delivery_date >= %s AND delivery_date < %s
+            GROUP BY store_id""",
+         (month, nxt)),
+        ("item frequency 90 days",
+         """SELECT item_id, COUNT(DISTINCT delivery_date) FROM {t}
+            WHERE is_deleted = 0 AND store_id = %s
+              AND delivery_date >= CURRENT_DATE - 90
+            GROUP BY item_id""",
+         (1,)),
+        ("recent purchases page",
+         """SELECT id, delivery_date, amount FROM {t}
+            WHERE is_deleted = 0 AND store_id = %s
+            ORDER BY delivery_date DESC, id DESC LIMIT 50""",
+         (2,)),
+        ("duplicate check (one day)",
+         """SELECT COUNT(*) FROM {t}
+            WHERE is_deleted = 0 AND store_id = %s AND supplier_id = %s
+              AND delivery_date = %s""",
+         (1, 3, _month_add(month, -2))),
+    ]
+
+
+def _walk(node, rels):
+    if "Relation Name" in node:
+        rels.add(node["Relation Name"])
+    for child in node.get("Plans", []):
+        _walk(child, rels)
+
+
+def explain(cur, sql, params, repeat):
+    exec_ms, plan_ms = [], []
+    for _ in range(repeat):
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+        raw = cur.fetchone()
+        doc = raw[next(iter(raw))] if isinstance(raw, dict) else raw[0]
+        doc = json.loads(doc) if isinstance(doc, str) else doc
+        exec_ms.append(doc[0]["Execution Time"])
+        plan_ms.append(doc[0]["Planning Time"])
+    plan = doc[0]["Plan"]
+    rels = set()
+    _walk(plan, rels)
+    buffers = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+    return statistics.median(exec_ms), statistics.median(plan_ms), buffers, len(rels)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rows", type=int, default=2_000_000)
+    ap.add_argument("--years", type=int, default=5)
+    ap.add_argument("--stores", type=int, default=40)
+    ap.add_argument("--items", type=int, default=3000)
+    ap.add_argument("--suppliers", type=int, default=60)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--keep", action="store_true", help="Keep the bench schema afterwards")
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV (or DATABASE_URL) not set")
+
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        month = build(cur, args.rows, args.years, args.stores, args.items, args.suppliers)
+        print(f"{'query':<28} {'table':<5} {'exec ms':>9} {'plan ms':>8} "
+              f"{'buffers':>9} {'tables':>6}")
+        for name, sql, params in queries(month):
+            for table in ("flat", "part"):
+                e, p, b, n = explain(cur, sql.format(t=f"{SCHEMA}.{table}"), params, args.repeat)
+                print(f"{name:<28} {table:<5} {e:>9.1f} {p:>8.1f} {b:>9,} {n:>6}")
+    finally:
+        if not args.keep:
+            cur.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+"""
+Plan check: EXPLAIN the app's hot queries and fail on large sequential scans.
+
+Picks representative parameters from the data (the store with the most
+purchases, its company, its most bought items, a supplier, an invoice and
+a session token — or --store-id), then runs each query of the catalog
+below with EXPLAIN (FORMAT JSON) and walks the plan. A Seq Scan on a table
+whose pg_class.reltuples is above --max-seq-rows is a violation, as is a
+table that was never ANALYZEd (no estimate to go by).
+
+Where the query lives in a helper, the helper itself is called through a
+wrapper that EXPLAINs every SELECT it issues before running it, so the
+check follows the code. Queries that are inline in a route are mirrored
+here (the route is named in the catalog entry).
+
+The indexes these rely on are in init/migrate_20261019_hot_indexes.sql.
+Only meaningful on production-sized data — a few hundred rows per table
+are legitimately seq-scanned. init/generate_dataset.py builds such a
+dataset in a local database (run the refresh_* scripts after it).
+
+Read-only session; every run ends in a rollback. Exit status 1 when any
+query violates the threshold.
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/check_query_plans.py
+    python init/check_query_plans.py --store-id 3 --max-seq-rows 20000 --analyze --verbose
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import DBWrapper  # noqa: E402
+from utils.count_sheet import load_count_sheet  # noqa: E402
+from utils.delivery_csv import fetch_existing_counts  # noqa: E402
+from utils.item_frequency import _fetch_live_counts  # noqa: E402
+from utils.item_spend import _fetch_live as _fetch_item_spend_live  # noqa: E402
+from views.purchases import _fetch_recent_purchases  # noqa: E402
+
+
+class ExplainingDB:
+    """Wraps a DBWrapper: every SELECT / WITH is EXPLAINed, then run."""
+
+    def __init__(self, db, analyze=False):
+        self.db = db
+        self.prefix = ("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " if analyze
+                       else "EXPLAIN (FORMAT JSON) ")
+        self.plans = []
+
+    def execute(self, sql, params=None):
+        if sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            raw = self.db.execute(self.prefix + sql, params).fetchone()
+            doc = raw[next(iter(raw))] if isinstance(raw, dict) else raw[0]
+            doc = json.loads(doc) if isinstance(doc, str) else doc
+            self.plans.append(doc[0])
+        return self.db.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self.db, name)
+
+
+def resolve_params(db, store_id=None):
+    """Representative ids for the catalog; None when the data is missing."""
+    if store_id is None:
+        row = db.execute(
+            """
+            SELECT store_id FROM pur_purchases
+            WHERE is_deleted = 0
+            GROUP BY store_id ORDER BY COUNT(*) DESC LIMIT 1
+            """
+        ).fetchone()
+        if not row:
+            return None
+        store_id = row["store_id"]
+    store = db.execute("SELECT id, company_id FROM mst_stores WHERE id = %s",
+                       (store_id,)).fetchone()
+    if not store:
+        return None
+
+    since = date.today() - timedelta(days=90)
+    items = db.execute(
+        """
+        SELECT item_id FROM pur_purchases
+        WHERE store_id = %s AND is_deleted = 0 AND delivery_date >= %s
+        GROUP BY item_id ORDER BY COUNT(*) DESC LIMIT 200
+        """,
+        (store_id, since),
+    ).fetchall()
+    invoice = db.execute(
+        """
+        SELECT store_id, supplier_id, delivery_date, invoice_no
+        FROM pur_purchases
+        WHERE store_id = %s AND is_deleted = 0
+        ORDER BY delivery_date DESC, id DESC LIMIT 1
+        """,
+        (store_id,),
+    ).fetchone()
+    session = db.execute(
+        "SELECT id FROM sys_sessions WHERE company_id = %s ORDER BY created_at DESC LIMIT 1",
+        (store["company_id"],),
+    ).fetchone()
+    return {
+        "store_id": store_id,
+        "company_id": store["company_id"],
+        "item_ids": [r["item_id"] for r in items],
+        "supplier_id": invoice["supplier_id"] if invoice else None,
+        "invoice": dict(invoice) if invoice else None,
+        "session_id": session["id"] if session else None,
+        "today": date.today(),
+    }
+
+
+def catalog(p):
+    """(name, where it runs, fn(db), tables a Seq Scan is accepted on).
+
+    The accepted tables are small dimensions hashed into a report join;
+    they are still printed, just not counted as violations."""
+    today = p["today"]
+    month = today.replace(day=1)
+    y12 = (month - timedelta(days=335)).replace(day=1)
+    inv = p["invoice"] or {}
+
+    def session_lookup(db):
+        db.execute(
+            """
+            SELECT s.id AS session_id, s.user_id, s.company_id, s.expires_at,
+                   s.last_seen_at, s.is_active, u.email, u.name,
+                   u.is_active AS user_active, u.is_system_admin,
+                   u.sys_role AS sys_role, uc.role,
+                   uc.is_active AS membership_active
+            FROM sys_sessions s
+            JOIN sys_users u ON u.id = s.user_id
+            JOIN sys_user_companies uc
+              ON uc.user_id = s.user_id AND uc.company_id = s.company_id
+            WHERE s.id = %s
+            """,
+            (p["session_id"] or "",),
+        )
+
+    def latest_counts(db):
+        db.execute(
+            """
+            WITH latest AS (
+              SELECT DISTINCT ON (item_id)
+                item_id, counted_qty, count_date
+              FROM stock_counts
+              WHERE store_id = %s AND count_date <= %s
+              ORDER BY item_id, count_date DESC, id DESC
+            )
+            SELECT l.item_id, l.counted_qty, l.count_date,
+                   COALESCE(SUM(p.quantity), 0) AS qty_after
+            FROM latest l
+            LEFT JOIN purchases p
+              ON p.store_id = %s
+             AND p.item_id = l.item_id
+             AND p.is_deleted = 0
+             AND p.delivery_date > l.count_date
+            GROUP BY l.item_id, l.counted_qty, l.count_date
+            """,
+            (p["store_id"], today, p["store_id"]),
+        )
+
+    def work_logs(company_id):
+        def run(db):
+            where, params = [], []
+            if company_id:
+                where.append("company_id = %s")
+                params.append(company_id)
+            where += ["created_at >= %s", "created_at < (%s::date + INTERVAL '1 day')"]
+            params += [today - timedelta(days=7), today]
+            db.execute(
+                f"""
+                SELECT id, created_at, company_id, store_id, actor_email,
+                       method, path, status_code, message
+                FROM sys_work_logs
+                WHERE {" AND ".join(where)}
+                ORDER BY created_at DESC, id DESC
+                LIMIT 50 OFFSET 0
+                """,
+                params,
+            )
+        return run
+
+    def recent_errors(db):
+        db.execute(
+            """
+            SELECT created_at, method, path, status_code, actor_email
+            FROM sys_work_logs
+            WHERE status_code >= 400
+              AND created_at >= NOW() - (%s || ' days')::interval
+            ORDER BY created_at DESC
+            LIMIT 30
+            """,
+            ("7",),
+        )
+
+    def purchase_report(db):
+        db.execute(
+            """
+            SELECT s.id AS supplier_id, s.name AS supplier_name,
+                   TO_CHAR(p.delivery_date, 'YYYY-MM') AS ym,
+                   SUM(p.amount) AS total_amount
+            FROM pur_purchases p
+            LEFT JOIN mst_items i ON p.item_id = i.id
+            LEFT JOIN pur_suppliers s ON i.supplier_id = s.id
+            WHERE p.is_deleted = 0
+              AND p.delivery_date >= %s
+              AND p.delivery_date < %s
+              AND p.company_id = %s
+              AND p.store_id = %s
+            GROUP BY s.id, s.name, ym
+            ORDER BY s.id, ym
+            """,
+            (y12, (month + timedelta(days=32)).replace(day=1), p["company_id"], p["store_id"]),
+        )
+
+    return [
+        ("session lookup", "views/auth/login.py", session_lookup, ()),
+        ("count sheet", "utils/count_sheet.load_count_sheet",
+         lambda db: load_count_sheet(db, p["store_id"], today, p["company_id"],
+                                     with_frequency=True),
+         ("mst_items", "pur_suppliers")),
+        ("latest count + purchases after", "views/order_support.py", latest_counts, ()),
+        ("recent purchases page", "views/purchases._fetch_recent_purchases",
+         lambda db: _fetch_recent_purchases(db, p["store_id"], p["company_id"],
+                                            None, None, None, None),
+         ()),
+        ("item frequency (live)", "utils/item_frequency._fetch_live_counts",
+         lambda db: _fetch_live_counts(db, p["item_ids"], today, p["store_id"]), ()),
+        ("item picker (live)", "utils/item_spend._fetch_live",
+         lambda db: _fetch_item_spend_live(db, p["company_id"], p["supplier_id"], today), ()),
+        ("duplicate check", "utils/delivery_csv.fetch_existing_counts",
+         lambda db: fetch_existing_counts(db, [inv], by_invoice_no=True) if inv else None, ()),
+        ("work logs (company)", "views/reports/work_logs.py",
+         work_logs(p["company_id"]), ()),
+        ("work logs (all)", "views/reports/work_logs.py", work_logs(None), ()),
+        ("recent errors", "views/admin/dev_dashboard.py", recent_errors, ()),
+        ("purchase report 12 months", "views/reports/purchase_report.py",
+         purchase_report, ("mst_items", "pur_suppliers")),
+    ]
+
+
+def _seq_scans(node, out):
+    if node.get("Node Type") == "Seq Scan":
+        out.append((node.get("Relation Name"), node.get("Filter", "")))
+    for child in node.get("Plans", []):
+        _seq_scans(child, out)
+
+
+def _reltuples(db, cache, rel):
+    if rel not in cache:
+        row = db.execute("SELECT reltuples FROM pg_class WHERE oid = to_regclass(%s)",
+                         (rel,)).fetchone()
+        cache[rel] = float(row["reltuples"]) if row else -1.0
+    return cache[rel]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store-id", type=int, default=None,
+                    help="Store to check with (default: the one with the most purchases)")
+    ap.add_argument("--max-seq-rows", type=int, default=10_000,
+                    help="A Seq Scan on a table with more rows than this fails the check")
+    ap.add_argument("--analyze", action="store_true",
+                    help="EXPLAIN ANALYZE (runs each query twice) and print timings")
+    ap.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV (or DATABASE_URL) not set")
+
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    conn.set_session(readonly=True)
+    db = DBWrapper(conn)
+    failed = 0
+    try:
+        params = resolve_params(db, args.store_id)
+        if not params:
+            sys.exit("[warn] no purchases / store to check with — load data first")
+        print(f"[info] store {params['store_id']} (company {params['company_id']}), "
+              f"{len(params['item_ids'])} items, threshold {args.max_seq_rows:,} rows")
+
+        cache = {}
+        print(f"{'query':<32} {'stmts':>5} {'ms':>8}  result")
+        for name, where, fn, allow_seq in catalog(params):
+            xdb = ExplainingDB(db, analyze=args.analyze)
+            try:
+                fn(xdb)
+            except Exception as e:
+                conn.rollback()
+                print(f"{name:<32} {'-':>5} {'-':>8}  [warn] {type(e).__name__}: {e}".rstrip())
+                failed += 1
+                continue
+
+            problems, allowed = [], []
+            for plan in xdb.plans:
+                scans = []
+                _seq_scans(plan["Plan"], scans)
+                for rel, filt in scans:
+                    n = _reltuples(db, cache, rel)
+                    if n < 0:
+                        problems.append(f"{rel} (never analyzed)")
+                    elif n > args.max_seq_rows:
+                        (allowed if rel in allow_seq else problems).append(f"{rel} ~{n:,.0f} rows")
+            ms = sum(pl.get("Execution Time", 0) for pl in xdb.plans)
+            ms_txt = f"{ms:>8.1f}" if args.analyze else f"{'-':>8}"
+            status = "FAIL seq scan: " + ", ".join(problems) if problems else "ok"
+            if allowed:
+                status += "  (accepted: " + ", ".join(allowed) + ")"
+            print(f"{name:<32} {len(xdb.plans):>5} {ms_txt}  {status}")
+            if problems:
+                print(f"{'':<32} ↳ {where}")
+                failed += 1
+            if args.verbose:
+                for plan in xdb.plans:
+                    print(json.dumps(plan["Plan"], indent=2, default=str))
+    finally:
+        conn.rollback()
+        conn.close()
+
+    if failed:
+        print(f"[warn] {failed} quer{'y' if failed == 1 else 'ies'} over the threshold or failing")
+        sys.exit(1)
+    print("[info] all plans ok")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,623 @@
+"""
+Synthetic multi-tenant dataset for load and benchmark work, loaded with COPY.
+
+Creates --companies companies whose size falls off with rank (the first
+gets --stores stores, --suppliers suppliers and --items items, the tail a
+fraction of that) and fills each one with
+  stores      lognormal activity weight; about a quarter open partway
+              through the history
+  suppliers   delivery_schedule on 1–6 weekdays (the JSON the supplier form
+              writes), ~30 % follow the store's closed days (holidays_off);
+              each store buys from most of its company's suppliers
+  items       Zipf popularity per supplier, lognormal base price drifting
+              ~2 %/year
+  purchases   one invoice per store × supplier × scheduled delivery day
+              over --years years (holidays skipped, December busier),
+              --lines lines on average, ~1 % deleted
+  counts      month-end full counts and weekly ad-hoc spot counts of the
+              store's most bought items
+  holidays    mst_national_holidays, national holidays for some stores,
+              New Year / Obon closures for stores and suppliers
+  users       one admin + --users-per-store operators per store, sessions
+              on business days and work logs (logins, watched / slow
+              requests peaking in business hours, 2 % 4xx, 0.3 % 5xx)
+              for the last --log-days days
+
+The same --seed gives the same rows. Companies are named "<prefix> NNN"
+(--prefix, default SYN) and users <prefix>-cNNN-uNNN@example.invalid;
+--reset deletes an earlier run with that prefix first. Everything is one
+transaction. --no-triggers loads with session_replication_role = replica
+(superuser only) — the row triggers are skipped, which is much faster for
+millions of purchases; company_id is written explicitly either way.
+
+Writes only to DATABASE_URL_DEV. Afterwards the precomputed tables are
+stale — run init/refresh_item_frequency.py, init/refresh_item_spend.py and
+init/refresh_walk_order.py — and init/check_query_plans.py shows how the
+hot queries plan at this size.
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/generate_dataset.py
+    python init/generate_dataset.py --companies 50 --stores 40 --items 4000 --years 5 --no-triggers
+    python init/generate_dataset.py --reset --seed 7
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import base64
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta, timezone
+from itertools import accumulate
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.holiday_calendar import generate_japanese_holidays  # noqa: E402
+from views.auth.login import IDLE_DAYS, MAX_SESSION_DAYS  # noqa: E402
+
+
+JST = timezone(timedelta(hours=9))
+COPY_CHUNK = 1 << 20
+
+DAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+TEMP_ZONES = ["冷凍", "冷蔵", "常温"]
+CATEGORIES = ["肉", "魚", "野菜", "乳製品", "乾物", "調味料", "酒類", "飲料", "消耗品"]
+UNITS = ["kg", "個", "本", "袋", "箱", "パック"]
+# requests per business hour, 0–23 (lunch and evening prep peaks)
+HOUR_WEIGHTS = [0, 0, 0, 0, 0, 0, 1, 3, 8, 12, 14, 10, 5, 6, 11, 12, 9, 7, 5, 3, 2, 1, 0, 0]
+# (path, endpoint, method, share, median ms) — watched pages and the pages
+# that turn up as slow requests (app.log_slow_request)
+PAGES = [
+    ("/purchases/new", "new_purchase", "POST", 30, 220),
+    ("/purchases", "purchases", "GET", 14, 260),
+    ("/inventory/count_v2", "inventory_count_v2", "GET", 16, 480),
+    ("/inventory/count_v2", "inventory_count_v2", "POST", 8, 650),
+    ("/order_support", "order_support", "GET", 14, 700),
+    ("/reports/purchase_report", "reports.purchase_report", "GET", 7, 900),
+    ("/reports/cost_report", "reports.cost_report", "GET", 5, 1300),
+    ("/reports/usage_report", "reports.usage_report", "GET", 4, 1100),
+    ("/reports/work_logs", "reports.work_logs", "GET", 2, 400),
+]
+USER_AGENTS = [
+    "Mozilla/5.0 (iPad; CPU OS 17_5 like Mac OS X) AppleWebKit/605.1.15 Safari/604.1",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/129.0 Safari/537.36",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_6 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148",
+]
+
+
+# ─────────────────────────────────────────────────────────────────────
+# COPY plumbing
+# ─────────────────────────────────────────────────────────────────────
+def _copy_text(v) -> str:
+    """One value in COPY text format."""
+    if v is None:
+        return r"\N"
+    if isinstance(v, bool):
+        return "t" if v else "f"
+    if isinstance(v, (dict, list)):
+        v = json.dumps(v, ensure_ascii=False)
+    elif isinstance(v, (date, datetime)):
+        v = v.isoformat()
+    else:
+        v = str(v)
+    return (v.replace("\\", "\\\\").replace("\t", "\\t")
+             .replace("\n", "\\n").replace("\r", "\\r"))
+
+
+class CopyStream:
+    """File-like reader over an iterator of row tuples, for copy_expert;
+    rows are rendered as they are read, so nothing is held in memory."""
+
+    def __init__(self, rows):
+        self.rows = iter(rows)
+        self.buf = ""
+        self.count = 0
+
+    def read(self, size=-1):
+        parts, n = [self.buf], len(self.buf)
+        for row in self.rows:
+            line = "\t".join(map(_copy_text, row)) + "\n"
+            parts.append(line)
+            n += len(line)
+            self.count += 1
+            if 0 <= size <= n:
+                break
+        data = "".join(parts)
+        if size < 0:
+            self.buf = ""
+            return data
+        self.buf = data[size:]
+        return data[:size]
+
+
+def copy_rows(cur, table, columns, rows) -> int:
+    started = time.perf_counter()
+    stream = CopyStream(rows)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", stream, size=COPY_CHUNK)
+    print(f"[info] {table:<20} {stream.count:>12,} rows  {time.perf_counter() - started:7.1f} s")
+    return stream.count
+
+
+def _table_exists(cur, table) -> bool:
+    cur.execute("SELECT to_regclass(%s) AS t", (table,))
+    return cur.fetchone()["t"] is not None
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Reset
+# ─────────────────────────────────────────────────────────────────────
+def reset(cur, prefix) -> int:
+    """Delete an earlier run's rows (companies named "<prefix> …")."""
+    cur.execute("SELECT id FROM mst_companies WHERE name LIKE %s", (prefix + " %",))
+    ids = [r["id"] for r in cur.fetchall()]
+    if not ids:
+        return 0
+    stores = "store_id IN (SELECT id FROM mst_stores WHERE company_id = ANY(%(ids)s))"
+    steps = [
+        ("sys_work_logs", "company_id = ANY(%(ids)s) OR actor_email LIKE %(emails)s"),
+        ("sys_sessions", "company_id = ANY(%(ids)s)"),
+        ("sys_user_companies", "company_id = ANY(%(ids)s)"),
+        ("sys_users", "email LIKE %(emails)s"),
+        ("inv_stock_counts", stores),
+        ("pur_purchases", stores),
+        ("pur_item_frequency", stores),
+        ("inv_item_walk_order", stores),
+        ("pur_item_spend", "company_id = ANY(%(ids)s)"),
+        ("store_holidays", "company_id = ANY(%(ids)s)"),
+        ("supplier_holidays", "company_id = ANY(%(ids)s)"),
+        ("pur_store_suppliers", stores),
+        ("mst_items", "company_id = ANY(%(ids)s)"),
+        ("pur_suppliers", "company_id = ANY(%(ids)s)"),
+        ("mst_stores", "company_id = ANY(%(ids)s)"),
+        ("mst_companies", "id = ANY(%(ids)s)"),
+    ]
+    params = {"ids": ids, "emails": f"{prefix.lower()}-%@example.invalid"}
+    for table, where in steps:
+        if _table_exists(cur, table):
+            cur.execute(f"DELETE FROM {table} WHERE {where}", params)
+            print(f"[info] reset {table:<20} {cur.rowcount:>12,} rows")
+    return len(ids)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Generator
+# ─────────────────────────────────────────────────────────────────────
+class Generator:
+    def __init__(self, args):
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.today = date.today()
+        self.start = date(self.today.year - args.years, self.today.month, 1)
+        self.prefix = args.prefix
+        self.national = {}
+        for year in range(self.start.year, self.today.year + 2):
+            self.national.update(generate_japanese_holidays(year))
+
+    # ── masters ──────────────────────────────────────────────────────
+    def plan_companies(self):
+        a, rng = self.args, self.rng
+        companies = []
+        for c in range(a.companies):
+            scale = 1.0 / (c + 1) ** 0.7
+            companies.append({
+                "n": c + 1,
+                "name": f"{self.prefix} {c + 1:03d}",
+                "stores": max(1, round(a.stores * scale)),
+                "suppliers": max(3, round(a.suppliers * scale ** 0.5)),
+                "items": max(60, round(a.items * scale ** 0.5)),
+                "created_at": datetime.combine(self.start, datetime.min.time(), JST)
+                              - timedelta(days=rng.randint(0, 60)),
+            })
+        return companies
+
+    def load_masters(self, cur, companies):
+        rng = self.rng
+        copy_rows(cur, "mst_companies", ["name", "created_at"],
+                  ((c["name"], c["created_at"]) for c in companies))
+        cur.execute("SELECT id, name FROM mst_companies WHERE name LIKE %s", (self.prefix + " %",))
+        ids = {r["name"]: r["id"] for r in cur.fetchall()}
+        for c in companies:
+            c["id"] = ids[c["name"]]
+
+        span = (self.today - self.start).days
+        stores = []
+        for c in companies:
+            for s in range(c["stores"]):
+                late = s > 0 and rng.random() < 0.25
+                stores.append({
+                    "company": c, "code": f"S{s + 1:03d}",
+                    "name": f"{c['name']} 店舗{s + 1:03d}",
+                    "seats": rng.choice([20, 30, 40, 60, 80, 120]),
+                    "opened_on": self.start + timedelta(days=rng.randint(span // 4, span * 3 // 4))
+                                 if late else self.start,
+                    "weight": rng.lognormvariate(0, 0.6),
+                    "national_off": rng.random() < 0.4,
+                })
+        copy_rows(cur, "mst_stores", ["company_id", "code", "name", "seats", "opened_on"],
+                  ((s["company"]["id"], s["code"], s["name"], s["seats"], s["opened_on"])
+                   for s in stores))
+
+        suppliers = []
+        for c in companies:
+            for k in range(c["suppliers"]):
+                n_days = rng.choices([6, 5, 3, 2, 1], weights=[3, 4, 4, 3, 1])[0]
+                days = sorted(rng.sample(range(7), n_days))
+                suppliers.append({
+                    "company": c, "code": f"V{k + 1:03d}",
+                    "name": f"{c['name']} 仕入先{k + 1:03d}",
+                    "schedule": {DAYS[d]: {"deadline_days": rng.choice([1, 1, 1, 2]),
+                                           "deadline_time": rng.choice(["12:00", "15:00", "17:00"])}
+                                 for d in days},
+                    "weekdays": set(days),
+                    "holidays_off": 1 if rng.random() < 0.3 else 0,
+                    "weight": rng.lognormvariate(0, 0.4),
+                    "items": [],
+                })
+        copy_rows(cur, "pur_suppliers",
+                  ["company_id", "code", "name", "delivery_schedule", "holidays_off"],
+                  ((v["company"]["id"], v["code"], v["name"], v["schedule"], v["holidays_off"])
+                   for v in suppliers))
+
+        company_ids = [c["id"] for c in companies]
+        for table, rows in (("mst_stores", stores), ("pur_suppliers", suppliers)):
+            cur.execute(f"SELECT id, company_id, code FROM {table} WHERE company_id = ANY(%s)",
+                        (company_ids,))
+            ids = {(r["company_id"], r["code"]): r["id"] for r in cur.fetchall()}
+            for row in rows:
+                row["id"] = ids[(row["company"]["id"], row["code"])]
+
+        by_company = defaultdict(list)
+        for v in suppliers:
+            by_company[v["company"]["id"]].append(v)
+        for s in stores:
+            pool = by_company[s["company"]["id"]]
+            s["suppliers"] = rng.sample(pool, max(1, round(len(pool) * rng.uniform(0.6, 1.0))))
+        copy_rows(cur, "pur_store_suppliers", ["store_id", "supplier_id", "is_active"],
+                  ((s["id"], v["id"], 1) for s in stores for v in s["suppliers"]))
+
+        items = []
+        for c in companies:
+            pool = by_company[c["id"]]
+            # supplier share of the item master is skewed too
+            shares = [rng.lognormvariate(0, 0.8) for _ in pool]
+            for i in range(c["items"]):
+                v = rng.choices(pool, weights=shares)[0]
+                cat = rng.choice(CATEGORIES)
+                items.append({
+                    "company": c, "supplier": v, "code": f"{i + 1:06d}",
+                    "name": f"{cat} {i + 1:05d}", "unit": rng.choice(UNITS),
+                    "temp_zone": rng.choice(TEMP_ZONES), "category": cat,
+                    "is_internal": 1 if rng.random() < 0.02 else 0,
+                    "price": max(10, round(rng.lognormvariate(6.2, 0.9))),
+                    "est_order_qty": rng.choice([0, 0, 2, 3, 5, 10]),
+                })
+        copy_rows(cur, "mst_items",
+                  ["company_id", "code", "name", "unit", "supplier_id", "temp_zone",
+                   "is_internal", "category", "est_order_qty", "is_active"],
+                  ((it["company"]["id"], it["code"], it["name"], it["unit"], it["supplier"]["id"],
+                    it["temp_zone"], it["is_internal"], it["category"], it["est_order_qty"], 1)
+                   for it in items))
+        cur.execute("SELECT id, company_id, code FROM mst_items WHERE company_id = ANY(%s)",
+                    (company_ids,))
+        ids = {(r["company_id"], r["code"]): r["id"] for r in cur.fetchall()}
+        for it in items:
+            it["id"] = ids[(it["company"]["id"], it["code"])]
+            it["supplier"]["items"].append(it)
+        for v in suppliers:
+            # Zipf popularity in a random order (not by code)
+            rng.shuffle(v["items"])
+            v["cum"] = list(accumulate(1.0 / (r + 1) ** 1.1 for r in range(len(v["items"]))))
+        return stores, suppliers
+
+    # ── holidays ─────────────────────────────────────────────────────
+    def closures(self, days_per_year):
+        """New Year (and for some, Obon) closures over the whole range."""
+        out = {}
+        for year in range(self.start.year, self.today.year + 2):
+            for d in (date(year - 1, 12, 31), date(year, 1, 1), date(year, 1, 2), date(year, 1, 3)):
+                out[d] = "年末年始"
+            if days_per_year:
+                for d in range(13, 13 + days_per_year):
+                    out[date(year, 8, d)] = "夏季休業"
+        return out
+
+    def load_holidays(self, cur, stores, suppliers):
+        rng = self.rng
+        if _table_exists(cur, "mst_national_holidays"):
+            ds = sorted(self.national)
+            cur.execute(
+                """
+                INSERT INTO mst_national_holidays (country, holiday_date, name)
+                SELECT 'JP', d, n FROM unnest(%s::date[], %s::text[]) AS u(d, n)
+                ON CONFLICT DO NOTHING
+                """,
+                (ds, [self.national[d] for d in ds]),
+            )
+        for s in stores:
+            s["holidays"] = self.closures(rng.choice([0, 0, 3]))
+            if s["national_off"]:
+                s["holidays"].update(self.national)
+        for v in suppliers:
+            v["holidays"] = self.closures(rng.choice([0, 3, 4]))
+        copy_rows(cur, "store_holidays", ["store_id", "holiday_date", "name", "company_id"],
+                  ((s["id"], d, n, s["company"]["id"])
+                   for s in stores for d, n in sorted(s["holidays"].items())))
+        copy_rows(cur, "supplier_holidays", ["supplier_id", "holiday_date", "name", "company_id"],
+                  ((v["id"], d, n, v["company"]["id"])
+                   for v in suppliers for d, n in sorted(v["holidays"].items())))
+
+    # ── purchases / counts ───────────────────────────────────────────
+    def purchases(self, stores, first_bought, bought):
+        a, rng = self.args, self.rng
+        for s in stores:
+            day = s["opened_on"]
+            while day <= self.today:
+                season = 1.3 if day.month == 12 else 0.85 if day.month in (1, 2) else 1.0
+                drift = 1 + 0.02 * (day - self.start).days / 365
+                for v in s["suppliers"]:
+                    if day.weekday() not in v["weekdays"] or day in v["holidays"] \
+                            or (v["holidays_off"] and day in s["holidays"]) or not v["items"]:
+                        continue
+                    mean = a.lines * s["weight"] * v["weight"] * season
+                    n = min(len(v["items"]), max(1, round(rng.gammavariate(2.0, mean / 2.0))))
+                    picked = {it["id"]: it for it in rng.choices(v["items"], cum_weights=v["cum"], k=n)}
+                    invoice_no = f"{v['code']}{day:%y%m%d}{s['code']}"
+                    created = datetime.combine(day, datetime.min.time(), JST) + timedelta(
+                        days=rng.choice([0, 0, 0, 1, 2]), minutes=rng.randint(8 * 60, 21 * 60))
+                    for item_id, it in picked.items():
+                        qty = rng.choice([1, 1, 2, 2, 3, 4, 5, 6, 10, 12, 20])
+                        price = max(1, round(it["price"] * drift * rng.uniform(0.95, 1.05)))
+                        first_bought[s["id"]].setdefault(item_id, day)
+                        bought[s["id"]][item_id] += 1
+                        yield (s["company"]["id"], s["id"], v["id"], item_id, day, qty, price,
+                               qty * price, invoice_no, 1 if rng.random() < 0.01 else 0, created)
+                day += timedelta(days=1)
+
+    def stock_counts(self, stores, first_bought, bought):
+        rng = self.rng
+
+        def row(s, item_id, day):
+            system = rng.randint(0, 30)
+            counted = max(0, system + rng.choice([0, 0, 0, 0, -1, 1, -2, 2, -5]))
+            created = datetime.combine(day, datetime.min.time(), JST) + timedelta(
+                minutes=rng.randint(20 * 60, 23 * 60))
+            return (s["company"]["id"], s["id"], item_id, day, system, counted,
+                    counted - system, created)
+
+        for s in stores:
+            carried = first_bought[s["id"]]
+            top = [i for i, _ in bought[s["id"]].most_common(30)]
+            month = s["opened_on"].replace(day=1)
+            while month <= self.today:
+                nxt = (month + timedelta(days=32)).replace(day=1)
+                month_end = nxt - timedelta(days=1)
+                # weekly spot counts of the most bought items
+                week = month
+                while week < nxt and week <= self.today:
+                    if rng.random() < 0.5:
+                        day = week + timedelta(days=rng.randint(0, 6))
+                        if day < nxt and day <= self.today and day != month_end:
+                            for item_id in top:
+                                if carried.get(item_id, self.today) <= day:
+                                    yield row(s, item_id, day)
+                    week += timedelta(days=7)
+                if month_end <= self.today:
+                    for item_id, first in carried.items():
+                        if first <= month_end and rng.random() < 0.9:
+                            yield row(s, item_id, month_end)
+                month = nxt
+
+    def load_activity(self, cur, stores):
+        cur.execute("SELECT relkind FROM pg_class WHERE oid = 'pur_purchases'::regclass")
+        if cur.fetchone()["relkind"] == "p":
+            # partitioned (migrate_20261019_purchase_partitions.sql)
+            cur.execute("SELECT ensure_month_partitions('pur_purchases', %s, %s) AS n",
+                        (self.start, self.today + timedelta(days=92)))
+            print(f"[info] pur_purchases partitions created: {cur.fetchone()['n']}")
+        first_bought, bought = defaultdict(dict), defaultdict(Counter)
+        copy_rows(cur, "pur_purchases",
+                  ["company_id", "store_id", "supplier_id", "item_id", "delivery_date",
+                   "quantity", "unit_price", "amount", "invoice_no", "is_deleted", "created_at"],
+                  self.purchases(stores, first_bought, bought))
+        copy_rows(cur, "inv_stock_counts",
+                  ["company_id", "store_id", "item_id", "count_date",
+                   "system_qty", "counted_qty", "diff_qty", "created_at"],
+                  self.stock_counts(stores, first_bought, bought))
+
+    # ── users / sessions / work logs ─────────────────────────────────
+    def load_users(self, cur, companies, stores):
+        a, rng = self.args, self.rng
+        pw_hash = generate_password_hash(a.password, method="pbkdf2:sha256")
+        users = []
+        for c in companies:
+            c_stores = [s for s in stores if s["company"] is c]
+            plan = [("admin", None)] + [("operator", s) for s in c_stores
+                                        for _ in range(a.users_per_store)]
+            if len(c_stores) >= 5:
+                plan.append(("auditor", None))
+            for n, (role, store) in enumerate(plan, start=1):
+                users.append({
+                    "company": c, "role": role, "store": store or rng.choice(c_stores),
+                    "email": f"{self.prefix.lower()}-c{c['n']:03d}-u{n:03d}@example.invalid",
+                    "name": f"{c['name']} {role} {n:03d}",
+                })
+        created = datetime.combine(self.start, datetime.min.time(), JST)
+        copy_rows(cur, "sys_users",
+                  ["company_id", "email", "name", "password_hash", "role", "is_active",
+                   "created_at", "updated_at"],
+                  ((u["company"]["id"], u["email"], u["name"], pw_hash, u["role"], 1,
+                    created, created) for u in users))
+        cur.execute("SELECT id, email FROM sys_users WHERE email LIKE %s",
+                    (f"{self.prefix.lower()}-%@example.invalid",))
+        ids = {r["email"]: r["id"] for r in cur.fetchall()}
+        for u in users:
+            u["id"] = ids[u["email"]]
+        copy_rows(cur, "sys_user_companies", ["user_id", "company_id", "role", "is_active"],
+                  ((u["id"], u["company"]["id"], u["role"], 1) for u in users))
+        return users
+
+    def sessions(self, users):
+        rng = self.rng
+        login_p = {"admin": 0.4, "operator": 0.7, "auditor": 0.15}
+        now = datetime.now(JST)
+        first = self.today - timedelta(days=self.args.log_days)
+        out = []
+        for u in users:
+            mine = []
+            day = max(first, u["store"]["opened_on"])
+            while day <= self.today:
+                if day.weekday() < 6 and day not in u["store"]["holidays"] \
+                        and rng.random() < login_p[u["role"]]:
+                    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+                    start = datetime.combine(day, datetime.min.time(), JST) + timedelta(
+                        hours=hour, minutes=rng.randint(0, 59))
+                    if start < now:
+                        token = base64.urlsafe_b64encode(
+                            rng.getrandbits(256).to_bytes(32, "big")).rstrip(b"=").decode()
+                        mine.append({
+                            "id": token, "user": u, "created_at": start,
+                            "expires_at": start + timedelta(days=MAX_SESSION_DAYS),
+                            "last_seen_at": min(now, start + timedelta(minutes=rng.randint(5, 240))),
+                            "requests": int(rng.expovariate(1 / 6)) + 1,
+                            "ip": f"10.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(1, 254)}",
+                            "user_agent": rng.choice(USER_AGENTS),
+                            "is_active": 0,
+                        })
+                day += timedelta(days=1)
+            if mine and mine[-1]["last_seen_at"] >= now - timedelta(days=IDLE_DAYS):
+                mine[-1]["is_active"] = 1
+            out += mine
+        return out
+
+    def work_logs(self, sessions):
+        rng = self.rng
+        cum = list(accumulate(p[3] for p in PAGES))
+        for ss in sessions:
+            u = ss["user"]
+            c_id, s_id = u["company"]["id"], u["store"]["id"]
+            actor = (u["id"], u["email"], u["name"])
+            # the login POST is logged before the session exists: no company
+            yield (None, None, *actor, f"{rng.getrandbits(64):016x}", None, "POST", "/login",
+                   302, ss["ip"], ss["user_agent"], "LOGIN", "auth", "Login", None,
+                   ss["created_at"])
+            at = ss["created_at"]
+            for _ in range(ss["requests"]):
+                at += timedelta(seconds=rng.randint(20, 900))
+                path, endpoint, method, _share, median = rng.choices(PAGES, cum_weights=cum)[0]
+                elapsed = round(median * rng.lognormvariate(0, 0.7), 1)
+                r = rng.random()
+                status = (500 if r < 0.003 else rng.choice([400, 403, 404]) if r < 0.023
+                          else 302 if method == "POST" else 200)
+                watched = endpoint.startswith("reports.") or endpoint in (
+                    "inventory_count_v2", "new_purchase")
+                if not (watched or elapsed >= 800 or status >= 400):
+                    continue
+                yield (c_id, s_id, *actor, f"{rng.getrandbits(64):016x}", ss["id"], method, path,
+                       status, ss["ip"], ss["user_agent"], "PERF", "system",
+                       "Watched request" if watched else "Slow request",
+                       {"elapsed_ms": elapsed, "endpoint": endpoint, "method": method,
+                        "path": path, "query": "", "watched": watched},
+                       at)
+
+    def load_sessions(self, cur, users):
+        sessions = self.sessions(users)
+        copy_rows(cur, "sys_sessions",
+                  ["id", "user_id", "company_id", "created_at", "expires_at", "last_seen_at",
+                   "user_agent", "ip", "is_active"],
+                  ((ss["id"], ss["user"]["id"], ss["user"]["company"]["id"], ss["created_at"],
+                    ss["expires_at"], ss["last_seen_at"], ss["user_agent"], ss["ip"],
+                    ss["is_active"]) for ss in sessions))
+        copy_rows(cur, "sys_work_logs",
+                  ["company_id", "store_id", "actor_user_id", "actor_email", "actor_name",
+                   "request_id", "session_id", "method", "path", "status_code", "ip",
+                   "user_agent", "action", "module", "message", "meta", "created_at"],
+                  self.work_logs(sessions))
+
+
+LOADED_TABLES = (
+    "mst_companies", "mst_stores", "pur_suppliers", "pur_store_suppliers", "mst_items",
+    "store_holidays", "supplier_holidays", "pur_purchases", "inv_stock_counts",
+    "sys_users", "sys_user_companies", "sys_sessions", "sys_work_logs",
+)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--companies", type=int, default=20)
+    ap.add_argument("--stores", type=int, default=12, help="Stores of the largest company")
+    ap.add_argument("--suppliers", type=int, default=25, help="Suppliers of the largest company")
+    ap.add_argument("--items", type=int, default=1500, help="Items of the largest company")
+    ap.add_argument("--years", type=int, default=3, help="Years of purchase / count history")
+    ap.add_argument("--lines", type=float, default=6.0, help="Mean lines per delivery")
+    ap.add_argument("--users-per-store", type=int, default=2)
+    ap.add_argument("--log-days", type=int, default=180, help="Days of sessions / work logs")
+    ap.add_argument("--password", default="synthetic", help="Password of every generated user")
+    ap.add_argument("--prefix", default="SYN", help="Company name / user email prefix")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--reset", action="store_true", help="Delete an earlier run with this prefix first")
+    ap.add_argument("--no-triggers", action="store_true",
+                    help="session_replication_role = replica while loading (superuser)")
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV not set (the generator never writes to DATABASE_URL)")
+
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    cur = conn.cursor()
+    started = time.perf_counter()
+    try:
+        if args.no_triggers:
+            try:
+                cur.execute("SET LOCAL session_replication_role = replica")
+            except psycopg2.errors.InsufficientPrivilege:
+                conn.rollback()
+                print("[warn] --no-triggers needs a superuser; loading with triggers")
+
+        cur.execute("SELECT COUNT(*) AS n FROM mst_companies WHERE name LIKE %s",
+                    (args.prefix + " %",))
+        if cur.fetchone()["n"]:
+            if not args.reset:
+                sys.exit(f"[warn] companies named '{args.prefix} …' exist — use --reset "
+                         f"or another --prefix")
+            print(f"[info] reset: {reset(cur, args.prefix)} companies")
+
+        gen = Generator(args)
+        companies = gen.plan_companies()
+        print(f"[info] seed {args.seed}: {len(companies)} companies, "
+              f"{sum(c['stores'] for c in companies)} stores, "
+              f"{sum(c['items'] for c in companies):,} items, {gen.start} … {gen.today}")
+        stores, suppliers = gen.load_masters(cur, companies)
+        gen.load_holidays(cur, stores, suppliers)
+        gen.load_activity(cur, stores)
+        users = gen.load_users(cur, companies, stores)
+        gen.load_sessions(cur, users)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    conn.autocommit = True
+    cur = conn.cursor()
+    for table in LOADED_TABLES:
+        cur.execute(f"ANALYZE {table}")
+    conn.close()
+    print(f"[info] done in {time.perf_counter() - started:.1f} s. Next: refresh_item_frequency.py, "
+          f"refresh_item_spend.py, refresh_walk_order.py, then check_query_plans.py")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+-- 2026-10-19 — Change stamps for conditional GETs (ETag / 304).
+--
+-- One version counter per (scope, id, kind), bumped by triggers whenever a
+-- watched table changes, e.g.
+--   'store:12:purchases'    — any pur_purchases row of store 12
+--   'company:3:items'       — any mst_items row of company 3
+-- JSON endpoints hash the relevant counters into an ETag so an unchanged
+-- screen answers 304 without running its queries (utils/change_stamps.py).
+--
+-- Triggers are FOR EACH STATEMENT with transition tables, so a bulk COPY
+-- or INSERT … SELECT pays once per statement, not once per row: each
+-- distinct key is queued in sys_change_stamp_pending (no lock on the hot
+-- stamp row), and a deferred trigger moves the counters at commit, in key
+-- order, once per transaction. The stamp row is therefore locked only for
+-- the commit itself, never across a long import or worker job.
+
+CREATE TABLE IF NOT EXISTS sys_change_stamps (
+  scope_key   VARCHAR(64) PRIMARY KEY,        -- '<scope>:<id>:<kind>'
+  version     BIGINT NOT NULL DEFAULT 1,
+  last_txid   BIGINT NOT NULL,
+  changed_at  TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Keys changed by open transactions; rows live until their commit
+CREATE UNLOGGED TABLE IF NOT EXISTS sys_change_stamp_pending (
+  txid        BIGINT NOT NULL,
+  scope_key   VARCHAR(64) NOT NULL,
+  PRIMARY KEY (txid, scope_key)
+);
+
+-- TG_ARGV[0] = scope ('store' | 'company') — the row column <scope>_id is read
+-- TG_ARGV[1] = kind
+-- Statement level reads the transition tables new_rows / old_rows (see
+-- watch_change_stamp below); row level is still accepted.
+CREATE OR REPLACE FUNCTION bump_change_stamp() RETURNS TRIGGER AS $$
+DECLARE
+  scope_col TEXT := TG_ARGV[0] || '_id';
+  ids       TEXT[];
+BEGIN
+  IF TG_LEVEL = 'ROW' THEN
+    ids := ARRAY[
+      CASE WHEN TG_OP <> 'DELETE' THEN to_jsonb(NEW) ->> scope_col END,
+      CASE WHEN TG_OP <> 'INSERT' THEN to_jsonb(OLD) ->> scope_col END];
+  ELSIF TG_OP = 'INSERT' THEN
+    EXECUTE format('SELECT array_agg(DISTINCT %I::text) FROM new_rows', scope_col) INTO ids;
+  ELSIF TG_OP = 'DELETE' THEN
+    EXECUTE format('SELECT array_agg(DISTINCT %I::text) FROM old_rows', scope_col) INTO ids;
+  ELSE
+    EXECUTE format('SELECT array_agg(DISTINCT v) FROM (SELECT %I::text AS v FROM new_rows '
+                   'UNION SELECT %I::text FROM old_rows) u', scope_col, scope_col) INTO ids;
+  END IF;
+
+  IF ids IS NOT NULL THEN
+    INSERT INTO sys_change_stamp_pending (txid, scope_key)
+    SELECT txid_current(), TG_ARGV[0] || ':' || sid || ':' || TG_ARGV[1]
+    FROM unnest(ids) AS sid
+    WHERE sid IS NOT NULL
+    ON CONFLICT DO NOTHING;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Deferred to commit. The first firing of a transaction moves all of its
+-- keys (sorted, so concurrent commits lock stamp rows in the same order);
+-- later firings find nothing left.
+CREATE OR REPLACE FUNCTION flush_change_stamps() RETURNS TRIGGER AS $$
+BEGIN
+  WITH done AS (
+    DELETE FROM sys_change_stamp_pending
+    WHERE txid = NEW.txid
+    RETURNING scope_key
+  )
+  INSERT INTO sys_change_stamps (scope_key, version, last_txid, changed_at)
+  SELECT scope_key, 1, NEW.txid, NOW() FROM done ORDER BY scope_key
+  ON CONFLICT (scope_key) DO UPDATE
+    SET version    = sys_change_stamps.version + 1,
+        last_txid  = EXCLUDED.last_txid,
+        changed_at = EXCLUDED.changed_at
+    WHERE sys_change_stamps.last_txid <> EXCLUDED.last_txid;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_flush_change_stamps ON sys_change_stamp_pending;
+CREATE CONSTRAINT TRIGGER tr_flush_change_stamps
+AFTER INSERT ON sys_change_stamp_pending
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION flush_change_stamps();
+
+-- (Re)creates the stamp triggers of one table: <name>_ins / _upd / _del,
+-- statement level (transition tables need one trigger per event). Drops
+-- an earlier row-level trigger called <name>.
+CREATE OR REPLACE FUNCTION watch_change_stamp(
+  p_table REGCLASS, p_name TEXT, p_scope TEXT, p_kind TEXT
+) RETURNS VOID AS $$
+BEGIN
+  EXECUTE format('DROP TRIGGER IF EXISTS %I ON %s', p_name, p_table);
+  EXECUTE format('DROP TRIGGER IF EXISTS %I ON %s', p_name || '_ins', p_table);
+  EXECUTE format('DROP TRIGGER IF EXISTS %I ON %s', p_name || '_upd', p_table);
+  EXECUTE format('DROP TRIGGER IF EXISTS %I ON %s', p_name || '_del', p_table);
+  EXECUTE format('CREATE TRIGGER %I AFTER INSERT ON %s '
+                 'REFERENCING NEW TABLE AS new_rows '
+                 'FOR EACH STATEMENT EXECUTE FUNCTION bump_change_stamp(%L, %L)',
+                 p_name || '_ins', p_table, p_scope, p_kind);
+  EXECUTE format('CREATE TRIGGER %I AFTER UPDATE ON %s '
+                 'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows '
+                 'FOR EACH STATEMENT EXECUTE FUNCTION bump_change_stamp(%L, %L)',
+                 p_name || '_upd', p_table, p_scope, p_kind);
+  EXECUTE format('CREATE TRIGGER %I AFTER DELETE ON %s '
+                 'REFERENCING OLD TABLE AS old_rows '
+                 'FOR EACH STATEMENT EXECUTE FUNCTION bump_change_stamp(%L, %L)',
+                 p_name || '_del', p_table, p_scope, p_kind);
+END;
+$$ LANGUAGE plpgsql;
+
+-- `purchases` / `stock_counts` are views — triggers go on the base tables.
+SELECT watch_change_stamp('pur_purchases',    'tr_stamp_purchases',    'store', 'purchases');
+SELECT watch_change_stamp('inv_stock_counts', 'tr_stamp_stock_counts', 'store', 'stock_counts');
+
+-- Draft item writes always upsert their header first (updated_at = NOW()),
+-- so watching the header table is enough.
+SELECT watch_change_stamp('pur_order_drafts', 'tr_stamp_order_drafts', 'store', 'order_drafts');
+SELECT watch_change_stamp('store_holidays',   'tr_stamp_store_holidays', 'store', 'holidays');
+
+SELECT watch_change_stamp('mst_items',         'tr_stamp_items',             'company', 'items');
+SELECT watch_change_stamp('pur_suppliers',     'tr_stamp_suppliers',         'company', 'suppliers');
+SELECT watch_change_stamp('supplier_holidays', 'tr_stamp_supplier_holidays', 'company', 'supplier_holidays');
@@ -0,0 +1,39 @@
+-- 2026-10-19 — Offline count sync (smartphone count screens).
+--
+-- The phone records counts locally and uploads them in batches to
+-- /inventory/api/count-sync. Every count carries a client-generated op id;
+-- the server claims the id here (INSERT … ON CONFLICT DO NOTHING) before
+-- writing stock_counts, so a batch re-sent after a dropped response — or by
+-- two tabs at once — is applied exactly once.
+--
+-- Rows are only needed while a device may still retry. Safe to purge after
+-- a few weeks, e.g.
+--   DELETE FROM inv_count_sync_ops WHERE applied_at < NOW() - INTERVAL '30 days';
+
+CREATE TABLE IF NOT EXISTS inv_count_sync_ops (
+  op_id         VARCHAR(64) PRIMARY KEY,        -- client-generated (UUID)
+  store_id      INTEGER NOT NULL,
+  item_id       INTEGER NOT NULL,
+  count_date    DATE NOT NULL,
+  counted_qty   INTEGER NOT NULL,
+  status        VARCHAR(16) NOT NULL,           -- applied | superseded
+  device_id     VARCHAR(64),
+  user_id       INTEGER,
+  recorded_at   TIMESTAMPTZ,                    -- when the operator entered it
+  applied_at    TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_inv_count_sync_ops__applied_at
+  ON inv_count_sync_ops (applied_at);
+
+-- Shelf placement is part of the downloaded sheet (walk order), so its
+-- ETag has to move when locations change. Uses watch_change_stamp() from
+-- migrate_20261019_change_stamps.sql; the location views are backed by
+-- the inv_* tables, so the triggers go there.
+SELECT watch_change_stamp('inv_item_shelf_map', 'tr_stamp_item_shelf_map', 'store', 'locations');
+
+SELECT watch_change_stamp('inv_item_location_prefs', 'tr_stamp_item_location_prefs', 'store', 'locations');
+
+SELECT watch_change_stamp('inv_store_shelves', 'tr_stamp_store_shelves', 'store', 'locations');
+
+SELECT watch_change_stamp('inv_store_area_map', 'tr_stamp_store_area_map', 'store', 'locations');
@@ -0,0 +1,94 @@
+-- 2026-10-19 — Covering / partial indexes for the hot read paths.
+--
+-- Every count screen, order support and the reports read
+--   latest count per item   stock_counts WHERE store_id … ORDER BY item_id, count_date DESC, id DESC
+--   purchases after it      purchases WHERE store_id, item_id, delivery_date … AND is_deleted = 0
+-- and the admin screens read sys_work_logs by created_at window and resolve
+-- sys_sessions on every request. Each index below names the queries it is
+-- for; init/check_query_plans.py EXPLAINs those queries and fails when one
+-- of them still falls back to a sequential scan of a large table.
+
+-- Latest count per item (count_sheet last_cnt / last_ever, order_support
+-- latest, inventory screens): the DISTINCT ON order, with the columns they
+-- return so the heap is only visited for visibility.
+CREATE INDEX IF NOT EXISTS ix_inv_stock_counts__store_item_count_date
+  ON inv_stock_counts (store_id, item_id, count_date DESC, id DESC)
+  INCLUDE (counted_qty, created_at);
+
+-- Purchases after the last count / item frequency / per-item unit price.
+-- Same keys and predicate as ix_pur_purchases__store_id_item_id_delivery_date
+-- (migrate_20261019_item_frequency.sql), plus the summed columns, so it
+-- replaces that one.
+CREATE INDEX IF NOT EXISTS ix_pur_purchases__store_item_delivery_live
+  ON pur_purchases (store_id, item_id, delivery_date)
+  INCLUDE (quantity, unit_price)
+  WHERE is_deleted = 0;
+
+DROP INDEX IF EXISTS ix_pur_purchases__store_id_item_id_delivery_date;
+
+-- Partition copy in progress (migrate_20261019_purchase_partitions.sql):
+-- give it the same index so the swap keeps it, and drop the copy's twin
+-- of the index replaced above
+DROP INDEX IF EXISTS ix_pur_purchases_part__store_id_item_id_delivery_date;
+
+DO $$
+BEGIN
+  IF to_regclass('pur_purchases_part') IS NOT NULL THEN
+    CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__store_item_delivery_live
+      ON pur_purchases_part (store_id, item_id, delivery_date)
+      INCLUDE (quantity, unit_price)
+      WHERE is_deleted = 0;
+  END IF;
+END $$;
+
+-- Work log list (newest first, paged) and the developer dashboard windows
+CREATE INDEX IF NOT EXISTS ix_sys_work_logs__created
+  ON sys_work_logs (created_at DESC, id DESC);
+
+-- Work log list for one company, health metrics per company
+CREATE INDEX IF NOT EXISTS ix_sys_work_logs__company_created
+  ON sys_work_logs (company_id, created_at DESC, id DESC);
+
+-- Recent errors on the developer dashboard / health "errors_7d"
+CREATE INDEX IF NOT EXISTS ix_sys_work_logs__errors_created
+  ON sys_work_logs (created_at DESC)
+  WHERE status_code >= 400;
+
+-- Health metrics: logins per company in the window, last login
+CREATE INDEX IF NOT EXISTS ix_sys_sessions__company_created
+  ON sys_sessions (company_id, created_at);
+
+-- Session lookup on every request:
+--   sys_sessions s JOIN sys_users u … JOIN sys_user_companies uc
+--     ON uc.user_id = s.user_id AND uc.company_id = s.company_id
+--   WHERE s.id = %s
+-- s.id is the token and normally the primary key, and membership is
+-- usually unique on (user_id, company_id); only add what is missing so
+-- no duplicate index is built next to an existing key.
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_index x
+    JOIN pg_attribute a ON a.attrelid = x.indrelid AND a.attnum = x.indkey[0]
+    WHERE x.indrelid = 'sys_sessions'::regclass AND a.attname = 'id'
+  ) THEN
+    CREATE UNIQUE INDEX ux_sys_sessions__id ON sys_sessions (id);
+  END IF;
+
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_index x
+    JOIN pg_attribute a0 ON a0.attrelid = x.indrelid AND a0.attnum = x.indkey[0]
+    JOIN pg_attribute a1 ON a1.attrelid = x.indrelid AND a1.attnum = x.indkey[1]
+    WHERE x.indrelid = 'sys_user_companies'::regclass
+      AND x.indpred IS NULL
+      AND a0.attname = 'user_id' AND a1.attname = 'company_id'
+  ) THEN
+    CREATE INDEX ix_sys_user_companies__user_company
+      ON sys_user_companies (user_id, company_id);
+  END IF;
+END $$;
+
+ANALYZE inv_stock_counts;
+ANALYZE pur_purchases;
+ANALYZE sys_work_logs;
+ANALYZE sys_sessions;
@@ -0,0 +1,37 @@
+-- 2026-10-19 — Staging tables for the item-master CSV import.
+--
+-- items_csv_upload used to write the parsed file to cms_csv_<uuid>.json in
+-- the dyno's temp dir; preview and import each re-read and re-parsed the
+-- whole JSON. The file was gone when the next request (or the background
+-- worker) landed on another dyno, and a large file sat in memory twice.
+--
+-- Now the upload COPYs the rows here, one TEXT[] of raw cells per CSV line.
+-- Preview validates in SQL and pages with LIMIT/OFFSET, import is a single
+-- INSERT … SELECT into mst_items, and the error report is read back from
+-- the same rows (utils/item_import.py).
+--
+-- UNLOGGED: staging is disposable (re-upload after a crash), so it skips
+-- WAL. Uploads older than a day are purged on the next upload.
+
+CREATE UNLOGGED TABLE IF NOT EXISTS mst_item_csv_uploads (
+  id              BIGSERIAL PRIMARY KEY,
+  company_id      INTEGER NOT NULL,
+  created_by      INTEGER,
+  file_name       TEXT,
+  headers         TEXT[] NOT NULL,
+  row_count       INTEGER NOT NULL DEFAULT 0,
+  mapping         JSONB,                           -- field key → CSV column, set on preview
+  imported_at     TIMESTAMPTZ,
+  inserted_count  INTEGER,
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_mst_item_csv_uploads__created
+  ON mst_item_csv_uploads (created_at);
+
+CREATE UNLOGGED TABLE IF NOT EXISTS mst_item_csv_rows (
+  upload_id   BIGINT NOT NULL REFERENCES mst_item_csv_uploads (id) ON DELETE CASCADE,
+  row_num     INTEGER NOT NULL,                    -- 1 = first data row
+  cells       TEXT[] NOT NULL,
+  PRIMARY KEY (upload_id, row_num)
+);
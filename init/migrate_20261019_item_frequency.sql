@@ -0,0 +1,40 @@
+-- 2026-10-19 — Incrementally maintained purchase-frequency tiers.
+--
+-- utils/item_frequency.fetch_item_frequency used to run
+-- COUNT(DISTINCT delivery_date) over a 90-day window for every item on each
+-- load of the order-support sheet view and the smartphone count screen —
+-- and without a store filter. This table keeps the per-(store, item) result.
+--
+-- Maintenance:
+--   * purchase writes (new / edit / delete / delivery paste) refresh the
+--     touched (store, item) rows — see utils.item_frequency.touch_item_frequency
+--   * init/refresh_item_frequency.py re-ages every row once a day so items
+--     slide out of the window even when nothing new is purchased
+--
+-- Readers only trust a store's rows when all of them have window_end = today;
+-- otherwise they fall back to the live query.
+
+CREATE TABLE IF NOT EXISTS pur_item_frequency (
+  store_id        INTEGER NOT NULL,
+  item_id         INTEGER NOT NULL,
+  purchase_days   INTEGER NOT NULL DEFAULT 0,   -- distinct delivery days in window
+  bucket          VARCHAR(16) NOT NULL DEFAULT 'none',  -- very_high | high | low | none
+  window_end      DATE NOT NULL,                -- as_of date the count was taken for
+  refreshed_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (store_id, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_pur_item_frequency__window_end
+  ON pur_item_frequency (window_end);
+
+-- Supports the per-(store, item) recount issued on every purchase write.
+-- Skipped once migrate_20261019_hot_indexes.sql has put the covering
+-- ix_pur_purchases__store_item_delivery_live in its place.
+DO $$
+BEGIN
+  IF to_regclass('ix_pur_purchases__store_item_delivery_live') IS NULL THEN
+    CREATE INDEX IF NOT EXISTS ix_pur_purchases__store_id_item_id_delivery_date
+      ON pur_purchases (store_id, item_id, delivery_date)
+      WHERE is_deleted = 0;
+  END IF;
+END $$;
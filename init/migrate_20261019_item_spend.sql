@@ -0,0 +1,38 @@
+-- 2026-10-19 — Precomputed item picker ranking for purchase entry.
+--
+-- /api/mst_items/by_supplier/<id> ranked a supplier's items by summing
+-- three months of purchases on every supplier change in the entry form.
+-- This table keeps the per-(company, supplier, item) 90-day spend and the
+-- last unit price (used to prefill the price cell).
+--
+-- Maintenance (utils/item_spend.py):
+--   * purchase writes (new / edit / delete / delivery paste) refresh the
+--     touched items — touch_item_spend
+--   * init/refresh_item_spend.py re-ages every row once a day
+--
+-- Readers only trust a supplier's rows when all of them have
+-- window_end = today; otherwise they fall back to the live query. The
+-- 'company:<id>:item_spend' stamp revalidates the per-worker picker cache
+-- and the endpoint's ETag.
+
+CREATE TABLE IF NOT EXISTS pur_item_spend (
+  company_id          INTEGER NOT NULL,
+  supplier_id         INTEGER NOT NULL,
+  item_id             INTEGER NOT NULL,
+  spend_amount        BIGINT NOT NULL DEFAULT 0,   -- SUM(amount) in window
+  last_unit_price     INTEGER,                     -- latest live purchase, any date
+  last_delivery_date  DATE,
+  window_end          DATE NOT NULL,               -- as_of date the sum was taken for
+  refreshed_at        TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (company_id, supplier_id, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_pur_item_spend__item
+  ON pur_item_spend (item_id);
+
+-- Supports the per-item spend / last-price lookup on every purchase write.
+CREATE INDEX IF NOT EXISTS ix_pur_purchases__item_supplier_delivery
+  ON pur_purchases (item_id, supplier_id, delivery_date DESC, id DESC)
+  WHERE is_deleted = 0;
+
+SELECT watch_change_stamp('pur_item_spend', 'tr_stamp_item_spend', 'company', 'item_spend');
@@ -0,0 +1,49 @@
+-- 2026-10-19 — Postgres-backed background job queue.
+--
+-- Long imports (item master CSV, delivery CSV batches) and the monthly
+-- invoice run used to execute inside a gunicorn request and could hit the
+-- worker timeout. The request now inserts a sys_jobs row and returns; the
+-- `worker` process (Procfile → worker.py, utils/jobs.py) claims rows with
+-- FOR UPDATE SKIP LOCKED, so any number of workers can poll the same table
+-- without handing one job to two of them.
+--
+--   queued → running → done
+--                    ↘ queued (retry, run_after = backoff) → … → failed
+--
+-- A running job whose heartbeat is older than the stale timeout (worker
+-- died) is claimed again. Screens poll /api/jobs/<id> for progress.
+
+CREATE TABLE IF NOT EXISTS sys_jobs (
+  id              BIGSERIAL PRIMARY KEY,
+  kind            VARCHAR(64) NOT NULL,            -- handler name (utils/job_handlers.py)
+  company_id      INTEGER,                         -- NULL for system-level jobs
+  payload         JSONB NOT NULL DEFAULT '{}'::jsonb,
+  status          VARCHAR(16) NOT NULL DEFAULT 'queued',  -- queued | running | done | failed
+  attempts        INTEGER NOT NULL DEFAULT 0,
+  max_attempts    INTEGER NOT NULL DEFAULT 3,
+  run_after       TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  locked_by       VARCHAR(128),
+  heartbeat_at    TIMESTAMPTZ,
+  progress_done   INTEGER NOT NULL DEFAULT 0,
+  progress_total  INTEGER,
+  message         TEXT,                            -- latest progress line
+  result          JSONB,
+  error           TEXT,
+  created_by      INTEGER,
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  started_at      TIMESTAMPTZ,
+  finished_at     TIMESTAMPTZ
+);
+
+-- Claim query: next runnable job.
+CREATE INDEX IF NOT EXISTS ix_sys_jobs__runnable
+  ON sys_jobs (run_after, id)
+  WHERE status = 'queued';
+
+-- Stale-lease sweep (part of the claim query).
+CREATE INDEX IF NOT EXISTS ix_sys_jobs__running
+  ON sys_jobs (heartbeat_at)
+  WHERE status = 'running';
+
+CREATE INDEX IF NOT EXISTS ix_sys_jobs__company_created
+  ON sys_jobs (company_id, created_at DESC);
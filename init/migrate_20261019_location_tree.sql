@@ -0,0 +1,7 @@
+-- 2026-10-19 — Location picker bootstrap (/api/locations/bootstrap).
+--
+-- The store's zone → area → shelf tree is cached per worker and revalidated
+-- against the 'store:<id>:locations' change stamp (utils/location_tree.py).
+-- Shelves and store areas already bump it (migrate_20261019_count_sync.sql);
+-- the store's temp-zone names and order are part of the tree as well.
+SELECT watch_change_stamp('inv_store_temp_zones', 'tr_stamp_store_temp_zones', 'store', 'locations');
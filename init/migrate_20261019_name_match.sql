@@ -0,0 +1,10 @@
+-- 2026-10-19 — Cached name indexes for delivery CSV matching.
+--
+-- utils/name_match.py keeps one supplier / store / item name index per
+-- company and worker, revalidated against the 'company:<id>:<kind>' change
+-- stamps. Suppliers and items already bump theirs
+-- (migrate_20261019_change_stamps.sql); stores and store aliases are added
+-- here so a rename or a new alias reaches every worker.
+SELECT watch_change_stamp('mst_stores', 'tr_stamp_stores', 'company', 'stores');
+
+SELECT watch_change_stamp('mst_store_aliases', 'tr_stamp_store_aliases', 'company', 'store_aliases');
@@ -0,0 +1,24 @@
+-- 2026-10-19 — National holiday calendar, generated once per year.
+--
+-- Replaces the hard-coded _japanese_holidays(year) list in
+-- views/admin/store_holidays.py (which carried one specific year's
+-- Happy-Monday / equinox dates). utils.holiday_calendar.national_holidays()
+-- fills a year by rule the first time it is requested; the bulk
+-- "祝日を一括追加" presets for stores and suppliers read from here.
+--
+-- Store / supplier holiday lookups for order support are cached in-process
+-- as bitsets and invalidated via sys_change_stamps
+-- (see migrate_20261019_change_stamps.sql — apply that first).
+
+CREATE TABLE IF NOT EXISTS mst_national_holidays (
+  country       VARCHAR(2) NOT NULL DEFAULT 'JP',
+  holiday_date  DATE NOT NULL,
+  name          TEXT NOT NULL,
+  created_at    TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (country, holiday_date)
+);
+
+-- Horizon load of every supplier's holidays for a company
+-- (store_holidays is already covered by its (store_id, holiday_date) unique key).
+CREATE INDEX IF NOT EXISTS ix_supplier_holidays__company_id_holiday_date
+  ON supplier_holidays (company_id, holiday_date);
@@ -0,0 +1,80 @@
+-- 2026-10-19 — company_id kept current on pur_purchases / inv_stock_counts.
+--
+-- Both tables have a company_id column, but most rows predate it (NULL)
+-- and no write path fills it, so reports enforced tenancy with
+--   LEFT JOIN mst_stores st ON p.store_id = st.id … AND st.company_id = %s
+-- (the FIFO valuation joined mst_stores twice). This migration
+--   1. derives company_id from the store on every insert / store change
+--      (trigger, so every writer — views, bulk import, count sync — is covered)
+--   2. follows a store that moves to another company
+--   3. backfills existing rows
+--   4. adds (company_id, store_id, date) indexes for the report filters
+-- after which report queries filter p.company_id / sc.company_id directly.
+-- Those queries read the base tables: the `purchases` / `stock_counts`
+-- compatibility views are not guaranteed to expose the column.
+
+CREATE OR REPLACE FUNCTION set_company_id_from_store() RETURNS TRIGGER AS $$
+BEGIN
+  IF NEW.store_id IS NOT NULL THEN
+    NEW.company_id := COALESCE(
+      (SELECT company_id FROM mst_stores WHERE id = NEW.store_id),
+      NEW.company_id);
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_company_id_purchases ON pur_purchases;
+CREATE TRIGGER tr_company_id_purchases
+BEFORE INSERT OR UPDATE OF store_id, company_id ON pur_purchases
+FOR EACH ROW EXECUTE FUNCTION set_company_id_from_store();
+
+DROP TRIGGER IF EXISTS tr_company_id_stock_counts ON inv_stock_counts;
+CREATE TRIGGER tr_company_id_stock_counts
+BEFORE INSERT OR UPDATE OF store_id, company_id ON inv_stock_counts
+FOR EACH ROW EXECUTE FUNCTION set_company_id_from_store();
+
+CREATE OR REPLACE FUNCTION cascade_store_company_id() RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE pur_purchases    SET company_id = NEW.company_id WHERE store_id = NEW.id;
+  UPDATE inv_stock_counts SET company_id = NEW.company_id WHERE store_id = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS tr_store_company_id ON mst_stores;
+CREATE TRIGGER tr_store_company_id
+AFTER UPDATE OF company_id ON mst_stores
+FOR EACH ROW
+WHEN (OLD.company_id IS DISTINCT FROM NEW.company_id)
+EXECUTE FUNCTION cascade_store_company_id();
+
+-- Backfill (only rows that differ, so re-running is cheap)
+UPDATE pur_purchases p
+   SET company_id = s.company_id
+  FROM mst_stores s
+ WHERE p.store_id = s.id
+   AND p.company_id IS DISTINCT FROM s.company_id;
+
+UPDATE inv_stock_counts c
+   SET company_id = s.company_id
+  FROM mst_stores s
+ WHERE c.store_id = s.id
+   AND c.company_id IS DISTINCT FROM s.company_id;
+
+CREATE INDEX IF NOT EXISTS ix_pur_purchases__company_store_delivery
+  ON pur_purchases (company_id, store_id, delivery_date);
+
+CREATE INDEX IF NOT EXISTS ix_inv_stock_counts__company_store_count_date
+  ON inv_stock_counts (company_id, store_id, count_date);
+
+-- Partition copy built before this file ran: give it the same index so
+-- the swap keeps it (migrate_20261019_purchase_partitions.sql declares it
+-- for copies built afterwards)
+DO $$
+BEGIN
+  IF to_regclass('pur_purchases_part') IS NOT NULL THEN
+    CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__company_store_delivery
+      ON pur_purchases_part (company_id, store_id, delivery_date);
+  END IF;
+END $$;
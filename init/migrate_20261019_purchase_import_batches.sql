@@ -0,0 +1,33 @@
+-- 2026-10-19 — Import batches for delivery imports (納品書貼付け / CSV).
+--
+-- Every confirmed import is one batch: its lines are COPY'd into a
+-- per-transaction staging table and merged into pur_purchases with a single
+-- INSERT … SELECT (utils/purchase_import.py). Each purchase row carries the
+-- batch id, so a whole file can be reverted (soft delete) in one step, and
+-- the batch row keeps the per-phase timings of the write.
+
+CREATE TABLE IF NOT EXISTS pur_import_batches (
+  id              BIGSERIAL PRIMARY KEY,
+  company_id      INTEGER NOT NULL,
+  source          VARCHAR(16) NOT NULL,           -- 'csv' | 'paste'
+  file_name       TEXT,
+  invoice_count   INTEGER NOT NULL DEFAULT 0,
+  line_count      INTEGER NOT NULL DEFAULT 0,     -- lines submitted
+  inserted_count  INTEGER NOT NULL DEFAULT 0,     -- purchases written
+  timings         JSONB,                          -- {"copy_ms": …, "merge_ms": …, "total_ms": …}
+  created_by      INTEGER,
+  created_at      TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  reverted_at     TIMESTAMPTZ,
+  reverted_by     INTEGER,
+  reverted_count  INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS ix_pur_import_batches__company_created
+  ON pur_import_batches (company_id, created_at DESC);
+
+ALTER TABLE pur_purchases
+  ADD COLUMN IF NOT EXISTS import_batch_id BIGINT;
+
+CREATE INDEX IF NOT EXISTS ix_pur_purchases__import_batch
+  ON pur_purchases (import_batch_id)
+  WHERE import_batch_id IS NOT NULL;
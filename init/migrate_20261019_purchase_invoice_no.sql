@@ -0,0 +1,15 @@
+-- 2026-10-19 — Invoice-number dedupe key for delivery CSV imports.
+--
+-- CSV imports store the supplier's 伝票NO. on every purchase line. On the
+-- next upload the duplicate check (utils/delivery_csv.py) looks up
+-- (supplier_id, invoice_no) and flags an invoice that was already
+-- imported exactly, instead of only "something exists for this store /
+-- supplier / date". Optional: manual and paste entries leave it NULL, and it
+-- is not unique — an operator can still approve a deliberate re-import.
+
+ALTER TABLE pur_purchases
+  ADD COLUMN IF NOT EXISTS invoice_no VARCHAR(64);
+
+CREATE INDEX IF NOT EXISTS ix_pur_purchases__supplier_invoice
+  ON pur_purchases (supplier_id, invoice_no)
+  WHERE invoice_no IS NOT NULL AND is_deleted = 0;
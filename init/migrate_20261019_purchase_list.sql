@@ -0,0 +1,27 @@
+-- 2026-10-19 — Recent-purchases list: keyset pagination + trigram search.
+--
+-- /purchases/new shows the store's purchases newest first, 50 per page;
+-- further pages come from /api/purchases/recent?after=<date>:<id>
+-- (views/purchases.py _fetch_recent_purchases). The first page is the head
+-- of ix_pur_purchases__store_recent whatever the month's volume.
+--
+-- The keyword filter resolves item / supplier ids with ILIKE '%…%' first;
+-- the pg_trgm GIN indexes serve those lookups instead of a scan of the
+-- joined list. Keywords shorter than 3 characters fall back to a scan of the
+-- (small) master tables. Japanese text is indexed when the database
+-- LC_CTYPE is a UTF-8 locale (pg_trgm ignores non-alphanumeric characters).
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS ix_pur_purchases__store_recent
+  ON pur_purchases (store_id, delivery_date DESC, id DESC)
+  WHERE is_deleted = 0;
+
+CREATE INDEX IF NOT EXISTS ix_mst_items__name_trgm
+  ON mst_items USING gin (name gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_mst_items__code_trgm
+  ON mst_items USING gin (code gin_trgm_ops);
+
+CREATE INDEX IF NOT EXISTS ix_pur_suppliers__name_trgm
+  ON pur_suppliers USING gin (name gin_trgm_ops);
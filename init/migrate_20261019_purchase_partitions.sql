@@ -0,0 +1,188 @@
+-- 2026-10-19 — Monthly range partitioning of pur_purchases by delivery_date.
+--
+-- Reports, order support, item frequency, the dashboard and the duplicate
+-- check all read purchases for a delivery_date window of one store, and the
+-- table only grows. Partitioned by month, a 12-month report touches 12
+-- partitions (plus their indexes) however many years are stored.
+--
+-- This file only builds the new structure next to the live table:
+--
+--   pur_purchases_part           partitioned copy of pur_purchases
+--     _yYYYYmMM                  one partition per month with data, plus
+--                                the current month and 3 months ahead
+--     _default                   anything outside those (typo'd years …)
+--   ensure_month_partitions()    creates missing months; rows already in
+--                                DEFAULT for that month are moved over
+--   pur_purchases_part_sync      ids written to pur_purchases while the
+--                                copy runs (capture trigger)
+--
+-- The data is moved online by init/partition_purchases.py:
+--   copy   batched copy by id range + replay of captured ids (repeatable)
+--   swap   short write lock: final catch-up, rename, views / triggers /
+--          sequence moved to the partitioned table; the old table stays
+--          as pur_purchases_unpartitioned until dropped by hand
+--   ensure daily: next months' partitions (run with the other daily jobs)
+--
+-- Partitioned tables cannot have a unique key without the partition key,
+-- so id is unique together with delivery_date (ids still come from the one
+-- sequence). Indexes are declared on the parent and created per partition.
+-- Re-running this file after the swap is a no-op.
+
+CREATE OR REPLACE FUNCTION ensure_month_partitions(p_parent REGCLASS, p_from DATE, p_to DATE)
+RETURNS INTEGER AS $$
+DECLARE
+  nsp      TEXT;
+  base     TEXT;
+  key_col  TEXT;
+  def_part REGCLASS;
+  m        DATE := date_trunc('month', p_from)::date;
+  m_next   DATE;
+  part     TEXT;
+  has_rows BOOLEAN;
+  created  INTEGER := 0;
+BEGIN
+  SELECT n.nspname, c.relname, a.attname
+    INTO nsp, base, key_col
+  FROM pg_class c
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+  JOIN pg_partitioned_table pt ON pt.partrelid = c.oid
+  JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = pt.partattrs[0]
+  WHERE c.oid = p_parent;
+  IF key_col IS NULL THEN
+    RAISE EXCEPTION '% is not a partitioned table', p_parent;
+  END IF;
+
+  SELECT i.inhrelid::regclass INTO def_part
+  FROM pg_inherits i
+  JOIN pg_class c ON c.oid = i.inhrelid
+  WHERE i.inhparent = p_parent
+    AND pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT';
+
+  WHILE m <= p_to LOOP
+    m_next := (m + INTERVAL '1 month')::date;
+    part := base || '_y' || to_char(m, 'YYYY') || 'm' || to_char(m, 'MM');
+    IF to_regclass(format('%I.%I', nsp, part)) IS NULL THEN
+      has_rows := FALSE;
+      IF def_part IS NOT NULL THEN
+        EXECUTE format('SELECT EXISTS (SELECT 1 FROM %s WHERE %I >= %L AND %I < %L)',
+                       def_part, key_col, m, key_col, m_next)
+          INTO has_rows;
+      END IF;
+      IF has_rows THEN
+        -- creating the partition would fail while DEFAULT holds its rows
+        EXECUTE format('CREATE TABLE %I.%I (LIKE %s INCLUDING DEFAULTS INCLUDING CONSTRAINTS)',
+                       nsp, part, p_parent);
+        EXECUTE format('WITH moved AS (DELETE FROM %s WHERE %I >= %L AND %I < %L RETURNING *) '
+                       'INSERT INTO %I.%I SELECT * FROM moved',
+                       def_part, key_col, m, key_col, m_next, nsp, part);
+        EXECUTE format('ALTER TABLE %s ATTACH PARTITION %I.%I FOR VALUES FROM (%L) TO (%L)',
+                       p_parent, nsp, part, m, m_next);
+      ELSE
+        EXECUTE format('CREATE TABLE %I.%I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                       nsp, part, p_parent, m, m_next);
+      END IF;
+      created := created + 1;
+    END IF;
+    m := m_next;
+  END LOOP;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION pur_purchases_part_capture() RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    INSERT INTO pur_purchases_part_sync (id) VALUES (OLD.id) ON CONFLICT DO NOTHING;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO pur_purchases_part_sync (id) VALUES (NEW.id) ON CONFLICT DO NOTHING;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+
+DO $$
+DECLARE
+  m  DATE;
+  ix TEXT;
+BEGIN
+  IF (SELECT relkind FROM pg_class WHERE oid = 'pur_purchases'::regclass) = 'p' THEN
+    RAISE NOTICE 'pur_purchases is already partitioned — nothing to do';
+    RETURN;
+  END IF;
+
+  IF to_regclass('pur_purchases_part') IS NULL THEN
+    CREATE TABLE pur_purchases_part (
+      LIKE pur_purchases
+      INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING IDENTITY
+      INCLUDING GENERATED INCLUDING STORAGE
+    ) PARTITION BY RANGE (delivery_date);
+    CREATE TABLE pur_purchases_part_default PARTITION OF pur_purchases_part DEFAULT;
+  END IF;
+
+  -- Partition-aware versions of the pur_purchases indexes
+  CREATE UNIQUE INDEX IF NOT EXISTS ux_pur_purchases_part__id
+    ON pur_purchases_part (id, delivery_date);
+  -- (partial like their pur_purchases originals; copies left by an
+  -- earlier version of this block without the predicate are rebuilt)
+  DROP INDEX IF EXISTS ix_pur_purchases_part__store_id_item_id_delivery_date;
+  FOREACH ix IN ARRAY ARRAY[
+    'ix_pur_purchases_part__store_recent',
+    'ix_pur_purchases_part__item_supplier_delivery',
+    'ix_pur_purchases_part__supplier_invoice',
+    'ix_pur_purchases_part__import_batch'
+  ] LOOP
+    IF EXISTS (SELECT 1 FROM pg_index
+               WHERE indexrelid = to_regclass(ix) AND indpred IS NULL) THEN
+      EXECUTE format('DROP INDEX %I', ix);
+    END IF;
+  END LOOP;
+  CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__store_recent
+    ON pur_purchases_part (store_id, delivery_date DESC, id DESC)
+    WHERE is_deleted = 0;
+  CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__store_item_delivery_live
+    ON pur_purchases_part (store_id, item_id, delivery_date)
+    INCLUDE (quantity, unit_price)
+    WHERE is_deleted = 0;
+  CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__item_supplier_delivery
+    ON pur_purchases_part (item_id, supplier_id, delivery_date DESC, id DESC)
+    WHERE is_deleted = 0;
+  CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__supplier_invoice
+    ON pur_purchases_part (supplier_id, invoice_no)
+    WHERE invoice_no IS NOT NULL AND is_deleted = 0;
+  CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__import_batch
+    ON pur_purchases_part (import_batch_id)
+    WHERE import_batch_id IS NOT NULL;
+  -- report tenancy filter (migrate_20261019_purchase_company_id.sql)
+  CREATE INDEX IF NOT EXISTS ix_pur_purchases_part__company_store_delivery
+    ON pur_purchases_part (company_id, store_id, delivery_date);
+
+  -- Every month that has data, then the current month and 3 ahead
+  FOR m IN
+    SELECT DISTINCT date_trunc('month', delivery_date)::date
+    FROM pur_purchases
+    WHERE delivery_date IS NOT NULL
+  LOOP
+    PERFORM ensure_month_partitions('pur_purchases_part', m, m);
+  END LOOP;
+  PERFORM ensure_month_partitions('pur_purchases_part', CURRENT_DATE,
+                                  (CURRENT_DATE + INTERVAL '3 months')::date);
+
+  -- Change capture for the online copy (dropped by the swap)
+  CREATE TABLE IF NOT EXISTS pur_purchases_part_sync (
+    id BIGINT PRIMARY KEY
+  );
+  CREATE TABLE IF NOT EXISTS pur_purchases_part_progress (
+    copied_upto BIGINT NOT NULL                      -- ids <= this were range-copied
+  );
+  IF NOT EXISTS (SELECT 1 FROM pur_purchases_part_progress) THEN
+    INSERT INTO pur_purchases_part_progress (copied_upto) VALUES (0);
+  END IF;
+
+  DROP TRIGGER IF EXISTS tr_pur_purchases_part_capture ON pur_purchases;
+  CREATE TRIGGER tr_pur_purchases_part_capture
+  AFTER INSERT OR UPDATE OR DELETE ON pur_purchases
+  FOR EACH ROW EXECUTE FUNCTION pur_purchases_part_capture();
+END $$;
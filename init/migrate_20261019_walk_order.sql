@@ -0,0 +1,31 @@
+-- 2026-10-19 — Precomputed walk order for count sheets.
+--
+-- One row per (store, shelf-mapped item): walk_seq is the item's position
+-- when walking the store area → shelf → position on shelf, so the count
+-- sheet sorts by temp zone and one integer instead of joining and sorting
+-- over shelves / areas on every load (utils/walk_order.py).
+--
+-- Rebuilt per store by refresh_walk_order() from every save path that
+-- changes shelves, areas, item placement or the store's item sort config.
+-- Items without an active shelf have no row and sort after the mapped
+-- items of their zone, by code — as before.
+--
+-- After applying, fill the table once:
+--   python init/refresh_walk_order.py
+
+CREATE TABLE IF NOT EXISTS inv_item_walk_order (
+  store_id      INTEGER NOT NULL,
+  item_id       INTEGER NOT NULL,
+  walk_seq      INTEGER NOT NULL,
+  refreshed_at  TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (store_id, item_id)
+);
+
+CREATE INDEX IF NOT EXISTS ix_inv_item_walk_order__store_seq
+  ON inv_item_walk_order (store_id, walk_seq);
+
+-- The count sheet answers 304 until 'store:<id>:locations' moves; every
+-- rebuild (location, sort config or item edit) rewrites the store's rows,
+-- so watching the table bumps the stamp once per rebuild. Uses
+-- watch_change_stamp() from migrate_20261019_change_stamps.sql.
+SELECT watch_change_stamp('inv_item_walk_order', 'tr_stamp_item_walk_order', 'store', 'locations');
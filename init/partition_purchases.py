@@ -0,0 +1,323 @@
+"""
+Online move of pur_purchases into the monthly-partitioned table built by
+init/migrate_20261019_purchase_partitions.sql, and the daily job that keeps
+future months' partitions in place.
+
+Steps (run the migration first):
+
+  copy     Range-copies rows by id in --batch sized transactions, then
+           replays the ids the capture trigger recorded meanwhile (edits,
+           soft deletes, late inserts). Resumable and repeatable — run it
+           until the backlog is small, as often as you like.
+  swap     In one transaction holding a write lock on pur_purchases (reads
+           keep working): final catch-up, then pur_purchases becomes the
+           partitioned table. Views on it (`purchases` …) and its triggers
+           are recreated on the new table and the id sequence moves over.
+           The old table is kept as pur_purchases_unpartitioned; drop it by
+           hand once the app has run on the new one.
+  ensure   Creates partitions up to --months-ahead months from now. Run
+           daily with the other maintenance jobs; a write for a month
+           without a partition lands in the DEFAULT partition and is moved
+           into the new partition when it is created.
+  status   Row counts, backlog and partition summary.
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/partition_purchases.py copy --batch 20000
+    python init/partition_purchases.py swap
+    python init/partition_purchases.py ensure --months-ahead 3
+    python init/partition_purchases.py status
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import DBWrapper  # noqa: E402
+
+
+OLD = "pur_purchases"
+NEW = "pur_purchases_part"
+RETIRED = "pur_purchases_unpartitioned"
+CAPTURE_TRIGGER = "tr_pur_purchases_part_capture"
+
+
+def _is_partitioned(db, table) -> bool:
+    row = db.execute(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,)
+    ).fetchone()
+    return bool(row and row["relkind"] == "p")
+
+
+def _columns(db) -> str:
+    rows = db.execute(
+        """
+        SELECT attname
+        FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped
+          AND attgenerated = ''
+        ORDER BY attnum
+        """,
+        (NEW,),
+    ).fetchall()
+    return ", ".join(f'"{r["attname"]}"' for r in rows)
+
+
+def _overriding(db) -> str:
+    """OVERRIDING SYSTEM VALUE when id is an identity column (LIKE … INCLUDING
+    IDENTITY gave the new table its own sequence)."""
+    row = db.execute(
+        "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'",
+        (NEW,),
+    ).fetchone()
+    return "OVERRIDING SYSTEM VALUE" if row and row["attidentity"] else ""
+
+
+def _copy_range(db, cols, overriding, lo, hi) -> int:
+    db.execute(f"DELETE FROM {NEW} WHERE id > %s AND id <= %s", (lo, hi))
+    cur = db.execute(
+        f"INSERT INTO {NEW} ({cols}) {overriding} "
+        f"SELECT {cols} FROM {OLD} WHERE id > %s AND id <= %s",
+        (lo, hi),
+    )
+    db.execute("UPDATE pur_purchases_part_progress SET copied_upto = %s", (hi,))
+    return cur.rowcount
+
+
+def _replay(db, cols, overriding, limit=None) -> int:
+    """Re-copy captured ids (current state of the old row, or gone)."""
+    ids = db.execute(
+        f"""
+        DELETE FROM pur_purchases_part_sync
+        WHERE id IN (SELECT id FROM pur_purchases_part_sync ORDER BY id
+                     {'LIMIT %s' if limit else ''} FOR UPDATE SKIP LOCKED)
+        RETURNING id
+        """,
+        (limit,) if limit else None,
+    ).fetchall()
+    ids = [r["id"] for r in ids]
+    if ids:
+        db.execute(f"DELETE FROM {NEW} WHERE id = ANY(%s)", (ids,))
+        db.execute(
+            f"INSERT INTO {NEW} ({cols}) {overriding} "
+            f"SELECT {cols} FROM {OLD} WHERE id = ANY(%s)",
+            (ids,),
+        )
+    return len(ids)
+
+
+def cmd_copy(db, args):
+    if _is_partitioned(db, OLD):
+        sys.exit(f"[info] {OLD} is already partitioned — nothing to copy")
+    cols, overriding = _columns(db), _overriding(db)
+    top = db.execute(f"SELECT COALESCE(MAX(id), 0) AS m FROM {OLD}").fetchone()["m"]
+    lo = db.execute("SELECT copied_upto FROM pur_purchases_part_progress").fetchone()["copied_upto"]
+    db.commit()
+
+    started = time.perf_counter()
+    copied = 0
+    while lo < top:
+        hi = min(lo + args.batch, top)
+        copied += _copy_range(db, cols, overriding, lo, hi)
+        db.commit()
+        lo = hi
+        print(f"[info] copied ids ≤ {hi:,} / {top:,} ({copied:,} rows)")
+        if args.sleep:
+            time.sleep(args.sleep)
+
+    replayed = 0
+    while True:
+        n = _replay(db, cols, overriding, limit=args.batch)
+        db.commit()
+        replayed += n
+        if n < args.batch:
+            break
+    print(f"[info] {copied:,} rows copied, {replayed:,} changed rows replayed "
+          f"in {time.perf_counter() - started:.1f} s")
+
+
+def _ddl(db, sql):
+    """Run captured DDL verbatim (no placeholder handling: view bodies may
+    contain '%' or '?')."""
+    db.conn.cursor().execute(sql)
+
+
+def _rename_if_exists(db, kind, name, new_name):
+    if db.execute("SELECT to_regclass(%s) IS NOT NULL AS ok", (name,)).fetchone()["ok"]:
+        db.execute(f'ALTER {kind} "{name}" RENAME TO "{new_name}"')
+
+
+def cmd_swap(db, args):
+    if _is_partitioned(db, OLD):
+        sys.exit(f"[info] {OLD} is already partitioned")
+    cols, overriding = _columns(db), _overriding(db)
+    started = time.perf_counter()
+
+    db.execute("SET LOCAL lock_timeout = %s", (f"{int(args.lock_timeout * 1000)}ms",))
+    db.execute(f"LOCK TABLE {OLD} IN EXCLUSIVE MODE")      # blocks writes, not reads
+
+    lo = db.execute("SELECT copied_upto FROM pur_purchases_part_progress").fetchone()["copied_upto"]
+    top = db.execute(f"SELECT COALESCE(MAX(id), 0) AS m FROM {OLD}").fetchone()["m"]
+    tail = _copy_range(db, cols, overriding, lo, top) if top > lo else 0
+    replayed = _replay(db, cols, overriding)
+
+    views = db.execute(
+        """
+        SELECT DISTINCT v.oid::regclass::text AS name, v.relkind,
+               pg_get_viewdef(v.oid) AS def
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class v   ON v.oid = r.ev_class
+        WHERE d.refobjid = %s::regclass
+          AND v.oid <> %s::regclass
+        """,
+        (OLD, OLD),
+    ).fetchall()
+    if any(v["relkind"] != "v" for v in views):
+        sys.exit("[error] materialized views depend on pur_purchases — recreate them by hand")
+    triggers = db.execute(
+        """
+        SELECT tgname, pg_get_triggerdef(oid) AS def
+        FROM pg_trigger
+        WHERE tgrelid = %s::regclass AND NOT tgisinternal AND tgname <> %s
+        """,
+        (OLD, CAPTURE_TRIGGER),
+    ).fetchall()
+    seq = db.execute("SELECT pg_get_serial_sequence(%s, 'id') AS s", (OLD,)).fetchone()["s"]
+
+    # Old table (and the index names the new ones take over) out of the way
+    db.execute(f"DROP TRIGGER IF EXISTS {CAPTURE_TRIGGER} ON {OLD}")
+    db.execute(f"ALTER TABLE {OLD} RENAME TO {RETIRED}")
+    new_indexes = db.execute(
+        "SELECT indexrelid::regclass::text AS name FROM pg_index WHERE indrelid = %s::regclass",
+        (NEW,),
+    ).fetchall()
+    for ix in new_indexes:
+        target = ix["name"].replace(NEW, OLD, 1)
+        _rename_if_exists(db, "INDEX", target, f"{target[:54]}_unpart")
+        db.execute(f'ALTER INDEX "{ix["name"]}" RENAME TO "{target}"')
+
+    db.execute(f"ALTER TABLE {NEW} RENAME TO {OLD}")
+    parts = db.execute(
+        "SELECT inhrelid::regclass::text AS name FROM pg_inherits WHERE inhparent = %s::regclass",
+        (OLD,),
+    ).fetchall()
+    for p in parts:
+        db.execute(f'ALTER TABLE "{p["name"]}" RENAME TO "{p["name"].replace(NEW, OLD, 1)}"')
+
+    # Definitions were read while they still named pur_purchases, so they
+    # now resolve to the partitioned table
+    for v in views:
+        _ddl(db, f"CREATE OR REPLACE VIEW {v['name']} AS {v['def']}")
+    for t in triggers:
+        _ddl(db, t["def"])
+
+    if overriding:
+        db.execute(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT MAX(id) FROM pur_purchases))",
+            (OLD,),
+        )
+    elif seq:
+        db.execute(f"ALTER SEQUENCE {seq} OWNED BY {OLD}.id")
+
+    db.execute("DROP TABLE pur_purchases_part_sync, pur_purchases_part_progress")
+    db.execute("DROP FUNCTION pur_purchases_part_capture()")
+    db.commit()
+    db.execute(f"ANALYZE {OLD}")
+    db.commit()
+    print(f"[info] swapped in {time.perf_counter() - started:.1f} s — "
+          f"{tail:,} tail rows, {replayed:,} replayed, {len(views)} view(s), "
+          f"{len(triggers)} trigger(s) moved; old table kept as {RETIRED}")
+
+
+def cmd_ensure(db, args):
+    if not _is_partitioned(db, OLD):
+        sys.exit(f"[info] {OLD} is not partitioned yet — run copy / swap first")
+    n = db.execute(
+        """
+        SELECT ensure_month_partitions(%s, CURRENT_DATE,
+                                       (CURRENT_DATE + %s * INTERVAL '1 month')::date) AS n
+        """,
+        (OLD, args.months_ahead),
+    ).fetchone()["n"]
+    db.commit()
+    print(f"[info] {n} partition(s) created")
+    stray = db.execute(
+        f"SELECT COUNT(*) AS n, MIN(delivery_date) AS lo, MAX(delivery_date) AS hi "
+        f"FROM {OLD}_default"
+    ).fetchone()
+    if stray["n"]:
+        print(f"[warn] {stray['n']} row(s) in {OLD}_default "
+              f"({stray['lo']} … {stray['hi']}) — check the dates")
+
+
+def cmd_status(db, args):
+    if _is_partitioned(db, OLD):
+        rows = db.execute(
+            """
+            SELECT c.relname AS name, pg_get_expr(c.relpartbound, c.oid) AS bound,
+                   c.reltuples::bigint AS est_rows
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+            ORDER BY c.relname
+            """,
+            (OLD,),
+        ).fetchall()
+        print(f"[info] {OLD} is partitioned: {len(rows)} partition(s)")
+        for r in rows:
+            print(f"[info]   {r['name']:<32} {max(r['est_rows'], 0):>12,}  {r['bound']}")
+        return
+    counts = db.execute(
+        f"""
+        SELECT (SELECT COUNT(*) FROM {OLD}) AS old_rows,
+               (SELECT COUNT(*) FROM {NEW}) AS new_rows,
+               (SELECT COUNT(*) FROM pur_purchases_part_sync) AS backlog,
+               (SELECT copied_upto FROM pur_purchases_part_progress) AS copied_upto,
+               (SELECT MAX(id) FROM {OLD}) AS max_id
+        """
+    ).fetchone()
+    print(f"[info] {OLD}: {counts['old_rows']:,} rows (max id {counts['max_id']}); "
+          f"{NEW}: {counts['new_rows']:,} rows, copied ≤ {counts['copied_upto']:,}, "
+          f"{counts['backlog']:,} captured change(s) to replay")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("copy", help="Copy rows into the partitioned table (repeatable)")
+    p.add_argument("--batch", type=int, default=20000, help="Ids per transaction")
+    p.add_argument("--sleep", type=float, default=0.0, help="Pause between batches (seconds)")
+    p = sub.add_parser("swap", help="Final catch-up and switch to the partitioned table")
+    p.add_argument("--lock-timeout", type=float, default=5.0,
+                   help="Give up (and retry later) if the write lock takes longer (seconds)")
+    p = sub.add_parser("ensure", help="Create upcoming monthly partitions")
+    p.add_argument("--months-ahead", type=int, default=3)
+    sub.add_parser("status", help="Show progress / partitions")
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV (or DATABASE_URL) not set")
+
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    conn.autocommit = False
+    db = DBWrapper(conn)
+    try:
+        {"copy": cmd_copy, "swap": cmd_swap, "ensure": cmd_ensure,
+         "status": cmd_status}[args.command](db, args)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Daily sliding-window refresh of pur_item_frequency.
+
+Purchase writes only refresh the (store, item) rows they touch, so without
+this job an item that stops being purchased would keep its old bucket
+forever. Run once a day (after midnight JST) — it recounts every store's
+90-day window in a single set-based upsert and stamps window_end = today,
+which is what fetch_item_frequency checks before trusting the table.
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/refresh_item_frequency.py
+    DATABASE_URL=postgres://...     python init/refresh_item_frequency.py --store-id 3
+    python init/refresh_item_frequency.py --dry-run    # report only, rolls back
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import DBWrapper  # noqa: E402
+from utils.item_frequency import refresh_item_frequency  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store-id", type=int, default=None, help="Refresh a single store")
+    ap.add_argument("--dry-run", action="store_true", help="Compute, then roll back")
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV (or DATABASE_URL) not set")
+
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    conn.autocommit = False
+    db = DBWrapper(conn)
+    try:
+        started = time.perf_counter()
+        n = refresh_item_frequency(db, store_id=args.store_id)
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+        summary = db.execute(
+            """
+            SELECT bucket, COUNT(*) AS n
+            FROM pur_item_frequency
+            GROUP BY bucket
+            ORDER BY bucket
+            """
+        ).fetchall()
+
+        if args.dry_run:
+            conn.rollback()
+            print(f"[info] dry run — {n} rows computed in {elapsed_ms:.0f} ms, rolled back")
+        else:
+            conn.commit()
+            print(f"[info] {n} rows refreshed in {elapsed_ms:.0f} ms")
+        for r in summary:
+            print(f"[info]   {r['bucket']:<10} {r['n']}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Rebuild inv_item_walk_order (count-sheet walk order) for every store.
+
+The location save paths keep the table current; run this once after
+init/migrate_20261019_walk_order.sql, and again after any location change
+made outside the app (SQL console, data import).
+
+Usage:
+    DATABASE_URL_DEV=postgres://... python init/refresh_walk_order.py
+    DATABASE_URL=postgres://...     python init/refresh_walk_order.py --store-id 3
+    python init/refresh_walk_order.py --dry-run    # report only, rolls back
+
+Written: 2026-10-19
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+import psycopg2.extras
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import DBWrapper  # noqa: E402
+from utils.walk_order import refresh_walk_order  # noqa: E402
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store-id", type=int, default=None, help="Refresh a single store")
+    ap.add_argument("--dry-run", action="store_true", help="Compute, then roll back")
+    args = ap.parse_args()
+
+    db_url = os.environ.get("DATABASE_URL_DEV") or os.environ.get("DATABASE_URL")
+    if not db_url:
+        sys.exit("DATABASE_URL_DEV (or DATABASE_URL) not set")
+
+    conn = psycopg2.connect(db_url, cursor_factory=psycopg2.extras.RealDictCursor)
+    conn.autocommit = False
+    db = DBWrapper(conn)
+    try:
+        if args.store_id:
+            store_ids = [args.store_id]
+        else:
+            store_ids = [r["id"] for r in db.execute(
+                "SELECT id FROM mst_stores ORDER BY id"
+            ).fetchall()]
+
+        started = time.perf_counter()
+        total = 0
+        for store_id in store_ids:
+            n = refresh_walk_order(db, store_id)
+            total += n
+            print(f"[info]   store {store_id:<6} {n} items")
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+        if args.dry_run:
+            conn.rollback()
+            print(f"[info] dry run — {total} rows computed in {elapsed_ms:.0f} ms, rolled back")
+        else:
+            conn.commit()
+            print(f"[info] {total} rows refreshed for {len(store_ids)} stores in {elapsed_ms:.0f} ms")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
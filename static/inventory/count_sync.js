@@ -0,0 +1,260 @@
+/**
+ * count_sync.js  –  offline-first saving for the smartphone count screens.
+ *
+ * Usage:
+ *   <form id="count-form" data-sync-url="/inventory/api/count-sync"
+ *         data-store-id="3" data-count-date="2026-10-19"> …
+ *     <input class="count-input" data-item-id="123" data-base="41" …>
+ *   </form>
+ *   <script src="/static/inventory/count_sync.js"></script>
+ *   <script>initCountSync('#count-form', { onChange: fn, messages: {…} });</script>
+ *
+ * Options: onChange(input) re-applies the screen's own styling after the
+ * value or its saved baseline changed; submitAfterSync posts the form
+ * after a successful sync instead of reloading.
+ *
+ * Every edit of a .count-input is stored in localStorage as an op
+ * { op_id, item_id, counted_qty, system_qty, base_qty, recorded_at } and
+ * uploaded in batches (debounced, and again whenever the phone comes back
+ * online). Ops survive reloads and lost signal; the server applies each
+ * op_id at most once, so re-sending after a dropped response is safe.
+ *
+ * data-base is the count for that item/date the page was rendered with
+ * ('' = not counted yet). The server reports a conflict instead of
+ * overwriting when someone else saved a different value in the meantime.
+ *
+ * If the sync endpoint is missing (404, e.g. not migrated), the form falls
+ * back to its normal POST. Network errors and 5xx answers keep the queue
+ * and retry with backoff.
+ */
+
+function initCountSync(formSelector, options) {
+  var form = document.querySelector(formSelector);
+  if (!form || !form.dataset.syncUrl || !window.fetch || !window.localStorage) return;
+
+  options = options || {};
+  var msg = options.messages || {};
+  var onChange = options.onChange || function () {};
+
+  var SYNC_URL   = form.dataset.syncUrl;
+  var STORE_ID   = form.dataset.storeId;
+  var COUNT_DATE = form.dataset.countDate;
+  var KEY        = 'countsync:' + STORE_ID + ':' + COUNT_DATE;
+  var DEVICE_KEY = 'countsync:device';
+  var BATCH_SIZE = 200;
+  var DEBOUNCE_MS = 1500;
+  var MAX_RETRY_MS = 30000;
+
+  var queue = load();        // item_id -> op (only the newest edit per item)
+  var inflight = false;
+  var timer = null;
+  var retryMs = 0;           // backoff after a network error / 5xx
+  var disabled = false;      // endpoint missing (404) → plain form POST
+  var restoring = false;
+  var hadConflict = false;   // since the last Save press
+
+  function uuid() {
+    if (window.crypto && crypto.randomUUID) return crypto.randomUUID();
+    return Date.now().toString(36) + '-' + Math.random().toString(36).slice(2, 12)
+         + '-' + Math.random().toString(36).slice(2, 12);
+  }
+
+  function deviceId() {
+    var id = localStorage.getItem(DEVICE_KEY);
+    if (!id) { id = uuid(); localStorage.setItem(DEVICE_KEY, id); }
+    return id;
+  }
+
+  function load() {
+    try { return JSON.parse(localStorage.getItem(KEY) || '{}') || {}; }
+    catch (e) { return {}; }
+  }
+
+  function save() {
+    var n = Object.keys(queue).length;
+    if (n) localStorage.setItem(KEY, JSON.stringify(queue));
+    else localStorage.removeItem(KEY);
+    showStatus();
+  }
+
+  function inputFor(itemId) {
+    return form.querySelector('.count-input[data-item-id="' + itemId + '"]');
+  }
+
+  function fmt(s, vals) {
+    return String(s || '').replace(/\{(\w+)\}/g, function (_, k) {
+      return vals[k] != null ? vals[k] : '';
+    });
+  }
+
+  function showStatus(state) {
+    var el = document.getElementById('sync-status');
+    if (!el) return;
+    var n = Object.keys(queue).length;
+    if (state === 'offline' || (n && !navigator.onLine)) {
+      el.textContent = fmt(msg.offline, { n: n });
+      el.className = 'sync-status offline';
+    } else if (n) {
+      el.textContent = fmt(msg.pending, { n: n });
+      el.className = 'sync-status pending';
+    } else {
+      el.textContent = msg.synced || '';
+      el.className = 'sync-status synced';
+    }
+  }
+
+  function record(inp) {
+    if (restoring || disabled) return;
+    var itemId = inp.dataset.itemId;
+    var val = parseInt(inp.value, 10);
+    if (!itemId || isNaN(val) || val < 0) return;
+    var base = inp.dataset.base;
+    queue[itemId] = {
+      op_id: uuid(),
+      item_id: parseInt(itemId, 10),
+      counted_qty: val,
+      system_qty: parseInt(inp.dataset.system, 10) || 0,
+      base_qty: base === '' || base == null ? null : parseInt(base, 10),
+      recorded_at: new Date().toISOString()
+    };
+    save();
+    schedule();
+  }
+
+  function schedule(delay) {
+    clearTimeout(timer);
+    timer = setTimeout(flush, delay || DEBOUNCE_MS);
+  }
+
+  function settle(itemId, opId, qty) {
+    var op = queue[itemId];
+    if (op && op.op_id === opId) delete queue[itemId];
+    // A newer edit made while this one was in flight is based on it now.
+    else if (op) op.base_qty = qty;
+    var inp = inputFor(itemId);
+    if (!inp) return;
+    inp.dataset.base = qty;
+    if (inp.dataset.original !== undefined) inp.dataset.original = qty;
+    var card = inp.closest('.item-card');
+    if (card) card.classList.remove('sync-conflict');
+    onChange(inp);
+  }
+
+  function conflict(c, op) {
+    hadConflict = true;
+    var itemId = String(c.item_id);
+    if (queue[itemId] && queue[itemId].op_id === c.op_id) delete queue[itemId];
+    var inp = inputFor(itemId);
+    if (!inp) return;
+    inp.value = c.server_qty;
+    inp.dataset.base = c.server_qty;
+    if (inp.dataset.original !== undefined) inp.dataset.original = c.server_qty;
+    var card = inp.closest('.item-card');
+    if (card) {
+      card.classList.add('sync-conflict');
+      card.title = fmt(msg.conflict, { qty: c.server_qty, mine: op ? op.counted_qty : '' });
+    }
+    onChange(inp);
+  }
+
+  // Returns a promise resolving to true when the queue is empty afterwards.
+  function flush() {
+    clearTimeout(timer);
+    var ops = Object.keys(queue).map(function (k) { return queue[k]; }).slice(0, BATCH_SIZE);
+    if (disabled || inflight || !ops.length) return Promise.resolve(!Object.keys(queue).length);
+    if (!navigator.onLine) { showStatus('offline'); return Promise.resolve(false); }
+
+    inflight = true;
+    return fetch(SYNC_URL, {
+      method: 'POST',
+      credentials: 'same-origin',
+      keepalive: true,
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({
+        store_id: STORE_ID, count_date: COUNT_DATE,
+        device_id: deviceId(), ops: ops
+      })
+    }).then(function (resp) {
+      if (resp.status === 404) { disabled = true; }
+      if (!resp.ok) {
+        var err = new Error('sync ' + resp.status);
+        err.retry = resp.status >= 500;
+        throw err;
+      }
+      return resp.json();
+    }).then(function (data) {
+      retryMs = 0;
+      var byId = {};
+      ops.forEach(function (op) { byId[op.op_id] = op; });
+      (data.conflicts || []).forEach(function (c) { conflict(c, byId[c.op_id]); });
+      Object.keys(data.results || {}).forEach(function (opId) {
+        var st = data.results[opId];
+        var op = byId[opId];
+        if (!op || st === 'conflict' || st === 'superseded') return;
+        // unknown_item: the item is gone from the master — nothing to retry.
+        settle(String(op.item_id), opId, op.counted_qty);
+      });
+      inflight = false;
+      save();
+      if (Object.keys(queue).length) return flush();
+      return true;
+    }).catch(function (err) {
+      inflight = false;
+      showStatus(navigator.onLine ? undefined : 'offline');
+      // Network error (no status) or 5xx: keep the queue and try again later.
+      // While offline the 'online' event flushes instead.
+      if (!disabled && navigator.onLine && (!err || err.retry !== false)) {
+        retryMs = Math.min(retryMs ? retryMs * 2 : 2000, MAX_RETRY_MS);
+        schedule(retryMs);
+      }
+      return false;
+    });
+  }
+
+  // ── Restore unsent edits from a previous visit / lost connection ──
+  restoring = true;
+  Object.keys(queue).forEach(function (itemId) {
+    var inp = inputFor(itemId);
+    if (!inp) { delete queue[itemId]; return; }
+    inp.value = queue[itemId].counted_qty;
+    onChange(inp);
+  });
+  restoring = false;
+  save();
+
+  form.addEventListener('input', function (e) {
+    if (e.target.classList && e.target.classList.contains('count-input')) record(e.target);
+  });
+  window.addEventListener('online', function () { flush(); });
+  document.addEventListener('visibilitychange', function () {
+    if (document.visibilityState === 'hidden') flush();
+  });
+
+  // Save button: push what is left, then reload for fresh server values —
+  // or, with submitAfterSync, still post the form (screens where Save means
+  // "every row shown is confirmed", not just the edited ones).
+  // Offline → keep everything on the device and say so.
+  form.addEventListener('submit', function (e) {
+    if (disabled) { localStorage.removeItem(KEY); return; }
+    e.preventDefault();
+    flush().then(function (done) {
+      if (done && !hadConflict) {
+        if (options.submitAfterSync) { localStorage.removeItem(KEY); form.submit(); }
+        else window.location.reload();
+        return;
+      }
+      if (disabled) {
+        localStorage.removeItem(KEY);
+        form.submit();
+        return;
+      }
+      alert((done ? msg.conflicts_found : msg.saved_offline) || '');
+      hadConflict = false;
+      form.querySelectorAll('.count-input:disabled').forEach(function (inp) { inp.disabled = false; });
+    });
+  });
+
+  if (Object.keys(queue).length) flush();
+
+  return { flush: flush };
+}
@@ -0,0 +1,91 @@
+"""
+The item CSV import SQL (_CHECKED_SQL) goes through DBWrapper with named
+params. Every statement must reach psycopg2 with %(key)s placeholders
+only — no "?" rewritten to %s next to them.
+
+    python -m pytest -q tests/test_item_import_sql.py
+"""
+import os
+import re
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import DBWrapper  # noqa: E402
+from utils import item_import  # noqa: E402
+
+
+class _Cursor:
+    def __init__(self, executed):
+        self._executed = executed
+        self.rowcount = 0
+
+    def execute(self, sql, params):
+        self._executed.append((sql, params))
+
+    def fetchone(self):
+        return {"total": 0, "ok_count": 0}
+
+    def fetchall(self):
+        return []
+
+
+class _Conn:
+    def __init__(self):
+        self.executed = []
+
+    def cursor(self):
+        return _Cursor(self.executed)
+
+
+UPLOAD = {"id": 1, "headers": ["品名", "仕入先"], "row_count": 0}
+MAPPING = {"name": "品名", "supplier": "仕入先"}
+
+
+def _run_all():
+    conn = _Conn()
+    db = DBWrapper(conn)
+    item_import.count_checked(db, UPLOAD, MAPPING, 1)
+    item_import.preview_page(db, UPLOAD, MAPPING, 1)
+    item_import.error_report_rows(db, UPLOAD, MAPPING, 1)
+    item_import.import_items(db, 1, UPLOAD, MAPPING)
+    return [(sql, params) for sql, params in conn.executed if isinstance(params, dict)]
+
+
+def test_checked_sql_has_no_question_mark():
+    assert "?" not in item_import._CHECKED_SQL
+
+
+def test_named_queries_keep_one_placeholder_style():
+    named = _run_all()
+    assert len(named) == 5
+    for sql, params in named:
+        assert not re.search(r"%s", sql.replace("%%", "")), sql
+        # psycopg2 interpolates %(key)s the same way; a stray % or a
+        # missing key fails here
+        sql % {k: "x" for k in params}
+
+
+def test_dict_params_skip_question_mark_rewrite():
+    conn = _Conn()
+    DBWrapper(conn).execute("SELECT %(a)s WHERE 'x' ~ 'y?'", {"a": 1})
+    assert conn.executed == [("SELECT %(a)s WHERE 'x' ~ 'y?'", {"a": 1})]
+
+
+def test_fullwidth_numbers_pass_numeric_checks():
+    params = item_import._params(UPLOAD, MAPPING, 1)
+    for f in ("unit", "purchase_unit", "inventory_unit", "min_purchase_unit"):
+        assert re.search(
+            r"translate\(btrim\(COALESCE\(r\.cells\[%\(i_" + f + r"\)s\].*\n\s*"
+            r"%\(num_from\)s, %\(num_to\)s\)\s+AS " + f + "_raw",
+            item_import._CHECKED_SQL,
+        ), f
+    to_ascii = str.maketrans(params["num_from"], params["num_to"])
+    for raw, value in (("５", 5), ("１２", 12), ("－３", -3), ("+7", 7)):
+        cell = raw.translate(to_ascii)
+        assert re.match(params["int_re"], cell), raw
+        assert int(cell) == value
+    for raw in ("１．５", "０.２５", "．５", "12"):
+        assert re.match(params["num_re"], raw.translate(to_ascii)), raw
+    for raw in ("五", "1,000", "1.2.3", ""):
+        assert not re.match(params["int_re"], raw.translate(to_ascii)), raw
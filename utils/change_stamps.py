@@ -0,0 +1,59 @@
+"""
+Change stamps → ETags for conditional GETs.
+
+sys_change_stamps holds one version counter per '<scope>:<id>:<kind>' key,
+bumped by triggers (init/migrate_20261019_change_stamps.sql) when a
+transaction that changed a watched table commits. A JSON endpoint reads the counters its response
+depends on — one indexed lookup — hashes them with its own parameters and
+answers 304 when the client already has that version.
+
+Import-safe before the migration: fetch_change_stamps() returns None when
+the table is missing and callers simply skip the ETag (always 200).
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Iterable, Optional
+
+
+def store_key(store_id, kind: str) -> str:
+    return f"store:{int(store_id)}:{kind}"
+
+
+def company_key(company_id, kind: str) -> str:
+    return f"company:{int(company_id)}:{kind}"
+
+
+def fetch_change_stamps(db, keys: Iterable[str]) -> Optional[Dict[str, int]]:
+    """Return {key: version} for every requested key (0 = never changed),
+    or None if the stamps table is unavailable."""
+    keys = list(keys)
+    try:
+        rows = db.execute(
+            """
+            SELECT scope_key, version
+            FROM sys_change_stamps
+            WHERE scope_key = ANY(%s)
+            """,
+            (keys,),
+        ).fetchall()
+    except Exception:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        return None
+    found = {r["scope_key"]: int(r["version"]) for r in rows}
+    return {k: found.get(k, 0) for k in keys}
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag value (unquoted) from arbitrary parts. Stamp dicts are
+    serialized in key order so the result is stable."""
+    h = hashlib.sha1()
+    for p in parts:
+        if isinstance(p, dict):
+            p = ",".join(f"{k}={p[k]}" for k in sorted(p))
+        h.update(str(p).encode("utf-8"))
+        h.update(b"|")
+    return h.hexdigest()[:32]
@@ -0,0 +1,245 @@
+"""
+Count-sheet loader shared by every inventory count screen.
+
+One statement returns the whole sheet for (store, count_date):
+
+  items        internal items, items with a location at the store, and
+               items purchased by the store up to count_date
+  location     temp zone (store pref → item master), area, shelf, and the
+               walk order: zone, then the precomputed walk_seq
+               (utils/walk_order.py), then code
+  system qty   latest count ≤ count_date + purchases after it
+  unit price   weighted average of purchases up to count_date, and up to
+               the item's own last count (for the accounting CSV)
+  prior counts last count ≤ count_date, this date's count, latest-ever save
+  frequency    optional, utils.item_frequency.frequency_cte
+
+It replaces the 6-query _fetch_count_data, the inline 5-query v2 GET path
+and the per-item N+1 loop of v1. init/bench_count_sheet.py compares the
+old and new paths per store.
+"""
+from __future__ import annotations
+
+from typing import List
+
+from utils.item_frequency import frequency_cte, frequency_cte_params, frequency_info
+
+
+ZONE_ORDER = ["冷凍", "冷蔵", "常温", "その他"]
+
+TZ_MAP = {
+    "冷凍": "冷凍", "FREEZE": "冷凍",
+    "冷蔵": "冷蔵", "CHILL":  "冷蔵",
+    "常温": "常温", "AMB":    "常温",
+}
+
+
+def _sheet_sql(with_frequency: bool, use_stored: bool) -> str:
+    """use_stored: read the precomputed tables (inv_item_walk_order,
+    pur_item_frequency); False sorts by the live shelf joins instead."""
+    freq_cte = f"{frequency_cte(use_stored)}," if with_frequency else ""
+    freq_join = "LEFT JOIN freq f ON f.item_id = b.item_id" if with_frequency else ""
+    freq_col = "f.purchase_days" if with_frequency else "NULL::int"
+    if use_stored:
+        walk_col = "w.walk_seq"
+        walk_join = ("LEFT JOIN inv_item_walk_order w\n"
+                     "            ON w.store_id = %(store_id)s AND w.item_id = i.id")
+        order_by = "zone_rank, walk_seq NULLS LAST, item_code"
+    else:
+        walk_col = "NULL::int"
+        walk_join = ""
+        order_by = ("zone_rank, area_sort_order, area_master_name,\n"
+                    "                 shelf_sort_order, shelf_sort_code, item_sort_order, item_code")
+    return f"""
+        WITH base AS (
+          SELECT
+            i.id   AS item_id,
+            i.code AS item_code,
+            i.name AS item_name,
+            i.category,
+            i.unit,
+            i.is_internal,
+            s.name AS supplier_name,
+            COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') AS tz_raw,
+            sh.code AS shelf_code,
+            sh.name AS shelf_name,
+            COALESCE(sam.display_name, am.name, '') AS area_name,
+            -- walk order
+            CASE
+              WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷凍','FREEZE') THEN 1
+              WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷蔵','CHILL')  THEN 2
+              WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('常温','AMB')    THEN 3
+              ELSE 9
+            END AS zone_rank,
+            COALESCE(sam.sort_order, 9999) AS area_sort_order,
+            COALESCE(am.name, '')          AS area_master_name,
+            COALESCE(sh.sort_order, 9999)  AS shelf_sort_order,
+            COALESCE(sh.code, '')          AS shelf_sort_code,
+            COALESCE(m.sort_order, 9999)   AS item_sort_order,
+            {walk_col} AS walk_seq
+          FROM mst_items i
+          LEFT JOIN pur_suppliers s ON s.id = i.supplier_id
+          LEFT JOIN item_location_prefs pref
+            ON pref.store_id = %(store_id)s AND pref.item_id = i.id
+          LEFT JOIN item_shelf_map m
+            ON m.store_id = %(store_id)s AND m.item_id = i.id AND m.is_active = TRUE
+          LEFT JOIN store_shelves sh ON sh.id = m.shelf_id
+          LEFT JOIN store_area_map sam ON sam.id = sh.store_area_map_id
+          LEFT JOIN area_master am ON am.id = sam.area_id
+          {walk_join}
+          WHERE (%(company_id)s::int IS NULL OR i.company_id = %(company_id)s)
+            AND (
+              pref.item_id IS NOT NULL OR m.item_id IS NOT NULL
+              OR i.is_internal = 1
+              OR EXISTS (
+                SELECT 1 FROM purchases p
+                WHERE p.store_id = %(store_id)s AND p.item_id = i.id
+                  AND p.is_deleted = 0 AND p.delivery_date <= %(count_date)s
+              )
+              OR (%(include_counted)s AND EXISTS (
+                SELECT 1 FROM stock_counts c
+                WHERE c.store_id = %(store_id)s AND c.item_id = i.id
+              ))
+            )
+        ),
+        last_cnt AS (
+          SELECT DISTINCT ON (item_id)
+            item_id, count_date AS last_count_date, counted_qty AS opening_qty
+          FROM stock_counts
+          WHERE store_id = %(store_id)s AND count_date <= %(count_date)s
+          ORDER BY item_id, count_date DESC, id DESC
+        ),
+        pur AS (
+          SELECT
+            p.item_id,
+            COALESCE(SUM(p.quantity) FILTER (
+              WHERE lc.last_count_date IS NULL OR p.delivery_date > lc.last_count_date
+            ), 0) AS qty_after,
+            CASE WHEN SUM(p.quantity) > 0
+                 THEN SUM(p.quantity * p.unit_price)::numeric / SUM(p.quantity)
+                 ELSE 0 END AS unit_price,
+            CASE WHEN SUM(p.quantity) FILTER (WHERE p.delivery_date <= lc.last_count_date) > 0
+                 THEN SUM(p.quantity * p.unit_price) FILTER (WHERE p.delivery_date <= lc.last_count_date)::numeric
+                      / SUM(p.quantity) FILTER (WHERE p.delivery_date <= lc.last_count_date)
+                 ELSE 0 END AS last_count_unit_price
+          FROM purchases p
+          LEFT JOIN last_cnt lc ON lc.item_id = p.item_id
+          WHERE p.store_id = %(store_id)s
+            AND p.is_deleted = 0
+            AND p.delivery_date <= %(count_date)s
+          GROUP BY p.item_id
+        ),
+        on_date AS (
+          SELECT DISTINCT ON (item_id) item_id, counted_qty
+          FROM stock_counts
+          WHERE store_id = %(store_id)s AND count_date = %(count_date)s
+          ORDER BY item_id, id DESC
+        ),
+        last_ever AS (
+          SELECT DISTINCT ON (item_id)
+            item_id, count_date AS last_ever_date, created_at AS last_ever_at
+          FROM stock_counts
+          WHERE store_id = %(store_id)s
+          ORDER BY item_id, count_date DESC, id DESC
+        ),
+        {freq_cte}
+        sheet AS (
+          SELECT
+            b.*,
+            COALESCE(lc.opening_qty, 0) AS opening_qty,
+            lc.last_count_date,
+            COALESCE(lc.opening_qty, 0) + COALESCE(pu.qty_after, 0) AS system_qty,
+            COALESCE(pu.unit_price, 0) AS unit_price,
+            COALESCE(pu.last_count_unit_price, 0) AS last_count_unit_price,
+            od.counted_qty,
+            le.last_ever_date,
+            le.last_ever_at,
+            {freq_col} AS purchase_days
+          FROM base b
+          LEFT JOIN last_cnt lc  ON lc.item_id = b.item_id
+          LEFT JOIN pur pu       ON pu.item_id = b.item_id
+          LEFT JOIN on_date od   ON od.item_id = b.item_id
+          LEFT JOIN last_ever le ON le.item_id = b.item_id
+          {freq_join}
+        )
+        SELECT *
+        FROM sheet
+        WHERE system_qty > 0 OR is_internal = 1 OR %(include_empty)s
+        ORDER BY {order_by}
+    """
+
+
+def load_count_sheet(
+    db, store_id, count_date, company_id,
+    with_frequency: bool = False, include_empty: bool = False,
+    include_counted: bool = False,
+) -> List[dict]:
+    """
+    The count sheet for one store and date, in walk order.
+
+    Items whose system qty is ≤ 0 are left out (internal items always stay),
+    as every count screen did; include_empty=True keeps them.
+    include_counted=True also takes in items that were only ever counted
+    here (no location, no purchase) — the accounting CSV wants those.
+    company_id None means no company filter (the legacy v1/v2 screens).
+
+    Each item dict: item_id, item_code, item_name, category, unit,
+    supplier_name, temp_zone (冷凍/冷蔵/常温/その他), area_name, shelf_label,
+    system_qty, opening_qty, unit_price, stock_amount, counted_qty,
+    last_count_date, last_count_qty, last_count_unit_price, last_ever_date,
+    last_ever_at, is_internal — plus `frequency` (see
+    item_frequency.frequency_info) when with_frequency.
+    """
+    params = {
+        "store_id": int(store_id),
+        "company_id": company_id,
+        "count_date": count_date,
+        "include_empty": bool(include_empty),
+        "include_counted": bool(include_counted),
+        **frequency_cte_params(),
+    }
+    try:
+        rows = db.execute(_sheet_sql(with_frequency, True), params).fetchall()
+    except Exception:
+        # inv_item_walk_order / pur_item_frequency not migrated yet.
+        db.rollback()
+        rows = db.execute(_sheet_sql(with_frequency, False), params).fetchall()
+
+    items = []
+    for r in rows:
+        system_qty = r["system_qty"] or 0
+        unit_price = float(r["unit_price"] or 0)
+        item = {
+            "item_id":      r["item_id"],
+            "item_code":    r["item_code"],
+            "item_name":    r["item_name"],
+            "category":     r["category"],
+            "unit":         r["unit"],
+            "supplier_name": r["supplier_name"],
+            "temp_zone":    TZ_MAP.get(r["tz_raw"] or "", "その他"),
+            "area_name":    r["area_name"] or "—",
+            "shelf_label":  r["shelf_name"] or r["shelf_code"] or "—",
+            "system_qty":   system_qty,
+            "opening_qty":  r["opening_qty"] or 0,
+            "unit_price":   unit_price,
+            "stock_amount": system_qty * unit_price,
+            "counted_qty":  r["counted_qty"],
+            "last_count_date": r["last_count_date"],
+            "last_count_qty":  r["opening_qty"] if r["last_count_date"] else None,
+            "last_count_unit_price": float(r["last_count_unit_price"] or 0),
+            "last_ever_date": r["last_ever_date"],
+            "last_ever_at":   r["last_ever_at"],
+            "is_internal":  r["is_internal"],
+        }
+        if with_frequency:
+            item["frequency"] = frequency_info(r["purchase_days"] or 0)
+        items.append(item)
+    return items
+
+
+def group_by_zone(items: List[dict]) -> dict:
+    """{zone: [items]} in ZONE_ORDER, empty zones dropped."""
+    zones = {z: [] for z in ZONE_ORDER}
+    for item in items:
+        zones.get(item["temp_zone"], zones["その他"]).append(item)
+    return {z: v for z, v in zones.items() if v}
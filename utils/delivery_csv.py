@@ -0,0 +1,208 @@
+"""
+Streaming parse pipeline for delivery CSV uploads (シーニュ/尾家産業-style
+multi-invoice exports).
+
+The upload used to be read whole, decoded to one string, turned into a
+list of rows and then into the full invoices list. A monthly wholesaler
+export is 100k+ lines, so every stage is now a generator and memory is
+bounded by one chunk of input plus one invoice:
+
+  detect_encoding()      cp932 first, then UTF-8 (same order as before),
+                         checked with an incremental decoder — no full copy
+  iter_text_lines()      binary chunks → decoded lines, one at a time
+  iter_invoices()        csv rows → invoices grouped by 伝票NO.
+  with_existing_counts() duplicate check in chunks of DUP_CHUNK invoices,
+                         one query per chunk (store/supplier/date and, when
+                         pur_purchases.invoice_no exists, the 伝票NO.)
+
+views/pur_delivery_paste.py streams the result as NDJSON.
+"""
+from __future__ import annotations
+
+import codecs
+import re
+from typing import Dict, Iterable, Iterator, List, Optional
+
+
+READ_CHUNK = 64 * 1024
+DUP_CHUNK = 200
+
+# Tried in order; cp932 = Shift-JIS + MS extensions.
+ENCODINGS = ("cp932", "utf-8-sig")
+
+
+def detect_encoding(stream, chunk_size: int = READ_CHUNK) -> Optional[str]:
+    """First encoding in ENCODINGS that decodes the whole stream, or None.
+    The stream must be seekable; it is rewound before returning."""
+    for enc in ENCODINGS:
+        stream.seek(0)
+        decoder = codecs.getincrementaldecoder(enc)()
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    decoder.decode(b"", final=True)
+                    break
+                decoder.decode(chunk)
+        except UnicodeDecodeError:
+            continue
+        stream.seek(0)
+        return enc
+    stream.seek(0)
+    return None
+
+
+def iter_text_lines(stream, encoding: str, chunk_size: int = READ_CHUNK) -> Iterator[str]:
+    """Decode the stream chunk by chunk and yield lines with their '\\n'
+    (what csv.reader expects; '\\r\\n' is left for csv to handle)."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    while True:
+        chunk = stream.read(chunk_size)
+        final = not chunk
+        pending += decoder.decode(chunk or b"", final=final)
+        if "\n" in pending:
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield line + "\n"
+        if final:
+            break
+    if pending:
+        yield pending
+
+
+def parse_csv_date(raw):
+    """Accept 'YYYY/MM/DD' or 'YYYY-MM-DD'. Return ISO 'YYYY-MM-DD' or ''."""
+    if not raw:
+        return ""
+    raw = raw.strip()
+    m = re.match(r"^(\d{4})[/\-](\d{1,2})[/\-](\d{1,2})$", raw)
+    if not m:
+        return ""
+    y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
+    return f"{y:04d}-{mo:02d}-{d:02d}"
+
+
+def parse_int(raw, default=0):
+    if raw is None or raw == "":
+        return default
+    try:
+        return int(str(raw).replace(",", "").strip())
+    except ValueError:
+        return default
+
+
+def iter_invoices(rows: Iterable[list], col_map: Dict[str, int], stats: Optional[dict] = None) -> Iterator[dict]:
+    """Group data rows (header already consumed) by 伝票NO. — a non-blank
+    invoice_no starts a new invoice, a blank one continues the previous.
+    Yields each invoice once its last line has been read. Master matching
+    and the duplicate check are left to the caller.
+
+    stats, when given, gets "lines" (data rows read) once input is exhausted."""
+    def col(row, field):
+        idx = col_map.get(field)
+        if idx is None or idx >= len(row):
+            return ""
+        return row[idx]
+
+    current = None
+    max_col = max(col_map.values()) if col_map else 0
+    lines = 0
+    for row in rows:
+        lines += 1
+        if len(row) <= max_col:
+            continue
+        inv_no = (col(row, "invoice_no") or "").strip()
+        if inv_no:
+            if current:
+                yield current
+            current = {
+                "invoice_no":      inv_no,
+                "csv_supplier":    (col(row, "supplier_name") or "").strip(),
+                "csv_place":       (col(row, "delivery_place") or "").strip(),
+                "invoice_date":    parse_csv_date(col(row, "invoice_date")),
+                "delivery_date":   parse_csv_date(col(row, "delivery_date")),
+                "supplier_id":     None,
+                "supplier_name":   None,
+                "store_id":        None,
+                "store_name":      None,
+                "items":           [],
+                "existing_count":  0,
+                "existing_invoice_count": 0,
+            }
+        if current is None:
+            continue
+        name = (col(row, "item_name") or "").strip()
+        if not name:
+            continue
+        current["items"].append({
+            "item_name":    name,
+            "item_code":    (col(row, "item_code") or "").strip(),
+            "unit":         (col(row, "unit") or "").strip(),
+            "unit_price":   parse_int(col(row, "unit_price")),
+            "quantity":     parse_int(col(row, "quantity")),
+            "line_amount":  parse_int(col(row, "line_amount")),
+        })
+    if stats is not None:
+        stats["lines"] = lines
+    if current:
+        yield current
+
+
+def fetch_existing_counts(db, invoices: List[dict], by_invoice_no: bool = False) -> List[tuple]:
+    """[(existing_count, existing_invoice_count)] aligned with invoices,
+    in one query:
+      existing_count          live purchases for (store, supplier, delivery_date)
+      existing_invoice_count  live purchases already carrying this supplier's
+                              伝票NO. (pur_purchases.invoice_no) — only when
+                              by_invoice_no, i.e. after the dedupe migration
+    Invoices without a matched store / supplier / date count 0."""
+    if not invoices:
+        return []
+    invoice_sql = """,
+          (SELECT COUNT(*) FROM pur_purchases p
+            WHERE p.supplier_id = k.supplier_id
+              AND p.invoice_no = k.invoice_no
+              AND p.is_deleted = 0) AS n_invoice""" if by_invoice_no else ""
+    rows = db.execute(
+        f"""
+        SELECT k.ord,
+          (SELECT COUNT(*) FROM purchases p
+            WHERE p.store_id = k.store_id
+              AND p.supplier_id = k.supplier_id
+              AND p.delivery_date = k.delivery_date
+              AND p.is_deleted = 0) AS n{invoice_sql}
+        FROM unnest(%s::int[], %s::int[], %s::date[], %s::text[])
+               WITH ORDINALITY AS k(store_id, supplier_id, delivery_date, invoice_no, ord)
+        """,
+        (
+            [inv["store_id"] for inv in invoices],
+            [inv["supplier_id"] for inv in invoices],
+            [inv["delivery_date"] or None for inv in invoices],
+            [inv["invoice_no"] or None for inv in invoices],
+        ),
+    ).fetchall()
+    counts = {int(r["ord"]): (int(r["n"] or 0), int(r.get("n_invoice") or 0)) for r in rows}
+    return [counts.get(i, (0, 0)) for i in range(1, len(invoices) + 1)]
+
+
+def with_existing_counts(db, invoices: Iterable[dict], chunk_size: int = DUP_CHUNK,
+                         by_invoice_no: bool = False) -> Iterator[dict]:
+    """Fill existing_count / existing_invoice_count, DUP_CHUNK invoices per
+    query: any live purchase for (store, supplier, delivery_date) means
+    "maybe already saved"; one with the same 伝票NO. means "this invoice
+    was already imported". Invoices are yielded in their original order."""
+    def flush(buf):
+        for inv, (n, n_invoice) in zip(buf, fetch_existing_counts(db, buf, by_invoice_no)):
+            inv["existing_count"] = n
+            inv["existing_invoice_count"] = n_invoice
+        return buf
+
+    buf = []
+    for inv in invoices:
+        buf.append(inv)
+        if len(buf) >= chunk_size:
+            yield from flush(buf)
+            buf = []
+    if buf:
+        yield from flush(buf)
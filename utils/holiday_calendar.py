@@ -0,0 +1,332 @@
+"""
+Holiday calendar service.
+
+Two things used to be recomputed on every request:
+  - the Japanese public-holiday list (`_japanese_holidays(year)`, a fixed
+    table that was only right for one year), and
+  - the store / supplier holiday sets for order support, rebuilt by turning
+    every `holiday_date` into a string and doing `str(d) in set` lookups.
+
+This module replaces both:
+
+  National holidays   Generated once per year by rule (Happy Monday,
+                      equinox formula, 振替休日, 国民の休日) into
+                      mst_national_holidays; the bulk "public holidays"
+                      presets read from there.
+
+  Store / supplier    HolidayBits — one bit per day over a rolling horizon
+  holidays            (today − HORIZON_BACK_DAYS … + HORIZON_DAYS), cached
+                      in-process. `d in bits` is a shift + mask.
+
+Cache invalidation:
+  - the toggle / bulk endpoints call invalidate_store / invalidate_suppliers
+    for the worker that handled the write;
+  - other gunicorn workers notice through sys_change_stamps (triggers on
+    store_holidays / supplier_holidays bump 'store:<id>:holidays' and
+    'company:<id>:supplier_holidays'). If that table is missing, entries
+    simply expire after CACHE_TTL_SECONDS.
+
+Ranges outside the horizon (e.g. a base_date far in the past) are served by
+an uncached calendar built just for that range.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from utils.change_stamps import company_key, fetch_change_stamps, store_key
+
+
+HORIZON_BACK_DAYS = 60
+HORIZON_DAYS = 460           # ~15 months: covers order support's +37 / +66 day look-ahead
+CACHE_TTL_SECONDS = 300      # only used when change stamps are unavailable
+
+COUNTRY_JP = "JP"
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Bitset
+# ─────────────────────────────────────────────────────────────────────
+class HolidayBits:
+    """Set of dates over [start, start + days) stored as one int, bit i = start + i.
+
+    Dates outside the range are reported as non-holidays — same as the old
+    per-request sets, which only loaded the window being displayed."""
+
+    __slots__ = ("start", "days", "bits")
+
+    def __init__(self, start: date, days: int, bits: int = 0):
+        self.start = start
+        self.days = days
+        self.bits = bits
+
+    @classmethod
+    def from_dates(cls, start: date, days: int, dates: Iterable[date]) -> "HolidayBits":
+        bits = 0
+        for d in dates:
+            off = (d - start).days
+            if 0 <= off < days:
+                bits |= 1 << off
+        return cls(start, days, bits)
+
+    @property
+    def end(self) -> date:
+        """Exclusive end date."""
+        return self.start + timedelta(days=self.days)
+
+    def __contains__(self, d) -> bool:
+        off = (d - self.start).days
+        if off < 0 or off >= self.days:
+            return False
+        return (self.bits >> off) & 1 == 1
+
+    def __or__(self, other: "HolidayBits") -> "HolidayBits":
+        if other.start == self.start and other.days == self.days:
+            return HolidayBits(self.start, self.days, self.bits | other.bits)
+        start = min(self.start, other.start)
+        end = max(self.end, other.end)
+        days = (end - start).days
+        return HolidayBits(
+            start, days,
+            (self.bits << (self.start - start).days)
+            | (other.bits << (other.start - start).days),
+        )
+
+    def __len__(self) -> int:
+        return bin(self.bits).count("1")
+
+
+def _empty(start: date, end: date) -> HolidayBits:
+    return HolidayBits(start, (end - start).days + 1)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# In-process cache
+# ─────────────────────────────────────────────────────────────────────
+# key -> (value, horizon_start, stamp_version or None, loaded_at)
+_CACHE: Dict[tuple, tuple] = {}
+_LOCK = threading.Lock()
+
+
+def _horizon_start() -> date:
+    return date.today() - timedelta(days=HORIZON_BACK_DAYS)
+
+
+def _in_horizon(start: date, end: date) -> bool:
+    h = _horizon_start()
+    return h <= start and end < h + timedelta(days=HORIZON_DAYS)
+
+
+def _cached(db, cache_key: tuple, stamp_key: str, loader):
+    """Return the cached value for cache_key, reloading it when the rolling
+    horizon moved (new day), the change stamp moved, or — without stamps —
+    the TTL expired. `loader(start, days)` builds a fresh value."""
+    stamps = fetch_change_stamps(db, [stamp_key])
+    version = stamps[stamp_key] if stamps is not None else None
+    start = _horizon_start()
+
+    with _LOCK:
+        hit = _CACHE.get(cache_key)
+    if hit is not None:
+        value, hit_start, hit_version, loaded_at = hit
+        fresh = (
+            hit_start == start
+            and (hit_version == version if version is not None
+                 else time.monotonic() - loaded_at < CACHE_TTL_SECONDS)
+        )
+        if fresh:
+            return value
+
+    value = loader(start, HORIZON_DAYS)
+    with _LOCK:
+        _CACHE[cache_key] = (value, start, version, time.monotonic())
+    return value
+
+
+def invalidate_store(store_id) -> None:
+    with _LOCK:
+        _CACHE.pop(("store", int(store_id)), None)
+
+
+def invalidate_suppliers(company_id) -> None:
+    with _LOCK:
+        _CACHE.pop(("suppliers", int(company_id)), None)
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Store / supplier calendars
+# ─────────────────────────────────────────────────────────────────────
+def _load_store_bits(db, company_id, store_id, start: date, days: int) -> HolidayBits:
+    rows = db.execute(
+        """
+        SELECT holiday_date FROM store_holidays
+        WHERE store_id = %s AND company_id = %s
+          AND holiday_date >= %s AND holiday_date < %s
+        """,
+        (store_id, company_id, start, start + timedelta(days=days)),
+    ).fetchall()
+    return HolidayBits.from_dates(start, days, (r["holiday_date"] for r in rows))
+
+
+def _load_supplier_bits(db, company_id, start: date, days: int) -> Dict[int, HolidayBits]:
+    rows = db.execute(
+        """
+        SELECT supplier_id, holiday_date
+        FROM supplier_holidays
+        WHERE company_id = %s
+          AND holiday_date >= %s AND holiday_date < %s
+        """,
+        (company_id, start, start + timedelta(days=days)),
+    ).fetchall()
+    by_supplier: Dict[int, List[date]] = {}
+    for r in rows:
+        by_supplier.setdefault(r["supplier_id"], []).append(r["holiday_date"])
+    return {
+        sid: HolidayBits.from_dates(start, days, dates)
+        for sid, dates in by_supplier.items()
+    }
+
+
+def get_store_holidays(db, company_id, store_id, start: date, end: date) -> HolidayBits:
+    """Store holidays covering at least [start, end]."""
+    if not store_id:
+        return _empty(start, end)
+    if _in_horizon(start, end):
+        return _cached(
+            db, ("store", int(store_id)), store_key(store_id, "holidays"),
+            lambda s, n: _load_store_bits(db, company_id, store_id, s, n),
+        )
+    return _load_store_bits(db, company_id, store_id, start, (end - start).days + 1)
+
+
+def get_supplier_holidays(db, company_id, start: date, end: date) -> Dict[int, HolidayBits]:
+    """{supplier_id: HolidayBits} for every supplier of the company that has
+    holidays, covering at least [start, end]. Suppliers without holidays are
+    absent — use .get(sid) and fall back to an empty calendar."""
+    if not company_id:
+        return {}
+    if _in_horizon(start, end):
+        return _cached(
+            db, ("suppliers", int(company_id)),
+            company_key(company_id, "supplier_holidays"),
+            lambda s, n: _load_supplier_bits(db, company_id, s, n),
+        )
+    return _load_supplier_bits(db, company_id, start, (end - start).days + 1)
+
+
+def supplier_calendar(
+    supplier_id, supplier_cals: Dict[int, HolidayBits], store_cal: HolidayBits,
+    holidays_off: bool,
+) -> HolidayBits:
+    """Effective holidays for one supplier: its own holidays, plus the
+    store's when the supplier follows the store's closed days (holidays_off)."""
+    own = supplier_cals.get(supplier_id)
+    if own is None:
+        own = HolidayBits(store_cal.start, store_cal.days)
+    return (own | store_cal) if holidays_off else own
+
+
+# ─────────────────────────────────────────────────────────────────────
+# Japanese national holidays
+# ─────────────────────────────────────────────────────────────────────
+def _nth_monday(year: int, month: int, n: int) -> date:
+    first = date(year, month, 1)
+    offset = (7 - first.weekday()) % 7          # days until the first Monday
+    return first + timedelta(days=offset + 7 * (n - 1))
+
+
+def _equinox_day(year: int, base: float) -> int:
+    # Standard approximation, valid 1980–2099.
+    return int(base + 0.242194 * (year - 1980)) - int((year - 1980) / 4)
+
+
+def generate_japanese_holidays(year: int) -> List[Tuple[date, str]]:
+    """National holidays for `year` under the current (2020+) rules,
+    including 振替休日 and 国民の休日. Sorted by date."""
+    base = {
+        date(year, 1, 1): "元日",
+        _nth_monday(year, 1, 2): "成人の日",
+        date(year, 2, 11): "建国記念の日",
+        date(year, 2, 23): "天皇誕生日",
+        date(year, 3, _equinox_day(year, 20.8431)): "春分の日",
+        date(year, 4, 29): "昭和の日",
+        date(year, 5, 3): "憲法記念日",
+        date(year, 5, 4): "みどりの日",
+        date(year, 5, 5): "こどもの日",
+        _nth_monday(year, 7, 3): "海の日",
+        date(year, 8, 11): "山の日",
+        _nth_monday(year, 9, 3): "敬老の日",
+        date(year, 9, _equinox_day(year, 23.2488)): "秋分の日",
+        _nth_monday(year, 10, 2): "スポーツの日",
+        date(year, 11, 3): "文化の日",
+        date(year, 11, 23): "勤労感謝の日",
+    }
+    result = dict(base)
+
+    # 国民の休日: a weekday sandwiched between two holidays.
+    for d in sorted(base):
+        mid = d + timedelta(days=1)
+        if (mid not in base and (d + timedelta(days=2)) in base
+                and mid.weekday() != 6):
+            result[mid] = "国民の休日"
+
+    # 振替休日: a holiday on Sunday moves to the next non-holiday day.
+    for d in sorted(base):
+        if d.weekday() == 6:
+            sub = d + timedelta(days=1)
+            while sub in result:
+                sub += timedelta(days=1)
+            if sub.year == year:
+                result[sub] = "振替休日"
+
+    return sorted(result.items())
+
+
+_NATIONAL_YEARS: set = set()
+
+
+def national_holidays(db, year: int, country: str = COUNTRY_JP) -> List[Tuple[date, str]]:
+    """National holidays for `year`. The first time a year is requested it
+    is generated into mst_national_holidays within the caller's transaction
+    (the caller commits it along with its own writes). Falls back to the
+    generator when the table is missing (pre-migration)."""
+    start, end = date(year, 1, 1), date(year + 1, 1, 1)
+    if (country, year) not in _NATIONAL_YEARS:
+        if db.execute("SELECT to_regclass('mst_national_holidays') AS t").fetchone()["t"] is None:
+            return generate_japanese_holidays(year)
+        exists = db.execute(
+            """
+            SELECT 1 FROM mst_national_holidays
+            WHERE country = %s AND holiday_date >= %s AND holiday_date < %s
+            LIMIT 1
+            """,
+            (country, start, end),
+        ).fetchone()
+        if not exists:
+            # Not remembered as loaded until a later call sees the rows
+            # committed — the caller may still roll back.
+            generated = generate_japanese_holidays(year)
+            db.execute(
+                """
+                INSERT INTO mst_national_holidays (country, holiday_date, name)
+                SELECT %s, d, n FROM unnest(%s::date[], %s::text[]) AS u(d, n)
+                ON CONFLICT (country, holiday_date) DO NOTHING
+                """,
+                (country, [d for d, _ in generated], [n for _, n in generated]),
+            )
+            return generated
+        with _LOCK:
+            _NATIONAL_YEARS.add((country, year))
+
+    rows = db.execute(
+        """
+        SELECT holiday_date, name FROM mst_national_holidays
+        WHERE country = %s AND holiday_date >= %s AND holiday_date < %s
+        ORDER BY holiday_date
+        """,
+        (country, start, end),
+    ).fetchall()
+    return [(r["holiday_date"], r["name"]) for r in rows]
+
@@ -11,6 +11,12 @@ Thresholds (purchases per month, over the rolling window):
   - high:       2.0 – 4.3   (2x/month to 1x/week — the operator's defined band)
   - low:        0.01 – 2.0  (monthly or less)
   - none:       0 purchases in the window
+
+Storage: per-(store, item) counts + bucket are kept in pur_item_frequency
+(init/migrate_20261019_item_frequency.sql). Purchase writes refresh the
+touched rows (touch_item_frequency) and init/refresh_item_frequency.py
+re-ages the whole table daily. fetch_item_frequency reads that table when
+it is current and falls back to the live COUNT(DISTINCT) query otherwise.
 """
 
 from __future__ import annotations
@@ -72,43 +78,245 @@ def bucket_order(code: str) -> int:
     return 99
 
 
-def fetch_item_frequency(db, item_ids: List[int], as_of: date | None = None) -> Dict[int, dict]:
-    """
-    Compute purchase frequency for the given item_ids over WINDOW_DAYS ending at as_of.
+def bucket_lookup() -> List[str]:
+    """classify() for every possible purchase-day count, index = days.
+
+    Passed to SQL as a text[] so the refresh statement assigns exactly the
+    same bucket the Python classifier would (no float thresholds in SQL).
+    Counts above the window are clamped to the last slot by the callers.
+    The window is inclusive at both ends, hence WINDOW_DAYS + 1 slots."""
+    return [classify(d) for d in range(WINDOW_DAYS + 2)]
+
+
+def frequency_info(purchase_days: int) -> dict:
+    """Bucket + display rate for one purchase-day count."""
+    days = purchase_days or 0
+    per_month = (days / WINDOW_DAYS) * DAYS_PER_MONTH if days else 0.0
+    scale, n = classify_rate(per_month)
+    return {
+        "purchase_days": days,
+        "bucket": classify(days),
+        "per_month": round(per_month, 2),
+        "rate_scale": scale,   # 'per_week' | 'per_month' | 'less_than_month' | 'none'
+        "rate_n": n,           # integer or None; template interpolates into i18n string
+    }
+
+
+def _build_result(item_ids: List[int], counts: Dict[int, int]) -> Dict[int, dict]:
+    return {iid: frequency_info(counts.get(iid, 0)) for iid in item_ids}
 
-    Returns: {item_id: {'purchase_days': int, 'bucket': str, 'per_month': float}}
-    Items with no purchases in the window get bucket='none'.
-    """
-    if not item_ids:
-        return {}
-    as_of = as_of or date.today()
-    since = as_of - timedelta(days=WINDOW_DAYS)
 
+def _fetch_live_counts(db, item_ids: List[int], as_of: date, store_id=None) -> Dict[int, int]:
+    """The original on-the-fly COUNT(DISTINCT delivery_date) query."""
+    since = as_of - timedelta(days=WINDOW_DAYS)
+    store_sql = "AND store_id = %s" if store_id else ""
+    params = [since, as_of, item_ids] + ([store_id] if store_id else [])
     rows = db.execute(
-        """
+        f"""
         SELECT item_id, COUNT(DISTINCT delivery_date) AS purchase_days
         FROM purchases
         WHERE is_deleted = 0
           AND delivery_date >= %s
           AND delivery_date <= %s
           AND item_id = ANY(%s)
+          {store_sql}
         GROUP BY item_id
         """,
-        (since, as_of, item_ids),
+        params,
     ).fetchall()
+    return {r["item_id"]: r["purchase_days"] for r in rows}
+
+
+def _fetch_stored_counts(db, store_id, as_of: date) -> Dict[int, int] | None:
+    """Read the store's rows from pur_item_frequency.
+
+    Returns None (→ caller falls back to the live query) when the table is
+    missing, the store has never been refreshed, or any row has not been
+    aged to `as_of` yet (daily job hasn't run today)."""
+    try:
+        rows = db.execute(
+            """
+            SELECT item_id, purchase_days,
+                   MIN(window_end) OVER () AS oldest_window_end
+            FROM pur_item_frequency
+            WHERE store_id = %s
+            """,
+            (store_id,),
+        ).fetchall()
+    except Exception:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        return None
+    if not rows or rows[0]["oldest_window_end"] != as_of:
+        return None
+    return {r["item_id"]: r["purchase_days"] for r in rows}
+
+
+def fetch_item_frequency(
+    db, item_ids: List[int], as_of: date | None = None, store_id=None,
+) -> Dict[int, dict]:
+    """
+    Purchase frequency for the given item_ids over WINDOW_DAYS ending at as_of.
+
+    With store_id, only that store's purchases count, and the precomputed
+    pur_item_frequency rows are used when current (fallback: live query).
+    Without store_id, always queries live across all stores.
+
+    Returns: {item_id: {'purchase_days': int, 'bucket': str, 'per_month': float}}
+    Items with no purchases in the window get bucket='none'.
+    """
+    if not item_ids:
+        return {}
+    today = date.today()
+    as_of = as_of or today
+
+    counts = None
+    if store_id and as_of == today:
+        counts = _fetch_stored_counts(db, store_id, as_of)
+    if counts is None:
+        counts = _fetch_live_counts(db, item_ids, as_of, store_id=store_id)
+
+    return _build_result(item_ids, counts)
+
+
+def frequency_cte(use_stored: bool = True) -> str:
+    """
+    SQL for a `freq(item_id, purchase_days)` CTE — one store, window ending
+    at as_of — to embed in a larger query (no leading WITH / trailing comma).
+
+    Same rule as fetch_item_frequency: pur_item_frequency is used when every
+    row of the store is current for as_of, otherwise the live count. The
+    uncorrelated `stored_ok` test becomes a one-time filter, so only one
+    branch actually runs. Pass use_stored=False before the table exists.
 
-    counts = {r["item_id"]: r["purchase_days"] for r in rows}
-
-    result: Dict[int, dict] = {}
-    for iid in item_ids:
-        days = counts.get(iid, 0)
-        per_month = (days / WINDOW_DAYS) * DAYS_PER_MONTH if days else 0.0
-        scale, n = classify_rate(per_month)
-        result[iid] = {
-            "purchase_days": days,
-            "bucket": classify(days),
-            "per_month": round(per_month, 2),
-            "rate_scale": scale,   # 'per_week' | 'per_month' | 'less_than_month' | 'none'
-            "rate_n": n,           # integer or None; template interpolates into i18n string
-        }
-    return result
+    Named params: %(store_id)s, %(freq_as_of)s, %(freq_since)s
+    (see frequency_cte_params).
+    """
+    live = """
+          SELECT item_id, COUNT(DISTINCT delivery_date) AS purchase_days
+          FROM purchases
+          WHERE store_id = %(store_id)s
+            AND is_deleted = 0
+            AND delivery_date >= %(freq_since)s
+            AND delivery_date <= %(freq_as_of)s"""
+    if not use_stored:
+        return f"""freq AS ({live}
+          GROUP BY item_id
+        )"""
+    return f"""stored_ok AS (
+          SELECT COALESCE(MIN(window_end) = %(freq_as_of)s, FALSE) AS ok
+          FROM pur_item_frequency
+          WHERE store_id = %(store_id)s
+        ),
+        freq AS (
+          SELECT item_id, purchase_days
+          FROM pur_item_frequency
+          WHERE store_id = %(store_id)s
+            AND (SELECT ok FROM stored_ok)
+          UNION ALL{live}
+            AND NOT (SELECT ok FROM stored_ok)
+          GROUP BY item_id
+        )"""
+
+
+def frequency_cte_params(as_of: date | None = None) -> dict:
+    """Named params for frequency_cte (store_id is supplied by the caller)."""
+    as_of = as_of or date.today()
+    return {
+        "freq_as_of": as_of,
+        "freq_since": as_of - timedelta(days=WINDOW_DAYS),
+    }
+
+
+def refresh_item_frequency(
+    db, store_id=None, item_ids: List[int] | None = None, as_of: date | None = None,
+) -> int:
+    """
+    Recompute pur_item_frequency rows in one set-based upsert. Does not commit.
+
+    Scope:
+      store_id + item_ids -> just those (store, item) rows (purchase writes)
+      store_id only       -> every item of the store
+      neither             -> every store (daily sliding-window job)
+
+    Rows already in the table with no purchases left in the window are
+    rewritten as 0 / 'none' — that is how items age out.
+    Returns the number of rows written.
+    """
+    as_of = as_of or date.today()
+    since = as_of - timedelta(days=WINDOW_DAYS)
+
+    scope_sql = ""
+    scope_params: list = []
+    if store_id:
+        scope_sql += " AND store_id = %s"
+        scope_params.append(store_id)
+    if item_ids is not None:
+        if not item_ids:
+            return 0
+        scope_sql += " AND item_id = ANY(%s)"
+        scope_params.append(list(item_ids))
+
+    lookup = bucket_lookup()
+    cur = db.execute(
+        f"""
+        WITH counts AS (
+          SELECT store_id, item_id, COUNT(DISTINCT delivery_date) AS purchase_days
+          FROM purchases
+          WHERE is_deleted = 0
+            AND store_id IS NOT NULL
+            AND delivery_date >= %s
+            AND delivery_date <= %s
+            {scope_sql}
+          GROUP BY store_id, item_id
+        ),
+        keys AS (
+          SELECT store_id, item_id FROM counts
+          UNION
+          SELECT store_id, item_id FROM pur_item_frequency
+          WHERE TRUE {scope_sql}
+        )
+        INSERT INTO pur_item_frequency
+          (store_id, item_id, purchase_days, bucket, window_end, refreshed_at)
+        SELECT k.store_id, k.item_id,
+               COALESCE(c.purchase_days, 0),
+               (%s::text[])[LEAST(COALESCE(c.purchase_days, 0), %s) + 1],
+               %s, NOW()
+        FROM keys k
+        LEFT JOIN counts c
+          ON c.store_id = k.store_id AND c.item_id = k.item_id
+        ON CONFLICT (store_id, item_id)
+        DO UPDATE SET purchase_days = EXCLUDED.purchase_days,
+                      bucket        = EXCLUDED.bucket,
+                      window_end    = EXCLUDED.window_end,
+                      refreshed_at  = EXCLUDED.refreshed_at
+        """,
+        [since, as_of] + scope_params + scope_params + [lookup, len(lookup) - 1, as_of],
+    )
+    return cur.rowcount
+
+
+def touch_item_frequency(db, pairs) -> None:
+    """
+    Best-effort refresh after a purchase write has been COMMITTED.
+
+    `pairs` is an iterable of (store_id, item_id); falsy entries are skipped.
+    Runs in its own transaction so a failure here (e.g. table not migrated
+    yet) can never roll back the purchase itself — the daily job catches up.
+    """
+    try:
+        by_store: Dict[int, set] = {}
+        for store_id, item_id in pairs:
+            if store_id and item_id:
+                by_store.setdefault(int(store_id), set()).add(int(item_id))
+        for store_id, ids in by_store.items():
+            refresh_item_frequency(db, store_id=store_id, item_ids=sorted(ids))
+        if by_store:
+            db.commit()
+    except Exception:
+        try:
+            db.rollback()
+        except Exception:
+            pass
@@ -0,0 +1,433 @@
+"""
+Bulk import engine for the item-master CSV (品目マスタ CSVインポート).
+
+The import used to validate row by row, look up the next code with a
+`SELECT MAX(code) … LIKE` per supplier prefix, INSERT each item on its own
+and print a stderr line per row. The parsed file sat in the dyno's temp
+dir as JSON between requests. Now the file lives in Postgres from upload to
+import (init/migrate_20261019_item_csv_staging.sql):
+
+  stage_upload()       raw rows COPY'd into the UNLOGGED staging table,
+                       one TEXT[] of cells per CSV line
+  count_checked()      ok / ng counts over the whole file
+  preview_page()       one LIMIT/OFFSET page for the preview screen
+  import_items()       one INSERT … SELECT into mst_items, codes for every
+                       supplier prefix allocated in the same statement
+  error_report_rows()  rejected rows (行, 項目, 値, エラー) for the report
+
+All four run the same set-based validation (_CHECKED_SQL), so preview
+counts always match what the import does. Any web or worker process can
+pick an upload up by id (utils/job_handlers.py).
+
+Code format is unchanged: 2-digit supplier prefix + 3-digit sequence
+(wider once a prefix passes 999). The next sequence is the numeric maximum
+in use — the old string MAX(code) ranked '01999' above '011000'.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import time
+from typing import Callable, Iterable, List, Optional
+
+
+# Field keys the validation knows (views/mst_items_csv.SYSTEM_FIELDS)
+FIELDS = (
+    "name", "supplier", "temp_zone", "unit", "purchase_unit",
+    "inventory_unit", "min_purchase_unit", "is_internal",
+)
+
+INTERNAL_TRUE = ["1", "yes", "true", "◯", "○", "内製"]
+
+ERROR_REPORT_HEADER = ("行", "項目", "値", "エラー")
+
+UPLOAD_TTL_HOURS = 24
+
+# stripped from both ends of every cell (incl. 全角スペース)
+_TRIM = " \t\r\n\f\v　"
+
+# numeric cells: 全角 digits / sign / point are read as their ASCII forms
+# (int() / float() accepted them before the validation moved into SQL)
+_NUM_FULLWIDTH = "０１２３４５６７８９．＋－"
+_NUM_ASCII = "0123456789.+-"
+_INT_RE = r"^[+-]?[0-9]{1,9}$"
+_NUM_RE = r"^[+-]?([0-9]+[.]?[0-9]*|[.][0-9]+)([eE][+-]?[0-9]+)?$"
+
+
+# ── Staging ───────────────────────────────────────────────────────────────────
+
+def _pg_array(values: Iterable[str]) -> str:
+    """TEXT[] literal for COPY, every element quoted."""
+    out = []
+    for v in values:
+        v = (v or "").replace("\\", "\\\\").replace('"', '\\"')
+        out.append(f'"{v}"')
+    return "{" + ",".join(out) + "}"
+
+
+def stage_upload(db, company_id, user_id, file_name: Optional[str],
+                 headers: List[str], rows: Iterable[list]) -> tuple:
+    """COPY a parsed CSV (data rows as lists of cells) into staging. Does
+    not commit. Expired uploads are purged on the way.
+    Returns (upload_id, row_count)."""
+    db.execute(
+        "DELETE FROM mst_item_csv_uploads WHERE created_at < NOW() - %s * INTERVAL '1 hour'",
+        (UPLOAD_TTL_HOURS,),
+    )
+    upload_id = db.execute(
+        """
+        INSERT INTO mst_item_csv_uploads (company_id, created_by, file_name, headers)
+        VALUES (%s, %s, %s, %s)
+        RETURNING id
+        """,
+        (company_id, user_id, file_name, list(headers)),
+    ).fetchone()["id"]
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    n = 0
+    for n, row in enumerate(rows, start=1):
+        writer.writerow((upload_id, n, _pg_array(row)))
+    buf.seek(0)
+    db.conn.cursor().copy_expert(
+        "COPY mst_item_csv_rows (upload_id, row_num, cells) FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+    db.execute(
+        "UPDATE mst_item_csv_uploads SET row_count = %s WHERE id = %s",
+        (n, upload_id),
+    )
+    return upload_id, n
+
+
+def get_upload(db, upload_id, company_id) -> Optional[dict]:
+    """The upload row, if it exists and belongs to the company."""
+    if not upload_id:
+        return None
+    row = db.execute(
+        """
+        SELECT id, company_id, file_name, headers, row_count, mapping,
+               imported_at, inserted_count, created_at
+        FROM mst_item_csv_uploads
+        WHERE id = %s AND company_id = %s
+        """,
+        (upload_id, company_id),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def save_mapping(db, upload_id, mapping: dict) -> None:
+    """Store the confirmed field mapping with the upload. Does not commit."""
+    db.execute(
+        "UPDATE mst_item_csv_uploads SET mapping = %s::jsonb WHERE id = %s",
+        (json.dumps(mapping, ensure_ascii=False), upload_id),
+    )
+
+
+# ── Validation ────────────────────────────────────────────────────────────────
+
+def _params(upload: dict, mapping: dict, company_id) -> dict:
+    """Named parameters for _CHECKED_SQL. i_<field> is the 1-based cell
+    index of the mapped column (NULL when unmapped → blank); l_<field> is
+    the name shown in the error report."""
+    headers = list(upload["headers"] or [])
+    params = {
+        "upload_id": upload["id"],
+        "company_id": company_id,
+        "internal_true": INTERNAL_TRUE,
+        "trim": _TRIM,
+        "num_from": _NUM_FULLWIDTH,
+        "num_to": _NUM_ASCII,
+        "int_re": _INT_RE,
+        "num_re": _NUM_RE,
+    }
+    for f in FIELDS:
+        col = mapping.get(f) or ""
+        params[f"i_{f}"] = headers.index(col) + 1 if col in headers else None
+        params[f"l_{f}"] = col or f
+    return params
+
+
+# One row per staged line: trimmed raw cells, parsed values and
+# errors jsonb[] of {field, value, message} — empty means importable.
+# The numeric patterns are params (_INT_RE / _NUM_RE), which keeps "?" out
+# of the SQL text itself.
+_CHECKED_SQL = """
+    src AS (
+      SELECT r.row_num,
+             btrim(COALESCE(r.cells[%(i_name)s], ''), %(trim)s)              AS name_raw,
+             btrim(COALESCE(r.cells[%(i_supplier)s], ''), %(trim)s)          AS supplier_raw,
+             btrim(COALESCE(r.cells[%(i_temp_zone)s], ''), %(trim)s)         AS temp_zone_raw,
+             translate(btrim(COALESCE(r.cells[%(i_unit)s], ''), %(trim)s),
+                       %(num_from)s, %(num_to)s)                             AS unit_raw,
+             translate(btrim(COALESCE(r.cells[%(i_purchase_unit)s], ''), %(trim)s),
+                       %(num_from)s, %(num_to)s)                             AS purchase_unit_raw,
+             translate(btrim(COALESCE(r.cells[%(i_inventory_unit)s], ''), %(trim)s),
+                       %(num_from)s, %(num_to)s)                             AS inventory_unit_raw,
+             translate(btrim(COALESCE(r.cells[%(i_min_purchase_unit)s], ''), %(trim)s),
+                       %(num_from)s, %(num_to)s)                             AS min_purchase_unit_raw,
+             btrim(COALESCE(r.cells[%(i_is_internal)s], ''), %(trim)s)       AS is_internal_raw
+      FROM mst_item_csv_rows r
+      WHERE r.upload_id = %(upload_id)s
+    ),
+    suppliers AS (
+      SELECT DISTINCT ON (k) k, id, code, name
+      FROM (
+        SELECT lower(replace(replace(btrim(name, %(trim)s), ' ', ''), '　', '')) AS k,
+               id, code, name
+        FROM pur_suppliers
+        WHERE is_active = 1 AND company_id = %(company_id)s
+      ) s
+      ORDER BY k, id
+    ),
+    zones AS (
+      SELECT DISTINCT ON (k) k, code
+      FROM (
+        SELECT code AS k, code, 0 AS pri
+        FROM inv_temp_zone_master WHERE COALESCE(is_active, TRUE) = TRUE
+        UNION ALL
+        SELECT default_name, code, 1
+        FROM inv_temp_zone_master WHERE COALESCE(is_active, TRUE) = TRUE
+      ) z
+      ORDER BY k, pri
+    ),
+    parsed AS (
+      SELECT s.*,
+             sup.id   AS supplier_id,
+             sup.code AS supplier_code,
+             sup.name AS supplier_name,
+             CASE WHEN s.temp_zone_raw <> ''
+                  THEN COALESCE(z.code, s.temp_zone_raw) END                     AS temp_zone_code,
+             CASE WHEN s.unit_raw ~ %(int_re)s
+                  THEN s.unit_raw::int END                                       AS unit,
+             CASE WHEN s.purchase_unit_raw ~ %(int_re)s
+                  THEN s.purchase_unit_raw::int END                              AS purchase_unit,
+             CASE WHEN s.inventory_unit_raw ~ %(int_re)s
+                  THEN s.inventory_unit_raw::int END                             AS inventory_unit,
+             CASE WHEN s.min_purchase_unit_raw ~ %(num_re)s
+                  THEN s.min_purchase_unit_raw::numeric END                      AS min_purchase_unit,
+             CASE WHEN s.is_internal_raw = ANY(%(internal_true)s) THEN 1 ELSE 0 END AS is_internal
+      FROM src s
+      LEFT JOIN suppliers sup
+        ON sup.k = lower(replace(replace(s.supplier_raw, ' ', ''), '　', ''))
+      LEFT JOIN zones z
+        ON z.k = s.temp_zone_raw
+    ),
+    checked AS (
+      SELECT p.*,
+             array_remove(ARRAY[
+               CASE WHEN p.name_raw = '' THEN
+                 jsonb_build_object('field', %(l_name)s, 'value', '', 'message', '品名が空') END,
+               CASE WHEN p.supplier_raw = '' THEN
+                      jsonb_build_object('field', %(l_supplier)s, 'value', '', 'message', '仕入先が空')
+                    WHEN p.supplier_id IS NULL THEN
+                      jsonb_build_object('field', %(l_supplier)s, 'value', p.supplier_raw,
+                                         'message', '仕入先「' || p.supplier_raw || '」が未登録') END,
+               CASE WHEN p.unit_raw <> '' AND p.unit IS NULL THEN
+                 jsonb_build_object('field', %(l_unit)s, 'value', p.unit_raw,
+                                    'message', 'ケース入数「' || p.unit_raw || '」は整数で入力') END,
+               CASE WHEN p.purchase_unit_raw <> '' AND p.purchase_unit IS NULL THEN
+                 jsonb_build_object('field', %(l_purchase_unit)s, 'value', p.purchase_unit_raw,
+                                    'message', '仕入れ単位「' || p.purchase_unit_raw
+                                               || '」は整数で入力（例: 1, 5, 10）') END,
+               CASE WHEN p.inventory_unit_raw <> '' AND p.inventory_unit IS NULL THEN
+                 jsonb_build_object('field', %(l_inventory_unit)s, 'value', p.inventory_unit_raw,
+                                    'message', '棚卸し単位「' || p.inventory_unit_raw
+                                               || '」は整数で入力（例: 1, 5, 10）') END,
+               CASE WHEN p.min_purchase_unit_raw <> '' AND p.min_purchase_unit IS NULL THEN
+                 jsonb_build_object('field', %(l_min_purchase_unit)s, 'value', p.min_purchase_unit_raw,
+                                    'message', '最低仕入単位「' || p.min_purchase_unit_raw
+                                               || '」は数値で入力') END
+             ]::jsonb[], NULL) AS errors
+      FROM parsed p
+    )"""
+
+
+def count_checked(db, upload: dict, mapping: dict, company_id) -> dict:
+    """{total, ok_count, ng_count} for the whole upload."""
+    row = db.execute(
+        f"""
+        WITH {_CHECKED_SQL}
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE cardinality(errors) = 0) AS ok_count
+        FROM checked
+        """,
+        _params(upload, mapping, company_id),
+    ).fetchone()
+    total, ok_count = int(row["total"] or 0), int(row["ok_count"] or 0)
+    return {"total": total, "ok_count": ok_count, "ng_count": total - ok_count}
+
+
+def preview_page(db, upload: dict, mapping: dict, company_id,
+                 offset: int = 0, limit: int = 200) -> List[dict]:
+    """One page of validated rows — row_num (CSV line, header = 1), name,
+    supplier_raw, supplier_info, temp_zone_raw, temp_zone_code, unit,
+    purchase_unit, inventory_unit, min_purchase_unit, is_internal,
+    errors (messages), ok."""
+    rows = db.execute(
+        f"""
+        WITH {_CHECKED_SQL}
+        SELECT * FROM checked
+        ORDER BY row_num
+        LIMIT %(limit)s OFFSET %(offset)s
+        """,
+        {**_params(upload, mapping, company_id), "limit": limit, "offset": offset},
+    ).fetchall()
+    out = []
+    for r in rows:
+        errors = [e["message"] for e in (r["errors"] or [])]
+        out.append({
+            "row_num":           r["row_num"] + 1,
+            "name":              r["name_raw"],
+            "supplier_raw":      r["supplier_raw"],
+            "supplier_info":     ({"id": r["supplier_id"], "code": r["supplier_code"],
+                                   "name": r["supplier_name"]}
+                                  if r["supplier_id"] is not None else None),
+            "temp_zone_raw":     r["temp_zone_raw"],
+            "temp_zone_code":    r["temp_zone_code"],
+            "unit":              r["unit"],
+            "purchase_unit":     r["purchase_unit"],
+            "inventory_unit":    r["inventory_unit"],
+            "min_purchase_unit": r["min_purchase_unit"],
+            "is_internal":       r["is_internal"],
+            "errors":            errors,
+            "ok":                not errors,
+        })
+    return out
+
+
+def error_report_rows(db, upload: dict, mapping: dict, company_id) -> List[dict]:
+    """[{row, field, value, message}] — one per problem, in file order;
+    field is the CSV column name when mapped."""
+    rows = db.execute(
+        f"""
+        WITH {_CHECKED_SQL}
+        SELECT c.row_num + 1 AS row,
+               e->>'field' AS field, e->>'value' AS value, e->>'message' AS message
+        FROM checked c
+        CROSS JOIN LATERAL unnest(c.errors) AS e
+        ORDER BY c.row_num
+        """,
+        _params(upload, mapping, company_id),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def write_error_report(fp, errors: List[dict]) -> None:
+    """Rejected rows as CSV to a text file object. Prefix a BOM (or open
+    files with encoding="utf-8-sig") so Excel reads them as-is."""
+    writer = csv.writer(fp)
+    writer.writerow(ERROR_REPORT_HEADER)
+    for e in errors:
+        writer.writerow((e["row"], e["field"], e["value"], e["message"]))
+
+
+# ── Import ────────────────────────────────────────────────────────────────────
+
+def import_items(db, company_id, upload: dict, mapping: dict,
+                 progress: Optional[Callable] = None) -> dict:
+    """Insert every valid staged row of the upload into mst_items with one
+    INSERT … SELECT. Does not commit.
+
+    progress, when given, is called as progress(done, total, message).
+    Returns {upload_id, rows, inserted, skipped, codes: {prefix: (first, last)},
+    skipped_preview (first 10 rejected rows, one line each),
+    timings: {insert_ms, total_ms}}."""
+    t0 = time.perf_counter()
+    total = int(upload["row_count"] or 0)
+    params = _params(upload, mapping, company_id)
+    if progress:
+        progress(0, total, "登録中")
+
+    codes = db.execute(
+        f"""
+        WITH {_CHECKED_SQL},
+        accepted AS (
+          SELECT c.*, LEFT(lpad(c.supplier_code::text, 2, '0'), 2) AS prefix
+          FROM checked c
+          WHERE cardinality(c.errors) = 0
+        ),
+        used AS (
+          SELECT LEFT(code, 2) AS prefix,
+                 MAX(CASE WHEN SUBSTRING(code FROM 3) ~ '^[0-9]+$'
+                          THEN SUBSTRING(code FROM 3)::bigint END) AS max_seq
+          FROM mst_items
+          WHERE company_id = %(company_id)s
+            AND LEFT(code, 2) IN (SELECT prefix FROM accepted)
+          GROUP BY LEFT(code, 2)
+        ),
+        numbered AS (
+          SELECT a.*,
+                 COALESCE(u.max_seq, 0)
+                   + row_number() OVER (PARTITION BY a.prefix ORDER BY a.row_num) AS seq
+          FROM accepted a
+          LEFT JOIN used u ON u.prefix = a.prefix
+        ),
+        coded AS (
+          SELECT n.*,
+                 n.prefix || lpad(n.seq::text, GREATEST(3, length(n.seq::text)), '0') AS new_code
+          FROM numbered n
+        ),
+        ins AS (
+          INSERT INTO mst_items
+              (company_id, code, name, unit, supplier_id, temp_zone,
+               purchase_unit, inventory_unit, min_purchase_unit,
+               is_internal, is_active)
+          SELECT %(company_id)s, new_code, name_raw, unit, supplier_id, temp_zone_code,
+                 purchase_unit, inventory_unit, min_purchase_unit,
+                 is_internal, 1
+          FROM coded
+          ORDER BY row_num
+          RETURNING 1
+        )
+        SELECT prefix,
+               (array_agg(new_code ORDER BY seq))[1]      AS first_code,
+               (array_agg(new_code ORDER BY seq DESC))[1] AS last_code,
+               (SELECT COUNT(*) FROM ins)                 AS inserted
+        FROM coded
+        GROUP BY prefix
+        ORDER BY prefix
+        """,
+        params,
+    ).fetchall()
+    t1 = time.perf_counter()
+    inserted = int(codes[0]["inserted"]) if codes else 0
+
+    rejected = db.execute(
+        f"""
+        WITH {_CHECKED_SQL}
+        SELECT row_num + 1 AS row_num, errors
+        FROM checked
+        WHERE cardinality(errors) > 0
+        ORDER BY row_num
+        LIMIT 10
+        """,
+        params,
+    ).fetchall()
+    db.execute(
+        """
+        UPDATE mst_item_csv_uploads
+           SET imported_at = NOW(), inserted_count = %s, mapping = %s::jsonb
+         WHERE id = %s
+        """,
+        (inserted, json.dumps(mapping, ensure_ascii=False), upload["id"]),
+    )
+    if progress:
+        progress(total, total, "完了")
+
+    return {
+        "upload_id": upload["id"],
+        "rows": total,
+        "inserted": inserted,
+        "skipped": total - inserted,
+        "codes": {r["prefix"]: (r["first_code"], r["last_code"]) for r in codes},
+        "skipped_preview": [
+            f"行{r['row_num']}: {' / '.join(e['message'] for e in r['errors'])} → スキップ"
+            for r in rejected
+        ],
+        "timings": {
+            "insert_ms": round((t1 - t0) * 1000.0, 1),
+            "total_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+        },
+    }
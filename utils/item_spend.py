@@ -0,0 +1,268 @@
+"""
+Item picker ranking for purchase entry: per-(company, supplier, item)
+90-day spend plus the last unit price.
+
+/api/mst_items/by_supplier/<id> used to LEFT JOIN every active item of the
+supplier to three months of purchases and SUM(amount) each time a supplier
+was chosen on the entry form. The result now lives in pur_item_spend
+(init/migrate_20261019_item_spend.sql):
+
+  * purchase writes refresh the touched items (touch_item_spend)
+  * init/refresh_item_spend.py re-ages the whole table daily
+
+fetch_item_picker reads the table when it is current for today and falls
+back to the live query otherwise. Picker payloads are cached per worker
+and revalidated against the 'company:<id>:{items,item_spend}' change
+stamps; the stamp versions also make the ETag.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from utils.change_stamps import company_key, fetch_change_stamps, make_etag
+
+
+WINDOW_DAYS = 90
+CACHE_TTL_SECONDS = 300      # only used when change stamps are unavailable
+
+# (company_id, supplier_id) -> (rows, etag, version, loaded_at)
+_CACHE: Dict[tuple, tuple] = {}
+_LOCK = threading.Lock()
+
+
+def _row_dict(r) -> dict:
+    last_date = r["last_delivery_date"]
+    return {
+        "id": r["id"],
+        "code": r["code"],
+        "name": r["name"],
+        "unit": r["unit"],
+        "total_amount": int(r["total_amount"] or 0),
+        "last_unit_price": r["last_unit_price"],
+        "last_delivery_date": last_date.isoformat() if last_date else None,
+    }
+
+
+def _fetch_stored(db, company_id, supplier_id, as_of: date) -> Optional[List[dict]]:
+    """The supplier's picker rows from pur_item_spend.
+
+    Returns None (→ caller falls back to the live query) when the table is
+    missing, the supplier has never been refreshed, or a row has not been
+    aged to `as_of` yet (daily job hasn't run today). Items without a row
+    have had no purchase since the last refresh and rank with 0."""
+    try:
+        rows = db.execute(
+            """
+            SELECT
+                i.id, i.code, i.name, i.unit,
+                COALESCE(sp.spend_amount, 0) AS total_amount,
+                sp.last_unit_price,
+                sp.last_delivery_date,
+                sp.window_end
+            FROM mst_items i
+            LEFT JOIN pur_item_spend sp
+              ON sp.company_id = i.company_id
+             AND sp.supplier_id = i.supplier_id
+             AND sp.item_id = i.id
+            WHERE i.supplier_id = %s
+              AND i.is_active = 1
+              AND i.company_id = %s
+            ORDER BY total_amount DESC, i.name ASC
+            """,
+            (supplier_id, company_id),
+        ).fetchall()
+    except Exception:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        return None
+    ends = {r["window_end"] for r in rows if r["window_end"] is not None}
+    if rows and ends != {as_of}:
+        return None
+    return [_row_dict(r) for r in rows]
+
+
+def _fetch_live(db, company_id, supplier_id, as_of: date) -> List[dict]:
+    """The original on-the-fly ranking, plus the last unit price."""
+    rows = db.execute(
+        """
+        SELECT
+            i.id,
+            i.code,
+            i.name,
+            i.unit,
+            COALESCE(SUM(p.amount), 0) AS total_amount,
+            lp.unit_price AS last_unit_price,
+            lp.delivery_date AS last_delivery_date
+        FROM mst_items i
+        LEFT JOIN purchases p
+            ON p.item_id = i.id
+            AND p.supplier_id = i.supplier_id
+            AND p.delivery_date >= %s
+            AND p.is_deleted = 0
+        LEFT JOIN LATERAL (
+            SELECT q.unit_price, q.delivery_date
+            FROM purchases q
+            WHERE q.item_id = i.id
+              AND q.supplier_id = i.supplier_id
+              AND q.is_deleted = 0
+            ORDER BY q.delivery_date DESC, q.id DESC
+            LIMIT 1
+        ) lp ON TRUE
+        WHERE i.supplier_id = %s
+          AND i.is_active = 1
+          AND i.company_id = %s
+        GROUP BY i.id, i.code, i.name, i.unit, lp.unit_price, lp.delivery_date
+        ORDER BY total_amount DESC, i.name ASC
+        """,
+        (as_of - timedelta(days=WINDOW_DAYS), supplier_id, company_id),
+    ).fetchall()
+    return [_row_dict(r) for r in rows]
+
+
+def fetch_item_picker(db, company_id, supplier_id) -> tuple:
+    """(rows, etag) for the purchase-entry item picker of one supplier.
+
+    rows: [{id, code, name, unit, total_amount, last_unit_price,
+            last_delivery_date}] ranked by 90-day spend, then name.
+    etag: None when the answer came from the live query (nothing to
+          revalidate against) or the stamps table is missing."""
+    company_id = int(company_id)
+    supplier_id = int(supplier_id)
+    today = date.today()
+    keys = [company_key(company_id, "items"), company_key(company_id, "item_spend")]
+    stamps = fetch_change_stamps(db, keys)
+    version = (tuple(stamps[k] for k in keys), today) if stamps is not None else None
+
+    with _LOCK:
+        hit = _CACHE.get((company_id, supplier_id))
+    if hit is not None:
+        rows, etag, hit_version, loaded_at = hit
+        fresh = (hit_version == version if version is not None
+                 else time.monotonic() - loaded_at < CACHE_TTL_SECONDS)
+        if fresh:
+            return rows, etag
+
+    rows = _fetch_stored(db, company_id, supplier_id, today)
+    if rows is None:
+        return _fetch_live(db, company_id, supplier_id, today), None
+
+    etag = (make_etag("item_picker", company_id, supplier_id, stamps, today)
+            if stamps is not None else None)
+    with _LOCK:
+        _CACHE[(company_id, supplier_id)] = (rows, etag, version, time.monotonic())
+    return rows, etag
+
+
+def refresh_item_spend(
+    db, company_id=None, item_ids: List[int] | None = None, as_of: date | None = None,
+) -> int:
+    """
+    Recompute pur_item_spend rows in one set-based upsert. Does not commit.
+
+    Scope:
+      item_ids    -> just those items (purchase writes)
+      company_id  -> every item of the company
+      neither     -> every company (daily sliding-window job)
+
+    Every item in scope gets a row, so items with no purchases left in the
+    window are rewritten as 0 — that is how they age out. Rows left under a
+    supplier the item no longer belongs to are deleted.
+    Returns the number of rows written.
+    """
+    as_of = as_of or date.today()
+    since = as_of - timedelta(days=WINDOW_DAYS)
+
+    scope_sql = ""
+    scope_params: list = []
+    if company_id:
+        scope_sql += " AND company_id = %s"
+        scope_params.append(company_id)
+    if item_ids is not None:
+        if not item_ids:
+            return 0
+        scope_sql += " AND id = ANY(%s)"
+        scope_params.append(list(item_ids))
+
+    db.execute(
+        f"""
+        DELETE FROM pur_item_spend sp
+        WHERE sp.item_id IN (SELECT id FROM mst_items WHERE TRUE {scope_sql})
+          AND NOT EXISTS (
+            SELECT 1 FROM mst_items i
+            WHERE i.id = sp.item_id
+              AND i.company_id = sp.company_id
+              AND i.supplier_id = sp.supplier_id
+          )
+        """,
+        scope_params,
+    )
+    cur = db.execute(
+        f"""
+        WITH scope AS (
+          SELECT company_id, supplier_id, id AS item_id
+          FROM mst_items
+          WHERE company_id IS NOT NULL
+            AND supplier_id IS NOT NULL
+            {scope_sql}
+        ),
+        spend AS (
+          SELECT p.item_id, SUM(p.amount) AS spend_amount
+          FROM purchases p
+          JOIN scope s ON s.item_id = p.item_id AND s.supplier_id = p.supplier_id
+          WHERE p.is_deleted = 0
+            AND p.delivery_date >= %s
+          GROUP BY p.item_id
+        ),
+        last_price AS (
+          SELECT DISTINCT ON (p.item_id) p.item_id, p.unit_price, p.delivery_date
+          FROM purchases p
+          JOIN scope s ON s.item_id = p.item_id AND s.supplier_id = p.supplier_id
+          WHERE p.is_deleted = 0
+          ORDER BY p.item_id, p.delivery_date DESC, p.id DESC
+        )
+        INSERT INTO pur_item_spend
+          (company_id, supplier_id, item_id, spend_amount,
+           last_unit_price, last_delivery_date, window_end, refreshed_at)
+        SELECT s.company_id, s.supplier_id, s.item_id,
+               COALESCE(sp.spend_amount, 0),
+               lp.unit_price, lp.delivery_date,
+               %s, NOW()
+        FROM scope s
+        LEFT JOIN spend sp      ON sp.item_id = s.item_id
+        LEFT JOIN last_price lp ON lp.item_id = s.item_id
+        ON CONFLICT (company_id, supplier_id, item_id)
+        DO UPDATE SET spend_amount       = EXCLUDED.spend_amount,
+                      last_unit_price    = EXCLUDED.last_unit_price,
+                      last_delivery_date = EXCLUDED.last_delivery_date,
+                      window_end         = EXCLUDED.window_end,
+                      refreshed_at       = EXCLUDED.refreshed_at
+        """,
+        scope_params + [since, as_of],
+    )
+    return cur.rowcount
+
+
+def touch_item_spend(db, pairs) -> None:
+    """
+    Best-effort refresh after a purchase write has been COMMITTED.
+
+    `pairs` is the same iterable of (store_id, item_id) passed to
+    touch_item_frequency; the store is irrelevant here. Runs in its own
+    transaction so a failure (e.g. table not migrated yet) can never roll
+    back the purchase itself — the daily job catches up.
+    """
+    try:
+        ids = sorted({int(item_id) for _, item_id in pairs if item_id})
+        if ids:
+            refresh_item_spend(db, item_ids=ids)
+            db.commit()
+    except Exception:
+        try:
+            db.rollback()
+        except Exception:
+            pass
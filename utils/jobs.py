@@ -0,0 +1,308 @@
+"""
+Postgres-backed background job queue (sys_jobs,
+init/migrate_20261019_job_queue.sql).
+
+Web side:
+  enqueue_job()     insert a job row (does not commit) — the request
+                    returns right away with the job id
+  get_job()         status row for /api/jobs/<id>
+
+Worker side (worker.py, `worker:` in the Procfile):
+  claim_next_job()  one runnable job via FOR UPDATE SKIP LOCKED — queued and
+                    due, or running with a stale heartbeat whose worker no
+                    longer holds the job's advisory lock (worker died)
+  run_job()         calls the registered handler with the job's payload
+
+Handlers are registered with @job_handler("kind") (utils/job_handlers.py)
+and called as handler(db, payload, ctx). They must not commit: the work
+and the job's 'done' row are committed together, so a job is never
+marked done without its writes or re-run after they landed. Follow-up
+work that needs the commit (touch_item_frequency …) goes through
+ctx.after_commit(). ctx.progress() writes on a separate autocommit
+connection, so pollers see it while the work transaction is still open.
+
+The work transaction holds pg_advisory_xact_lock(job id) until it commits
+or rolls back. A stale heartbeat alone only means no progress was written
+for a while (one long statement can take longer than
+STALE_AFTER_SECONDS); the job is reclaimed only when that lock is free,
+i.e. the worker's connection is gone.
+
+A handler exception rolls the work back; the job is queued again after
+RETRY_DELAYS[attempt] seconds, or marked failed once max_attempts is used.
+When the work connection itself is gone (database restart, idle kill) the
+job is queued again right away without using up an attempt, and the
+worker reconnects before claiming the next one.
+"""
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+import traceback
+from typing import Callable, Dict, List, Optional
+
+
+DEFAULT_MAX_ATTEMPTS = 3
+RETRY_DELAYS = (30, 120, 600)        # seconds before attempt 2, 3, 4…
+STALE_AFTER_SECONDS = 15 * 60        # running without heartbeat and unlocked → reclaimable
+PROGRESS_MIN_INTERVAL = 1.0          # seconds between progress writes
+
+_HANDLERS: Dict[str, Callable] = {}
+
+
+def job_handler(kind: str):
+    """Register fn(db, payload, ctx) -> result dict as the handler for kind."""
+    def register(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return register
+
+
+def jobs_available(db) -> bool:
+    """sys_jobs exists (migration applied). Callers run inline otherwise."""
+    row = db.execute("SELECT to_regclass('sys_jobs') IS NOT NULL AS ok").fetchone()
+    return bool(row and row["ok"])
+
+
+def enqueue_job(db, kind: str, payload: dict, company_id=None, user_id=None,
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> int:
+    """Queue a job; returns its id. Does not commit."""
+    return db.execute(
+        """
+        INSERT INTO sys_jobs (kind, company_id, payload, max_attempts, created_by)
+        VALUES (%s, %s, %s::jsonb, %s, %s)
+        RETURNING id
+        """,
+        (kind, company_id, json.dumps(payload, ensure_ascii=False, default=str),
+         max_attempts, user_id),
+    ).fetchone()["id"]
+
+
+def get_job(db, job_id) -> Optional[dict]:
+    row = db.execute(
+        """
+        SELECT id, kind, company_id, status, attempts, max_attempts,
+               progress_done, progress_total, message, result, error,
+               created_by, created_at, started_at, finished_at
+        FROM sys_jobs
+        WHERE id = %s
+        """,
+        (job_id,),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def job_status(job: dict) -> dict:
+    """JSON-safe view of a get_job() row for pollers."""
+    def iso(v):
+        return v.isoformat() if v else None
+    total = job["progress_total"]
+    return {
+        "id": job["id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "max_attempts": job["max_attempts"],
+        "progress": {
+            "done": job["progress_done"],
+            "total": total,
+            "percent": (round(100.0 * job["progress_done"] / total, 1)
+                        if total else None),
+        },
+        "message": job["message"],
+        "result": job["result"],
+        "error": job["error"],
+        "created_at": iso(job["created_at"]),
+        "started_at": iso(job["started_at"]),
+        "finished_at": iso(job["finished_at"]),
+    }
+
+
+class JobContext:
+    """Handed to handlers: progress reporting + post-commit hooks."""
+
+    def __init__(self, control, job: dict):
+        self._control = control
+        self.job = job
+        self.job_id = job["id"]
+        self.company_id = job["company_id"]
+        self.user_id = job["created_by"]
+        self._after_commit: List[Callable] = []
+        self._last_progress = 0.0
+
+    def progress(self, done: int, total: Optional[int] = None,
+                 message: Optional[str] = None, force: bool = False) -> None:
+        """Record progress (and refresh the heartbeat). Throttled to one
+        write per PROGRESS_MIN_INTERVAL unless force or done == total."""
+        now = time.monotonic()
+        if not force and total != done and now - self._last_progress < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_progress = now
+        self._control.execute(
+            """
+            UPDATE sys_jobs
+               SET progress_done  = %s,
+                   progress_total = COALESCE(%s, progress_total),
+                   message        = COALESCE(%s, message),
+                   heartbeat_at   = NOW()
+             WHERE id = %s
+            """,
+            (int(done), total, message, self.job_id),
+        )
+
+    def after_commit(self, fn: Callable[[], None]) -> None:
+        self._after_commit.append(fn)
+
+
+def claim_next_job(control, worker_id: str) -> Optional[dict]:
+    """Claim one runnable job (autocommit connection). None when idle."""
+    row = control.execute(
+        """
+        UPDATE sys_jobs j
+           SET status       = 'running',
+               attempts     = j.attempts + 1,
+               locked_by    = %s,
+               heartbeat_at = NOW(),
+               started_at   = NOW(),
+               error        = NULL
+         WHERE j.id = (
+           SELECT id FROM sys_jobs
+           WHERE (status = 'queued' AND run_after <= NOW())
+              OR (status = 'running'
+                  AND heartbeat_at < NOW() - %s * INTERVAL '1 second'
+                  AND pg_try_advisory_xact_lock(id))
+           ORDER BY run_after, id
+           FOR UPDATE SKIP LOCKED
+           LIMIT 1
+         )
+        RETURNING id, kind, company_id, payload, attempts, max_attempts, created_by
+        """,
+        (worker_id, STALE_AFTER_SECONDS),
+    ).fetchone()
+    return dict(row) if row else None
+
+
+def _fail_or_retry(control, job: dict, error: str) -> str:
+    if job["attempts"] >= job["max_attempts"]:
+        control.execute(
+            """
+            UPDATE sys_jobs
+               SET status = 'failed', error = %s, finished_at = NOW(), locked_by = NULL
+             WHERE id = %s
+            """,
+            (error, job["id"]),
+        )
+        return "failed"
+    delay = RETRY_DELAYS[min(job["attempts"], len(RETRY_DELAYS)) - 1]
+    control.execute(
+        """
+        UPDATE sys_jobs
+           SET status = 'queued', error = %s, locked_by = NULL,
+               run_after = NOW() + %s * INTERVAL '1 second'
+         WHERE id = %s
+        """,
+        (error, delay, job["id"]),
+    )
+    return "queued"
+
+
+def _requeue_lost(control, job: dict, error: str) -> str:
+    """The work connection died under the job: give the attempt back."""
+    control.execute(
+        """
+        UPDATE sys_jobs
+           SET status = 'queued', error = %s, locked_by = NULL,
+               attempts = GREATEST(attempts - 1, 0), run_after = NOW()
+         WHERE id = %s
+        """,
+        (error, job["id"]),
+    )
+    return "queued"
+
+
+def run_job(db, control, job: dict) -> str:
+    """Run one claimed job. Returns the resulting status."""
+    handler = _HANDLERS.get(job["kind"])
+    if handler is None:
+        job = {**job, "attempts": job["max_attempts"]}
+        return _fail_or_retry(control, job, f"unknown job kind: {job['kind']}")
+    if job["attempts"] > job["max_attempts"]:
+        return _fail_or_retry(control, job, "worker lost (stale heartbeat)")
+
+    ctx = JobContext(control, job)
+    try:
+        # Held until commit / rollback: keeps the job from being reclaimed
+        # while this transaction is alive, however long one statement runs.
+        db.execute("SELECT pg_advisory_xact_lock(%s)", (job["id"],))
+        result = handler(db, job["payload"] or {}, ctx)
+        db.execute(
+            """
+            UPDATE sys_jobs
+               SET status = 'done', result = %s::jsonb, finished_at = NOW(),
+                   progress_done = COALESCE(progress_total, progress_done),
+                   locked_by = NULL
+             WHERE id = %s
+            """,
+            (json.dumps(result or {}, ensure_ascii=False, default=str), job["id"]),
+        )
+        db.commit()
+    except Exception as e:
+        try:
+            db.rollback()
+        except Exception:
+            pass
+        traceback.print_exc()
+        if db.conn.closed:
+            return _requeue_lost(control, job, f"connection lost: {type(e).__name__}: {e}")
+        return _fail_or_retry(control, job, f"{type(e).__name__}: {e}")
+
+    for fn in ctx._after_commit:
+        try:
+            fn()
+        except Exception:
+            traceback.print_exc()
+    return "done"
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def run_worker(connect: Callable, worker_id: Optional[str] = None,
+               poll_interval: float = 2.0, once: bool = False) -> None:
+    """Claim-and-run loop. connect() returns a new DBWrapper; two are
+    opened — one for the work, one (autocommit) for claims and progress.
+    A closed connection is reopened before the next claim; when that
+    fails the worker exits and the process manager restarts it."""
+    worker_id = worker_id or default_worker_id()
+    db = connect()
+    control = connect()
+    control.conn.autocommit = True
+    print(f"[worker] {worker_id} started, handlers={sorted(_HANDLERS)}")
+    try:
+        while True:
+            if control.conn.closed:
+                print(f"[worker] {worker_id} control connection lost, reconnecting")
+                control = connect()
+                control.conn.autocommit = True
+            if db.conn.closed:
+                print(f"[worker] {worker_id} work connection lost, reconnecting")
+                db = connect()
+            job = claim_next_job(control, worker_id)
+            if job is None:
+                if once:
+                    return
+                time.sleep(poll_interval)
+                continue
+            started = time.perf_counter()
+            status = run_job(db, control, job)
+            print(f"[worker] job={job['id']} kind={job['kind']} "
+                  f"attempt={job['attempts']}/{job['max_attempts']} → {status} "
+                  f"in {(time.perf_counter() - started) * 1000.0:.0f} ms")
+    finally:
+        for c in (db, control):
+            try:
+                c.conn.close()
+            except Exception:
+                pass
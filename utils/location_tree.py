@@ -0,0 +1,112 @@
+"""
+Per-store location tree (temp zone → area → shelf) for the location pickers.
+
+The pickers used to call /api/locations/areas and /api/locations/shelves on
+every zone / area change. /api/locations/bootstrap now returns the whole
+tree once; the browser revalidates it with its ETag and resolves every
+picker change locally.
+
+The tree is cached in-process per store. Invalidation:
+  - the shelves / store-areas / store-temp-zones save paths call
+    invalidate_store() for the worker that handled the write;
+  - other workers notice through the 'store:<id>:locations' change stamp
+    (triggers on inv_store_shelves / inv_store_area_map, and
+    inv_store_temp_zones from migrate_20261019_location_tree.sql). Without
+    the stamps table, entries expire after CACHE_TTL_SECONDS.
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Dict
+
+from utils.change_stamps import fetch_change_stamps, make_etag, store_key
+
+
+CACHE_TTL_SECONDS = 300      # only used when change stamps are unavailable
+
+# store_id -> (tree, etag, stamp_version or None, loaded_at)
+_CACHE: Dict[int, tuple] = {}
+_LOCK = threading.Lock()
+
+
+def invalidate_store(store_id) -> None:
+    with _LOCK:
+        _CACHE.pop(int(store_id), None)
+
+
+def _load_tree(db, store_id: int) -> dict:
+    zones = db.execute(
+        """
+        SELECT
+          tzm.code,
+          COALESCE(stz.display_name, tzm.default_name) AS name
+        FROM inv_temp_zone_master tzm
+        LEFT JOIN inv_store_temp_zones stz
+          ON stz.code = tzm.code
+          AND stz.store_id = %s
+          AND COALESCE(stz.is_active, TRUE) = TRUE
+        WHERE COALESCE(tzm.is_active, TRUE) = TRUE
+        ORDER BY COALESCE(stz.sort_order, tzm.sort_order), tzm.code
+        """,
+        (store_id,),
+    ).fetchall()
+
+    shelves = db.execute(
+        """
+        SELECT
+          sh.id,
+          sh.code,
+          COALESCE(sh.name, sh.code) AS name,
+          sh.temp_zone,
+          sam.id AS area_id,
+          COALESCE(sam.display_name, am.name) AS area_name
+        FROM inv_store_shelves sh
+        JOIN store_area_map sam ON sam.id = sh.store_area_map_id
+        JOIN area_master am ON am.id = sam.area_id
+        WHERE sh.store_id = %s
+          AND COALESCE(sh.is_active, TRUE) = TRUE
+          AND COALESCE(sam.is_active, TRUE) = TRUE
+        ORDER BY sam.sort_order, area_name, sh.sort_order, sh.code
+        """,
+        (store_id,),
+    ).fetchall()
+
+    tree = {z["code"]: {"code": z["code"], "name": z["name"], "areas": []} for z in zones}
+    areas = {}   # (zone, area_id) -> area node
+    for s in shelves:
+        tz = (s["temp_zone"] or "").strip()
+        zone = tree.setdefault(tz, {"code": tz, "name": tz, "areas": []})
+        area = areas.get((tz, s["area_id"]))
+        if area is None:
+            area = {"id": s["area_id"], "name": s["area_name"], "shelves": []}
+            areas[(tz, s["area_id"])] = area
+            zone["areas"].append(area)
+        area["shelves"].append({"id": s["id"], "code": s["code"], "name": s["name"]})
+
+    return {"store_id": store_id, "zones": list(tree.values())}
+
+
+def get_location_tree(db, store_id) -> tuple:
+    """(tree, etag) for one store, from the in-process cache when current.
+    The ETag is a hash of the tree itself, so it is stable across workers."""
+    store_id = int(store_id)
+    stamp = store_key(store_id, "locations")
+    stamps = fetch_change_stamps(db, [stamp])
+    version = stamps[stamp] if stamps is not None else None
+
+    with _LOCK:
+        hit = _CACHE.get(store_id)
+    if hit is not None:
+        tree, etag, hit_version, loaded_at = hit
+        fresh = (hit_version == version if version is not None
+                 else time.monotonic() - loaded_at < CACHE_TTL_SECONDS)
+        if fresh:
+            return tree, etag
+
+    tree = _load_tree(db, store_id)
+    etag = make_etag("location_tree", json.dumps(tree, sort_keys=True, ensure_ascii=False))
+    with _LOCK:
+        _CACHE[store_id] = (tree, etag, version, time.monotonic())
+    return tree, etag
@@ -0,0 +1,267 @@
+"""
+Name matching for delivery CSV imports: CSV supplier / 納品場所 / item
+names → pur_suppliers / mst_stores / mst_items.
+
+Matching used to normalize and compare the CSV name against every master
+row, for every invoice (and reload mst_store_aliases per call). A
+NameIndex is built once per company and kind instead:
+
+  exact    normalized name or alias → entry (dict lookup)
+  grams    character bigram → entries (inverted index); a CSV name is
+           compared only with entries sharing a bigram
+
+Match tiers, best first:
+  code     CSV item code == mst_items.code (items only)
+  exact    normalized name or alias equal
+  partial  one normalized name contains the other
+  similar  bigram Dice coefficient >= min_similarity (items only)
+Within a tier: the preferred entries first (e.g. items of the invoice's
+supplier), then higher similarity, then master order.
+
+Indexes are cached in-process per company and revalidated against the
+'company:<id>:{suppliers,stores,store_aliases,items}' change stamps
+(migrate_20261019_name_match.sql for the store ones); the alias admin
+screen also calls invalidate_company(). Without the stamps table entries
+expire after CACHE_TTL_SECONDS.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from utils.change_stamps import company_key, fetch_change_stamps
+
+
+CACHE_TTL_SECONDS = 300      # only used when change stamps are unavailable
+ITEM_MIN_SIMILARITY = 0.5
+
+# kind -> change-stamp kinds the index depends on
+_STAMP_KINDS = {
+    "suppliers": ("suppliers",),
+    "stores":    ("stores", "store_aliases"),
+    "items":     ("items",),
+}
+
+# (company_id, kind) -> (index, stamp versions or None, loaded_at)
+_CACHE: Dict[tuple, tuple] = {}
+_LOCK = threading.Lock()
+
+
+def normalize_name(s):
+    """Normalize a name for fuzzy matching: full-width → half-width ASCII,
+    strip whitespace (incl. 全角), lowercase alphanumerics."""
+    if not s:
+        return ""
+    out = []
+    for ch in s:
+        code = ord(ch)
+        if 0xFF10 <= code <= 0xFF19:       # ０-９
+            out.append(chr(code - 0xFEE0))
+        elif 0xFF21 <= code <= 0xFF3A:     # Ａ-Ｚ
+            out.append(chr(code - 0xFEE0).lower())
+        elif 0xFF41 <= code <= 0xFF5A:     # ａ-ｚ
+            out.append(chr(code - 0xFEE0))
+        elif ch in (" ", "　", "\t"):
+            continue
+        else:
+            out.append(ch.lower() if ch.isascii() else ch)
+    return "".join(out)
+
+
+def _grams(s: str) -> set:
+    if len(s) < 2:
+        return {s} if s else set()
+    return {s[i:i + 2] for i in range(len(s) - 1)}
+
+
+class NameIndex:
+    """Normalized-name index over master rows. add() every entry, then
+    match(). Entries are the caller's dicts, returned as-is."""
+
+    def __init__(self):
+        self._entries: List[dict] = []
+        self._keys: List[tuple] = []           # (normalized, entry_pos, n_grams)
+        self._exact: Dict[str, int] = {}       # normalized -> entry_pos
+        self._codes: Dict[str, int] = {}       # normalized code -> entry_pos
+        self._postings: Dict[str, List[int]] = {}
+        self._short: List[int] = []            # key positions of 1-char names
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry: dict, names: Iterable[str], code: Optional[str] = None) -> None:
+        pos = len(self._entries)
+        self._entries.append(entry)
+        if code:
+            self._codes.setdefault(normalize_name(code), pos)
+        for raw in names:
+            n = normalize_name(raw)
+            if not n:
+                continue
+            self._exact.setdefault(n, pos)
+            grams = _grams(n)
+            kpos = len(self._keys)
+            self._keys.append((n, pos, len(grams)))
+            if len(n) < 2:
+                self._short.append(kpos)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(kpos)
+
+    def match(
+        self,
+        name: str,
+        code: Optional[str] = None,
+        allowed: Optional[set] = None,
+        prefer: Optional[Callable[[dict], bool]] = None,
+        min_similarity: Optional[float] = None,
+    ) -> Optional[tuple]:
+        """Best (entry, kind, score) for a CSV name / code, or None.
+
+        allowed: entry ids ('id' key) that may be returned.
+        prefer:  entries it accepts rank first within a tier.
+        min_similarity: enables the 'similar' tier."""
+        def ok(pos):
+            return allowed is None or self._entries[pos].get("id") in allowed
+
+        if code:
+            pos = self._codes.get(normalize_name(code))
+            if pos is not None and ok(pos):
+                return self._entries[pos], "code", 1.0
+
+        n = normalize_name(name)
+        if not n:
+            return None
+        pos = self._exact.get(n)
+        if pos is not None and ok(pos):
+            return self._entries[pos], "exact", 1.0
+
+        q_grams = _grams(n)
+        hits = Counter()
+        for gram in q_grams:
+            for kpos in self._postings.get(gram, ()):
+                hits[kpos] += 1
+        if len(n) < 2:
+            # a 1-char CSV name: its grams are not bigrams, scan for containment
+            hits.update({kpos: 1 for kpos, (k, _, _) in enumerate(self._keys) if n in k})
+        else:
+            hits.update({kpos: 1 for kpos in self._short if self._keys[kpos][0] in n})
+
+        best = None
+        for kpos, shared in hits.items():
+            k, pos, k_grams = self._keys[kpos]
+            if not ok(pos):
+                continue
+            score = 2.0 * shared / (k_grams + len(q_grams))
+            if k in n or n in k:
+                tier = 0
+            elif min_similarity is not None and score >= min_similarity:
+                tier = 1
+            else:
+                continue
+            preferred = bool(prefer and prefer(self._entries[pos]))
+            rank = (tier, not preferred, -score, pos)
+            if best is None or rank < best[0]:
+                best = (rank, pos, score)
+        if best is None:
+            return None
+        (tier, _, _, _), pos, score = best
+        return self._entries[pos], ("partial" if tier == 0 else "similar"), round(score, 3)
+
+
+def invalidate_company(company_id, kind: Optional[str] = None) -> None:
+    with _LOCK:
+        for k in list(_CACHE):
+            if k[0] == int(company_id) and (kind is None or k[1] == kind):
+                _CACHE.pop(k, None)
+
+
+def _build_suppliers(db, company_id) -> NameIndex:
+    index = NameIndex()
+    for r in db.execute(
+        "SELECT id, code, name FROM pur_suppliers "
+        "WHERE is_active = 1 AND company_id = %s ORDER BY code",
+        (company_id,),
+    ).fetchall():
+        index.add(dict(r), [r["name"]])
+    return index
+
+
+def _build_stores(db, company_id) -> NameIndex:
+    stores = db.execute(
+        """
+        SELECT id, code, name
+        FROM mst_stores
+        WHERE COALESCE(is_active, 1) = 1
+          AND company_id = %s
+        ORDER BY code, id
+        """,
+        (company_id,),
+    ).fetchall()
+    aliases: Dict[int, List[str]] = {}
+    try:
+        for r in db.execute(
+            """
+            SELECT store_id, alias_text
+            FROM mst_store_aliases
+            WHERE company_id = %s
+            ORDER BY id
+            """,
+            (company_id,),
+        ).fetchall():
+            aliases.setdefault(r["store_id"], []).append(r["alias_text"])
+    except Exception:
+        # mst_store_aliases missing (pre-migration) — names only
+        try: db.rollback()
+        except Exception: pass
+    index = NameIndex()
+    for r in stores:
+        index.add(dict(r), aliases.get(r["id"], []) + [r["name"]])
+    return index
+
+
+def _build_items(db, company_id) -> NameIndex:
+    index = NameIndex()
+    for r in db.execute(
+        """
+        SELECT i.id, i.code, i.name, i.supplier_id
+        FROM mst_items i
+        WHERE i.is_active = 1
+          AND i.company_id = %s
+        ORDER BY i.name
+        """,
+        (company_id,),
+    ).fetchall():
+        index.add(dict(r), [r["name"]], code=r["code"])
+    return index
+
+
+_BUILDERS = {
+    "suppliers": _build_suppliers,
+    "stores":    _build_stores,
+    "items":     _build_items,
+}
+
+
+def get_name_index(db, company_id, kind: str) -> NameIndex:
+    """The company's NameIndex for 'suppliers' | 'stores' | 'items', from
+    the in-process cache when current."""
+    company_id = int(company_id)
+    keys = [company_key(company_id, k) for k in _STAMP_KINDS[kind]]
+    stamps = fetch_change_stamps(db, keys)
+    version = tuple(stamps[k] for k in keys) if stamps is not None else None
+
+    with _LOCK:
+        hit = _CACHE.get((company_id, kind))
+    if hit is not None:
+        index, hit_version, loaded_at = hit
+        fresh = (hit_version == version if version is not None
+                 else time.monotonic() - loaded_at < CACHE_TTL_SECONDS)
+        if fresh:
+            return index
+
+    index = _BUILDERS[kind](db, company_id)
+    with _LOCK:
+        _CACHE[(company_id, kind)] = (index, version, time.monotonic())
+    return index
@@ -0,0 +1,263 @@
+"""
+Bulk write path for delivery imports (納品書貼付け / CSV upload).
+
+A confirmed import used to be one INSERT per purchase line — a monthly
+wholesaler CSV is hundreds of invoices and thousands of lines. Now:
+
+  1. one pur_import_batches row (id, source, file name, counts)
+  2. all lines COPY'd into a staging temp table (dropped at commit)
+  3. one INSERT … SELECT into pur_purchases, stamped with the batch id;
+     lines whose item / supplier is not the company's are dropped there
+  4. the batch row gets the counts and per-phase timings
+
+revert_import_batch() soft-deletes every purchase of a batch at once.
+
+Before init/migrate_20261019_purchase_import_batches.sql is applied the
+same COPY + merge runs without a batch id (no revert).
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+
+STAGING_COLUMNS = (
+    "ord", "store_id", "supplier_id", "item_id",
+    "delivery_date", "quantity", "unit_price", "invoice_no",
+)
+
+
+def import_capabilities(db) -> dict:
+    """Which optional migrations are applied:
+      batches     pur_import_batches + pur_purchases.import_batch_id
+      invoice_no  pur_purchases.invoice_no (migrate_20261019_purchase_invoice_no.sql)"""
+    row = db.execute(
+        """
+        SELECT
+          to_regclass('pur_import_batches') IS NOT NULL AS batches,
+          EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND table_name = 'pur_purchases'
+              AND column_name = 'invoice_no'
+          ) AS invoice_no
+        """
+    ).fetchone()
+    return {"batches": bool(row and row["batches"]),
+            "invoice_no": bool(row and row["invoice_no"])}
+
+
+def _copy_lines(db, lines: List[tuple]) -> None:
+    """COPY lines (tuples in STAGING_COLUMNS order) into tmp_purchase_import."""
+    db.execute(
+        """
+        CREATE TEMP TABLE IF NOT EXISTS tmp_purchase_import (
+          ord            INTEGER,
+          store_id       INTEGER,
+          supplier_id    INTEGER,
+          item_id        INTEGER,
+          delivery_date  DATE,
+          quantity       INTEGER,
+          unit_price     INTEGER,
+          invoice_no     VARCHAR(64)
+        ) ON COMMIT DROP
+        """
+    )
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerows(lines)
+    buf.seek(0)
+    cur = db.conn.cursor()
+    cur.copy_expert(
+        f"COPY tmp_purchase_import ({', '.join(STAGING_COLUMNS)}) "
+        "FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+
+
+def bulk_insert_purchases(
+    db, company_id, invoices: Iterable[dict], source: str,
+    file_name: Optional[str] = None, user_id=None,
+) -> dict:
+    """Write a confirmed import. Does not commit.
+
+    invoices: [{store_id, supplier_id, delivery_date, invoice_no (optional),
+                rows: [{item_id, quantity, unit_price}, ...]}, ...]
+    Rows without item_id or quantity are skipped, as before. The 伝票NO.
+    is stored on each line once pur_purchases.invoice_no exists.
+
+    Returns {batch_id, invoices, lines, inserted, skipped, touched,
+    timings: {copy_ms, merge_ms, total_ms}} — touched is the
+    [(store_id, item_id)] list for touch_item_frequency after commit.
+    """
+    t0 = time.perf_counter()
+    lines = []
+    invoice_count = 0
+    submitted = 0
+    for inv in invoices:
+        invoice_count += 1
+        for row in inv.get("rows") or []:
+            submitted += 1
+            try:
+                item_id = int(row.get("item_id") or 0)
+                quantity = int(row.get("quantity") or 0)
+                unit_price = int(row.get("unit_price") or 0)
+            except (TypeError, ValueError):
+                continue
+            if not item_id or not quantity:
+                continue
+            lines.append((
+                len(lines) + 1,
+                int(inv["store_id"]) if inv.get("store_id") else None,
+                int(inv["supplier_id"]),
+                item_id,
+                inv["delivery_date"],
+                quantity,
+                unit_price,
+                (str(inv.get("invoice_no") or "").strip()[:64] or None),
+            ))
+
+    result = {"batch_id": None, "invoices": invoice_count, "lines": submitted,
+              "inserted": 0, "skipped": submitted, "touched": [],
+              "timings": {"copy_ms": 0.0, "merge_ms": 0.0, "total_ms": 0.0}}
+    if not lines:
+        return result
+
+    caps = import_capabilities(db)
+    batch_id = None
+    if caps["batches"]:
+        batch_id = db.execute(
+            """
+            INSERT INTO pur_import_batches
+              (company_id, source, file_name, invoice_count, line_count, created_by)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            RETURNING id
+            """,
+            (company_id, source, file_name, invoice_count, submitted, user_id),
+        ).fetchone()["id"]
+
+    t1 = time.perf_counter()
+    _copy_lines(db, lines)
+    t2 = time.perf_counter()
+
+    extra_cols = ""
+    extra_vals = ""
+    params = [datetime.now().isoformat(timespec="seconds")]
+    if batch_id:
+        extra_cols += ", import_batch_id"
+        extra_vals += ", %s"
+        params.append(batch_id)
+    if caps["invoice_no"]:
+        extra_cols += ", invoice_no"
+        extra_vals += ", t.invoice_no"
+    params += [company_id, company_id]
+    touched = db.execute(
+        f"""
+        INSERT INTO pur_purchases
+            (store_id, supplier_id, item_id,
+             delivery_date, quantity, unit_price, amount, created_at{extra_cols})
+        SELECT t.store_id, t.supplier_id, t.item_id,
+               t.delivery_date, t.quantity, t.unit_price,
+               t.quantity * t.unit_price, %s{extra_vals}
+        FROM tmp_purchase_import t
+        JOIN mst_items i     ON i.id = t.item_id     AND i.company_id = %s
+        JOIN pur_suppliers s ON s.id = t.supplier_id AND s.company_id = %s
+        ORDER BY t.ord
+        RETURNING store_id, item_id
+        """,
+        params,
+    ).fetchall()
+    t3 = time.perf_counter()
+    db.execute("TRUNCATE tmp_purchase_import")
+
+    inserted = len(touched)
+    timings = {
+        "copy_ms": round((t2 - t1) * 1000.0, 1),
+        "merge_ms": round((t3 - t2) * 1000.0, 1),
+        "total_ms": round((time.perf_counter() - t0) * 1000.0, 1),
+    }
+    if batch_id:
+        db.execute(
+            """
+            UPDATE pur_import_batches
+               SET inserted_count = %s, timings = %s::jsonb
+             WHERE id = %s
+            """,
+            (inserted, json.dumps(timings), batch_id),
+        )
+
+    result.update({
+        "batch_id": batch_id,
+        "inserted": inserted,
+        "skipped": submitted - inserted,
+        "touched": [(r["store_id"], r["item_id"]) for r in touched],
+        "timings": timings,
+    })
+    return result
+
+
+def revert_import_batch(db, company_id, batch_id, user_id=None) -> Optional[dict]:
+    """Soft-delete every live purchase of one batch. Does not commit.
+
+    Returns None when the batch is not the company's, otherwise
+    {batch_id, reverted, already_reverted, touched, rows}; rows are the
+    soft-deleted purchases as they were before the update, for the
+    caller's audit log."""
+    batch = db.execute(
+        """
+        SELECT id, reverted_at FROM pur_import_batches
+        WHERE id = %s AND company_id = %s
+        """,
+        (batch_id, company_id),
+    ).fetchone()
+    if not batch:
+        return None
+    if batch["reverted_at"]:
+        return {"batch_id": batch["id"], "reverted": 0,
+                "already_reverted": True, "touched": [], "rows": []}
+
+    touched = db.execute(
+        """
+        UPDATE pur_purchases
+           SET is_deleted = 1
+         WHERE import_batch_id = %s
+           AND is_deleted = 0
+        RETURNING *
+        """,
+        (batch_id,),
+    ).fetchall()
+    db.execute(
+        """
+        UPDATE pur_import_batches
+           SET reverted_at = NOW(), reverted_by = %s, reverted_count = %s
+         WHERE id = %s
+        """,
+        (user_id, len(touched), batch_id),
+    )
+    return {"batch_id": batch["id"], "reverted": len(touched),
+            "already_reverted": False,
+            "touched": [(r["store_id"], r["item_id"]) for r in touched],
+            "rows": [{**r, "is_deleted": 0} for r in touched]}
+
+
+def recent_import_batches(db, company_id, limit: int = 50) -> list:
+    """Latest batches of the company with counts and timings."""
+    if not import_capabilities(db)["batches"]:
+        return []
+    rows = db.execute(
+        """
+        SELECT id, source, file_name, invoice_count, line_count,
+               inserted_count, timings, created_by, created_at,
+               reverted_at, reverted_count
+        FROM pur_import_batches
+        WHERE company_id = %s
+        ORDER BY created_at DESC, id DESC
+        LIMIT %s
+        """,
+        (company_id, limit),
+    ).fetchall()
+    return [dict(r) for r in rows]
@@ -0,0 +1,101 @@
+"""
+Per-store walk order for count sheets (inv_item_walk_order).
+
+The count sheet used to derive its order on every load from the shelf /
+area joins: zone → area sort → area name → shelf sort → shelf code →
+position on shelf → item code. That order only changes when a location
+or sort setting is saved, so it is stored as one ordinal per item:
+
+  walk_seq   1..n over the store's shelf-mapped items, in the order above;
+             the position tie-break follows the store's item sort config
+             (inventory_item_sort_config, views/loc/sort) when one is set
+
+The sheet then sorts by (zone, walk_seq, code). Every location save path
+calls refresh_walk_order() inside its own transaction; the rebuild is a
+single DELETE + INSERT … SELECT for the store (a few hundred rows). Item
+edits that change the zone or the name / code tie-break call
+refresh_walk_order_for_item() for the stores that shelve the item.
+"""
+from __future__ import annotations
+
+
+# Same expression as the count sheet's zone_rank.
+ZONE_RANK_SQL = """
+    CASE
+      WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷凍','FREEZE') THEN 1
+      WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷蔵','CHILL')  THEN 2
+      WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('常温','AMB')    THEN 3
+      ELSE 9
+    END"""
+
+
+def refresh_walk_order(db, store_id) -> int:
+    """Rebuild inv_item_walk_order for one store. Does not commit.
+    Returns the number of items placed (0 before the migration — table
+    presence is checked up front so the caller's transaction survives)."""
+    from views.loc.sort.order_builder import build_order_by
+    from views.loc.sort.sort_config import get_sort_config
+
+    store_id = int(store_id)
+    tables = db.execute(
+        """
+        SELECT to_regclass('inv_item_walk_order') IS NOT NULL AS walk_ok,
+               to_regclass('inventory_item_sort_config') IS NOT NULL AS cfg_ok
+        """
+    ).fetchone()
+    if not tables or not tables["walk_ok"]:
+        return 0
+    sort_cfg = get_sort_config(db, store_id) if tables["cfg_ok"] else None
+    tie_break = build_order_by(sort_cfg)
+
+    db.execute("DELETE FROM inv_item_walk_order WHERE store_id = %s", (store_id,))
+    cur = db.execute(
+        f"""
+        WITH walk AS (
+          SELECT
+            m.item_id,
+            ROW_NUMBER() OVER (
+              ORDER BY {ZONE_RANK_SQL},
+                COALESCE(sam.sort_order, 9999), COALESCE(am.name, ''),
+                COALESCE(sh.sort_order, 9999),  COALESCE(sh.code, ''),
+                COALESCE(m.sort_order, 9999),   {tie_break}
+            ) AS seq
+          FROM item_shelf_map m
+          JOIN mst_items i ON i.id = m.item_id
+          JOIN store_shelves sh ON sh.id = m.shelf_id
+          LEFT JOIN item_location_prefs pref
+            ON pref.store_id = m.store_id AND pref.item_id = m.item_id
+          LEFT JOIN store_area_map sam ON sam.id = sh.store_area_map_id
+          LEFT JOIN area_master am ON am.id = sam.area_id
+          WHERE m.store_id = %s AND m.is_active = TRUE
+        )
+        INSERT INTO inv_item_walk_order (store_id, item_id, walk_seq, refreshed_at)
+        SELECT %s, item_id, MIN(seq), NOW()
+        FROM walk
+        GROUP BY item_id
+        """,
+        (store_id, store_id),
+    )
+    return cur.rowcount
+
+
+def refresh_walk_order_for_item(db, item_id) -> int:
+    """Rebuild walk order for every store with the item on an active shelf.
+    Does not commit. Returns the number of stores rebuilt."""
+    exists = db.execute(
+        "SELECT to_regclass('inv_item_walk_order') IS NOT NULL AS ok"
+    ).fetchone()
+    if not exists or not exists["ok"]:
+        return 0
+    stores = db.execute(
+        """
+        SELECT DISTINCT store_id
+        FROM item_shelf_map
+        WHERE item_id = %s AND is_active = TRUE
+        ORDER BY store_id
+        """,
+        (int(item_id),),
+    ).fetchall()
+    for r in stores:
+        refresh_walk_order(db, r["store_id"])
+    return len(stores)
@@ -7,8 +7,9 @@ from __future__ import annotations
 from flask import render_template, request, redirect, url_for, flash, g, jsonify
 
 from utils.access_scope import is_chief_admin
+from utils.name_match import invalidate_company, normalize_name
 from views.reports.audit_log import log_event
-from views.pur_delivery_paste import CMS_FIELDS, CMS_FIELD_KEYS, _normalize_name
+from views.pur_delivery_paste import CMS_FIELDS, CMS_FIELD_KEYS
 
 
 def init_csv_import_admin_views(app, get_db):
@@ -62,9 +63,10 @@ def init_csv_import_admin_views(app, get_db):
                         ON CONFLICT (company_id, normalized_alias) DO NOTHING
                         """,
                         (company_id, store_id, alias_text,
-                         _normalize_name(alias_text), actor_id),
+                         normalize_name(alias_text), actor_id),
                     )
                     db.commit()
+                    invalidate_company(company_id, "stores")
                     log_event(db, action="STORE_ALIAS_ADD", module="admin",
                               entity_table="mst_store_aliases",
                               entity_id=str(store_id),
@@ -88,6 +90,7 @@ def init_csv_import_admin_views(app, get_db):
                     (alias_id, company_id),
                 )
                 db.commit()
+                invalidate_company(company_id, "stores")
                 log_event(db, action="STORE_ALIAS_DELETE", module="admin",
                           entity_table="mst_store_aliases",
                           entity_id=str(alias_id),
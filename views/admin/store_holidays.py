@@ -3,6 +3,12 @@ import calendar
 from datetime import date, datetime
 from flask import render_template, request, redirect, url_for, flash, g, jsonify
 
+from utils.holiday_calendar import (
+    invalidate_store,
+    invalidate_suppliers,
+    national_holidays,
+)
+
 
 def init_store_holidays_views(app, get_db):
 
@@ -90,6 +96,7 @@ def init_store_holidays_views(app, get_db):
                 (store_id, date_str, name, company_id),
             )
             db.commit()
+        invalidate_store(store_id)
 
         if redirect_url:
             return redirect(redirect_url)
@@ -115,7 +122,7 @@ def init_store_holidays_views(app, get_db):
 
         if preset == "public_holidays":
             # Japanese public holidays for the year
-            dates_to_add = _japanese_holidays(year)
+            dates_to_add = national_holidays(db, year)
         elif preset == "yearend":
             # 年末年始 12/29 - 1/3
             for d in range(29, 32):
@@ -142,6 +149,7 @@ def init_store_holidays_views(app, get_db):
             except Exception:
                 pass
         db.commit()
+        invalidate_store(store_id)
         flash(f"{added}件の休日を追加しました。")
 
         return redirect(url_for("store_holidays", store_id=store_id, year=year))
@@ -203,6 +211,7 @@ def init_store_holidays_views(app, get_db):
                 (supplier_id, date_str, name, company_id),
             )
         db.commit()
+        invalidate_suppliers(company_id)
         return redirect(redirect_url)
 
     @app.route("/suppliers/holidays/bulk", methods=["POST"])
@@ -221,7 +230,7 @@ def init_store_holidays_views(app, get_db):
 
         dates_to_add = []
         if preset == "public_holidays":
-            dates_to_add = _japanese_holidays(year)
+            dates_to_add = national_holidays(db, year)
         elif preset == "yearend":
             for d in range(29, 32):
                 dates_to_add.append((f"{year}-12-{d:02d}", "年末年始"))
@@ -246,28 +255,7 @@ def init_store_holidays_views(app, get_db):
             except Exception:
                 pass
         db.commit()
+        invalidate_suppliers(company_id)
         flash(f"{added}件の休日を追加しました。")
         return redirect(redirect_url)
 
-
-def _japanese_holidays(year):
-    """Return list of (date_str, name) for Japanese public holidays."""
-    holidays = [
-        (f"{year}-01-01", "元日"),
-        (f"{year}-01-13", "成人の日"),
-        (f"{year}-02-11", "建国記念の日"),
-        (f"{year}-02-23", "天皇誕生日"),
-        (f"{year}-03-20", "春分の日"),
-        (f"{year}-04-29", "昭和の日"),
-        (f"{year}-05-03", "憲法記念日"),
-        (f"{year}-05-04", "みどりの日"),
-        (f"{year}-05-05", "こどもの日"),
-        (f"{year}-07-20", "海の日"),
-        (f"{year}-08-11", "山の日"),
-        (f"{year}-09-15", "敬老の日"),
-        (f"{year}-09-23", "秋分の日"),
-        (f"{year}-10-13", "スポーツの日"),
-        (f"{year}-11-03", "文化の日"),
-        (f"{year}-11-23", "勤労感謝の日"),
-    ]
-    return holidays
@@ -119,12 +119,30 @@ def init_admin_system_invoices_views(app, get_db):
         """Manual trigger of the monthly invoice generator. In production
         this would be a cron job — for now sys admin clicks a button."""
         from utils.invoice_generator import generate_monthly_invoices
+        from utils.jobs import enqueue_job, jobs_available
 
         target_year = int(request.form.get("year") or date.today().year)
         target_month = int(request.form.get("month") or date.today().month)
 
+        db = get_db()
+        # Runs in the background worker once the job queue is migrated
+        if jobs_available(db):
+            actor = getattr(g, "current_user", None) or {}
+            try:
+                job_id = enqueue_job(
+                    db, "monthly_invoices",
+                    {"year": target_year, "month": target_month},
+                    user_id=actor.get("id"),
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                flash(f"Generation failed: {e}")
+                return redirect(url_for("admin_system_invoices"))
+            return redirect(url_for("job_status_page", job_id=job_id,
+                                    next=url_for("admin_system_invoices")))
+
         try:
-            db = get_db()
             count, skipped = generate_monthly_invoices(db, target_year, target_month)
             db.commit()
             flash(f"Generated {count} invoice(s). Skipped {skipped} (already exists or trial).")
@@ -1,5 +1,6 @@
 from flask import abort, redirect, request, url_for
 
+from utils.walk_order import refresh_walk_order
 from .sort_config import save_item_sort_config
 
 
@@ -37,6 +38,7 @@ def init_inventory_sort_views(app, get_db, SORTABLE_KEYS: set[str]):
 
         conn = get_db()
         save_item_sort_config(conn, store_id, cfg)
+        refresh_walk_order(conn, store_id)
         conn.commit()
 
         return redirect(url_for("inventory_count", store_id=store_id, count_date=count_date))
@@ -7,8 +7,11 @@ from flask import (
     redirect,
     url_for,
     flash,
+    g,
 )
 
+from utils.count_sheet import load_count_sheet
+
 
 def get_latest_stock_count_dates(db, store_id, limit=3):
     """
@@ -135,148 +138,13 @@ def init_inventory_views(app, get_db):
         grouped_items = {z: [] for z in zones}
 
         if store_id:
-            # まず、内製品（is_internal=1）は仕入がなくても拾う
-            # 通常品（is_internal=0）は、指定店舗・指定日までに一度でも仕入がある品目だけ拾う
-            base_rows = db.execute(
-                """
-                SELECT
-                    i.id   AS item_id,
-                    i.code AS item_code,
-                    i.name AS item_name,
-                    COALESCE(i.temp_zone, 'その他') AS storage_type,
-                    i.is_internal
-                FROM mst_items i
-                WHERE i.is_internal = 1
-
-                UNION
-
-                SELECT DISTINCT
-                    i.id   AS item_id,
-                    i.code AS item_code,
-                    i.name AS item_name,
-                    COALESCE(i.temp_zone, 'その他') AS storage_type,
-                    i.is_internal
-                FROM mst_items i
-                JOIN purchases p
-                  ON p.item_id = i.id
-                 AND p.store_id = %s
-                 AND p.delivery_date <= %s
-                 AND p.is_deleted = 0
-                WHERE i.is_internal = 0
-
-                ORDER BY storage_type, item_code
-                """,
-                (store_id, count_date),
-            ).fetchall()
-
-            for row in base_rows:
-                item_id = row["item_id"]
-                item_code = row["item_code"]
-                item_name = row["item_name"]
-
-                # ---------- システム在庫の計算 ----------
-                # 最新の棚卸し（count_date 以前）を取得
-                last_cnt = db.execute(
-                    """
-                    SELECT counted_qty, count_date
-                    FROM stock_counts
-                    WHERE store_id = %s
-                      AND item_id  = %s
-                      AND count_date <= %s
-                    ORDER BY count_date DESC, id DESC
-                    LIMIT 1
-                    """,
-                    (store_id, item_id, count_date),
-                ).fetchone()
-
-                if last_cnt:
-                    opening_qty = last_cnt["counted_qty"]
-                    start_date = last_cnt["count_date"]
-
-                    pur_row = db.execute(
-                        """
-                        SELECT COALESCE(SUM(quantity), 0) AS qty
-                        FROM purchases
-                        WHERE store_id = %s
-                          AND item_id  = %s
-                          AND delivery_date > %s
-                          AND delivery_date <= %s
-                          AND is_deleted = 0
-                        """,
-                        (store_id, item_id, start_date, count_date),
-                    ).fetchone()
-                else:
-                    opening_qty = 0
-                    pur_row = db.execute(
-                        """
-                        SELECT COALESCE(SUM(quantity), 0) AS qty
-                        FROM purchases
-                        WHERE store_id = %s
-                          AND item_id  = %s
-                          AND delivery_date <= %s
-                          AND is_deleted = 0
-                        """,
-                        (store_id, item_id, count_date),
-                    ).fetchone()
-
-                pur_qty = pur_row["qty"] if pur_row else 0
-                end_qty = opening_qty + pur_qty   # システム在庫
-
-                # ---------- 単価（加重平均） ----------
-                price_row = db.execute(
-                    """
-                    SELECT
-                      CASE
-                        WHEN SUM(quantity) > 0 THEN
-                          CAST(SUM(quantity * unit_price) AS REAL) / SUM(quantity)
-                        ELSE 0
-                      END AS unit_price
-                    FROM purchases
-                    WHERE store_id = %s
-                      AND item_id  = %s
-                      AND delivery_date <= %s
-                      AND is_deleted = 0
-                    """,
-                    (store_id, item_id, count_date),
-                ).fetchone()
-
-                unit_price = price_row["unit_price"] or 0.0
-                stock_amount = end_qty * unit_price
-
-                # ---------- この棚卸し日の棚卸数量を取得 ----------
-                counted_row = db.execute(
-                    """
-                    SELECT counted_qty
-                    FROM stock_counts
-                    WHERE store_id   = %s
-                      AND item_id    = %s
-                      AND count_date = %s
-                    ORDER BY id DESC
-                    LIMIT 1
-                    """,
-                    (store_id, item_id, count_date),
-                ).fetchone()
-
-                counted_qty = counted_row["counted_qty"] if counted_row else None
-
-                # 在庫ゼロは通常は表示しないが、
-                # 内製品（is_internal=1）は在庫ゼロでも表示する
-                is_internal = row["is_internal"] == 1
-
-                if end_qty > 0 or is_internal:
-                    mst_items.append(
-                        {
-                            "item_id": item_id,
-                            "item_code": item_code,
-                            "item_name": item_name,
-                            "system_qty": end_qty,
-                            "unit_price": unit_price,
-                            "stock_amount": stock_amount,
-                            "counted_qty": counted_qty,
-                            "storage_type": row["storage_type"],
-                            "is_internal": row["is_internal"],
-                        }
-                    )
+            # 棚卸し表はカウント画面共通のローダーで 1 クエリ取得
+            # （内製品は在庫ゼロでも表示、通常品は指定日までに仕入がある品目）
+            mst_items = load_count_sheet(
+                db, store_id, count_date, getattr(g, "current_company_id", None),
+            )
+            for it in mst_items:
+                it["storage_type"] = it["temp_zone"]
 
             # ★ mst_items を温度帯ごとにグルーピング
             for it in mst_items:
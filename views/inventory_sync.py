@@ -0,0 +1,348 @@
+# views/inventory_sync.py
+"""
+Offline-first sync API for the smartphone count screens.
+
+  GET  /inventory/api/count-sheet   compact count sheet for one store/date
+                                    (columns + rows, walk order), ETag'd
+  POST /inventory/api/count-sync    idempotent batch of counts recorded on
+                                    the device
+
+The phone keeps every count it records in localStorage
+(static/inventory/count_sync.js) and uploads them in batches, so a walk-in
+freezer without signal no longer loses in-progress work and a 300-item
+count is a handful of small requests instead of one large form POST.
+
+Idempotency: each count carries a client-generated op_id. The server claims
+op ids in inv_count_sync_ops (INSERT … ON CONFLICT DO NOTHING) before it
+writes stock_counts, so a re-sent batch is applied exactly once.
+
+Conflicts: each op also carries base_qty — the count for that item/date the
+device last saw from the server. If the server now holds a different value
+(another phone or the desktop screen saved in between), the op is reported
+as a conflict with the server's value instead of silently overwriting it.
+The client can re-send with force=true.
+"""
+
+from datetime import date, datetime
+
+from flask import request, jsonify, g
+
+from utils.access_scope import normalize_accessible_store_id
+from utils.change_stamps import (
+    company_key,
+    fetch_change_stamps,
+    make_etag,
+    store_key,
+)
+from utils.count_sheet import load_count_sheet
+from views.inventory_v2 import _insert_stock_counts
+from views.reports.audit_log import log_event
+
+
+MAX_SYNC_OPS = 1000
+
+# Columns of the compact sheet. Rows are lists in this order.
+SHEET_COLUMNS = (
+    "item_id", "code", "name", "temp_zone", "area", "shelf",
+    "system_qty", "counted_qty", "last_count_date", "frequency",
+)
+
+SHEET_STORE_STAMP_KINDS = ("purchases", "stock_counts", "locations")
+SHEET_COMPANY_STAMP_KINDS = ("items",)
+
+
+def _parse_ops(raw_ops):
+    """Validate the uploaded ops. Returns a list of dicts, or raises
+    ValueError with a short error code."""
+    ops = []
+    seen = set()
+    for raw in raw_ops:
+        if not isinstance(raw, dict):
+            raise ValueError("invalid_payload")
+        op_id = str(raw.get("op_id") or "").strip()
+        if not (8 <= len(op_id) <= 64):
+            raise ValueError("invalid_op_id")
+        if op_id in seen:
+            continue
+        seen.add(op_id)
+        try:
+            item_id = int(raw.get("item_id") or 0)
+            counted_qty = int(raw.get("counted_qty"))
+            system_qty = int(raw.get("system_qty") or 0)
+            base_qty = raw.get("base_qty")
+            base_qty = None if base_qty in (None, "") else int(base_qty)
+        except (TypeError, ValueError):
+            raise ValueError("invalid_payload")
+        if not item_id:
+            raise ValueError("missing_fields")
+        if counted_qty < 0:
+            raise ValueError("negative_qty")
+        recorded_at = raw.get("recorded_at")
+        try:
+            recorded_at = datetime.fromisoformat(
+                str(recorded_at).replace("Z", "+00:00")
+            ) if recorded_at else None
+        except ValueError:
+            recorded_at = None
+        ops.append({
+            "op_id": op_id,
+            "item_id": item_id,
+            "counted_qty": counted_qty,
+            "system_qty": system_qty,
+            "base_qty": base_qty,
+            "force": bool(raw.get("force")),
+            "recorded_at": recorded_at,
+        })
+    return ops
+
+
+def _apply_count_ops(db, company_id, store_id, count_date, ops,
+                     device_id=None, user_id=None):
+    """Apply one uploaded batch. Does not commit.
+
+    Returns (results, conflicts): results maps op_id → status
+    ('applied' | 'duplicate' | 'superseded' | 'conflict' | 'unknown_item'),
+    conflicts lists the server-side value for every conflicting op.
+    """
+    results = {}
+    conflicts = []
+    item_ids = sorted({op["item_id"] for op in ops})
+
+    # 1) Items must belong to the company.
+    owned = {
+        r["id"] for r in db.execute(
+            "SELECT id FROM mst_items WHERE company_id = %s AND id = ANY(%s)",
+            (company_id, item_ids),
+        ).fetchall()
+    }
+
+    # 2) Ops this server has already applied (re-sent batch).
+    done = {
+        r["op_id"] for r in db.execute(
+            "SELECT op_id FROM inv_count_sync_ops WHERE op_id = ANY(%s)",
+            ([op["op_id"] for op in ops],),
+        ).fetchall()
+    }
+
+    # 3) Current server value per item for this count date.
+    current = {
+        r["item_id"]: r for r in db.execute(
+            """
+            SELECT DISTINCT ON (item_id) item_id, counted_qty, created_at
+            FROM stock_counts
+            WHERE store_id = %s AND count_date = %s AND item_id = ANY(%s)
+            ORDER BY item_id, id DESC
+            """,
+            (store_id, count_date, item_ids),
+        ).fetchall()
+    }
+
+    # 4) Last op per item wins; earlier ones in the batch are superseded.
+    latest_by_item = {}
+    pending = []
+    for op in ops:
+        if op["op_id"] in done:
+            results[op["op_id"]] = "duplicate"
+        elif op["item_id"] not in owned:
+            results[op["op_id"]] = "unknown_item"
+        else:
+            pending.append(op)
+            latest_by_item[op["item_id"]] = op
+
+    to_claim = []
+    to_apply = []
+    for op in pending:
+        if latest_by_item[op["item_id"]] is not op:
+            to_claim.append((op, "superseded"))
+            continue
+        server = current.get(op["item_id"])
+        server_qty = server["counted_qty"] if server else None
+        if (not op["force"] and server_qty is not None
+                and server_qty != op["base_qty"]
+                and server_qty != op["counted_qty"]):
+            results[op["op_id"]] = "conflict"
+            conflicts.append({
+                "op_id": op["op_id"],
+                "item_id": op["item_id"],
+                "server_qty": server_qty,
+                "server_at": server["created_at"],
+            })
+            continue
+        to_claim.append((op, "applied"))
+        to_apply.append(op)
+
+    if not to_claim:
+        return results, conflicts
+
+    # 5) Claim op ids. A concurrent upload of the same batch blocks on the
+    #    primary key here and then claims nothing.
+    claimed = {
+        r["op_id"] for r in db.execute(
+            """
+            INSERT INTO inv_count_sync_ops
+              (op_id, store_id, item_id, count_date, counted_qty,
+               status, device_id, user_id, recorded_at)
+            SELECT u.op_id, %s, u.item_id, %s, u.counted_qty,
+                   u.status, %s, %s, u.recorded_at
+            FROM unnest(%s::varchar[], %s::int[], %s::int[],
+                        %s::varchar[], %s::timestamptz[])
+              AS u(op_id, item_id, counted_qty, status, recorded_at)
+            ON CONFLICT (op_id) DO NOTHING
+            RETURNING op_id
+            """,
+            (
+                store_id, count_date, device_id, user_id,
+                [op["op_id"] for op, _ in to_claim],
+                [op["item_id"] for op, _ in to_claim],
+                [op["counted_qty"] for op, _ in to_claim],
+                [status for _, status in to_claim],
+                [op["recorded_at"] for op, _ in to_claim],
+            ),
+        ).fetchall()
+    }
+    for op, status in to_claim:
+        results[op["op_id"]] = status if op["op_id"] in claimed else "duplicate"
+
+    # 6) One multi-row insert for everything that was claimed. No re-submit
+    #    window here: the op ids already dedupe re-sends, and a 41 → 40 → 41
+    #    recount must still record the final 41 it reports as applied.
+    _insert_stock_counts(
+        db, store_id, count_date,
+        [(op["item_id"], op["system_qty"], op["counted_qty"])
+         for op in to_apply if op["op_id"] in claimed],
+        window_minutes=0,
+    )
+    return results, conflicts
+
+
+def init_inventory_sync_views(app, get_db):
+    @app.route("/inventory/api/count-sheet", methods=["GET"],
+               endpoint="inventory_api_count_sheet")
+    def inventory_api_count_sheet():
+        """Compact count sheet for offline counting: one row per item in
+        walk order (temp zone → area → shelf → position), with system qty,
+        today's count and frequency bucket. Answers 304 while the store's
+        purchases / counts / locations and the company's items are
+        unchanged."""
+        db = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        store_id = normalize_accessible_store_id(request.args.get("store_id"))
+        if not (company_id and store_id):
+            return jsonify({"ok": False, "error": "missing store_id"}), 400
+        try:
+            count_date = date.fromisoformat(request.args.get("count_date") or "")
+        except ValueError:
+            count_date = date.today()
+
+        stamps = fetch_change_stamps(
+            db,
+            [store_key(store_id, k) for k in SHEET_STORE_STAMP_KINDS]
+            + [company_key(company_id, k) for k in SHEET_COMPANY_STAMP_KINDS],
+        )
+        etag = None
+        if stamps is not None:
+            # today matters: frequency buckets age daily
+            etag = make_etag("count_sheet", store_id, count_date, date.today(), stamps)
+            if request.if_none_match.contains(etag):
+                resp = app.response_class(status=304)
+                resp.set_etag(etag)
+                resp.headers["Cache-Control"] = "private, no-cache"
+                return resp
+
+        items = load_count_sheet(db, store_id, count_date, company_id,
+                                 with_frequency=True)
+
+        rows = [
+            [
+                it["item_id"], it["item_code"], it["item_name"], it["temp_zone"],
+                it["area_name"], it["shelf_label"], it["system_qty"],
+                it["counted_qty"],
+                str(it["last_count_date"]) if it["last_count_date"] else None,
+                it["frequency"]["bucket"],
+            ]
+            for it in items
+        ]
+        resp = jsonify({
+            "ok": True,
+            "store_id": store_id,
+            "count_date": count_date.isoformat(),
+            "columns": list(SHEET_COLUMNS),
+            "rows": rows,
+        })
+        if etag:
+            resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
+    @app.route("/inventory/api/count-sync", methods=["POST"],
+               endpoint="inventory_api_count_sync")
+    def inventory_api_count_sync():
+        """Apply a batch of device-recorded counts. JSON body:
+        {store_id, count_date, device_id?, ops: [{op_id, item_id,
+        counted_qty, system_qty, base_qty, recorded_at?, force?}, ...]}.
+
+        Safe to retry: ops already applied come back as 'duplicate'."""
+        db = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        current_user = getattr(g, "current_user", None) or {}
+
+        payload = request.get_json(silent=True) or {}
+        store_id = normalize_accessible_store_id(payload.get("store_id"))
+        raw_ops = payload.get("ops")
+        if not (company_id and store_id) or not isinstance(raw_ops, list):
+            return jsonify({"ok": False, "error": "missing_fields"}), 400
+        try:
+            count_date = date.fromisoformat(str(payload.get("count_date") or ""))
+        except ValueError:
+            return jsonify({"ok": False, "error": "invalid_count_date"}), 400
+        if len(raw_ops) > MAX_SYNC_OPS:
+            return jsonify({"ok": False, "error": "too_many_ops"}), 400
+        try:
+            ops = _parse_ops(raw_ops)
+        except ValueError as e:
+            return jsonify({"ok": False, "error": str(e)}), 400
+
+        server_time = datetime.now().isoformat(timespec="seconds")
+        if not ops:
+            return jsonify({"ok": True, "results": {}, "conflicts": [],
+                            "server_time": server_time})
+
+        device_id = str(payload.get("device_id") or "")[:64] or None
+        try:
+            results, conflicts = _apply_count_ops(
+                db, company_id, store_id, count_date, ops,
+                device_id=device_id, user_id=current_user.get("id"),
+            )
+            applied = sum(1 for s in results.values() if s == "applied")
+            if applied:
+                try:
+                    log_event(
+                        db, action="SUBMIT", module="inv",
+                        entity_table="stock_counts",
+                        entity_id=f"{store_id}:{count_date}",
+                        message=f"Inventory count synced (sp-sync) {count_date}",
+                        store_id=int(store_id), status_code=200,
+                        meta={"count_date": str(count_date),
+                              "op_count": len(ops),
+                              "applied": applied,
+                              "conflicts": len(conflicts),
+                              "device_id": device_id,
+                              "version": "sp-sync"},
+                    )
+                except Exception:
+                    pass
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        return jsonify({
+            "ok": True,
+            "results": results,
+            "conflicts": [
+                {**c, "server_at": c["server_at"].isoformat()
+                 if hasattr(c["server_at"], "isoformat") else c["server_at"]}
+                for c in conflicts
+            ],
+            "server_time": server_time,
+        })
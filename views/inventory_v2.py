@@ -3,7 +3,7 @@
 import csv
 import io
 import time
-from datetime import datetime
+from datetime import date, datetime
 from flask import render_template, request, redirect, url_for, flash, g, Response
 from views.reports.audit_log import log_event
 
@@ -11,31 +11,90 @@ from utils.access_scope import (
     get_accessible_stores,
     normalize_accessible_store_id,
 )
+from utils.count_sheet import group_by_zone, load_count_sheet
 
 
-def _is_recent_duplicate_count(db, store_id, item_id, count_date,
-                               counted_qty, window_minutes=10):
-    """Layer B: detect re-submits.
+def _parse_count_rows(form):
+    """Collect the submitted rows of a count form.
+
+    Returns (row_count, rows) where rows is a list of
+    (item_id, system_qty, counted_qty) ints. Rows without an item or with
+    an empty / non-numeric count are skipped, as the per-row loops did.
+    """
+    row_count = int(form.get("row_count", 0))
+    rows = []
+    for i in range(1, row_count + 1):
+        item_id = form.get(f"item_id_{i}")
+        system_qty = form.get(f"system_qty_{i}")
+        counted_qty = form.get(f"count_qty_{i}")
+
+        if not item_id or counted_qty is None or counted_qty == "":
+            continue
+        try:
+            rows.append((int(item_id), int(system_qty or 0), int(counted_qty)))
+        except ValueError:
+            continue
+    return row_count, rows
 
-    Returns True if an identical count (same store/item/date/qty) was
-    inserted within the last `window_minutes`. Used to suppress duplicate
-    INSERTs when an operator presses Save multiple times in a row.
+
+def _insert_stock_counts(db, store_id, count_date, rows, window_minutes=10):
+    """Insert a whole count submission with one statement. Does not commit.
+
+    Layer B — re-submit suppression: a row is dropped when an identical
+    count (same store/item/date/qty) was inserted within the last
+    `window_minutes`, or appears earlier in the same batch. Used to
+    suppress duplicate INSERTs when an operator presses Save multiple
+    times in a row. `window_minutes=0` turns the time-window check off
+    (offline sync, where every op is a deliberate count).
 
     Background: on 2026-04-20, item 15005 was saved 4 times (qty=41) within
     50 min from the SP UI; the dashboard correctly showed the latest value
     but the audit history was noisy. This check keeps the row count clean.
+
+    The check used to be one SELECT per row followed by a single-row
+    INSERT (~600 round trips for a 300-item count); now the duplicate
+    test is an anti-join inside the INSERT … SELECT.
+    Returns the number of rows inserted.
     """
-    rows = db.execute(
+    seen = set()
+    batch = []
+    for item_id, sys_val, cnt_val in rows:
+        if (item_id, cnt_val) in seen:
+            continue
+        seen.add((item_id, cnt_val))
+        batch.append((item_id, sys_val, cnt_val))
+    if not batch:
+        return 0
+
+    cur = db.execute(
         """
-        SELECT 1 FROM stock_counts
-        WHERE store_id = %s AND item_id = %s AND count_date = %s
-          AND counted_qty = %s
-          AND created_at >= now() - (interval '1 minute' * %s)
-        LIMIT 1
+        WITH incoming AS (
+          SELECT *
+          FROM unnest(%s::int[], %s::int[], %s::int[]) WITH ORDINALITY
+            AS u(item_id, system_qty, counted_qty, ord)
+        )
+        INSERT INTO stock_counts
+            (store_id, item_id, count_date,
+             system_qty, counted_qty, diff_qty, created_at)
+        SELECT %s, u.item_id, %s,
+               u.system_qty, u.counted_qty, u.counted_qty - u.system_qty, %s
+        FROM incoming u
+        WHERE %s = 0 OR NOT EXISTS (
+          SELECT 1 FROM stock_counts sc
+          WHERE sc.store_id = %s AND sc.item_id = u.item_id
+            AND sc.count_date = %s
+            AND sc.counted_qty = u.counted_qty
+            AND sc.created_at >= now() - (interval '1 minute' * %s)
+        )
+        ORDER BY u.ord
         """,
-        (store_id, item_id, count_date, counted_qty, window_minutes),
-    ).fetchone()
-    return rows is not None
+        (
+            [b[0] for b in batch], [b[1] for b in batch], [b[2] for b in batch],
+            store_id, count_date, datetime.now().isoformat(timespec="seconds"),
+            window_minutes, store_id, count_date, window_minutes,
+        ),
+    )
+    return cur.rowcount
 
 
 def get_latest_stock_count_dates(db, store_id, limit=3):
@@ -52,172 +111,6 @@ def get_latest_stock_count_dates(db, store_id, limit=3):
     return [r["count_date"] for r in rows]
 
 
-def _fetch_count_data(db, store_id, count_date, company_id=None):
-    """
-    Shared data-fetching logic for both the desktop (v2) and
-    smartphone (sp) inventory count screens.
-    Returns a list of item dicts ready for rendering.
-    """
-    base_rows = db.execute(
-        """
-        SELECT
-          i.id   AS item_id,
-          i.code AS item_code,
-          i.name AS item_name,
-          COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') AS tz_raw,
-          m.shelf_id,
-          COALESCE(m.sort_order, 9999) AS item_sort_order,
-          sh.code AS shelf_code,
-          sh.name AS shelf_name,
-          COALESCE(sh.sort_order, 9999) AS shelf_sort_order,
-          COALESCE(sam.sort_order, 9999) AS area_sort_order,
-          COALESCE(sam.display_name, am.name, '') AS area_name,
-          i.is_internal
-        FROM mst_items i
-        LEFT JOIN item_location_prefs pref
-          ON pref.store_id = %s AND pref.item_id = i.id
-        LEFT JOIN item_shelf_map m
-          ON m.store_id = %s AND m.item_id = i.id AND m.is_active = TRUE
-        LEFT JOIN store_shelves sh ON sh.id = m.shelf_id
-        LEFT JOIN store_area_map sam ON sam.id = sh.store_area_map_id
-        LEFT JOIN area_master am ON am.id = sam.area_id
-        WHERE i.company_id = %s
-          AND (
-            pref.item_id IS NOT NULL OR m.item_id IS NOT NULL
-            OR i.is_internal = 1
-            OR EXISTS (
-              SELECT 1 FROM purchases p
-              WHERE p.store_id = %s AND p.item_id = i.id
-                AND p.is_deleted = 0 AND p.delivery_date <= %s
-            )
-          )
-        ORDER BY
-          CASE
-            WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷凍','FREEZE') THEN 1
-            WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('冷蔵','CHILL')  THEN 2
-            WHEN COALESCE(NULLIF(pref.temp_zone,''),NULLIF(i.temp_zone,''),'その他') IN ('常温','AMB')    THEN 3
-            ELSE 9
-          END,
-          COALESCE(sam.sort_order,9999), COALESCE(am.name,''),
-          COALESCE(sh.sort_order,9999),  COALESCE(sh.code,''),
-          COALESCE(m.sort_order,9999),   i.code
-        """,
-        (store_id, store_id, company_id, store_id, count_date),
-    ).fetchall()
-
-    item_ids = [r["item_id"] for r in base_rows] or []
-
-    # Last counted qty per item
-    last_rows = db.execute(
-        """
-        SELECT DISTINCT ON (item_id) item_id,
-               count_date AS last_count_date, counted_qty AS opening_qty
-        FROM stock_counts
-        WHERE store_id = %s AND item_id = ANY(%s) AND count_date <= %s
-        ORDER BY item_id, count_date DESC, id DESC
-        """,
-        (store_id, item_ids, count_date),
-    ).fetchall()
-    last_map = {r["item_id"]: (r["opening_qty"] or 0, r["last_count_date"]) for r in last_rows}
-
-    # Purchases after last count
-    after_rows = db.execute(
-        """
-        WITH last_cnt AS (
-          SELECT DISTINCT ON (item_id) item_id, count_date AS last_count_date
-          FROM stock_counts
-          WHERE store_id = %s AND item_id = ANY(%s) AND count_date <= %s
-          ORDER BY item_id, count_date DESC, id DESC
-        )
-        SELECT p.item_id, COALESCE(SUM(p.quantity),0) AS qty_after
-        FROM purchases p
-        LEFT JOIN last_cnt lc ON lc.item_id = p.item_id
-        WHERE p.store_id = %s AND p.item_id = ANY(%s)
-          AND p.is_deleted = 0 AND p.delivery_date <= %s
-          AND (lc.last_count_date IS NULL OR p.delivery_date > lc.last_count_date)
-        GROUP BY p.item_id
-        """,
-        (store_id, item_ids, count_date, store_id, item_ids, count_date),
-    ).fetchall()
-    after_map = {r["item_id"]: (r["qty_after"] or 0) for r in after_rows}
-
-    # Weighted avg unit price
-    price_rows = db.execute(
-        """
-        SELECT item_id,
-               CASE WHEN SUM(quantity)>0
-                    THEN SUM(quantity*unit_price)::numeric/SUM(quantity)
-                    ELSE 0 END AS unit_price
-        FROM purchases
-        WHERE store_id = %s AND item_id = ANY(%s)
-          AND is_deleted = 0 AND delivery_date <= %s
-        GROUP BY item_id
-        """,
-        (store_id, item_ids, count_date),
-    ).fetchall()
-    price_map = {r["item_id"]: float(r["unit_price"] or 0) for r in price_rows}
-
-    # Already counted today
-    counted_rows = db.execute(
-        "SELECT item_id, counted_qty FROM stock_counts "
-        "WHERE store_id = %s AND item_id = ANY(%s) AND count_date = %s",
-        (store_id, item_ids, count_date),
-    ).fetchall()
-    counted_map = {r["item_id"]: r["counted_qty"] for r in counted_rows}
-
-    # Latest-ever save timestamp per item (used by the smart/v3 screen for
-    # the per-item "最終 YYYY-MM-DD HH:MM" freshness display).
-    last_ever_rows = db.execute(
-        """
-        SELECT DISTINCT ON (item_id)
-          item_id,
-          count_date   AS last_ever_date,
-          created_at   AS last_ever_at
-        FROM stock_counts
-        WHERE store_id = %s AND item_id = ANY(%s)
-        ORDER BY item_id, count_date DESC, id DESC
-        """,
-        (store_id, item_ids),
-    ).fetchall()
-    last_ever_map = {
-        r["item_id"]: (r["last_ever_date"], r["last_ever_at"])
-        for r in last_ever_rows
-    }
-
-    # Build item list
-    TZ_MAP = {
-        "冷凍": "冷凍", "FREEZE": "冷凍",
-        "冷蔵": "冷蔵", "CHILL":  "冷蔵",
-        "常温": "常温", "AMB":    "常温",
-    }
-    items = []
-    for row in base_rows:
-        item_id    = row["item_id"]
-        opening, last_count_date = last_map.get(item_id, (0, None))
-        system_qty = opening + after_map.get(item_id, 0)
-        if system_qty <= 0 and not row["is_internal"]:
-            continue
-        shelf_name = row["shelf_name"] or row["shelf_code"] or "—"
-        last_ever_date, last_ever_at = last_ever_map.get(item_id, (None, None))
-        items.append({
-            "item_id":     item_id,
-            "item_code":   row["item_code"],
-            "item_name":   row["item_name"],
-            "temp_zone":   TZ_MAP.get(row["tz_raw"] or "", "その他"),
-            "area_name":   row["area_name"] or "—",
-            "shelf_label": shelf_name,
-            "system_qty":  system_qty,
-            "unit_price":  price_map.get(item_id, 0.0),
-            "stock_amount": system_qty * price_map.get(item_id, 0.0),
-            "counted_qty": counted_map.get(item_id),
-            "last_count_date": last_count_date,
-            "last_ever_date": last_ever_date,
-            "last_ever_at": last_ever_at,
-            "is_internal": row["is_internal"],
-        })
-    return items
-
-
 def init_inventory_views_v2(app, get_db):
     @app.route("/inventory/count_v2", methods=["GET", "POST"], endpoint="inventory_count_v2")
     def inventory_count_v2():
@@ -244,53 +137,8 @@ def init_inventory_views_v2(app, get_db):
                 flash("店舗を選択してください。")
                 return redirect(url_for("inventory_count_v2"))
 
-            row_count = int(request.form.get("row_count", 0))
-            
-            inserted_rows = 0
-
-            for i in range(1, row_count + 1):
-                item_id = request.form.get(f"item_id_{i}")
-                system_qty = request.form.get(f"system_qty_{i}")
-                counted_qty = request.form.get(f"count_qty_{i}")
-
-                if not item_id:
-                    continue
-                if counted_qty is None or counted_qty == "":
-                    continue
-
-                try:
-                    sys_val = int(system_qty or 0)
-                    cnt_val = int(counted_qty or 0)
-                except ValueError:
-                    continue
-
-                diff = cnt_val - sys_val
-
-                # Layer B — skip if an identical save just landed.
-                if _is_recent_duplicate_count(
-                    db, store_id, item_id, count_date, cnt_val
-                ):
-                    continue
-
-                db.execute(
-                    """
-                    INSERT INTO stock_counts
-                        (store_id, item_id, count_date,
-                         system_qty, counted_qty, diff_qty, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        store_id,
-                        item_id,
-                        count_date,
-                        sys_val,
-                        cnt_val,
-                        diff,
-                        datetime.now().isoformat(timespec="seconds"),
-                    ),
-                )
-
-                inserted_rows += 1
+            row_count, rows = _parse_count_rows(request.form)
+            inserted_rows = _insert_stock_counts(db, store_id, count_date, rows)
 
             #  NEW: one audit log per submit (lightweight)
             try:
@@ -329,10 +177,6 @@ def init_inventory_views_v2(app, get_db):
         count_date = request.args.get("count_date") or today
 
         mst_items = []
-        selected_store_id = normalize_accessible_store_id(
-        request.args.get("store_id")
-        )
-        store_id = str(selected_store_id) if selected_store_id else ""
 
         latest_dates = []
         latest_date = None
@@ -355,250 +199,16 @@ def init_inventory_views_v2(app, get_db):
         t0 = time.perf_counter()
 
         # =========================================================
-        # 1) base_rows: locations-aware ordered item list (FAST)
-        # =========================================================
-        base_rows = db.execute(
-            """
-            SELECT
-              i.id   AS item_id,
-              i.code AS item_code,
-              i.name AS item_name,
-
-              -- temp zone preference: prefs -> item master -> default
-              COALESCE(NULLIF(pref.temp_zone, ''), NULLIF(i.temp_zone, ''), 'その他') AS tz_raw,
-
-              -- shelf / area (from locations)
-              m.shelf_id,
-              COALESCE(m.sort_order, 9999) AS item_sort_order,
-
-              sh.code AS shelf_code,
-              sh.name AS shelf_name,
-              COALESCE(sh.sort_order, 9999) AS shelf_sort_order,
-
-              COALESCE(sam.sort_order, 9999) AS area_sort_order,
-              COALESCE(sam.display_name, am.name, '') AS area_name,
-
-              i.is_internal
-            FROM mst_items i
-
-            LEFT JOIN item_location_prefs pref
-              ON pref.store_id = %s
-             AND pref.item_id  = i.id
-
-            LEFT JOIN item_shelf_map m
-              ON m.store_id   = %s
-             AND m.item_id    = i.id
-             AND m.is_active  = TRUE
-
-            LEFT JOIN store_shelves sh
-              ON sh.id = m.shelf_id
-
-            LEFT JOIN store_area_map sam
-              ON sam.id = sh.store_area_map_id
-
-            LEFT JOIN area_master am
-              ON am.id = sam.area_id
-
-            WHERE
-              pref.item_id IS NOT NULL
-              OR m.item_id IS NOT NULL
-              OR i.is_internal = 1
-              OR EXISTS (
-                SELECT 1
-                FROM purchases p
-                WHERE p.store_id = %s
-                  AND p.item_id = i.id
-                  AND p.is_deleted = 0
-                  AND p.delivery_date <= %s
-              )
-
-            ORDER BY
-              CASE
-                WHEN COALESCE(NULLIF(pref.temp_zone, ''), NULLIF(i.temp_zone, ''), 'その他') IN ('冷凍','FREEZE') THEN 1
-                WHEN COALESCE(NULLIF(pref.temp_zone, ''), NULLIF(i.temp_zone, ''), 'その他') IN ('冷蔵','CHILL')  THEN 2
-                WHEN COALESCE(NULLIF(pref.temp_zone, ''), NULLIF(i.temp_zone, ''), 'その他') IN ('常温','AMB')    THEN 3
-                ELSE 9
-              END,
-              COALESCE(sam.sort_order, 9999),
-              COALESCE(am.name, ''),
-              COALESCE(sh.sort_order, 9999),
-              COALESCE(sh.code, ''),
-              COALESCE(m.sort_order, 9999),
-              i.code;
-            """,
-            (store_id, store_id, store_id, count_date),
-        ).fetchall()
-
-        print(f"[V2-1] 1 base_rows elapsed: {time.perf_counter() - t0:.3f}s rows={len(base_rows)}")
-
-        item_ids = [r["item_id"] for r in base_rows]
-        if not item_ids:
-            item_ids = []
-
-        # =========================================================
-        # 2) Batch: last count (opening_qty + last_count_date)
-        # =========================================================
-        t1 = time.perf_counter()
-        last_rows = db.execute(
-            """
-            SELECT DISTINCT ON (item_id)
-              item_id,
-              count_date AS last_count_date,
-              counted_qty AS opening_qty
-            FROM stock_counts
-            WHERE store_id = %s
-              AND item_id = ANY(%s)
-              AND count_date <= %s
-            ORDER BY item_id, count_date DESC, id DESC
-            """,
-            (store_id, item_ids, count_date),
-        ).fetchall()
-
-        last_map = {}
-        for r in last_rows:
-            last_map[r["item_id"]] = (r["opening_qty"] or 0, r["last_count_date"])
-
-        print(f"[V2-1] 2 last_cnt batch elapsed: {time.perf_counter() - t1:.3f}s rows={len(last_rows)}")
-
-        # =========================================================
-        # 3) Batch: purchases AFTER last_count_date (system_qty component)
-        # =========================================================
-        t2 = time.perf_counter()
-        after_rows = db.execute(
-            """
-            WITH last_cnt AS (
-              SELECT DISTINCT ON (item_id)
-                item_id,
-                count_date AS last_count_date
-              FROM stock_counts
-              WHERE store_id = %s
-                AND item_id = ANY(%s)
-                AND count_date <= %s
-              ORDER BY item_id, count_date DESC, id DESC
-            )
-            SELECT
-              p.item_id,
-              COALESCE(SUM(p.quantity), 0) AS qty_after
-            FROM purchases p
-            LEFT JOIN last_cnt lc ON lc.item_id = p.item_id
-            WHERE p.store_id = %s
-              AND p.item_id = ANY(%s)
-              AND p.is_deleted = 0
-              AND p.delivery_date <= %s
-              AND (lc.last_count_date IS NULL OR p.delivery_date > lc.last_count_date)
-            GROUP BY p.item_id
-            """,
-            (store_id, item_ids, count_date, store_id, item_ids, count_date),
-        ).fetchall()
-
-        after_map = {r["item_id"]: (r["qty_after"] or 0) for r in after_rows}
-
-        print(f"[V2-1] 3 purchases-after batch elapsed: {time.perf_counter() - t2:.3f}s rows={len(after_rows)}")
-
-        # =========================================================
-        # 4) Batch: weighted avg unit price up to count_date
-        # =========================================================
-        t3 = time.perf_counter()
-        price_rows = db.execute(
-            """
-            SELECT
-              item_id,
-              CASE
-                WHEN SUM(quantity) > 0 THEN
-                  (SUM(quantity * unit_price)::numeric / SUM(quantity))
-                ELSE 0
-              END AS unit_price
-            FROM purchases
-            WHERE store_id = %s
-              AND item_id = ANY(%s)
-              AND is_deleted = 0
-              AND delivery_date <= %s
-            GROUP BY item_id
-            """,
-            (store_id, item_ids, count_date),
-        ).fetchall()
-
-        price_map = {r["item_id"]: float(r["unit_price"] or 0) for r in price_rows}
-
-        print(f"[V2-1] 4 price batch elapsed: {time.perf_counter() - t3:.3f}s rows={len(price_rows)}")
-
-        # =========================================================
-        # 5) Batch: counted_qty on this count_date (for input default)
+        # 1) Whole sheet: one query (utils/count_sheet.py)
         # =========================================================
-        t4 = time.perf_counter()
-        counted_rows = db.execute(
-            """
-            SELECT item_id, counted_qty
-            FROM stock_counts
-            WHERE store_id = %s
-              AND item_id = ANY(%s)
-              AND count_date = %s
-            """,
-            (store_id, item_ids, count_date),
-        ).fetchall()
-
-        counted_map = {r["item_id"]: r["counted_qty"] for r in counted_rows}
-
-        print(f"[V2-1] 5 counted_today batch elapsed: {time.perf_counter() - t4:.3f}s rows={len(counted_rows)}")
-
-        # =========================================================
-        # 6) Build items (NO DB calls here)
-        # =========================================================
-        t5 = time.perf_counter()
-
-        for row in base_rows:
-            item_id = row["item_id"]
-            item_code = row["item_code"]
-            item_name = row["item_name"]
-
-            # temp zone normalize to Japanese labels
-            tz_raw = row["tz_raw"] or "その他"
-            if tz_raw in ("冷凍", "FREEZE"):
-                storage_type = "冷凍"
-            elif tz_raw in ("冷蔵", "CHILL"):
-                storage_type = "冷蔵"
-            elif tz_raw in ("常温", "AMB"):
-                storage_type = "常温"
-            else:
-                storage_type = "その他"
-
-            opening_qty, _last_date = last_map.get(item_id, (0, None))
-            pur_after = after_map.get(item_id, 0)
-            end_qty = opening_qty + pur_after
-
-            unit_price = price_map.get(item_id, 0.0)
-            stock_amount = end_qty * unit_price
-
-            counted_qty = counted_map.get(item_id)
-
-            is_internal = (row["is_internal"] == 1)
-
-            area_name = row["area_name"] or "—"
-            shelf_code = row["shelf_code"] or ""
-            shelf_name = row["shelf_name"] or ""
-            shelf_label = shelf_name or shelf_code or "—"
-
-            if end_qty > 0 or is_internal:
-                mst_items.append(
-                    {
-                        "item_id": item_id,
-                        "item_code": item_code,
-                        "item_name": item_name,
-                        "temp_zone": storage_type,
-                        "area_name": area_name if area_name else "—",
-                        "shelf_label": shelf_label,
-                        "system_qty": end_qty,
-                        "unit_price": unit_price,
-                        "stock_amount": stock_amount,
-                        "counted_qty": counted_qty,
-                        "is_internal": row["is_internal"],
-                    }
-                )
+        mst_items = load_count_sheet(
+            db, store_id, count_date, getattr(g, "current_company_id", None),
+        )
 
-        print(f"[V2-1] 6 build-items elapsed: {time.perf_counter() - t5:.3f}s items={len(mst_items)}")
+        print(f"[V2-1] 1 count sheet elapsed: {time.perf_counter() - t0:.3f}s items={len(mst_items)}")
 
         # =========================================================
-        # 7) Render
+        # 2) Render
         # =========================================================
         t6 = time.perf_counter()
         html = render_template(
@@ -611,7 +221,7 @@ def init_inventory_views_v2(app, get_db):
             latest_date=latest_date,
             latest_dates=latest_dates,
         )
-        print(f"[V2-1] 7 render elapsed: {time.perf_counter() - t6:.3f}s")
+        print(f"[V2-1] 2 render elapsed: {time.perf_counter() - t6:.3f}s")
         print(f"[V2-1] TOTAL elapsed: {time.perf_counter() - t0:.3f}s")
 
         return html
@@ -634,40 +244,8 @@ def init_inventory_views_v2(app, get_db):
                 flash("店舗を選択してください。")
                 return redirect(url_for("inventory_count_sp"))
 
-            row_count    = int(request.form.get("row_count", 0))
-            inserted_rows = 0
-
-            for i in range(1, row_count + 1):
-                item_id    = request.form.get(f"item_id_{i}")
-                system_qty = request.form.get(f"system_qty_{i}")
-                counted_qty = request.form.get(f"count_qty_{i}")
-
-                if not item_id or counted_qty is None or counted_qty == "":
-                    continue
-                try:
-                    sys_val = int(system_qty or 0)
-                    cnt_val = int(counted_qty)
-                except ValueError:
-                    continue
-
-                # Layer B — skip if an identical save just landed.
-                if _is_recent_duplicate_count(
-                    db, store_id, item_id, count_date, cnt_val
-                ):
-                    continue
-
-                db.execute(
-                    """
-                    INSERT INTO stock_counts
-                        (store_id, item_id, count_date,
-                         system_qty, counted_qty, diff_qty, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (store_id, item_id, count_date,
-                     sys_val, cnt_val, cnt_val - sys_val,
-                     datetime.now().isoformat(timespec="seconds")),
-                )
-                inserted_rows += 1
+            row_count, rows = _parse_count_rows(request.form)
+            inserted_rows = _insert_stock_counts(db, store_id, count_date, rows)
 
             try:
                 log_event(db, action="SUBMIT", module="inv",
@@ -697,31 +275,17 @@ def init_inventory_views_v2(app, get_db):
 
         latest_dates = []
         items        = []
-        freq_map     = {}
 
         if selected_store_id:
             latest_dates = get_latest_stock_count_dates(db, selected_store_id, limit=3)
             company_id = getattr(g, "current_company_id", None)
-            items = _fetch_count_data(db, store_id, count_date, company_id)
-
-            # Attach frequency bucket + filter
-            from utils.item_frequency import fetch_item_frequency
-            freq_map = fetch_item_frequency(db, [i["item_id"] for i in items])
-            for it in items:
-                it["frequency"] = freq_map.get(it["item_id"], {"bucket": "none"})
-
+            items = load_count_sheet(db, store_id, count_date, company_id,
+                                     with_frequency=True)
             if freq_filter:
                 items = [i for i in items if i["frequency"]["bucket"] == freq_filter]
 
         # Group items by temp zone for the template
-        from collections import OrderedDict
-        ZONE_ORDER = ["冷凍", "冷蔵", "常温", "その他"]
-        zones: dict = OrderedDict((z, []) for z in ZONE_ORDER)
-        for item in items:
-            tz = item["temp_zone"] if item["temp_zone"] in zones else "その他"
-            zones[tz].append(item)
-        # Remove empty zones
-        zones = {z: v for z, v in zones.items() if v}
+        zones = group_by_zone(items)
 
         return render_template(
             "inv/inventory_count_sp.html",
@@ -773,39 +337,8 @@ def init_inventory_views_v3(app, get_db):
                 flash("店舗を選択してください。")
                 return redirect(url_for("inventory_count_v3"))
 
-            row_count = int(request.form.get("row_count", 0))
-            inserted_rows = 0
-
-            for i in range(1, row_count + 1):
-                item_id = request.form.get(f"item_id_{i}")
-                system_qty = request.form.get(f"system_qty_{i}")
-                counted_qty = request.form.get(f"count_qty_{i}")
-
-                if not item_id or counted_qty is None or counted_qty == "":
-                    continue
-                try:
-                    sys_val = int(system_qty or 0)
-                    cnt_val = int(counted_qty)
-                except ValueError:
-                    continue
-
-                if _is_recent_duplicate_count(
-                    db, store_id, item_id, count_date, cnt_val
-                ):
-                    continue
-
-                db.execute(
-                    """
-                    INSERT INTO stock_counts
-                        (store_id, item_id, count_date,
-                         system_qty, counted_qty, diff_qty, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (store_id, item_id, count_date,
-                     sys_val, cnt_val, cnt_val - sys_val,
-                     datetime.now().isoformat(timespec="seconds")),
-                )
-                inserted_rows += 1
+            row_count, rows = _parse_count_rows(request.form)
+            inserted_rows = _insert_stock_counts(db, store_id, count_date, rows)
 
             try:
                 log_event(
@@ -839,7 +372,7 @@ def init_inventory_views_v3(app, get_db):
         if selected_store_id:
             latest_dates = get_latest_stock_count_dates(db, selected_store_id, limit=3)
             company_id = getattr(g, "current_company_id", None)
-            items = _fetch_count_data(db, store_id, count_date, company_id)
+            items = load_count_sheet(db, store_id, count_date, company_id)
 
         return render_template(
             "inv/inventory_count_v3.html",
@@ -881,45 +414,22 @@ def init_inventory_views_v3(app, get_db):
             (selected_store_id, company_id),
         ).fetchone()
 
-        # Latest count per item at this store + weighted-avg unit price
-        # computed over each item's own count_date (LATERAL subquery).
-        rows = db.execute(
-            """
-            SELECT DISTINCT ON (sc.item_id)
-              sc.item_id,
-              sc.count_date,
-              sc.counted_qty,
-              i.code     AS item_code,
-              i.name     AS item_name,
-              i.category,
-              i.unit,
-              s.name     AS supplier_name,
-              COALESCE(pr.weighted_price, 0) AS unit_price
-            FROM stock_counts sc
-            JOIN mst_items i ON i.id = sc.item_id
-            LEFT JOIN pur_suppliers s ON s.id = i.supplier_id
-            LEFT JOIN LATERAL (
-              SELECT CASE WHEN SUM(p.quantity) > 0
-                          THEN SUM(p.quantity * p.unit_price)::numeric / SUM(p.quantity)
-                          ELSE 0 END AS weighted_price
-              FROM purchases p
-              WHERE p.store_id = sc.store_id
-                AND p.item_id  = sc.item_id
-                AND p.is_deleted = 0
-                AND p.delivery_date <= sc.count_date
-            ) pr ON TRUE
-            WHERE sc.store_id = %s
-              AND i.company_id = %s
-            ORDER BY sc.item_id, sc.count_date DESC, sc.id DESC
-            """,
-            (selected_store_id, company_id),
-        ).fetchall()
+        # Same loader as the count screens, as of today: the latest count
+        # per item and the weighted-avg unit price over purchases up to that
+        # item's own count date (last_count_unit_price).
+        sheet = load_count_sheet(
+            db, selected_store_id, date.today(), company_id,
+            include_empty=True, include_counted=True,
+        )
 
         # Drop zero-qty items — the accounting team only wants lines that
-        # actually represent stock on hand. DISTINCT ON runs first (above)
-        # so "latest count = 0" correctly skips items whose stock was
-        # exhausted in the most recent count.
-        rows = [r for r in rows if (r["counted_qty"] or 0) > 0]
+        # actually represent stock on hand. "Latest count = 0" correctly
+        # skips items whose stock was exhausted in the most recent count.
+        rows = sorted(
+            (it for it in sheet
+             if it["last_count_date"] and (it["last_count_qty"] or 0) > 0),
+            key=lambda it: it["item_id"],
+        )
 
         if not rows:
             flash("この店舗の棚卸しデータがありません（在庫数量ゼロの品目のみ、または未カウント）。")
@@ -936,8 +446,8 @@ def init_inventory_views_v3(app, get_db):
 
         store_name = store["name"] if store else ""
         for r in rows:
-            qty = int(r["counted_qty"] or 0)
-            price = float(r["unit_price"] or 0)
+            qty = int(r["last_count_qty"] or 0)
+            price = r["last_count_unit_price"]
             amount = round(qty * price)
             writer.writerow([
                 store_name,
@@ -949,7 +459,7 @@ def init_inventory_views_v3(app, get_db):
                 qty,
                 round(price),
                 amount,
-                r["count_date"].isoformat() if r["count_date"] else "",
+                r["last_count_date"].isoformat(),
             ])
 
         # UTF-8 BOM so Excel on Japanese Windows auto-detects the encoding.
@@ -997,39 +507,8 @@ def init_inventory_views_v3(app, get_db):
                 flash("店舗を選択してください。")
                 return redirect(url_for("inventory_count_sp_v3"))
 
-            row_count = int(request.form.get("row_count", 0))
-            inserted_rows = 0
-
-            for i in range(1, row_count + 1):
-                item_id = request.form.get(f"item_id_{i}")
-                system_qty = request.form.get(f"system_qty_{i}")
-                counted_qty = request.form.get(f"count_qty_{i}")
-
-                if not item_id or counted_qty is None or counted_qty == "":
-                    continue
-                try:
-                    sys_val = int(system_qty or 0)
-                    cnt_val = int(counted_qty)
-                except ValueError:
-                    continue
-
-                if _is_recent_duplicate_count(
-                    db, store_id, item_id, count_date, cnt_val
-                ):
-                    continue
-
-                db.execute(
-                    """
-                    INSERT INTO stock_counts
-                        (store_id, item_id, count_date,
-                         system_qty, counted_qty, diff_qty, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (store_id, item_id, count_date,
-                     sys_val, cnt_val, cnt_val - sys_val,
-                     datetime.now().isoformat(timespec="seconds")),
-                )
-                inserted_rows += 1
+            row_count, rows = _parse_count_rows(request.form)
+            inserted_rows = _insert_stock_counts(db, store_id, count_date, rows)
 
             try:
                 log_event(
@@ -1064,22 +543,12 @@ def init_inventory_views_v3(app, get_db):
         if selected_store_id:
             latest_dates = get_latest_stock_count_dates(db, selected_store_id, limit=3)
             company_id = getattr(g, "current_company_id", None)
-            items = _fetch_count_data(db, store_id, count_date, company_id)
-
-            from utils.item_frequency import fetch_item_frequency
-            freq_map = fetch_item_frequency(db, [i["item_id"] for i in items])
-            for it in items:
-                it["frequency"] = freq_map.get(it["item_id"], {"bucket": "none"})
+            items = load_count_sheet(db, store_id, count_date, company_id,
+                                     with_frequency=True)
             if freq_filter:
                 items = [i for i in items if i["frequency"]["bucket"] == freq_filter]
 
-        from collections import OrderedDict
-        ZONE_ORDER = ["冷凍", "冷蔵", "常温", "その他"]
-        zones = OrderedDict((z, []) for z in ZONE_ORDER)
-        for item in items:
-            tz = item["temp_zone"] if item["temp_zone"] in zones else "その他"
-            zones[tz].append(item)
-        zones = {z: v for z, v in zones.items() if v}
+        zones = group_by_zone(items)
 
         return render_template(
             "inv/inventory_count_sp_v3.html",
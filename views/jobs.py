@@ -0,0 +1,50 @@
+# views/jobs.py
+# Background job status — polled by the screens that hand work to the worker
+
+from urllib.parse import urlparse
+
+from flask import abort, g, jsonify, render_template, request
+
+from utils.jobs import get_job, job_status
+
+
+def _visible(job) -> bool:
+    """Company jobs: same company. System jobs (no company): the creator."""
+    if job["company_id"] is not None:
+        return job["company_id"] == getattr(g, "current_company_id", None)
+    user = getattr(g, "current_user", None) or {}
+    return job["created_by"] is not None and job["created_by"] == user.get("id")
+
+
+def _safe_next(url):
+    """Only same-site paths are accepted as the return link. "//host" and
+    "/\\host" are rejected too: browsers read both as another site."""
+    if not url or "\\" in url or url.startswith("//"):
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme or parsed.netloc or not url.startswith("/"):
+        return None
+    return url
+
+
+def init_job_views(app, get_db):
+
+    @app.get("/api/jobs/<int:job_id>", endpoint="api_job_status")
+    def api_job_status(job_id):
+        job = get_job(get_db(), job_id)
+        if not job or not _visible(job):
+            return jsonify({"ok": False, "error": "not found"}), 404
+        resp = jsonify({"ok": True, **job_status(job)})
+        resp.headers["Cache-Control"] = "no-store"
+        return resp
+
+    @app.get("/jobs/<int:job_id>", endpoint="job_status_page")
+    def job_status_page(job_id):
+        job = get_job(get_db(), job_id)
+        if not job or not _visible(job):
+            abort(404)
+        return render_template(
+            "jobs/job_status.html",
+            job=job_status(job),
+            next_url=_safe_next(request.args.get("next")),
+        )
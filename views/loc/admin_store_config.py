@@ -3,6 +3,8 @@ from utils.access_scope import (
     get_accessible_stores,
     normalize_accessible_store_id,
 )
+from utils.location_tree import invalidate_store
+from utils.walk_order import refresh_walk_order
 
 def init_admin_store_config(app, get_db):
 
@@ -107,6 +109,7 @@ def init_admin_store_config(app, get_db):
             )
 
         db.commit()
+        invalidate_store(store_id)
         flash("Updated store temp zones.")
         return redirect(back if back else url_for("store_temp_zones_admin", store_id=store_id))
 
@@ -217,6 +220,8 @@ def init_admin_store_config(app, get_db):
                 (store_id, area_id, display_name, sort_order, use_flag),
             )
 
+        refresh_walk_order(db, store_id)
         db.commit()
+        invalidate_store(store_id)
         flash("Updated store areas.")
         return redirect(back if back else url_for("store_areas_admin", store_id=store_id))
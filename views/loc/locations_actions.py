@@ -2,75 +2,204 @@
 
 from flask import request, redirect, url_for, flash, jsonify
 from utils.access_scope import normalize_accessible_store_id
+from utils.walk_order import refresh_walk_order
+
+
+def _int_or_none(v):
+    try:
+        return int(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_assignments(form):
+    """Form fields per item: zone_<id>, area_<id>, shelf_id_<id>.
+    Returns {item_id: (temp_zone, store_area_map_id, shelf_id)}."""
+    out = {}
+    for raw in form.getlist("item_ids"):
+        item_id = _int_or_none(raw)
+        if item_id is None:
+            continue
+        out[item_id] = (
+            form.get(f"zone_{raw}") or None,
+            _int_or_none(form.get(f"area_{raw}")),
+            _int_or_none(form.get(f"shelf_id_{raw}")),
+        )
+    return out
+
+
+def _save_location_assignments(db, store_id, assignments):
+    """Apply {item_id: (temp_zone, store_area_map_id, shelf_id)} for one store.
+    Does not commit.
+
+    Reads the current prefs / active shelf mappings of the submitted items
+    once, then writes only what changed, with one multi-row statement per
+    kind of change (pref upsert, shelf deactivation, shelf activation).
+    Unchanged items keep their position on the shelf.
+
+    Returns a summary dict: items, unchanged, prefs_updated, shelves_set,
+    shelves_cleared.
+    """
+    summary = {"items": len(assignments), "unchanged": 0,
+               "prefs_updated": 0, "shelves_set": 0, "shelves_cleared": 0}
+    if not assignments:
+        return summary
+
+    item_ids = sorted(assignments)
+    current = {
+        r["item_id"]: r for r in db.execute(
+            """
+            SELECT
+              u.item_id,
+              p.item_id IS NOT NULL AS has_pref,
+              p.temp_zone,
+              p.store_area_map_id,
+              (SELECT array_agg(m.shelf_id)
+                 FROM inv_item_shelf_map m
+                WHERE m.store_id = %s AND m.item_id = u.item_id
+                  AND m.is_active = TRUE) AS shelf_ids
+            FROM unnest(%s::int[]) AS u(item_id)
+            LEFT JOIN inv_item_location_prefs p
+              ON p.store_id = %s AND p.item_id = u.item_id
+            """,
+            (store_id, item_ids, store_id),
+        ).fetchall()
+    }
+
+    pref_rows = []      # (item_id, temp_zone, store_area_map_id)
+    shelf_rows = []     # (item_id, shelf_id or None)
+    for item_id in item_ids:
+        temp_zone, area_id, shelf_id = assignments[item_id]
+        cur = current.get(item_id) or {}
+        changed = False
+
+        if (not cur.get("has_pref")
+                or cur.get("temp_zone") != temp_zone
+                or cur.get("store_area_map_id") != area_id):
+            pref_rows.append((item_id, temp_zone, area_id))
+            changed = True
+
+        active = set(cur.get("shelf_ids") or [])
+        wanted = {shelf_id} if shelf_id else set()
+        if active != wanted:
+            shelf_rows.append((item_id, shelf_id))
+            summary["shelves_set" if shelf_id else "shelves_cleared"] += 1
+            changed = True
+
+        if not changed:
+            summary["unchanged"] += 1
+    summary["prefs_updated"] = len(pref_rows)
+
+    # save preferences (temp_zone + area) even if shelf is blank
+    if pref_rows:
+        db.execute(
+            """
+            INSERT INTO inv_item_location_prefs (store_id, item_id, temp_zone, store_area_map_id, updated_at)
+            SELECT %s, u.item_id, u.temp_zone, u.store_area_map_id, NOW()
+            FROM unnest(%s::int[], %s::varchar[], %s::int[])
+              AS u(item_id, temp_zone, store_area_map_id)
+            ON CONFLICT (store_id, item_id)
+            DO UPDATE SET
+              temp_zone = EXCLUDED.temp_zone,
+              store_area_map_id = EXCLUDED.store_area_map_id,
+              updated_at = NOW()
+            """,
+            (store_id,
+             [r[0] for r in pref_rows], [r[1] for r in pref_rows], [r[2] for r in pref_rows]),
+        )
+
+    if shelf_rows:
+        # deactivate the current mappings that are not the new shelf
+        db.execute(
+            """
+            UPDATE inv_item_shelf_map m
+               SET is_active = FALSE
+              FROM unnest(%s::int[], %s::int[]) AS u(item_id, shelf_id)
+             WHERE m.store_id = %s
+               AND m.item_id  = u.item_id
+               AND m.is_active = TRUE
+               AND m.shelf_id IS DISTINCT FROM u.shelf_id
+            """,
+            ([r[0] for r in shelf_rows], [r[1] for r in shelf_rows], store_id),
+        )
+
+        new_rows = [r for r in shelf_rows if r[1]]
+        if new_rows:
+            # upsert-like: insert new active mapping
+            db.execute(
+                """
+                INSERT INTO inv_item_shelf_map (store_id, shelf_id, item_id, sort_order, is_active, updated_at)
+                SELECT %s, u.shelf_id, u.item_id, 100, TRUE, NOW()
+                FROM unnest(%s::int[], %s::int[]) AS u(item_id, shelf_id)
+                ON CONFLICT (store_id, item_id, shelf_id)
+                DO UPDATE SET
+                  is_active  = TRUE,
+                  sort_order = EXCLUDED.sort_order,
+                  updated_at = NOW()
+                """,
+                (store_id, [r[0] for r in new_rows], [r[1] for r in new_rows]),
+            )
+
+    if pref_rows or shelf_rows:
+        refresh_walk_order(db, store_id)
+    return summary
 
 
 def init_location_actions(app, get_db):
     @app.route("/inventory/locations/save", methods=["POST"])
     def inventory_locations_save():
+        """Save the item → temp zone / area / shelf assignments of one store.
+
+        Form post from loc/locations.html (flash + redirect), or JSON
+        {store_id, assignments: [{item_id, temp_zone, area_id, shelf_id}]}
+        answered with the change summary."""
         db = get_db()
+        payload = request.get_json(silent=True) if request.is_json else None
 
         selected_store_id = normalize_accessible_store_id(
-        request.form.get("store_id")
+            payload.get("store_id") if payload else request.form.get("store_id")
         )
-        store_id = str(selected_store_id) if selected_store_id else None
+        store_id = int(selected_store_id) if selected_store_id else None
 
         if not store_id:
+            if payload is not None:
+                return jsonify({"ok": False, "error": "missing store_id"}), 400
             flash("missing store_id")
             return redirect(url_for("inventory_locations"))
 
-        # Expect fields like:
-        # shelf_id_<item_id> = <shelf_id>
-        # Example: shelf_id_123 = 55
-        item_ids = request.form.getlist("item_ids")
-
-        for item_id in item_ids:
-            shelf_id = request.form.get(f"shelf_id_{item_id}") or None
-
-            # save preferences (temp_zone + area) even if shelf is blank
-            temp_zone = request.form.get(f"zone_{item_id}") or None
-            area_map_id = request.form.get(f"area_{item_id}") or None
-
-            db.execute(
-                """
-                INSERT INTO inv_item_location_prefs (store_id, item_id, temp_zone, store_area_map_id, updated_at)
-                VALUES (%s, %s, %s, %s, NOW())
-                ON CONFLICT (store_id, item_id)
-                DO UPDATE SET
-                  temp_zone = EXCLUDED.temp_zone,
-                  store_area_map_id = EXCLUDED.store_area_map_id,
-                  updated_at = NOW()
-                """,
-                (store_id, item_id, temp_zone, area_map_id),
-            )
-
-            # deactivate current mappings for this item in this store
-            db.execute(
-                """
-                UPDATE inv_item_shelf_map
-                   SET is_active = FALSE
-                 WHERE store_id = %s
-                   AND item_id  = %s
-                """,
-                (store_id, item_id),
-            )
-
-            if shelf_id:
-                # upsert-like: insert new active mapping
-                db.execute(
-                """
-                INSERT INTO inv_item_shelf_map (store_id, shelf_id, item_id, sort_order, is_active, updated_at)
-                VALUES (%s, %s, %s, 100, TRUE, NOW())
-                ON CONFLICT (store_id, item_id, shelf_id)
-                DO UPDATE SET
-                is_active  = TRUE,
-                sort_order = EXCLUDED.sort_order,
-                updated_at = NOW()
-                """,
-                (store_id, shelf_id, item_id),
-            )
-
-        db.commit()
-        flash("Saved inventory locations.")
+        if payload is not None:
+            assignments = {}
+            for a in payload.get("assignments") or []:
+                item_id = _int_or_none(a.get("item_id")) if isinstance(a, dict) else None
+                if item_id is None:
+                    continue
+                assignments[item_id] = (
+                    a.get("temp_zone") or None,
+                    _int_or_none(a.get("area_id")),
+                    _int_or_none(a.get("shelf_id")),
+                )
+        else:
+            # Expect fields like:
+            # shelf_id_<item_id> = <shelf_id>
+            # Example: shelf_id_123 = 55
+            assignments = _parse_assignments(request.form)
+
+        try:
+            summary = _save_location_assignments(db, store_id, assignments)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+
+        if payload is not None:
+            return jsonify({"ok": True, **summary})
+
+        flash(
+            "Saved inventory locations. "
+            f"({summary['items']} items: {summary['prefs_updated']} zone/area, "
+            f"{summary['shelves_set']} shelf set, {summary['shelves_cleared']} shelf cleared, "
+            f"{summary['unchanged']} unchanged)"
+        )
         return redirect(url_for("inventory_locations", store_id=store_id))
 
     @app.route("/inventory/reorder-mst_items", methods=["POST"])
@@ -98,5 +227,6 @@ def init_location_actions(app, get_db):
                 (idx, store_id, shelf_id, item_id),
             )
 
+        refresh_walk_order(db, store_id)
         db.commit()
         return jsonify({"ok": True})
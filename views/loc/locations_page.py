@@ -4,10 +4,31 @@ from utils.access_scope import (
     get_accessible_stores,
     normalize_accessible_store_id,
 )
+from utils.location_tree import get_location_tree
 
 
 def init_location_page(app, get_db):
 
+    @app.get("/api/locations/bootstrap")
+    def api_locations_bootstrap():
+        """The store's whole temp zone → area → shelf tree in one payload,
+        so pickers resolve zone / area changes locally instead of calling
+        /api/locations/areas and /api/locations/shelves each time.
+        ETag'd; cached per store (utils/location_tree.py)."""
+        db = get_db()
+        store_id = normalize_accessible_store_id(request.args.get("store_id"))
+        if not store_id:
+            return jsonify({"ok": False, "error": "missing store_id"}), 400
+
+        tree, etag = get_location_tree(db, store_id)
+        if request.if_none_match.contains(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = jsonify({"ok": True, "version": etag, **tree})
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
     @app.get("/api/locations/areas")
     def api_locations_areas():
         db = get_db()
@@ -5,6 +5,8 @@ from utils.access_scope import (
     get_accessible_stores,
     normalize_accessible_store_id,
 )
+from utils.location_tree import invalidate_store
+from utils.walk_order import refresh_walk_order
 
 
 def init_location_shelves_page(app, get_db):
@@ -122,7 +124,9 @@ def init_location_shelves_page(app, get_db):
 
                 print("UPDATE shelf", sid, "rowcount=", cur.rowcount, "temp_zone=", temp_zone)
 
+            refresh_walk_order(db, selected_store_id)
             db.commit()
+            invalidate_store(selected_store_id)
             flash("Updated shelves.")
             return redirect(back if back else url_for("shelf_master", store_id=selected_store_id))
 
@@ -1,4 +1,5 @@
 from flask import abort, redirect, request, url_for
+from utils.walk_order import refresh_walk_order
 from .sort_config import save_sort_config
 
 SORT_KEYS = {"item_code", "item_name"}
@@ -30,6 +31,7 @@ def init_location_sort_routes(app, get_db):
             "sort_key2": sort_key2,
             "sort_dir2": sort_dir2,
         })
+        refresh_walk_order(db, store_id)
         db.commit()
 
         return redirect(url_for("inventory_locations", store_id=store_id))
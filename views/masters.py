@@ -10,6 +10,7 @@ from flask import (
     flash,g,
 )
 from views.reports.audit_log import log_event
+from utils.walk_order import refresh_walk_order_for_item
 
 
 def init_master_views(app, get_db):
@@ -806,6 +807,10 @@ def init_master_views(app, get_db):
                         # history is audit-only; never break the save
                         pass
 
+                # Zone and name feed the count-sheet walk order
+                if (temp_zone or None) != (item["temp_zone"] or None) or name != item["name"]:
+                    refresh_walk_order_for_item(db, item_id)
+
                 # NEW: audit log (UPDATE item)
                 try:
                     log_event(
@@ -3,12 +3,14 @@
 
 import csv
 import io
-import json
-import os
-import tempfile
-import uuid
 
-from flask import render_template, request, redirect, url_for, flash, g, session
+from flask import render_template, request, redirect, url_for, flash, g, session, Response
+
+from utils.item_import import (
+    count_checked, error_report_rows, get_upload, import_items, preview_page,
+    save_mapping, stage_upload, write_error_report,
+)
+from utils.jobs import enqueue_job, jobs_available
 
 # ── System field definitions ──────────────────────────────────────────────────
 SYSTEM_FIELDS = [
@@ -33,7 +35,10 @@ FIELD_ALIASES = {
     "is_internal":       ["内製", "内製_flg", "is_internal", "内製フラグ", "内製品"],
 }
 
-TEMP_DIR = tempfile.gettempdir()
+PREVIEW_PAGE_SIZE = 200
+
+# Files with at least this many rows are imported by the background worker
+ASYNC_MIN_ROWS = 2000
 
 
 def _auto_match(headers):
@@ -58,114 +63,6 @@ def _detect_delimiter(content: str) -> str:
     return "\t" if sample.count("\t") > sample.count(",") else ","
 
 
-def _load_temp(temp_id: str):
-    path = os.path.join(TEMP_DIR, f"cms_csv_{temp_id}.json")
-    if not os.path.exists(path):
-        return None, path
-    with open(path, "r", encoding="utf-8") as fp:
-        return json.load(fp), path
-
-
-def _build_supplier_map(db, company_id):
-    rows = db.execute(
-        "SELECT id, name, code FROM pur_suppliers WHERE is_active = 1 AND company_id = %s",
-        (company_id,),
-    ).fetchall()
-    result = {}
-    for s in rows:
-        key = s["name"].strip().lower().replace(" ", "").replace("\u3000", "")
-        result[key] = {"id": s["id"], "code": s["code"], "name": s["name"]}
-    return result
-
-
-def _build_tz_map(db):
-    rows = db.execute(
-        "SELECT code, default_name FROM inv_temp_zone_master WHERE COALESCE(is_active,TRUE)=TRUE"
-    ).fetchall()
-    result = {}
-    for tz in rows:
-        result[tz["default_name"]] = tz["code"]
-        result[tz["code"]] = tz["code"]
-    return result
-
-
-def _validate_row(row, mapping, supplier_map, tz_map):
-    """Return a dict with parsed values + errors list."""
-    def get(key):
-        col = mapping.get(key, "")
-        return row.get(col, "").strip() if col else ""
-
-    item_name      = get("name")
-    supplier_raw   = get("supplier")
-    temp_zone_raw  = get("temp_zone")
-    unit_raw       = get("unit")
-    purchase_unit  = get("purchase_unit")
-    inventory_unit = get("inventory_unit")
-    min_pu_raw     = get("min_purchase_unit")
-    is_int_raw     = get("is_internal")
-
-    errors = []
-
-    if not item_name:
-        errors.append("品名が空")
-
-    supplier_info = None
-    if not supplier_raw:
-        errors.append("仕入先が空")
-    else:
-        key = supplier_raw.lower().replace(" ", "").replace("\u3000", "")
-        supplier_info = supplier_map.get(key)
-        if not supplier_info:
-            errors.append(f"仕入先「{supplier_raw}」が未登録")
-
-    unit_val = None
-    if unit_raw:
-        try:
-            unit_val = int(unit_raw)
-        except ValueError:
-            errors.append(f"ケース入数「{unit_raw}」は整数で入力")
-
-    # purchase_unit and inventory_unit are INTEGER columns in mst_items
-    pu_val = None
-    if purchase_unit:
-        try:
-            pu_val = int(purchase_unit)
-        except ValueError:
-            errors.append(f"仕入れ単位「{purchase_unit}」は整数で入力（例: 1, 5, 10）")
-
-    iu_val = None
-    if inventory_unit:
-        try:
-            iu_val = int(inventory_unit)
-        except ValueError:
-            errors.append(f"棚卸し単位「{inventory_unit}」は整数で入力（例: 1, 5, 10）")
-
-    min_pu_val = None
-    if min_pu_raw:
-        try:
-            min_pu_val = float(min_pu_raw)
-        except ValueError:
-            errors.append(f"最低仕入単位「{min_pu_raw}」は数値で入力")
-
-    temp_zone_code = tz_map.get(temp_zone_raw, temp_zone_raw) if temp_zone_raw else None
-    is_internal    = 1 if is_int_raw in ("1", "yes", "true", "◯", "○", "内製") else 0
-
-    return {
-        "name":              item_name,
-        "supplier_raw":      supplier_raw,
-        "supplier_info":     supplier_info,
-        "temp_zone_raw":     temp_zone_raw,
-        "temp_zone_code":    temp_zone_code,
-        "unit":              unit_val,
-        "purchase_unit":     pu_val,
-        "inventory_unit":    iu_val,
-        "min_purchase_unit": min_pu_val,
-        "is_internal":       is_internal,
-        "errors":            errors,
-        "ok":                len(errors) == 0,
-    }
-
-
 # ── Routes ────────────────────────────────────────────────────────────────────
 
 def init_items_csv_views(app, get_db):
@@ -236,6 +133,7 @@ def init_items_csv_views(app, get_db):
                 sample_suppliers=sample_suppliers,
             )
 
+
         f = request.files.get("csv_file")
         if not f or not f.filename:
             flash("CSVファイルを選択してください。")
@@ -248,25 +146,34 @@ def init_items_csv_views(app, get_db):
             content = f.read().decode("cp932", errors="replace")
 
         delimiter = _detect_delimiter(content)
-        reader    = csv.DictReader(io.StringIO(content), delimiter=delimiter)
-        headers   = list(reader.fieldnames or [])
+        reader    = csv.reader(io.StringIO(content), delimiter=delimiter)
+        headers   = next(reader, [])
 
         if not headers:
             flash("CSVのヘッダー行が読み取れませんでした。")
             return render_template("mst/items_csv_upload.html", sample_suppliers=[])
 
-        rows = list(reader)
-        if not rows:
-            flash("データ行が0件です。")
+        # Rows go straight into the staging table (blank lines skipped)
+        db           = get_db()
+        company_id   = getattr(g, "current_company_id", None)
+        current_user = getattr(g, "current_user", None) or {}
+        try:
+            upload_id, row_count = stage_upload(
+                db, company_id, current_user.get("id"), f.filename, headers,
+                (row for row in reader if row),
+            )
+            if not row_count:
+                db.rollback()
+                flash("データ行が0件です。")
+                return render_template("mst/items_csv_upload.html", sample_suppliers=[])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            flash(f"CSVの取り込みに失敗しました: {e}")
             return render_template("mst/items_csv_upload.html", sample_suppliers=[])
 
-        # Save to temp file
-        temp_id   = str(uuid.uuid4())
-        temp_path = os.path.join(TEMP_DIR, f"cms_csv_{temp_id}.json")
-        with open(temp_path, "w", encoding="utf-8") as fp:
-            json.dump({"headers": headers, "rows": rows}, fp, ensure_ascii=False)
-
-        session["csv_temp_id"] = temp_id
+        session["csv_upload_id"] = upload_id
+        session.pop("csv_mapping", None)
         auto_mapping = _auto_match(headers)
 
         return render_template(
@@ -274,153 +181,115 @@ def init_items_csv_views(app, get_db):
             headers=headers,
             auto_mapping=auto_mapping,
             system_fields=SYSTEM_FIELDS,
-            row_count=len(rows),
+            row_count=row_count,
         )
 
+    def _current_upload(db):
+        """The session's staged upload (None if expired or another company's)."""
+        return get_upload(db, session.get("csv_upload_id"),
+                          getattr(g, "current_company_id", None))
+
     # ── Step 2: Preview ───────────────────────────────────────────────────────
-    @app.route("/mst_items/csv/preview", methods=["POST"], endpoint="items_csv_preview")
+    # POST confirms the mapping; GET ?page=N pages through the same upload
+    @app.route("/mst_items/csv/preview", methods=["GET", "POST"], endpoint="items_csv_preview")
     def items_csv_preview():
-        temp_id = session.get("csv_temp_id")
-        if not temp_id:
+        db     = get_db()
+        upload = _current_upload(db)
+        if not upload:
             flash("セッションが切れました。もう一度アップロードしてください。")
             return redirect(url_for("items_csv_upload"))
 
-        data, _ = _load_temp(temp_id)
-        if not data:
-            flash("一時ファイルが見つかりません。もう一度アップロードしてください。")
-            return redirect(url_for("items_csv_upload"))
-
-        # Build mapping: field_key -> csv_column_name
-        mapping = {
-            f["key"]: request.form.get(f"map_{f['key']}", "")
-            for f in SYSTEM_FIELDS
-        }
-        session["csv_mapping"] = mapping
-
-        db           = get_db()
-        company_id   = getattr(g, "current_company_id", None)
-        supplier_map = _build_supplier_map(db, company_id)
-        tz_map       = _build_tz_map(db)
-
-        rows         = data["rows"]
-        preview_rows = []
-        for i, row in enumerate(rows[:200]):
-            parsed = _validate_row(row, mapping, supplier_map, tz_map)
-            parsed["row_num"] = i + 2
-            preview_rows.append(parsed)
+        if request.method == "POST":
+            # Build mapping: field_key -> csv_column_name
+            mapping = {
+                f["key"]: request.form.get(f"map_{f['key']}", "")
+                for f in SYSTEM_FIELDS
+            }
+            session["csv_mapping"] = mapping
+            save_mapping(db, upload["id"], mapping)
+            db.commit()
+        else:
+            mapping = session.get("csv_mapping")
+            if not mapping:
+                flash("セッションが切れました。もう一度アップロードしてください。")
+                return redirect(url_for("items_csv_upload"))
 
-        ok_count    = sum(1 for r in preview_rows if r["ok"])
-        ng_count    = len(preview_rows) - ok_count
-        total_count = len(rows)
+        company_id = getattr(g, "current_company_id", None)
+        # counts cover the whole file so they (and the confirm prompt) match
+        # what the import will do; rows are shown one page at a time
+        counts      = count_checked(db, upload, mapping, company_id)
+        total_count = counts["total"]
+        page_count  = max(1, -(-total_count // PREVIEW_PAGE_SIZE))
+        page        = min(max(request.args.get("page", 1, type=int), 1), page_count)
+        preview_rows = preview_page(db, upload, mapping, company_id,
+                                    offset=(page - 1) * PREVIEW_PAGE_SIZE,
+                                    limit=PREVIEW_PAGE_SIZE)
 
         return render_template(
             "mst/items_csv_preview.html",
             preview_rows=preview_rows,
-            ok_count=ok_count,
-            ng_count=ng_count,
+            ok_count=counts["ok_count"],
+            ng_count=counts["ng_count"],
             total_count=total_count,
+            page=page,
+            page_count=page_count,
+            page_size=PREVIEW_PAGE_SIZE,
         )
 
     # ── Step 3: Import ────────────────────────────────────────────────────────
     @app.route("/mst_items/csv/import", methods=["POST"], endpoint="items_csv_import")
     def items_csv_import():
-        import sys
-
-        temp_id = session.get("csv_temp_id")
         mapping = session.get("csv_mapping", {})
+        db      = get_db()
+        upload  = _current_upload(db) if mapping else None
 
-        print(f"[CSV import] temp_id={temp_id!r}  mapping={mapping!r}", file=sys.stderr)
-
-        if not temp_id or not mapping:
+        if not upload:
             flash("セッションが切れました。もう一度アップロードしてください。")
             return redirect(url_for("items_csv_upload"))
+        if upload["imported_at"]:
+            flash("このCSVはインポート済みです。")
+            return redirect(url_for("items_master"))
 
-        data, temp_path = _load_temp(temp_id)
-        if not data:
-            flash("一時ファイルが見つかりません。もう一度アップロードしてください。")
-            return redirect(url_for("items_csv_upload"))
-
-        db           = get_db()
-        company_id   = getattr(g, "current_company_id", None)
-        supplier_map = _build_supplier_map(db, company_id)
-        tz_map       = _build_tz_map(db)
-
-        print(f"[CSV import] company_id={company_id}  suppliers_in_map={len(supplier_map)}  rows={len(data['rows'])}", file=sys.stderr)
-        if data["rows"]:
-            print(f"[CSV import] first row keys: {list(data['rows'][0].keys())}", file=sys.stderr)
-
-        counters  = {}   # code2 -> current max seq
-        inserted  = 0
-        skipped   = 0
-        err_msgs  = []
-
-        try:
-            for i, row in enumerate(data["rows"]):
-                parsed = _validate_row(row, mapping, supplier_map, tz_map)
-                if not parsed["ok"]:
-                    skipped += 1
-                    msg = f"行{i+2}: {' / '.join(parsed['errors'])} → スキップ"
-                    err_msgs.append(msg)
-                    if skipped <= 3:
-                        print(f"[CSV import] SKIP {msg}", file=sys.stderr)
-                    continue
-
-                si     = parsed["supplier_info"]
-                code2  = str(si["code"]).zfill(2)[:2]
-
-                if code2 not in counters:
-                    r = db.execute(
-                        "SELECT MAX(code) AS mx FROM mst_items WHERE code LIKE %s AND company_id = %s",
-                        (f"{code2}%", company_id),
-                    ).fetchone()
-                    try:
-                        counters[code2] = int(str(r["mx"])[2:]) if r["mx"] else 0
-                    except Exception:
-                        counters[code2] = 0
-
-                counters[code2] += 1
-                new_code = f"{code2}{counters[code2]:03d}"
-
-                db.execute(
-                    """
-                    INSERT INTO mst_items
-                        (company_id, code, name, unit, supplier_id, temp_zone,
-                         purchase_unit, inventory_unit, min_purchase_unit,
-                         is_internal, is_active)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, 1)
-                    """,
-                    (
-                        company_id,
-                        new_code,
-                        parsed["name"],
-                        parsed["unit"],
-                        si["id"],
-                        parsed["temp_zone_code"],
-                        parsed["purchase_unit"],
-                        parsed["inventory_unit"],
-                        parsed["min_purchase_unit"],
-                        parsed["is_internal"],
-                    ),
+        company_id = getattr(g, "current_company_id", None)
+        row_count  = upload["row_count"]
+
+        # Large files leave the request: the worker runs the same import
+        if row_count >= ASYNC_MIN_ROWS and jobs_available(db):
+            current_user = getattr(g, "current_user", None) or {}
+            try:
+                job_id = enqueue_job(
+                    db, "items_csv_import", {"upload_id": upload["id"], "mapping": mapping},
+                    company_id=company_id, user_id=current_user.get("id"),
                 )
-                inserted += 1
-                print(f"[CSV import] INSERT row {i+2}: code={new_code} name={parsed['name']!r}", file=sys.stderr)
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                flash(f"インポートの登録に失敗しました: {e}")
+                return redirect(url_for("items_master"))
+            _clear_session()
+            return redirect(url_for("job_status_page", job_id=job_id,
+                                    next=url_for("items_master")))
 
+        try:
+            result = import_items(db, company_id, upload, mapping)
             db.commit()
-            print(f"[CSV import] COMMIT done — inserted={inserted} skipped={skipped}", file=sys.stderr)
-
         except Exception as e:
             db.rollback()
-            print(f"[CSV import] EXCEPTION: {e}", file=sys.stderr)
+            print(f"[CSV import] company_id={company_id} rows={row_count} EXCEPTION: {e}")
             flash(f"インポート中にエラーが発生しました: {e}")
             return redirect(url_for("items_master"))
 
-        # Cleanup
-        try:
-            os.remove(temp_path)
-        except Exception:
-            pass
-        session.pop("csv_temp_id", None)
-        session.pop("csv_mapping", None)
+        inserted = result["inserted"]
+        skipped  = result["skipped"]
+        print(f"[CSV import] company_id={company_id} upload_id={upload['id']} rows={row_count} "
+              f"inserted={inserted} skipped={skipped} codes={result['codes']} "
+              f"timings={result['timings']}")
+
+        _clear_session()
+        # Error report replaces the per-row log lines; the staged rows stay
+        # until they expire, so it is built from them on download
+        if skipped:
+            session["csv_error_report"] = upload["id"]
 
         if inserted == 0 and skipped > 0:
             flash(f"⚠️ 0件のインポート。{skipped}件すべてスキップされました。エラー内容を確認してください。")
@@ -429,7 +298,33 @@ def init_items_csv_views(app, get_db):
         else:
             flash(f"✅ {inserted}件をインポートしました。{skipped}件はスキップしました。")
 
-        for msg in err_msgs[:10]:
+        for msg in result["skipped_preview"]:
             flash(f"⚠️ {msg}")
 
         return redirect(url_for("items_master"))
+
+    def _clear_session():
+        session.pop("csv_upload_id", None)
+        session.pop("csv_mapping", None)
+        session.pop("csv_error_report", None)
+
+    # ── Error report of an import ─────────────────────────────────────────────
+    @app.route("/mst_items/csv/errors", methods=["GET"], endpoint="items_csv_error_report")
+    def items_csv_error_report():
+        # ?upload_id= from the job status page, else the last inline import
+        db        = get_db()
+        upload_id = request.args.get("upload_id", type=int) or session.get("csv_error_report")
+        upload    = get_upload(db, upload_id, getattr(g, "current_company_id", None))
+        errors    = (error_report_rows(db, upload, upload["mapping"] or {}, upload["company_id"])
+                     if upload and upload["mapping"] is not None else [])
+        if not errors:
+            flash("エラーレポートが見つかりません。")
+            return redirect(url_for("items_master"))
+
+        buf = io.StringIO()
+        write_error_report(buf, errors)
+        return Response(
+            ("\ufeff" + buf.getvalue()).encode("utf-8"),
+            mimetype="text/csv; charset=utf-8",
+            headers={"Content-Disposition": 'attachment; filename="items_import_errors.csv"'},
+        )
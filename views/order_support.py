@@ -16,12 +16,34 @@ from utils.access_scope import (
     get_accessible_stores,
     normalize_accessible_store_id,
 )
+from utils.change_stamps import (
+    company_key,
+    fetch_change_stamps,
+    make_etag,
+    store_key,
+)
+from utils.holiday_calendar import (
+    get_store_holidays,
+    get_supplier_holidays,
+    supplier_calendar,
+)
 from views.reports.audit_log import log_event
 
 
 DAY_KEYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
 DAY_LABELS = {'mon': '月', 'tue': '火', 'wed': '水', 'thu': '木', 'fri': '金', 'sat': '土', 'sun': '日'}
 
+# Forward view shown on the cards / sheet (days from base_date).
+WINDOW_DAYS = 7
+
+# Change stamps the order-support data depends on (see utils/change_stamps).
+STORE_STAMP_KINDS = ("purchases", "stock_counts", "order_drafts", "holidays")
+COMPANY_STAMP_KINDS = ("items", "suppliers", "supplier_holidays")
+
+# Upper bound for /order-support/draft/save-batch. The page only flushes
+# inputs that changed since the last flush, so real batches are small.
+MAX_DRAFT_BATCH_LINES = 1000
+
 
 def _date_to_day_key(d):
     """Convert a date to day key (mon, tue, ...)."""
@@ -44,7 +66,7 @@ def _get_delivery_dates(schedule, start_date, num_days, holidays_set, min_deadli
         d = start_date + timedelta(days=i)
         day_key = _date_to_day_key(d)
 
-        if day_key in schedule and str(d) not in holidays_set:
+        if day_key in schedule and d not in holidays_set:
             info = schedule[day_key]
             deadline_days = info.get('deadline_days', 1) or 0
             deadline_time = info.get('deadline_time') or None
@@ -53,7 +75,7 @@ def _get_delivery_dates(schedule, start_date, num_days, holidays_set, min_deadli
             deadline_date = d - timedelta(days=deadline_days)
 
             # If deadline falls on a supplier holiday, shift earlier
-            while str(deadline_date) in holidays_set:
+            while deadline_date in holidays_set:
                 deadline_date -= timedelta(days=1)
 
             # Skip past-deadline deliveries (non-actionable for ordering)
@@ -76,11 +98,508 @@ def _find_next_delivery_after(schedule, after_date, holidays_set, max_days=60):
     for i in range(1, max_days + 1):
         d = after_date + timedelta(days=i)
         day_key = _date_to_day_key(d)
-        if day_key in schedule and str(d) not in holidays_set:
+        if day_key in schedule and d not in holidays_set:
             return d
     return None
 
 
+def _jsonable(value):
+    """Dates → ISO strings (Flask would emit RFC 822), recursively."""
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def _fetch_order_suppliers(db, company_id):
+    """Active, orderable suppliers that have at least one orderable item.
+
+    is_orderable filter: operator can hide a supplier from this screen
+    (auto-resets when a purchase is recorded)."""
+    return db.execute(
+        """
+        SELECT DISTINCT s.id, s.code, s.name, s.order_method, s.order_url,
+               s.delivery_schedule, s.order_notes, s.holidays_off
+        FROM pur_suppliers s
+        JOIN mst_items i ON i.supplier_id = s.id
+        WHERE s.is_active = 1 AND s.company_id = %s
+          AND s.is_orderable = TRUE
+          AND i.is_active = 1 AND i.company_id = %s
+          AND i.is_orderable = TRUE
+        ORDER BY s.code
+        """,
+        (company_id, company_id),
+    ).fetchall()
+
+
+def _supplier_deliveries(schedule, base_date, window_days, holidays_set):
+    """Deliveries to show for one supplier.
+
+    Returns (all_deliveries, deliveries, gap_warning): every actionable
+    delivery in the window, the 2-3 shown on the card (or upcoming ones
+    beyond the window when the window has none), and the holiday-gap banner.
+    """
+    # Delivery dates in the 7-day window (deadline must be future)
+    all_deliveries = _get_delivery_dates(
+        schedule, base_date, window_days, holidays_set,
+        min_deadline_date=base_date,
+    )
+    deliveries = all_deliveries[:3]  # Show only next 2-3 deliveries
+
+    # Find next delivery after window (for gap warning)
+    next_after = _find_next_delivery_after(schedule, base_date + timedelta(days=window_days - 1), holidays_set)
+
+    # Calculate gap warning
+    gap_warning = None
+    if all_deliveries and next_after:
+        gap_days = (next_after - all_deliveries[-1]['delivery_date']).days
+        # Normal gap = 7 / number_of_delivery_days_per_week
+        num_delivery_days = len(schedule)
+        normal_gap = (7 / num_delivery_days) if num_delivery_days > 0 else 7
+        if gap_days > normal_gap * 1.5:
+            gap_warning = {
+                'days': gap_days,
+                'next_date': next_after,
+                'last_in_window': all_deliveries[-1]['delivery_date'],
+            }
+    elif not all_deliveries and schedule:
+        # No deliveries in window — try to surface up to 3 upcoming
+        # deliveries beyond the window so the card matches the
+        # 発注〆切 / 納品 layout of other suppliers. 45-day window
+        # handles weekly (21d → 3) and biweekly (42d → 3) schedules.
+        next_after_now = _find_next_delivery_after(schedule, base_date - timedelta(days=1), holidays_set)
+        if next_after_now:
+            upcoming = _get_delivery_dates(
+                schedule, next_after_now, 45, holidays_set,
+                min_deadline_date=base_date,
+            )[:3]
+            if upcoming:
+                # Deadline is now visible in the table, which is
+                # the actionable info — no banner needed. The
+                # banner is only a fallback when we can't surface
+                # dates below.
+                deliveries = upcoming
+            else:
+                gap_warning = {
+                    'days': (next_after_now - base_date).days,
+                    'next_date': next_after_now,
+                    'last_in_window': None,
+                }
+
+    # Normal-supplier gap-banner suppression: once the earliest
+    # visible deadline has passed, the banner is stale — operator
+    # can't place an order for that delivery anymore.
+    if gap_warning and deliveries and deliveries[0]['deadline_date'] < base_date:
+        gap_warning = None
+
+    return all_deliveries, deliveries, gap_warning
+
+
+def _build_supplier_cards(db, company_id, selected_store_id, base_date, window_days=WINDOW_DAYS):
+    """Build the per-supplier cards for one store and base date.
+
+    Returns (date_range, supplier_cards). Shared by the HTML page and the
+    JSON API so both always show the same numbers.
+    """
+    date_range = [base_date + timedelta(days=i) for i in range(window_days)]
+
+    # Extended window for gap detection (look ahead 30 days beyond the 7-day window)
+    extended_end = base_date + timedelta(days=window_days + 30)
+
+    supplier_cards = []
+
+    suppliers = _fetch_order_suppliers(db, company_id)
+
+    # ── Holidays: cached per-store / per-supplier bitsets ─────
+    store_holidays = get_store_holidays(
+        db, company_id, selected_store_id, base_date, extended_end,
+    )
+    holidays_by_supplier = get_supplier_holidays(
+        db, company_id, base_date, extended_end,
+    )
+
+    # ── Get all items for the store ──────────────────────────
+    items = db.execute(
+        """
+        SELECT i.id, i.code, i.name, i.supplier_id, i.est_order_qty, i.category
+        FROM mst_items i
+        WHERE i.is_active = 1 AND i.company_id = %s
+          AND i.is_orderable = TRUE
+        ORDER BY i.code
+        """,
+        (company_id,),
+    ).fetchall()
+
+    items_by_supplier = {}
+    all_item_ids = []
+    for item in items:
+        sid = item["supplier_id"]
+        if sid not in items_by_supplier:
+            items_by_supplier[sid] = []
+        items_by_supplier[sid].append(item)
+        all_item_ids.append(item["id"])
+
+    # ── Latest stock count per item + purchases after that count,
+    #    collapsed into one query (was N+1: one SUM per item).
+    stock_map = {}
+    if all_item_ids:
+        stock_rows = db.execute(
+            """
+            WITH latest AS (
+              SELECT DISTINCT ON (item_id)
+                item_id, counted_qty, count_date
+              FROM stock_counts
+              WHERE store_id = %s AND count_date <= %s
+              ORDER BY item_id, count_date DESC, id DESC
+            )
+            SELECT
+              l.item_id,
+              l.counted_qty,
+              l.count_date,
+              COALESCE(SUM(p.quantity), 0) AS qty_after
+            FROM latest l
+            LEFT JOIN purchases p
+              ON p.store_id = %s
+             AND p.item_id = l.item_id
+             AND p.is_deleted = 0
+             AND p.delivery_date > l.count_date
+            GROUP BY l.item_id, l.counted_qty, l.count_date
+            """,
+            (selected_store_id, base_date, selected_store_id),
+        ).fetchall()
+        stock_map = {
+            r["item_id"]: {
+                "qty": (r["counted_qty"] or 0) + (r["qty_after"] or 0),
+                "date": r["count_date"],
+            }
+            for r in stock_rows
+        }
+
+    # ── Load today's draft order qtys (one query for the store) ──
+    # Key: (supplier_id, item_id) → quantity. Used to pre-fill the
+    # qty inputs on the items table.
+    today_date = date.today()
+    draft_rows = db.execute(
+        """
+        SELECT d.supplier_id, i.item_id, i.quantity
+        FROM pur_order_drafts d
+        JOIN pur_order_draft_items i ON i.order_draft_id = d.id
+        WHERE d.company_id = %s
+          AND d.store_id = %s
+          AND d.order_date = %s
+        """,
+        (company_id, selected_store_id, today_date),
+    ).fetchall()
+    draft_qty_map = {
+        (r["supplier_id"], r["item_id"]): r["quantity"] for r in draft_rows
+    }
+
+    # ── Build supplier cards ─────────────────────────────────
+    for supplier in suppliers:
+        sid = supplier["id"]
+        schedule = supplier["delivery_schedule"] or {}
+        # Merge store holidays (if holidays_off) + supplier-specific holidays
+        holidays_set = supplier_calendar(
+            sid, holidays_by_supplier, store_holidays, supplier["holidays_off"],
+        )
+
+        all_deliveries, deliveries, gap_warning = _supplier_deliveries(
+            schedule, base_date, window_days, holidays_set,
+        )
+
+        # Build items list with stock info
+        supplier_items = items_by_supplier.get(sid, [])
+        item_rows = []
+        for item in supplier_items:
+            stock_info = stock_map.get(item["id"], {})
+            current_stock = stock_info.get("qty", 0)
+            last_count_date = stock_info.get("date")
+            est_qty = item["est_order_qty"] or 0
+
+            if est_qty > 0:
+                if current_stock < est_qty:
+                    status = "shortage"
+                elif current_stock < est_qty * 1.5:
+                    status = "low"
+                else:
+                    status = "ok"
+            else:
+                status = "unknown"
+
+            item_rows.append({
+                "id": item["id"],
+                "code": item["code"],
+                "name": item["name"],
+                "category": item["category"],
+                "current_stock": current_stock,
+                "last_count_date": last_count_date,
+                "est_order_qty": est_qty,
+                "status": status,
+                "draft_qty": draft_qty_map.get((sid, item["id"]), 0),
+            })
+
+        # Sort: shortage first, then low, then ok
+        status_order = {"shortage": 0, "low": 1, "unknown": 2, "ok": 3}
+        item_rows.sort(key=lambda x: (status_order.get(x["status"], 9), x["code"]))
+
+        # Build 7-day column data
+        day_columns = []
+        for d in date_range:
+            day_key = _date_to_day_key(d)
+            is_holiday = d in holidays_set
+            is_delivery = any(dl['delivery_date'] == d for dl in all_deliveries)
+            is_deadline = any(dl['deadline_date'] == d for dl in all_deliveries)
+
+            day_columns.append({
+                'date': d,
+                'day_label': DAY_LABELS.get(day_key, ''),
+                'is_holiday': is_holiday,
+                'is_delivery': is_delivery,
+                'is_deadline': is_deadline,
+            })
+
+        supplier_cards.append({
+            'id': sid,
+            'code': supplier["code"],
+            'name': supplier["name"],
+            'order_method': supplier["order_method"],
+            'order_url': supplier["order_url"],
+            'order_notes': supplier["order_notes"],
+            'has_schedule': bool(schedule),
+            'deliveries': deliveries,
+            'gap_warning': gap_warning,
+            'item_rows': item_rows,
+            'day_columns': day_columns,
+            'shortage_count': sum(1 for r in item_rows if r["status"] == "shortage"),
+            'low_count': sum(1 for r in item_rows if r["status"] == "low"),
+        })
+
+    return date_range, supplier_cards
+
+
+# Sheet view: sortable columns → ORDER BY expression over the `sheet` CTE.
+# Values never come from the request, only keys, so the f-string is safe.
+SHEET_SORTS = {
+    "frequency":     "freq_rank",
+    "supplier":      "supplier_name",
+    "deadline":      "deadline",
+    "delivery":      "next_delivery",
+    "code":          "code",
+    "name":          "name",
+    "category":      "category",
+    "stock":         "current_stock",
+    "last_count":    "last_count_date",
+    "est_qty":       "est_order_qty",
+    "status":        "status_rank",
+}
+SHEET_DEFAULT_SORT = "frequency"
+SHEET_PER_PAGE_CHOICES = (100, 200, 500)
+SHEET_DEFAULT_PER_PAGE = 200
+
+
+def _sheet_params(args):
+    """(sort, direction, page, per_page) from request args, clamped to the
+    supported values."""
+    sort = args.get("sort") or SHEET_DEFAULT_SORT
+    if sort not in SHEET_SORTS:
+        sort = SHEET_DEFAULT_SORT
+    direction = "desc" if (args.get("dir") or "").lower() == "desc" else "asc"
+    try:
+        page = max(1, int(args.get("page") or 1))
+    except ValueError:
+        page = 1
+    try:
+        per_page = int(args.get("per_page") or SHEET_DEFAULT_PER_PAGE)
+    except ValueError:
+        per_page = SHEET_DEFAULT_PER_PAGE
+    if per_page not in SHEET_PER_PAGE_CHOICES:
+        per_page = SHEET_DEFAULT_PER_PAGE
+    return sort, direction, page, per_page
+
+
+def _query_sheet_rows(db, company_id, store_id, base_date, sup_cols,
+                      sort, direction, limit, offset, use_stored_freq=True):
+    """The sheet's one row query: items × next delivery × projected stock ×
+    frequency, status computed, sorted and paged in SQL. Frequency is the
+    shared utils.item_frequency.frequency_cte (stored table when current,
+    live count otherwise).
+    """
+    from utils.item_frequency import (
+        bucket_lookup,
+        bucket_order,
+        frequency_cte,
+        frequency_cte_params,
+    )
+
+    buckets = bucket_lookup()
+    ranks = [bucket_order(b) for b in buckets]
+
+    order_col = SHEET_SORTS[sort]
+    return db.execute(
+        f"""
+        WITH sup AS (
+          SELECT *
+          FROM unnest(%(sup_ids)s::int[], %(sup_names)s::text[],
+                      %(deadlines)s::date[], %(deadline_times)s::text[],
+                      %(next_deliveries)s::date[])
+            AS u(supplier_id, supplier_name, deadline, deadline_time, next_delivery)
+        ),
+        latest AS (
+          SELECT DISTINCT ON (item_id)
+            item_id, counted_qty, count_date
+          FROM stock_counts
+          WHERE store_id = %(store_id)s AND count_date <= %(base_date)s
+          ORDER BY item_id, count_date DESC, id DESC
+        ),
+        stock AS (
+          SELECT l.item_id, l.count_date,
+                 COALESCE(l.counted_qty, 0) + COALESCE(SUM(p.quantity), 0) AS qty
+          FROM latest l
+          LEFT JOIN purchases p
+            ON p.store_id = %(store_id)s
+           AND p.item_id = l.item_id
+           AND p.is_deleted = 0
+           AND p.delivery_date > l.count_date
+          GROUP BY l.item_id, l.counted_qty, l.count_date
+        ),
+        {frequency_cte(use_stored_freq)},
+        sheet AS (
+          SELECT i.id, i.code, i.name, i.category,
+                 COALESCE(i.est_order_qty, 0) AS est_order_qty,
+                 sup.supplier_id, sup.supplier_name,
+                 sup.deadline, sup.deadline_time, sup.next_delivery,
+                 COALESCE(st.qty, 0) AS current_stock,
+                 st.count_date AS last_count_date,
+                 COALESCE(f.purchase_days, 0) AS purchase_days
+          FROM mst_items i
+          JOIN sup ON sup.supplier_id = i.supplier_id
+          LEFT JOIN stock st ON st.item_id = i.id
+          LEFT JOIN freq f ON f.item_id = i.id
+          WHERE i.is_active = 1 AND i.company_id = %(company_id)s
+            AND i.is_orderable = TRUE
+        ),
+        ranked AS (
+          SELECT s.*,
+                 (%(ranks)s::int[])[LEAST(s.purchase_days, %(max_days)s) + 1] AS freq_rank,
+                 CASE
+                   WHEN s.est_order_qty <= 0 THEN 'unknown'
+                   WHEN s.current_stock < s.est_order_qty THEN 'shortage'
+                   WHEN s.current_stock < s.est_order_qty * 1.5 THEN 'low'
+                   ELSE 'ok'
+                 END AS status
+          FROM sheet s
+        )
+        SELECT r.*,
+               CASE r.status
+                 WHEN 'shortage' THEN 0 WHEN 'low' THEN 1
+                 WHEN 'unknown' THEN 2 ELSE 3
+               END AS status_rank,
+               COUNT(*) OVER () AS total_count
+        FROM ranked r
+        ORDER BY {order_col} {direction.upper()} NULLS LAST,
+                 freq_rank, status_rank, supplier_name, code, id
+        LIMIT %(limit)s OFFSET %(offset)s
+        """,
+        {
+            **sup_cols,
+            "company_id": company_id,
+            "store_id": store_id,
+            "base_date": base_date,
+            **frequency_cte_params(),
+            "ranks": ranks,
+            "max_days": len(ranks) - 1,
+            "limit": limit,
+            "offset": offset,
+        },
+    ).fetchall()
+
+
+def _build_sheet_page(db, company_id, store_id, base_date, sort=SHEET_DEFAULT_SORT,
+                      direction="asc", page=1, per_page=SHEET_DEFAULT_PER_PAGE,
+                      window_days=WINDOW_DAYS):
+    """Sheet view rows for one page, already sorted.
+
+    Next delivery / deadline depend on schedules and holiday calendars, so
+    they are worked out per supplier in Python (tens of suppliers, cached
+    calendars) and handed to the row query as arrays; everything per item —
+    stock projection, frequency, status, sort and paging — happens in SQL.
+
+    Returns {'rows', 'total', 'page', 'per_page', 'total_pages', 'sort', 'dir'}.
+    """
+    from utils.item_frequency import frequency_info
+
+    extended_end = base_date + timedelta(days=window_days + 30)
+    suppliers = _fetch_order_suppliers(db, company_id)
+    store_holidays = get_store_holidays(db, company_id, store_id, base_date, extended_end)
+    holidays_by_supplier = get_supplier_holidays(db, company_id, base_date, extended_end)
+
+    sup_cols = {"sup_ids": [], "sup_names": [], "deadlines": [],
+                "deadline_times": [], "next_deliveries": []}
+    for supplier in suppliers:
+        sid = supplier["id"]
+        schedule = supplier["delivery_schedule"] or {}
+        holidays_set = supplier_calendar(
+            sid, holidays_by_supplier, store_holidays, supplier["holidays_off"],
+        )
+        _, deliveries, _ = _supplier_deliveries(schedule, base_date, window_days, holidays_set)
+        nd = deliveries[0] if deliveries else None
+        sup_cols["sup_ids"].append(sid)
+        sup_cols["sup_names"].append(supplier["name"])
+        sup_cols["deadlines"].append(nd["deadline_date"] if nd else None)
+        sup_cols["deadline_times"].append(nd["deadline_time"] if nd else None)
+        sup_cols["next_deliveries"].append(nd["delivery_date"] if nd else None)
+
+    result = {"rows": [], "total": 0, "page": page, "per_page": per_page,
+              "total_pages": 1, "sort": sort, "dir": direction}
+    if not suppliers:
+        return result
+
+    def run(offset):
+        args = (db, company_id, store_id, base_date, sup_cols,
+                sort, direction, per_page, offset)
+        try:
+            return _query_sheet_rows(*args)
+        except Exception:
+            # pur_item_frequency not migrated yet — live frequency only.
+            db.rollback()
+            return _query_sheet_rows(*args, use_stored_freq=False)
+
+    rows = run((page - 1) * per_page)
+    if not rows and page > 1:
+        # Stale link past the last page (rows went away) — show page 1.
+        page = result["page"] = 1
+        rows = run(0)
+
+    total = rows[0]["total_count"] if rows else 0
+    for r in rows:
+        f = frequency_info(r["purchase_days"])
+        result["rows"].append({
+            "id":            r["id"],
+            "supplier_name": r["supplier_name"],
+            "supplier_id":   r["supplier_id"],
+            "deadline":      r["deadline"],
+            "deadline_time": r["deadline_time"],
+            "next_delivery": r["next_delivery"],
+            "code":          r["code"],
+            "name":          r["name"],
+            "category":      r["category"],
+            "frequency":     f["bucket"],
+            "per_month":     f["per_month"],
+            "rate_scale":    f["rate_scale"],
+            "rate_n":        f["rate_n"],
+            "current_stock": r["current_stock"],
+            "last_count_date": r["last_count_date"],
+            "est_order_qty": r["est_order_qty"],
+            "status":        r["status"],
+        })
+    result["total"] = total
+    result["total_pages"] = max(1, (total + per_page - 1) // per_page)
+    return result
+
+
 def init_order_support_views(app, get_db):
 
     @app.route("/order-support", methods=["GET"])
@@ -92,7 +611,6 @@ def init_order_support_views(app, get_db):
         selected_store_id = normalize_accessible_store_id(
             request.args.get("store_id")
         )
-        store_id = str(selected_store_id) if selected_store_id else ""
 
         # Base date (default: today)
         base_date_str = request.args.get("base_date") or str(date.today())
@@ -101,306 +619,24 @@ def init_order_support_views(app, get_db):
         except ValueError:
             base_date = date.today()
 
-        # 7-day window
-        window_days = 7
-        date_range = [base_date + timedelta(days=i) for i in range(window_days)]
-
-        # Extended window for gap detection (look ahead 30 days beyond the 7-day window)
-        extended_end = base_date + timedelta(days=window_days + 30)
+        view_mode = (request.args.get("view") or "cards").strip()
 
+        # 7-day window
+        date_range = [base_date + timedelta(days=i) for i in range(WINDOW_DAYS)]
         supplier_cards = []
-
-        if selected_store_id:
-            # ── Get all active suppliers with their items ────────────
-            # is_orderable filter: operator can hide a supplier from this
-            # screen (auto-resets when a purchase is recorded).
-            suppliers = db.execute(
-                """
-                SELECT DISTINCT s.id, s.code, s.name, s.order_method, s.order_url,
-                       s.delivery_schedule, s.order_notes, s.holidays_off
-                FROM pur_suppliers s
-                JOIN mst_items i ON i.supplier_id = s.id
-                WHERE s.is_active = 1 AND s.company_id = %s
-                  AND s.is_orderable = TRUE
-                  AND i.is_active = 1 AND i.company_id = %s
-                  AND i.is_orderable = TRUE
-                ORDER BY s.code
-                """,
-                (company_id, company_id),
-            ).fetchall()
-
-            # ── Get store holidays (for suppliers with holidays_off) ──
-            store_holidays_rows = db.execute(
-                """
-                SELECT holiday_date FROM store_holidays
-                WHERE store_id = %s AND company_id = %s
-                  AND holiday_date >= %s AND holiday_date <= %s
-                """,
-                (selected_store_id, company_id, base_date, extended_end),
-            ).fetchall()
-            store_holiday_set = {str(h["holiday_date"]) for h in store_holidays_rows}
-
-            # ── Get supplier-specific holidays ────────────────────────
-            all_supplier_holidays = db.execute(
-                """
-                SELECT supplier_id, holiday_date
-                FROM supplier_holidays
-                WHERE company_id = %s
-                  AND holiday_date >= %s AND holiday_date <= %s
-                """,
-                (company_id, base_date, extended_end),
-            ).fetchall()
-
-            holidays_by_supplier = {}
-            for h in all_supplier_holidays:
-                sid = h["supplier_id"]
-                if sid not in holidays_by_supplier:
-                    holidays_by_supplier[sid] = set()
-                holidays_by_supplier[sid].add(str(h["holiday_date"]))
-
-            # ── Get all items for the store ──────────────────────────
-            items = db.execute(
-                """
-                SELECT i.id, i.code, i.name, i.supplier_id, i.est_order_qty, i.category
-                FROM mst_items i
-                WHERE i.is_active = 1 AND i.company_id = %s
-                  AND i.is_orderable = TRUE
-                ORDER BY i.code
-                """,
-                (company_id,),
-            ).fetchall()
-
-            items_by_supplier = {}
-            all_item_ids = []
-            for item in items:
-                sid = item["supplier_id"]
-                if sid not in items_by_supplier:
-                    items_by_supplier[sid] = []
-                items_by_supplier[sid].append(item)
-                all_item_ids.append(item["id"])
-
-            # ── Latest stock count per item + purchases after that count,
-            #    collapsed into one query (was N+1: one SUM per item).
-            stock_map = {}
-            if all_item_ids:
-                stock_rows = db.execute(
-                    """
-                    WITH latest AS (
-                      SELECT DISTINCT ON (item_id)
-                        item_id, counted_qty, count_date
-                      FROM stock_counts
-                      WHERE store_id = %s AND count_date <= %s
-                      ORDER BY item_id, count_date DESC, id DESC
-                    )
-                    SELECT
-                      l.item_id,
-                      l.counted_qty,
-                      l.count_date,
-                      COALESCE(SUM(p.quantity), 0) AS qty_after
-                    FROM latest l
-                    LEFT JOIN purchases p
-                      ON p.store_id = %s
-                     AND p.item_id = l.item_id
-                     AND p.is_deleted = 0
-                     AND p.delivery_date > l.count_date
-                    GROUP BY l.item_id, l.counted_qty, l.count_date
-                    """,
-                    (selected_store_id, base_date, selected_store_id),
-                ).fetchall()
-                stock_map = {
-                    r["item_id"]: {
-                        "qty": (r["counted_qty"] or 0) + (r["qty_after"] or 0),
-                        "date": r["count_date"],
-                    }
-                    for r in stock_rows
-                }
-
-            # ── Load today's draft order qtys (one query for the store) ──
-            # Key: (supplier_id, item_id) → quantity. Used to pre-fill the
-            # qty inputs on the items table.
-            today_date = date.today()
-            draft_rows = db.execute(
-                """
-                SELECT d.supplier_id, i.item_id, i.quantity
-                FROM pur_order_drafts d
-                JOIN pur_order_draft_items i ON i.order_draft_id = d.id
-                WHERE d.company_id = %s
-                  AND d.store_id = %s
-                  AND d.order_date = %s
-                """,
-                (company_id, selected_store_id, today_date),
-            ).fetchall()
-            draft_qty_map = {
-                (r["supplier_id"], r["item_id"]): r["quantity"] for r in draft_rows
-            }
-
-            # ── Build supplier cards ─────────────────────────────────
-            for supplier in suppliers:
-                sid = supplier["id"]
-                schedule = supplier["delivery_schedule"] or {}
-                # Merge store holidays (if holidays_off) + supplier-specific holidays
-                holidays_set = set(holidays_by_supplier.get(sid, set()))
-                if supplier["holidays_off"]:
-                    holidays_set |= store_holiday_set
-
-                # Delivery dates in the 7-day window (deadline must be future)
-                all_deliveries = _get_delivery_dates(
-                    schedule, base_date, window_days, holidays_set,
-                    min_deadline_date=base_date,
+        sheet = None
+        if view_mode == "sheet":
+            # ── Sheet view: flat row-per-item, sorted + paged in SQL ────
+            sort, direction, page, per_page = _sheet_params(request.args)
+            if selected_store_id:
+                sheet = _build_sheet_page(
+                    db, company_id, selected_store_id, base_date,
+                    sort=sort, direction=direction, page=page, per_page=per_page,
                 )
-                deliveries = all_deliveries[:3]  # Show only next 2-3 deliveries
-
-                # Find next delivery after window (for gap warning)
-                last_delivery_in_window = all_deliveries[-1]['delivery_date'] if all_deliveries else base_date
-                next_after = _find_next_delivery_after(schedule, base_date + timedelta(days=window_days - 1), holidays_set)
-
-                # Calculate gap warning
-                gap_warning = None
-                if all_deliveries and next_after:
-                    gap_days = (next_after - all_deliveries[-1]['delivery_date']).days
-                    # Normal gap = 7 / number_of_delivery_days_per_week
-                    num_delivery_days = len(schedule)
-                    normal_gap = (7 / num_delivery_days) if num_delivery_days > 0 else 7
-                    if gap_days > normal_gap * 1.5:
-                        gap_warning = {
-                            'days': gap_days,
-                            'next_date': next_after,
-                            'last_in_window': all_deliveries[-1]['delivery_date'],
-                        }
-                elif not all_deliveries and schedule:
-                    # No deliveries in window — try to surface up to 3 upcoming
-                    # deliveries beyond the window so the card matches the
-                    # 発注〆切 / 納品 layout of other suppliers. 45-day window
-                    # handles weekly (21d → 3) and biweekly (42d → 3) schedules.
-                    next_after_now = _find_next_delivery_after(schedule, base_date - timedelta(days=1), holidays_set)
-                    if next_after_now:
-                        upcoming = _get_delivery_dates(
-                            schedule, next_after_now, 45, holidays_set,
-                            min_deadline_date=base_date,
-                        )[:3]
-                        if upcoming:
-                            # Deadline is now visible in the table, which is
-                            # the actionable info — no banner needed. The
-                            # banner is only a fallback when we can't surface
-                            # dates below.
-                            deliveries = upcoming
-                        else:
-                            gap_warning = {
-                                'days': (next_after_now - base_date).days,
-                                'next_date': next_after_now,
-                                'last_in_window': None,
-                            }
-
-                # Normal-supplier gap-banner suppression: once the earliest
-                # visible deadline has passed, the banner is stale — operator
-                # can't place an order for that delivery anymore.
-                if gap_warning and deliveries and deliveries[0]['deadline_date'] < base_date:
-                    gap_warning = None
-
-                # Build items list with stock info
-                supplier_items = items_by_supplier.get(sid, [])
-                item_rows = []
-                for item in supplier_items:
-                    stock_info = stock_map.get(item["id"], {})
-                    current_stock = stock_info.get("qty", 0)
-                    last_count_date = stock_info.get("date")
-                    est_qty = item["est_order_qty"] or 0
-
-                    if est_qty > 0:
-                        if current_stock < est_qty:
-                            status = "shortage"
-                        elif current_stock < est_qty * 1.5:
-                            status = "low"
-                        else:
-                            status = "ok"
-                    else:
-                        status = "unknown"
-
-                    item_rows.append({
-                        "id": item["id"],
-                        "code": item["code"],
-                        "name": item["name"],
-                        "category": item["category"],
-                        "current_stock": current_stock,
-                        "last_count_date": last_count_date,
-                        "est_order_qty": est_qty,
-                        "status": status,
-                        "draft_qty": draft_qty_map.get((sid, item["id"]), 0),
-                    })
-
-                # Sort: shortage first, then low, then ok
-                status_order = {"shortage": 0, "low": 1, "unknown": 2, "ok": 3}
-                item_rows.sort(key=lambda x: (status_order.get(x["status"], 9), x["code"]))
-
-                # Build 7-day column data
-                day_columns = []
-                for d in date_range:
-                    day_key = _date_to_day_key(d)
-                    is_holiday = str(d) in holidays_set
-                    is_delivery = any(dl['delivery_date'] == d for dl in all_deliveries)
-                    is_deadline = any(dl['deadline_date'] == d for dl in all_deliveries)
-
-                    day_columns.append({
-                        'date': d,
-                        'day_label': DAY_LABELS.get(day_key, ''),
-                        'is_holiday': is_holiday,
-                        'is_delivery': is_delivery,
-                        'is_deadline': is_deadline,
-                    })
-
-                supplier_cards.append({
-                    'id': sid,
-                    'code': supplier["code"],
-                    'name': supplier["name"],
-                    'order_method': supplier["order_method"],
-                    'order_url': supplier["order_url"],
-                    'order_notes': supplier["order_notes"],
-                    'has_schedule': bool(schedule),
-                    'deliveries': deliveries,
-                    'gap_warning': gap_warning,
-                    'item_rows': item_rows,
-                    'day_columns': day_columns,
-                    'shortage_count': sum(1 for r in item_rows if r["status"] == "shortage"),
-                    'low_count': sum(1 for r in item_rows if r["status"] == "low"),
-                })
-
-        # ── Sheet view: flat row-per-item with supplier/delivery info ────
-        view_mode = (request.args.get("view") or "cards").strip()
-        sheet_rows = []
-        if view_mode == "sheet" and supplier_cards:
-            from utils.item_frequency import fetch_item_frequency, bucket_order
-            all_ids = [r["id"] for c in supplier_cards for r in c["item_rows"] if r.get("id")]
-            freq_map = fetch_item_frequency(db, all_ids)
-            for card in supplier_cards:
-                next_delivery = card["deliveries"][0] if card["deliveries"] else None
-                for r in card["item_rows"]:
-                    f = freq_map.get(r.get("id"), {"bucket": "none", "purchase_days": 0, "per_month": 0, "rate_scale": "none", "rate_n": None})
-                    sheet_rows.append({
-                        "supplier_name": card["name"],
-                        "supplier_id":   card["id"],
-                        "deadline":      next_delivery["deadline_date"] if next_delivery else None,
-                        "deadline_time": next_delivery["deadline_time"] if next_delivery else None,
-                        "next_delivery": next_delivery["delivery_date"] if next_delivery else None,
-                        "code":          r["code"],
-                        "name":          r["name"],
-                        "category":      r["category"],
-                        "frequency":     f["bucket"],
-                        "per_month":     f["per_month"],
-                        "rate_scale":    f.get("rate_scale", "none"),
-                        "rate_n":        f.get("rate_n"),
-                        "current_stock": r["current_stock"],
-                        "last_count_date": r["last_count_date"],
-                        "est_order_qty": r["est_order_qty"],
-                        "status":        r["status"],
-                    })
-            # Default sort: frequency DESC (very_high → high → low → none), then status, then supplier
-            status_order = {"shortage": 0, "low": 1, "unknown": 2, "ok": 3}
-            sheet_rows.sort(key=lambda x: (
-                bucket_order(x["frequency"]),
-                status_order.get(x["status"], 9),
-                x["supplier_name"],
-                x["code"],
-            ))
+        elif selected_store_id:
+            date_range, supplier_cards = _build_supplier_cards(
+                db, company_id, selected_store_id, base_date,
+            )
 
         template = "pur/order_support_sheet.html" if view_mode == "sheet" else "pur/order_support.html"
         return render_template(
@@ -410,11 +646,79 @@ def init_order_support_views(app, get_db):
             base_date=base_date_str,
             date_range=date_range,
             supplier_cards=supplier_cards,
-            sheet_rows=sheet_rows,
+            sheet=sheet,
+            sheet_rows=sheet["rows"] if sheet else [],
+            sheet_sorts=SHEET_SORTS,
+            sheet_per_page_choices=SHEET_PER_PAGE_CHOICES,
             view_mode=view_mode,
             DAY_LABELS=DAY_LABELS,
         )
 
+    @app.route("/api/order-support", methods=["GET"])
+    def api_order_support():
+        """JSON twin of /order-support: supplier cards (with item rows and
+        day columns) or, for view=sheet, one page of the flat sheet rows
+        (same sort / dir / page / per_page parameters as the page).
+
+        Sends a strong ETag built from the store's purchase / stock-count /
+        draft / holiday change stamps plus the company's item and supplier
+        stamps, so a client re-requesting unchanged data gets 304 without
+        the cards being rebuilt."""
+        db = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        selected_store_id = normalize_accessible_store_id(
+            request.args.get("store_id")
+        )
+        if not (company_id and selected_store_id):
+            return jsonify({"error": "store_id required"}), 400
+
+        try:
+            base_date = date.fromisoformat(request.args.get("base_date") or "")
+        except ValueError:
+            base_date = date.today()
+        view_mode = (request.args.get("view") or "cards").strip()
+        sheet_args = _sheet_params(request.args) if view_mode == "sheet" else ()
+
+        stamps = fetch_change_stamps(
+            db,
+            [store_key(selected_store_id, k) for k in STORE_STAMP_KINDS]
+            + [company_key(company_id, k) for k in COMPANY_STAMP_KINDS],
+        )
+        etag = None
+        if stamps is not None:
+            # today matters too: drafts are keyed on it and frequency ages daily
+            etag = make_etag(
+                "order_support", selected_store_id, base_date, view_mode,
+                *sheet_args, date.today(), stamps,
+            )
+            if request.if_none_match.contains(etag):
+                resp = app.response_class(status=304)
+                resp.set_etag(etag)
+                resp.headers["Cache-Control"] = "private, no-cache"
+                return resp
+
+        payload = {
+            "store_id": selected_store_id,
+            "base_date": base_date,
+            "view": view_mode,
+        }
+        if view_mode == "sheet":
+            sort, direction, page, per_page = sheet_args
+            payload["sheet"] = _build_sheet_page(
+                db, company_id, selected_store_id, base_date,
+                sort=sort, direction=direction, page=page, per_page=per_page,
+            )
+        else:
+            payload["date_range"], payload["supplier_cards"] = _build_supplier_cards(
+                db, company_id, selected_store_id, base_date,
+            )
+
+        resp = jsonify(_jsonable(payload))
+        if etag:
+            resp.set_etag(etag)
+        resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
+
     # ----------------------------------------
     # In-screen 発注対象外 toggles. Operators can hide an item or an
     # entire supplier from the order-support screen without leaving
@@ -517,25 +821,13 @@ def init_order_support_views(app, get_db):
         # Next-delivery date to pre-fill 納品希望日 on the form.
         # Reuse the supplier's delivery_schedule + holidays.
         schedule = supplier["delivery_schedule"] or {}
-        holiday_rows = db.execute(
-            """
-            SELECT holiday_date FROM supplier_holidays
-            WHERE supplier_id = %s AND company_id = %s
-              AND holiday_date >= %s AND holiday_date <= %s
-            """,
-            (supplier_id, company_id, today_date, today_date + timedelta(days=45)),
-        ).fetchall()
-        holidays_set = {str(h["holiday_date"]) for h in holiday_rows}
-        if supplier["holidays_off"]:
-            store_holiday_rows = db.execute(
-                """
-                SELECT holiday_date FROM store_holidays
-                WHERE store_id = %s AND company_id = %s
-                  AND holiday_date >= %s AND holiday_date <= %s
-                """,
-                (store_id, company_id, today_date, today_date + timedelta(days=45)),
-            ).fetchall()
-            holidays_set |= {str(h["holiday_date"]) for h in store_holiday_rows}
+        horizon_end = today_date + timedelta(days=45)
+        holidays_set = supplier_calendar(
+            supplier_id,
+            get_supplier_holidays(db, company_id, today_date, horizon_end),
+            get_store_holidays(db, company_id, store_id, today_date, horizon_end),
+            supplier["holidays_off"],
+        )
 
         delivery_candidates = _get_delivery_dates(
             schedule, today_date, 45, holidays_set, min_deadline_date=today_date,
@@ -581,6 +873,95 @@ def init_order_support_views(app, get_db):
             mail_body_plain=mail_body_plain,
         )
 
+    def _save_draft_lines(db, company_id, store_id, operator_id, lines):
+        """Apply many (supplier_id, item_id, quantity) draft lines for today
+        in one transaction: one ownership query for the whole set, one
+        header upsert, one item upsert and one delete. Quantity 0 removes
+        the line; headers are kept (operator may add more items later).
+
+        Returns (result_dict, http_status). Commits on success only."""
+        # Last write wins when the same (supplier, item) appears twice.
+        by_key = {}
+        for supplier_id, item_id, quantity in lines:
+            by_key[(supplier_id, item_id)] = quantity
+        keys = list(by_key)
+        supplier_ids = [k[0] for k in keys]
+        item_ids = [k[1] for k in keys]
+
+        # Verify every item + supplier belongs to the current company
+        # (defense in depth) — one query for the whole batch.
+        ok_rows = db.execute(
+            """
+            SELECT u.supplier_id, u.item_id
+            FROM unnest(%s::int[], %s::int[]) AS u(supplier_id, item_id)
+            JOIN mst_items i
+              ON i.id = u.item_id AND i.company_id = %s
+            JOIN pur_suppliers s
+              ON s.id = u.supplier_id AND s.company_id = i.company_id
+            """,
+            (supplier_ids, item_ids, company_id),
+        ).fetchall()
+        ok_keys = {(r["supplier_id"], r["item_id"]) for r in ok_rows}
+        invalid = [
+            {"supplier_id": sid, "item_id": iid}
+            for sid, iid in keys if (sid, iid) not in ok_keys
+        ]
+        if invalid:
+            return {"ok": False, "error": "not_found", "invalid": invalid}, 404
+
+        today_date = date.today()
+
+        # Upsert every header touched by the batch
+        header_rows = db.execute(
+            """
+            INSERT INTO pur_order_drafts
+              (company_id, store_id, supplier_id, order_date, operator_id, status, updated_at)
+            SELECT %s, %s, u.supplier_id, %s, %s, 'draft', NOW()
+            FROM unnest(%s::int[]) AS u(supplier_id)
+            ON CONFLICT (company_id, store_id, supplier_id, order_date)
+            DO UPDATE SET operator_id = EXCLUDED.operator_id,
+                          updated_at  = NOW()
+            RETURNING id, supplier_id
+            """,
+            (company_id, store_id, today_date, operator_id, sorted(set(supplier_ids))),
+        ).fetchall()
+        header_by_supplier = {r["supplier_id"]: r["id"] for r in header_rows}
+
+        upsert = [(header_by_supplier[sid], iid, q) for (sid, iid), q in by_key.items() if q > 0]
+        remove = [(header_by_supplier[sid], iid) for (sid, iid), q in by_key.items() if q == 0]
+
+        if upsert:
+            db.execute(
+                """
+                INSERT INTO pur_order_draft_items (order_draft_id, item_id, quantity)
+                SELECT * FROM unnest(%s::int[], %s::int[], %s::int[])
+                ON CONFLICT (order_draft_id, item_id)
+                DO UPDATE SET quantity = EXCLUDED.quantity
+                """,
+                ([u[0] for u in upsert], [u[1] for u in upsert], [u[2] for u in upsert]),
+            )
+        if remove:
+            db.execute(
+                """
+                DELETE FROM pur_order_draft_items di
+                USING unnest(%s::int[], %s::int[]) AS u(order_draft_id, item_id)
+                WHERE di.order_draft_id = u.order_draft_id
+                  AND di.item_id = u.item_id
+                """,
+                ([r[0] for r in remove], [r[1] for r in remove]),
+            )
+
+        db.commit()
+        return {
+            "ok": True,
+            "saved": len(upsert),
+            "removed": len(remove),
+            "lines": [
+                {"supplier_id": sid, "item_id": iid, "quantity": q}
+                for (sid, iid), q in by_key.items()
+            ],
+        }, 200
+
     @app.route("/order-support/draft/save", methods=["POST"])
     def order_support_draft_save():
         """Upsert a single (store, supplier, item, today) draft qty. JSON body:
@@ -606,54 +987,51 @@ def init_order_support_views(app, get_db):
         if quantity < 0:
             return jsonify({"ok": False, "error": "negative_qty"}), 400
 
-        # Verify the item + supplier belong to the current company (defense in depth)
-        ok_row = db.execute(
-            """
-            SELECT 1
-            FROM mst_items i
-            JOIN pur_suppliers s ON s.id = %s AND s.company_id = i.company_id
-            WHERE i.id = %s AND i.company_id = %s
-            """,
-            (supplier_id, item_id, company_id),
-        ).fetchone()
-        if not ok_row:
-            return jsonify({"ok": False, "error": "not_found"}), 404
+        result, status = _save_draft_lines(
+            db, company_id, store_id, operator_id,
+            [(supplier_id, item_id, quantity)],
+        )
+        if not result["ok"]:
+            return jsonify({"ok": False, "error": result["error"]}), status
+        return jsonify({"ok": True, "quantity": quantity})
 
-        today_date = date.today()
+    @app.route("/order-support/draft/save-batch", methods=["POST"])
+    def order_support_draft_save_batch():
+        """Upsert many draft qtys for today in one round trip. JSON body:
+        {store_id, lines: [{supplier_id, item_id, quantity}, ...]}.
+        Lines may span suppliers. The whole batch is rejected if any line
+        is malformed or not owned by the current company."""
+        db = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        current_user = getattr(g, "current_user", None) or {}
+        operator_id = current_user.get("id")
 
-        # Upsert header
-        header_row = db.execute(
-            """
-            INSERT INTO pur_order_drafts
-              (company_id, store_id, supplier_id, order_date, operator_id, status, updated_at)
-            VALUES (%s, %s, %s, %s, %s, 'draft', NOW())
-            ON CONFLICT (company_id, store_id, supplier_id, order_date)
-            DO UPDATE SET operator_id = EXCLUDED.operator_id,
-                          updated_at  = NOW()
-            RETURNING id
-            """,
-            (company_id, store_id, supplier_id, today_date, operator_id),
-        ).fetchone()
-        header_id = header_row["id"]
+        payload = request.get_json(silent=True) or {}
+        store_id = normalize_accessible_store_id(payload.get("store_id"))
+        raw_lines = payload.get("lines")
+        if not (company_id and store_id) or not isinstance(raw_lines, list):
+            return jsonify({"ok": False, "error": "missing_fields"}), 400
+        if not raw_lines:
+            return jsonify({"ok": True, "saved": 0, "removed": 0, "lines": []})
+        if len(raw_lines) > MAX_DRAFT_BATCH_LINES:
+            return jsonify({"ok": False, "error": "too_many_lines"}), 400
 
-        if quantity == 0:
-            db.execute(
-                "DELETE FROM pur_order_draft_items WHERE order_draft_id = %s AND item_id = %s",
-                (header_id, item_id),
-            )
-        else:
-            db.execute(
-                """
-                INSERT INTO pur_order_draft_items (order_draft_id, item_id, quantity)
-                VALUES (%s, %s, %s)
-                ON CONFLICT (order_draft_id, item_id)
-                DO UPDATE SET quantity = EXCLUDED.quantity
-                """,
-                (header_id, item_id, quantity),
-            )
+        lines = []
+        try:
+            for ln in raw_lines:
+                supplier_id = int(ln.get("supplier_id") or 0)
+                item_id = int(ln.get("item_id") or 0)
+                quantity = int(ln.get("quantity") or 0)
+                if not (supplier_id and item_id):
+                    return jsonify({"ok": False, "error": "missing_fields"}), 400
+                if quantity < 0:
+                    return jsonify({"ok": False, "error": "negative_qty"}), 400
+                lines.append((supplier_id, item_id, quantity))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({"ok": False, "error": "invalid_payload"}), 400
 
-        db.commit()
-        return jsonify({"ok": True, "quantity": quantity})
+        result, status = _save_draft_lines(db, company_id, store_id, operator_id, lines)
+        return jsonify(result), status
 
     @app.route("/order-support/supplier/<int:supplier_id>/hide", methods=["POST"])
     def order_support_hide_supplier(supplier_id):
@@ -3,12 +3,35 @@
 # Also: CSV upload path for the シーニュ/尾家産業-style multi-invoice CSV export.
 
 import csv
-import io
+import itertools
 import json
-import re
-from datetime import datetime
-from flask import render_template, request, redirect, url_for, flash, g, jsonify
-
+import time
+from flask import (
+    Response, render_template, request, redirect, url_for, flash, g, jsonify,
+    stream_with_context,
+)
+
+from utils.delivery_csv import (
+    detect_encoding,
+    iter_invoices,
+    iter_text_lines,
+    with_existing_counts,
+)
+from utils.item_frequency import touch_item_frequency
+from utils.item_spend import touch_item_spend
+from utils.jobs import enqueue_job, jobs_available
+from utils.name_match import ITEM_MIN_SIMILARITY, get_name_index
+from utils.purchase_import import (
+    bulk_insert_purchases,
+    import_capabilities,
+    recent_import_batches,
+    revert_import_batch,
+)
+from views.reports.audit_log import log_event
+
+
+# Batches with at least this many lines are saved by the background worker
+ASYNC_MIN_LINES = 2000
 
 # CMS canonical fields for CSV imports. Admin-configured profiles map
 # each CSV's real header text to one of these.
@@ -47,87 +70,6 @@ _FALLBACK_CSV_COL = {
 }
 
 
-def _normalize_name(s):
-    """Normalize a name for fuzzy matching: full-width → half-width ASCII,
-    strip whitespace (incl. 全角), lowercase alphanumerics."""
-    if not s:
-        return ""
-    out = []
-    for ch in s:
-        code = ord(ch)
-        if 0xFF10 <= code <= 0xFF19:       # ０-９
-            out.append(chr(code - 0xFEE0))
-        elif 0xFF21 <= code <= 0xFF3A:     # Ａ-Ｚ
-            out.append(chr(code - 0xFEE0).lower())
-        elif 0xFF41 <= code <= 0xFF5A:     # ａ-ｚ
-            out.append(chr(code - 0xFEE0))
-        elif ch in (" ", "　", "\t"):
-            continue
-        else:
-            out.append(ch.lower() if ch.isascii() else ch)
-    return "".join(out)
-
-
-def _fuzzy_match_supplier(csv_name, suppliers):
-    """Match a CSV supplier name to a master supplier row. None if no match."""
-    n = _normalize_name(csv_name)
-    if not n:
-        return None
-    for s in suppliers:
-        if _normalize_name(s["name"]) == n:
-            return s
-    for s in suppliers:
-        sn = _normalize_name(s["name"])
-        if sn and (sn in n or n in sn):
-            return s
-    return None
-
-
-def _load_store_aliases(db, company_id):
-    """Fetch {normalized_alias: store_id} for the given company. Cached on g
-    per request. Returns empty dict on missing table (pre-migration)."""
-    cache_attr = f"_store_aliases_{company_id}"
-    cached = getattr(g, cache_attr, None)
-    if cached is not None:
-        return cached
-    try:
-        rows = db.execute(
-            """
-            SELECT normalized_alias, store_id
-            FROM mst_store_aliases
-            WHERE company_id = %s
-            """,
-            (company_id,),
-        ).fetchall()
-        result = {r["normalized_alias"]: r["store_id"] for r in rows}
-    except Exception:
-        try: db.connection.rollback()
-        except Exception: pass
-        result = {}
-    setattr(g, cache_attr, result)
-    return result
-
-
-def _fuzzy_match_store(csv_place, stores, company_id, db=None):
-    """Match a CSV 納品場所 to a store.
-    1) Normalized-exact against mst_store_aliases (DB).
-    2) Substring match on store.name.
-    """
-    n = _normalize_name(csv_place)
-    if not n:
-        return None
-    if db is not None and company_id:
-        alias_map = _load_store_aliases(db, company_id)
-        if n in alias_map:
-            sid = alias_map[n]
-            return next((s for s in stores if s["id"] == sid), None)
-    for s in stores:
-        sn = _normalize_name(s["name"])
-        if sn and (sn in n or n in sn):
-            return s
-    return None
-
-
 def _load_csv_profiles(db, company_id):
     """Return active CSV import profiles for the company.
 
@@ -212,28 +154,11 @@ def _detect_csv_profile(header_row, profiles):
     return (None, None)
 
 
-def _parse_csv_date(raw):
-    """Accept 'YYYY/MM/DD' or 'YYYY-MM-DD'. Return ISO 'YYYY-MM-DD' or ''."""
-    if not raw:
-        return ""
-    raw = raw.strip()
-    m = re.match(r"^(\d{4})[/\-](\d{1,2})[/\-](\d{1,2})$", raw)
-    if not m:
-        return ""
-    y, mo, d = int(m.group(1)), int(m.group(2)), int(m.group(3))
-    return f"{y:04d}-{mo:02d}-{d:02d}"
-
-
-def _parse_int(raw, default=0):
-    if raw is None or raw == "":
-        return default
-    try:
-        return int(str(raw).replace(",", "").strip())
-    except ValueError:
-        return default
+def _ndjson(obj):
+    return json.dumps(obj, ensure_ascii=False, default=str) + "\n"
 
 
-def init_delivery_paste_views(app, get_db):
+def init_delivery_paste_views(app, get_db, log_purchase_changes):
 
     # ── GET: show paste screen ────────────────────────────────────────────────
     @app.route("/pur/delivery_paste", methods=["GET"], endpoint="delivery_paste")
@@ -302,22 +227,19 @@ def init_delivery_paste_views(app, get_db):
             return jsonify({"error": "ファイルが選択されていません。"}), 400
 
         # Decode: シーニュ/尾家産業 CSVs are cp932 (Shift-JIS + MS extensions).
-        raw = f.read()
-        try:
-            text = raw.decode("cp932")
-        except UnicodeDecodeError:
-            try:
-                text = raw.decode("utf-8-sig")
-            except UnicodeDecodeError:
-                return jsonify({"error": "文字コードを判定できませんでした（Shift-JIS または UTF-8 のみ対応）。"}), 400
-
-        reader = csv.reader(io.StringIO(text))
-        rows = list(reader)
-        if len(rows) < 2:
+        # The upload is read in chunks from here on — never as one string.
+        stream = f.stream
+        encoding = detect_encoding(stream)
+        if encoding is None:
+            return jsonify({"error": "文字コードを判定できませんでした（Shift-JIS または UTF-8 のみ対応）。"}), 400
+
+        reader = csv.reader(iter_text_lines(stream, encoding))
+        header = next(reader, None)
+        first = next(reader, None)
+        if header is None or first is None:
             return jsonify({"error": "CSVが空、またはヘッダー行のみです。"}), 400
 
         # Detect which admin-configured profile matches this CSV's header row.
-        header = rows[0]
         profiles = _load_csv_profiles(db, company_id)
         if not profiles:
             # Pre-migration fallback: the original hardcoded column map.
@@ -359,73 +281,78 @@ def init_delivery_paste_views(app, get_db):
         stores = get_accessible_stores()
         stores_list = [dict(r) for r in stores]
 
-        def col(row, field):
-            idx = col_map.get(field)
-            if idx is None or idx >= len(row):
-                return ""
-            return row[idx]
-
-        # Group rows by 伝票NO. — when invoice_no column is blank, the row
-        # belongs to the previous invoice. When non-blank, it starts a new one.
-        invoices = []
-        current = None
-        max_col = max(col_map.values()) if col_map else 0
-        for row in rows[1:]:
-            if len(row) <= max_col:
-                continue
-            inv_no = (col(row, "invoice_no") or "").strip()
-            if inv_no:
-                if current:
-                    invoices.append(current)
-                csv_supplier = (col(row, "supplier_name") or "").strip()
-                csv_place    = (col(row, "delivery_place") or "").strip()
-                delivery     = _parse_csv_date(col(row, "delivery_date"))
-                matched_supplier = _fuzzy_match_supplier(csv_supplier, suppliers_list)
-                matched_store    = _fuzzy_match_store(csv_place, stores_list, company_id, db=db)
-                current = {
-                    "invoice_no":      inv_no,
-                    "csv_supplier":    csv_supplier,
-                    "csv_place":       csv_place,
-                    "invoice_date":    _parse_csv_date(col(row, "invoice_date")),
-                    "delivery_date":   delivery,
-                    "supplier_id":     matched_supplier["id"] if matched_supplier else None,
-                    "supplier_name":   matched_supplier["name"] if matched_supplier else None,
-                    "store_id":        matched_store["id"] if matched_store else None,
-                    "store_name":      matched_store["name"] if matched_store else None,
-                    "items":           [],
-                    "existing_count":  0,
-                }
-            if current is None:
-                continue
-            name = (col(row, "item_name") or "").strip()
-            if not name:
-                continue
-            current["items"].append({
-                "item_name":    name,
-                "item_code":    (col(row, "item_code") or "").strip(),
-                "unit":         (col(row, "unit") or "").strip(),
-                "unit_price":   _parse_int(col(row, "unit_price")),
-                "quantity":     _parse_int(col(row, "quantity")),
-                "line_amount":  _parse_int(col(row, "line_amount")),
-            })
-        if current:
-            invoices.append(current)
-
-        # Duplicate check per invoice: any existing purchase for
-        # (store, supplier, delivery_date) means "already saved".
-        for inv in invoices:
-            if inv["store_id"] and inv["supplier_id"] and inv["delivery_date"]:
-                dup = db.execute(
-                    """
-                    SELECT COUNT(*) AS n
-                    FROM purchases
-                    WHERE store_id = %s AND supplier_id = %s
-                      AND delivery_date = %s AND is_deleted = 0
-                    """,
-                    (inv["store_id"], inv["supplier_id"], inv["delivery_date"]),
-                ).fetchone()
-                inv["existing_count"] = int(dup["n"] or 0) if dup else 0
+        # Master matching goes through the company's cached name indexes
+        # (utils/name_match.py); store matches are limited to the user's
+        # accessible stores.
+        supplier_index = get_name_index(db, company_id, "suppliers")
+        store_index    = get_name_index(db, company_id, "stores")
+        item_index     = get_name_index(db, company_id, "items")
+        store_ids      = {s["id"] for s in stores_list}
+
+        def matched(invoices):
+            for inv in invoices:
+                sup = supplier_index.match(inv["csv_supplier"])
+                st  = store_index.match(inv["csv_place"], allowed=store_ids)
+                sup = sup[0] if sup else None
+                st  = st[0] if st else None
+                inv["supplier_id"]   = sup["id"] if sup else None
+                inv["supplier_name"] = sup["name"] if sup else None
+                inv["store_id"]      = st["id"] if st else None
+                inv["store_name"]    = st["name"] if st else None
+                supplier_id = inv["supplier_id"]
+                for it in inv["items"]:
+                    hit = item_index.match(
+                        it["item_name"], code=it["item_code"],
+                        prefer=lambda e: e["supplier_id"] == supplier_id,
+                        min_similarity=ITEM_MIN_SIMILARITY,
+                    )
+                    it["item_id"]    = hit[0]["id"] if hit else None
+                    it["item_match"] = hit[1] if hit else None
+                yield inv
+
+        # rows → invoices (grouped by 伝票NO.) → master match → chunked
+        # duplicate check; nothing upstream of one invoice is held.
+        stats = {}
+        invoices = with_existing_counts(
+            db, matched(iter_invoices(itertools.chain([first], reader), col_map, stats)),
+            by_invoice_no=import_capabilities(db)["invoice_no"],
+        )
 
+        if request.args.get("format") == "ndjson":
+            def generate():
+                started = time.perf_counter()
+                yield _ndjson({
+                    "type":          "meta",
+                    "suppliers":     suppliers_list,
+                    "stores":        stores_list,
+                    "profile_name":  profile_name,
+                })
+                n_invoices = 0
+                n_items = 0
+                try:
+                    for inv in invoices:
+                        n_invoices += 1
+                        n_items += len(inv["items"])
+                        yield _ndjson({"type": "invoice", **inv})
+                except csv.Error as e:
+                    yield _ndjson({"type": "error", "error": f"CSVの解析に失敗しました: {e}"})
+                    return
+                yield _ndjson({
+                    "type":      "summary",
+                    "invoices":  n_invoices,
+                    "items":     n_items,
+                    "lines":     stats.get("lines", 0),
+                    "elapsed_ms": round((time.perf_counter() - started) * 1000.0, 1),
+                })
+
+            return Response(stream_with_context(generate()),
+                            mimetype="application/x-ndjson",
+                            headers={"Cache-Control": "no-store"})
+
+        try:
+            invoices = list(invoices)
+        except csv.Error as e:
+            return jsonify({"error": f"CSVの解析に失敗しました: {e}"}), 400
         return jsonify({
             "invoices":      invoices,
             "suppliers":     suppliers_list,
@@ -458,41 +385,14 @@ def init_delivery_paste_views(app, get_db):
             flash("保存するデータがありません。品目マスタを選択してください。")
             return redirect(url_for("delivery_paste"))
 
-        inserted = 0
-        skipped  = 0
-
+        current_user = getattr(g, "current_user", None) or {}
         try:
-            for row in rows:
-                item_id    = row.get("item_id")
-                quantity   = row.get("quantity", 0)
-                unit_price = row.get("unit_price", 0)
-
-                if not item_id or not quantity:
-                    skipped += 1
-                    continue
-
-                amount = int(quantity) * int(unit_price)
-
-                db.execute(
-                    """
-                    INSERT INTO purchases
-                        (store_id, supplier_id, item_id,
-                         delivery_date, quantity, unit_price, amount, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        store_id,
-                        int(supplier_id),
-                        int(item_id),
-                        delivery_date,
-                        int(quantity),
-                        int(unit_price),
-                        amount,
-                        datetime.now().isoformat(timespec="seconds"),
-                    ),
-                )
-                inserted += 1
-
+            result = bulk_insert_purchases(
+                db, company_id,
+                [{"store_id": store_id, "supplier_id": supplier_id,
+                  "delivery_date": delivery_date, "rows": rows}],
+                source="paste", user_id=current_user.get("id"),
+            )
             db.commit()
 
         except Exception as e:
@@ -500,6 +400,11 @@ def init_delivery_paste_views(app, get_db):
             flash(f"保存中にエラーが発生しました: {e}")
             return redirect(url_for("delivery_paste"))
 
+        touch_item_frequency(db, result["touched"])
+        touch_item_spend(db, result["touched"])
+        inserted = result["inserted"]
+        skipped  = result["skipped"]
+
         if inserted == 0:
             flash("⚠️ 保存できる行がありませんでした。品目マスタの選択を確認してください。")
         else:
@@ -507,3 +412,122 @@ def init_delivery_paste_views(app, get_db):
                   + (f"（{skipped}件スキップ）" if skipped else ""))
 
         return redirect(url_for("new_purchase"))
+
+    # ── POST: save a whole CSV file (all confirmed invoices) as one batch ────
+    @app.route("/pur/delivery_paste/save_batch", methods=["POST"],
+               endpoint="delivery_paste_save_batch")
+    def delivery_paste_save_batch():
+        db         = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        if not company_id:
+            return jsonify({"error": "No company context"}), 400
+
+        from utils.access_scope import normalize_accessible_store_id
+
+        payload  = request.get_json(silent=True) or {}
+        invoices = payload.get("invoices") or []
+        if not invoices:
+            return jsonify({"error": "保存する伝票がありません。"}), 400
+
+        for inv in invoices:
+            label = inv.get("invoice_no") or "?"
+            if not inv.get("supplier_id") or not inv.get("delivery_date"):
+                return jsonify({"error": f"伝票 #{label}: 仕入先と納品日は必須です。"}), 400
+            store_id = normalize_accessible_store_id(inv.get("store_id"))
+            if store_id is None:
+                return jsonify({"error": f"伝票 #{label}: 店舗を選択してください。"}), 400
+            inv["store_id"] = store_id
+
+        current_user = getattr(g, "current_user", None) or {}
+
+        # Large batches go to the background worker; the page polls the job
+        lines = sum(len(inv.get("rows") or []) for inv in invoices)
+        if lines >= ASYNC_MIN_LINES and jobs_available(db):
+            try:
+                job_id = enqueue_job(
+                    db, "delivery_import",
+                    {"invoices": invoices, "file_name": payload.get("file_name") or None},
+                    company_id=company_id, user_id=current_user.get("id"),
+                )
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                return jsonify({"error": f"保存の登録に失敗しました: {e}"}), 500
+            print(f"[delivery_paste] queued job={job_id} "
+                  f"invoices={len(invoices)} lines={lines}")
+            return jsonify({"ok": True, "queued": True, "job_id": job_id,
+                            "status_url": url_for("api_job_status", job_id=job_id)})
+
+        try:
+            result = bulk_insert_purchases(
+                db, company_id, invoices,
+                source="csv",
+                file_name=(payload.get("file_name") or None),
+                user_id=current_user.get("id"),
+            )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            return jsonify({"error": f"保存中にエラーが発生しました: {e}"}), 500
+
+        touched = result.pop("touched")
+        touch_item_frequency(db, touched)
+        touch_item_spend(db, touched)
+        print(f"[delivery_paste] batch={result['batch_id']} "
+              f"invoices={result['invoices']} lines={result['lines']} "
+              f"inserted={result['inserted']} timings={result['timings']}")
+        return jsonify({"ok": True, **result})
+
+    # ── GET: recent import batches (JSON) ────────────────────────────────────
+    @app.route("/pur/delivery_paste/batches", methods=["GET"],
+               endpoint="delivery_paste_batches")
+    def delivery_paste_batches():
+        db         = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        if not company_id:
+            return jsonify({"error": "No company context"}), 400
+        return jsonify({"batches": recent_import_batches(db, company_id)})
+
+    # ── POST: revert (soft-delete) every purchase of one import batch ────────
+    @app.route("/pur/delivery_paste/batches/<int:batch_id>/revert", methods=["POST"],
+               endpoint="delivery_paste_batch_revert")
+    def delivery_paste_batch_revert(batch_id):
+        db         = get_db()
+        company_id = getattr(g, "current_company_id", None)
+        if not company_id:
+            return jsonify({"error": "No company context"}), 400
+
+        current_user = getattr(g, "current_user", None) or {}
+        try:
+            result = revert_import_batch(db, company_id, batch_id,
+                                         user_id=current_user.get("id"))
+            if result is None:
+                db.rollback()
+                return jsonify({"error": "取込履歴が見つかりません。"}), 404
+            deleted = result.pop("rows")
+            if deleted:
+                log_purchase_changes(
+                    db,
+                    [(r["id"], "DELETE", r, None) for r in deleted],
+                    changed_by=current_user.get("id"),
+                )
+                log_event(
+                    db,
+                    action="REVERT",
+                    module="pur",
+                    entity_table="pur_import_batches",
+                    entity_id=str(batch_id),
+                    message=f"Import batch reverted ({len(deleted)} purchases)",
+                    status_code=200,
+                    company_id=company_id,
+                    meta={"reverted": len(deleted)},
+                )
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            return jsonify({"error": f"取消中にエラーが発生しました: {e}"}), 500
+
+        touched = result.pop("touched")
+        touch_item_frequency(db, touched)
+        touch_item_spend(db, touched)
+        return jsonify({"ok": True, **result})
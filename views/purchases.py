@@ -1,6 +1,6 @@
 # views/purchases.py
 
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from flask import (
     render_template,
@@ -16,15 +16,113 @@ from utils.access_scope import (
     get_accessible_store_ids,
     normalize_accessible_store_id,
 )
+from utils.item_frequency import touch_item_frequency
+from utils.item_spend import fetch_item_picker, touch_item_spend
 
 
+RECENT_PAGE_SIZE = 50
 
-def init_purchase_views(app, get_db, log_purchase_change):
+
+def _fetch_recent_purchases(db, store_id, company_id, supplier_id, from_date,
+                            to_date, search_q, after=None, limit=RECENT_PAGE_SIZE):
+    """
+    直近仕入れ一覧の 1 ページ分（新しい順）。
+
+    キーセット方式：並び順は (delivery_date DESC, id DESC)、after は前ページ
+    最終行の "YYYY-MM-DD:id"。件数に関係なく 1 ページ目は
+    ix_pur_purchases__store_recent の先頭から読むだけで済む。
+
+    キーワードは品目名・品目コード・仕入先名の部分一致（大文字小文字無視）。
+    先に該当する品目 / 仕入先 ID を pg_trgm の GIN インデックスで引き、
+    purchases 側は ID で絞る（migrate_20261019_purchase_list.sql）。
+
+    Returns (rows, next_cursor) — next_cursor は最終ページなら None。
+    """
+    where_clauses = [
+        "p.is_deleted = 0",
+        "p.store_id = %s",
+    ]
+    params = [store_id]
+
+    if company_id:
+        where_clauses.append("p.company_id = %s")
+        params.append(company_id)
+
+    if supplier_id:
+        where_clauses.append("p.supplier_id = %s")
+        params.append(supplier_id)
+
+    if from_date:
+        where_clauses.append("p.delivery_date >= %s")
+        params.append(from_date)
+
+    if to_date:
+        where_clauses.append("p.delivery_date <= %s")
+        params.append(to_date)
+
+    if search_q:
+        like = "%" + search_q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        where_clauses.append(
+            """(
+                p.item_id IN (
+                    SELECT mi.id FROM mst_items mi
+                    WHERE mi.name ILIKE %s OR mi.code ILIKE %s
+                )
+                OR p.supplier_id IN (
+                    SELECT ms.id FROM pur_suppliers ms
+                    WHERE ms.name ILIKE %s
+                )
+            )"""
+        )
+        params.extend([like, like, like])
+
+    if after:
+        try:
+            after_date, after_id = after.rsplit(":", 1)
+            after_date = date.fromisoformat(after_date)
+            after_id = int(after_id)
+        except ValueError:
+            return [], None
+        where_clauses.append("(p.delivery_date, p.id) < (%s::date, %s)")
+        params.extend([after_date, after_id])
+
+    where_sql = "WHERE " + " AND ".join(where_clauses)
+
+    rows = db.execute(
+        f"""
+        SELECT
+            p.id,
+            p.delivery_date,
+            st.name AS store_name,
+            s.name  AS supplier_name,
+            i.name  AS item_name,
+            p.quantity,
+            p.unit_price,
+            p.amount
+        FROM pur_purchases p
+        LEFT JOIN pur_suppliers   s  ON p.supplier_id = s.id
+        LEFT JOIN mst_items   i  ON p.item_id     = i.id
+        LEFT JOIN mst_stores  st ON p.store_id    = st.id
+        {where_sql}
+        ORDER BY p.delivery_date DESC, p.id DESC
+        LIMIT %s
+        """,
+        params + [limit + 1],
+    ).fetchall()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, f"{last['delivery_date']}:{last['id']}"
+
+
+def init_purchase_views(app, get_db, log_purchase_change, log_purchase_changes):
     """
     app.py 側から呼び出してルートを登録する初期化関数。
 
         from views.purchases import init_purchase_views
-        init_purchase_views(app, get_db, log_purchase_change)
+        init_purchase_views(app, get_db, log_purchase_change, log_purchase_changes)
 
     という形で使います。
     """
@@ -108,8 +206,7 @@ def init_purchase_views(app, get_db, log_purchase_change):
                 except ValueError:
                     return 0
 
-            any_inserted = False
-
+            lines = []
             for i in range(1, row_count + 1):
                 item_id = request.form.get(f"item_id_{i}") or ""
                 qty_raw = request.form.get(f"quantity_{i}") or ""
@@ -128,16 +225,15 @@ def init_purchase_views(app, get_db, log_purchase_change):
                     # その行だけスキップ
                     continue
 
-                # INSERT（★RETURNING id）
-                cur = db.execute(
-                    """
-                    INSERT INTO purchases
-                      (store_id, supplier_id, item_id,
-                       delivery_date, quantity, unit_price, amount, created_at)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    RETURNING id
-                    """,
-                    (
+                lines.append((item_id, qty_val, unit_price_val, amount_val))
+
+            if lines:
+                # 全明細を 1 本の複数行 INSERT で登録し、RETURNING * の結果を
+                # そのまま CREATE ログ（purchase_logs / 監査ログ）に使う
+                created_at = datetime.now().isoformat(timespec="seconds")
+                params = []
+                for item_id, qty_val, unit_price_val, amount_val in lines:
+                    params += [
                         store_id,
                         header_supplier_id,
                         item_id,
@@ -145,33 +241,30 @@ def init_purchase_views(app, get_db, log_purchase_change):
                         qty_val,
                         unit_price_val,
                         amount_val,
-                        datetime.now().isoformat(timespec="seconds"),
-                    ),
-                )
-
-                row = cur.fetchone()
-                new_id = row["id"]
-
-                # ログ用に新レコードを読み直し
-                new_row = db.execute(
-                    "SELECT * FROM purchases WHERE id = %s",
-                    (new_id,),
-                ).fetchone()
+                        created_at,
+                    ]
+                new_rows = db.execute(
+                    """
+                    INSERT INTO purchases
+                      (store_id, supplier_id, item_id,
+                       delivery_date, quantity, unit_price, amount, created_at)
+                    VALUES
+                    """
+                    + ",\n".join(["(%s, %s, %s, %s, %s, %s, %s, %s)"] * len(lines))
+                    + "\nRETURNING *",
+                    params,
+                ).fetchall()
 
-                # CREATE ログを記録
-                log_purchase_change(
+                log_purchase_changes(
                     db,
-                    purchase_id=new_id,
-                    action="CREATE",
-                    old_row=None,
-                    new_row=new_row,
+                    [(r["id"], "CREATE", None, r) for r in new_rows],
                     changed_by=None,
                 )
 
-                any_inserted = True
-
-            if any_inserted:
                 db.commit()
+                touched = [(store_id, r["item_id"]) for r in new_rows]
+                touch_item_frequency(db, touched)
+                touch_item_spend(db, touched)
                 flash("取引を登録しました。")
             else:
                 flash("登録対象の行がありません。")
@@ -217,56 +310,17 @@ def init_purchase_views(app, get_db, log_purchase_change):
         # Prevents leaking other stores' data to operators whose grant
         # covers only a subset of the company.
         if not selected_store_id:
-            purchases = []
+            purchases, next_cursor = [], None
         else:
-            where_clauses = [
-                "p.is_deleted = 0",
-                "p.store_id = %s",
-            ]
-            params = [selected_store_id]
-
-            company_id = getattr(g, "current_company_id", None)
-            if company_id:
-                where_clauses.append("st.company_id = %s")
-                params.append(company_id)
-
-            if supplier_id:
-                where_clauses.append("p.supplier_id = %s")
-                params.append(supplier_id)
-
-            if from_date:
-                where_clauses.append("p.delivery_date >= %s")
-                params.append(from_date)
-
-            if to_date:
-                where_clauses.append("p.delivery_date <= %s")
-                params.append(to_date)
-
-            if search_q:
-                where_clauses.append("(i.name LIKE %s OR s.name LIKE %s OR i.code LIKE %s)")
-                like = f"%{search_q}%"
-                params.extend([like, like, like])
-
-            where_sql = "WHERE " + " AND ".join(where_clauses)
-
-            sql = f"""
-                SELECT
-                    p.id,
-                    p.delivery_date,
-                    st.name AS store_name,
-                    s.name  AS supplier_name,
-                    i.name  AS item_name,
-                    p.quantity,
-                    p.unit_price,
-                    p.amount
-                FROM purchases p
-                LEFT JOIN pur_suppliers   s  ON p.supplier_id = s.id
-                LEFT JOIN mst_items   i  ON p.item_id     = i.id
-                LEFT JOIN mst_stores  st ON p.store_id    = st.id
-                {where_sql}
-                ORDER BY p.delivery_date DESC, p.id DESC
-            """
-            purchases = db.execute(sql, params).fetchall()
+            purchases, next_cursor = _fetch_recent_purchases(
+                db,
+                store_id=selected_store_id,
+                company_id=getattr(g, "current_company_id", None),
+                supplier_id=supplier_id,
+                from_date=from_date,
+                to_date=to_date,
+                search_q=search_q,
+            )
 
         return render_template(
             "pur/purchase_form.html",
@@ -279,51 +333,70 @@ def init_purchase_views(app, get_db, log_purchase_change):
             from_date=from_date,
             to_date=to_date,
             search_q=search_q,
+            next_cursor=next_cursor,
+        )
+
+    # ----------------------------------------
+    # API: 直近仕入れ一覧の続き（無限スクロール）
+    # /api/purchases/recent?store_id=&supplier_id=&from_date=&to_date=&q=&after=
+    # ----------------------------------------
+    @app.route("/api/purchases/recent")
+    def api_recent_purchases():
+        db = get_db()
+        store_id = normalize_accessible_store_id(request.args.get("store_id"))
+        if not store_id:
+            return jsonify({"rows": [], "next_cursor": None})
+
+        rows, next_cursor = _fetch_recent_purchases(
+            db,
+            store_id=store_id,
+            company_id=getattr(g, "current_company_id", None),
+            supplier_id=request.args.get("supplier_id") or "",
+            from_date=request.args.get("from_date") or "",
+            to_date=request.args.get("to_date") or "",
+            search_q=(request.args.get("q") or "").strip(),
+            after=request.args.get("after") or None,
         )
+        return jsonify({
+            "rows": [
+                {
+                    "id": r["id"],
+                    "delivery_date": str(r["delivery_date"]),
+                    "store_name": r["store_name"],
+                    "supplier_name": r["supplier_name"],
+                    "item_name": r["item_name"],
+                    "quantity": r["quantity"],
+                    "unit_price": r["unit_price"],
+                    "amount": r["amount"],
+                }
+                for r in rows
+            ],
+            "next_cursor": next_cursor,
+        })
     
     # ----------------------------------------
-    # API: 仕入先に紐づく品目一覧を返す
+    # API: 仕入先に紐づく品目一覧を返す（90日仕入額順・前回単価つき）
     # /api/mst_items/by_supplier/<supplier_id>
     # ----------------------------------------
     @app.route("/api/mst_items/by_supplier/<int:supplier_id>")
     def api_items_by_supplier(supplier_id):
+        """Item picker for the entry form, ranked by 90-day spend.
+        Precomputed + cached per worker (utils/item_spend.py); ETag'd when
+        served from the precomputed table."""
         db = get_db()
         company_id = getattr(g, "current_company_id", None)
-        rows = db.execute(
-            """
-            SELECT
-                i.id,
-                i.code,
-                i.name,
-                i.unit,
-                COALESCE(SUM(p.amount), 0) AS total_amount
-            FROM mst_items i
-            LEFT JOIN purchases p
-                ON p.item_id = i.id
-                AND p.supplier_id = i.supplier_id
-                AND p.delivery_date >= CURRENT_DATE - INTERVAL '3 months'
-                AND p.is_deleted = 0
-            WHERE i.supplier_id = %s
-              AND i.is_active = 1
-              AND i.company_id = %s
-            GROUP BY i.id, i.code, i.name, i.unit
-            ORDER BY total_amount DESC, i.name ASC;
-            """,
-            (supplier_id, company_id),
-        ).fetchall()
+        if not company_id:
+            return jsonify([])
 
-        return jsonify(
-            [
-                {
-                    "id": r["id"],
-                    "code": r["code"],
-                    "name": r["name"],
-                    "unit": r["unit"],
-                    "total_amount": r["total_amount"],
-                }
-                for r in rows
-            ]
-        )
+        rows, etag = fetch_item_picker(db, company_id, supplier_id)
+        if etag and request.if_none_match.contains(etag):
+            resp = app.response_class(status=304)
+        else:
+            resp = jsonify(rows)
+        if etag:
+            resp.set_etag(etag)
+            resp.headers["Cache-Control"] = "private, no-cache"
+        return resp
 
     # ----------------------------------------
     # 取引編集・削除（ソフトデリート対応）
@@ -406,6 +479,9 @@ def init_purchase_views(app, get_db, log_purchase_change):
                 )
 
                 db.commit()
+                touched = [(old_row["store_id"], old_row["item_id"])]
+                touch_item_frequency(db, touched)
+                touch_item_spend(db, touched)
                 flash("取引を削除しました。")
 
                 return redirect(
@@ -491,6 +567,12 @@ def init_purchase_views(app, get_db, log_purchase_change):
             )
 
             db.commit()
+            touched = [
+                (old_row["store_id"], old_row["item_id"]),
+                (store_id, item_id),
+            ]
+            touch_item_frequency(db, touched)
+            touch_item_spend(db, touched)
             flash("取引を更新しました。")
 
             return redirect(url_for("new_purchase", store_id=store_id))
@@ -16,6 +16,28 @@ def log_event(
     company_id=None,
     status_code=None,
 ):
+    log_events(db, [{
+        "action": action,
+        "module": module,
+        "entity_table": entity_table,
+        "entity_id": entity_id,
+        "message": message,
+        "old_data": old_data,
+        "new_data": new_data,
+        "meta": meta,
+        "store_id": store_id,
+        "company_id": company_id,
+        "status_code": status_code,
+    }])
+
+
+def log_events(db, events):
+    """Write several sys_work_logs rows (dicts with log_event's keyword
+    arguments) in one multi-row INSERT. Actor and request columns are
+    shared by all rows."""
+    if not events:
+        return
+
     # actor from auth loader (views/auth/login.py before_request)
     cu = getattr(g, "current_user", None)
     actor_user_id = cu.get("id") if cu else None
@@ -26,11 +48,34 @@ def log_event(
     session_id = session.get("session_token") if hasattr(session, "get") else None
 
     # company default (optional)
-    if company_id is None:
-        company_id = getattr(g, "current_company_id", None)
+    default_company_id = getattr(g, "current_company_id", None)
 
     request_id = getattr(g, "request_id", None)
+    ip = request.headers.get("X-Forwarded-For", request.remote_addr)
+    user_agent = request.headers.get("User-Agent")
 
+    def dumps(v):
+        return json.dumps(v, ensure_ascii=False) if v is not None else None
+
+    params = []
+    for ev in events:
+        company_id = ev.get("company_id")
+        entity_id = ev.get("entity_id")
+        params += [
+            company_id if company_id is not None else default_company_id,
+            ev.get("store_id"),
+            actor_user_id, actor_email, actor_name,
+            request_id, session_id,
+            request.method, request.path, ev.get("status_code"), ip, user_agent,
+            ev["action"], ev.get("module"), ev.get("entity_table"),
+            str(entity_id) if entity_id is not None else None, ev.get("message"),
+            dumps(ev.get("old_data")), dumps(ev.get("new_data")), dumps(ev.get("meta")),
+        ]
+
+    row_sql = (
+        "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,"
+        " %s::jsonb, %s::jsonb, %s::jsonb)"
+    )
     db.execute(
         """
         INSERT INTO sys_work_logs
@@ -40,23 +85,6 @@ def log_event(
            action, module, entity_table, entity_id, message,
            old_data, new_data, meta)
         VALUES
-          (%s, %s,
-           %s, %s, %s,
-           %s, %s, %s, %s, %s, %s, %s,
-           %s, %s, %s, %s, %s,
-           %s::jsonb, %s::jsonb, %s::jsonb)
-        """,
-        [
-            company_id, store_id,
-            actor_user_id, actor_email, actor_name,
-            request_id, session_id,
-            request.method, request.path, status_code,
-            request.headers.get("X-Forwarded-For", request.remote_addr),
-            request.headers.get("User-Agent"),
-            action, module, entity_table,
-            str(entity_id) if entity_id is not None else None, message,
-            json.dumps(old_data, ensure_ascii=False) if old_data is not None else None,
-            json.dumps(new_data, ensure_ascii=False) if new_data is not None else None,
-            json.dumps(meta, ensure_ascii=False) if meta is not None else None,
-        ],
-    )
\ No newline at end of file
+        """ + ",\n".join([row_sql] * len(events)),
+        params,
+    )
@@ -87,13 +87,12 @@ def cost_report():
         SELECT
           TO_CHAR(p.delivery_date, 'YYYY-MM') AS ym,
           SUM(p.amount) AS total_amount
-        FROM purchases p
-        LEFT JOIN mst_stores st ON p.store_id = st.id
+        FROM pur_purchases p
         WHERE p.delivery_date >= %s
           AND p.delivery_date < %s
           AND p.is_deleted = 0
           AND p.store_id = %s
-          AND st.company_id = %s
+          AND p.company_id = %s
         GROUP BY ym
         """,
         [start_date, end_date, selected_store_id, company_id],
@@ -120,12 +119,11 @@ def cost_report():
                 PARTITION BY sc.store_id, sc.item_id, TO_CHAR(sc.count_date, 'YYYY-MM')
                 ORDER BY sc.count_date DESC, sc.id DESC
               ) AS rn
-            FROM stock_counts sc
-            LEFT JOIN mst_stores st ON sc.store_id = st.id
+            FROM inv_stock_counts sc
             WHERE sc.count_date >= %s
               AND sc.count_date < %s
               AND sc.store_id = %s
-              AND st.company_id = %s
+              AND sc.company_id = %s
         ),
         end_stock AS (
             SELECT
@@ -153,13 +151,11 @@ def cost_report():
                 ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW
               ) AS running_qty
             FROM end_stock e
-            JOIN purchases p
+            JOIN pur_purchases p
               ON p.store_id = e.store_id
              AND p.item_id = e.item_id
              AND p.delivery_date <= e.count_date
-            JOIN mst_stores stp
-              ON p.store_id = stp.id
-             AND stp.company_id = %s
+             AND p.company_id = %s
         ),
         fifo_layers AS (
             SELECT
@@ -139,14 +139,13 @@ def integrated_report():
             TO_CHAR(p.delivery_date, 'YYYY-MM') AS ym,
             SUM(p.quantity) AS qty,
             SUM(p.amount)   AS amount
-        FROM purchases p
+        FROM pur_purchases p
         JOIN mst_items i ON p.item_id = i.id
-        LEFT JOIN mst_stores st ON p.store_id = st.id
         WHERE p.is_deleted = 0
           AND p.delivery_date >= %s
           AND p.delivery_date < %s
           AND p.store_id = %s
-          AND st.company_id = %s
+          AND p.company_id = %s
     """
     pur_params: list = [start_date, end_date, selected_store_id, company_id]
     if selected_supplier_id:
@@ -106,13 +106,12 @@ def purchase_dashboard():
     supplier_data = db.execute(
         """
         SELECT s.name AS label, SUM(p.amount) AS total
-        FROM purchases p
+        FROM pur_purchases p
         JOIN pur_suppliers s ON p.supplier_id = s.id
-        LEFT JOIN mst_stores st ON p.store_id = st.id
         WHERE p.is_deleted = 0
           AND p.delivery_date >= %s
           AND p.delivery_date < %s
-          AND st.company_id = %s
+          AND p.company_id = %s
           AND p.store_id = %s
         GROUP BY s.id, s.name
         ORDER BY total DESC
@@ -124,13 +123,12 @@ def purchase_dashboard():
     category_data = db.execute(
         """
         SELECT COALESCE(i.category, '未分類') AS label, SUM(p.amount) AS total
-        FROM purchases p
+        FROM pur_purchases p
         JOIN mst_items i ON p.item_id = i.id
-        LEFT JOIN mst_stores st ON p.store_id = st.id
         WHERE p.is_deleted = 0
           AND p.delivery_date >= %s
           AND p.delivery_date < %s
-          AND st.company_id = %s
+          AND p.company_id = %s
           AND p.store_id = %s
         GROUP BY label
         ORDER BY total DESC
@@ -142,13 +140,12 @@ def purchase_dashboard():
     process_data = db.execute(
         """
         SELECT COALESCE(i.process_level, '未設定') AS label, SUM(p.amount) AS total
-        FROM purchases p
+        FROM pur_purchases p
         JOIN mst_items i ON p.item_id = i.id
-        LEFT JOIN mst_stores st ON p.store_id = st.id
         WHERE p.is_deleted = 0
           AND p.delivery_date >= %s
           AND p.delivery_date < %s
-          AND st.company_id = %s
+          AND p.company_id = %s
           AND p.store_id = %s
         GROUP BY label
         ORDER BY total DESC
@@ -166,14 +163,13 @@ def purchase_dashboard():
                i.category,
                SUM(p.quantity) AS total_qty,
                SUM(p.amount) AS total_amount
-        FROM purchases p
+        FROM pur_purchases p
         JOIN mst_items i ON p.item_id = i.id
         JOIN pur_suppliers s ON p.supplier_id = s.id
-        LEFT JOIN mst_stores st ON p.store_id = st.id
         WHERE p.is_deleted = 0
           AND p.delivery_date >= %s
           AND p.delivery_date < %s
-          AND st.company_id = %s
+          AND p.company_id = %s
           AND p.store_id = %s
         GROUP BY i.id, i.code, i.name, s.name, i.category
         ORDER BY total_amount DESC
@@ -189,14 +185,16 @@ def purchase_dashboard():
         WITH latest_stock AS (
           SELECT DISTINCT ON (sc.store_id, sc.item_id)
             sc.store_id, sc.item_id, sc.counted_qty, sc.count_date
-          FROM stock_counts sc
+          FROM inv_stock_counts sc
+          WHERE sc.company_id = %s
+            AND sc.store_id = %s
           ORDER BY sc.store_id, sc.item_id, sc.count_date DESC, sc.id DESC
         ),
         purchases_after_count AS (
           SELECT ls.store_id, ls.item_id,
                  COALESCE(SUM(p.quantity), 0) AS qty_after
           FROM latest_stock ls
-          LEFT JOIN purchases p
+          LEFT JOIN pur_purchases p
             ON p.store_id = ls.store_id
            AND p.item_id  = ls.item_id
            AND p.is_deleted = 0
@@ -206,8 +204,10 @@ def purchase_dashboard():
         last_purchase AS (
           SELECT DISTINCT ON (p.store_id, p.item_id)
             p.store_id, p.item_id, p.delivery_date, p.unit_price
-          FROM purchases p
+          FROM pur_purchases p
           WHERE p.is_deleted = 0
+            AND p.company_id = %s
+            AND p.store_id = %s
           ORDER BY p.store_id, p.item_id, p.delivery_date DESC, p.id DESC
         ),
         scored AS (
@@ -228,12 +228,10 @@ def purchase_dashboard():
             ON pac.store_id = ls.store_id AND pac.item_id = ls.item_id
           JOIN mst_items i      ON i.id = ls.item_id AND i.is_active = 1
           JOIN pur_suppliers s  ON s.id = i.supplier_id
-          LEFT JOIN mst_stores st ON st.id = ls.store_id
           LEFT JOIN last_purchase lp
             ON lp.store_id = ls.store_id AND lp.item_id = ls.item_id
           WHERE (ls.counted_qty + pac.qty_after) > 0
             AND lp.delivery_date IS NOT NULL
-            AND st.company_id = %s
         )
         SELECT
           code, name, supplier_name, category,
@@ -242,11 +240,10 @@ def purchase_dashboard():
           (days_since_purchase - threshold_days) AS days_over
         FROM scored
         WHERE days_since_purchase >= threshold_days
-          AND store_id = %s
         ORDER BY days_over DESC, estimated_value DESC NULLS LAST
         LIMIT 50
         """,
-        [company_id, selected_store_id],
+        [company_id, selected_store_id, company_id, selected_store_id],
     ).fetchall()
 
     return render_template(
@@ -59,14 +59,13 @@ def purchase_report():
             s.name AS supplier_name,
             TO_CHAR(p.delivery_date, 'YYYY-MM') AS ym,
             SUM(p.amount) AS total_amount
-        FROM purchases p
+        FROM pur_purchases p
         LEFT JOIN mst_items i ON p.item_id = i.id
         LEFT JOIN pur_suppliers s ON i.supplier_id = s.id
-        LEFT JOIN mst_stores st ON p.store_id = st.id
         WHERE p.is_deleted = 0
           AND p.delivery_date >= %s
           AND p.delivery_date < %s
-          AND st.company_id = %s
+          AND p.company_id = %s
           AND p.store_id = %s
         GROUP BY s.id, s.name, ym
         ORDER BY s.id, ym
@@ -98,7 +98,7 @@ def purchase_report_supplier(supplier_id: int):
 
         company_id = getattr(g, "current_company_id", None)
         if company_id:
-            where_clauses.append("st.company_id = %s")
+            where_clauses.append("p.company_id = %s")
             params.append(company_id)
 
         if store_id:
@@ -115,9 +115,8 @@ def purchase_report_supplier(supplier_id: int):
                 TO_CHAR(p.delivery_date, 'YYYY-MM') AS ym,
                 SUM(p.quantity) AS total_qty,
                 SUM(p.amount)   AS total_amount
-            FROM purchases p
+            FROM pur_purchases p
             LEFT JOIN mst_items i ON p.item_id = i.id
-            LEFT JOIN mst_stores st ON p.store_id = st.id
             WHERE {where_sql}
             GROUP BY i.id, i.code, i.name, ym
             ORDER BY i.code, ym
@@ -84,7 +84,7 @@ def usage_report():
         "p.delivery_date >= %s",
         "p.delivery_date < %s",
         "p.is_deleted = 0",
-        "st.company_id = %s",
+        "p.company_id = %s",
         "p.store_id = %s",
     ]
     params_pur: list[object] = [start_date, end_date, company_id, selected_store_id]
@@ -98,8 +98,7 @@ def usage_report():
             p.item_id,
             TO_CHAR(p.delivery_date, 'YYYY-MM') AS ym,
             SUM(p.quantity) AS pur_qty
-        FROM purchases p
-        LEFT JOIN mst_stores st ON p.store_id = st.id
+        FROM pur_purchases p
         WHERE {' AND '.join(where_pur)}
         GROUP BY p.item_id, ym
     """
@@ -117,7 +116,7 @@ def usage_report():
     where_inv = [
         "sc.count_date >= %s",
         "sc.count_date < %s",
-        "st.company_id = %s",
+        "sc.company_id = %s",
         "sc.store_id = %s",
     ]
     params_inv: list[object] = [start_date, end_date, company_id, selected_store_id]
@@ -129,8 +128,7 @@ def usage_report():
             sc.item_id,
             TO_CHAR(sc.count_date, 'YYYY-MM') AS ym,
             MAX(sc.count_date) AS max_date
-          FROM stock_counts sc
-          LEFT JOIN mst_stores st ON sc.store_id = st.id
+          FROM inv_stock_counts sc
           WHERE {' AND '.join(where_inv)}
           GROUP BY sc.store_id, sc.item_id, ym
         )
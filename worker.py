@@ -0,0 +1,34 @@
+"""
+Background job worker — `worker: python worker.py` in the Procfile.
+
+Claims sys_jobs rows (utils/jobs.py) and runs their handlers
+(utils/job_handlers.py) outside gunicorn, so long imports and batch runs
+are not cut off by the request timeout. Scale by running more worker
+processes; SKIP LOCKED keeps them from taking the same job.
+
+Usage:
+    python worker.py                 # poll forever
+    python worker.py --once          # drain the queue, then exit
+    python worker.py --poll 5        # idle poll interval (seconds)
+
+Uses the same database selection as the app (APP_ENV / DATABASE_URL*).
+"""
+from __future__ import annotations
+
+import argparse
+
+from db import connect_db
+import utils.job_handlers  # noqa: F401  (registers the handlers)
+from utils.jobs import run_worker
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--once", action="store_true", help="Exit when no job is runnable")
+    ap.add_argument("--poll", type=float, default=2.0, help="Idle poll interval in seconds")
+    args = ap.parse_args()
+    run_worker(connect_db, poll_interval=args.poll, once=args.once)
+
+
+if __name__ == "__main__":
+    main()